@@ -12,15 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import TYPE_CHECKING, Optional
+from collections import OrderedDict
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Generic, Optional, TypeVar
 
 from dogpile.cache.region import CacheRegion
 
 from rucio.common.config import config_get, is_client
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Hashable
 
+_V = TypeVar('_V')
 
 CACHE_URL = config_get('cache', 'url', False, '127.0.0.1:11211', check_config_table=False)
 
@@ -118,3 +121,71 @@ class CacheKey:
     @staticmethod
     def value(section: str, option: str) -> str:
         return CacheKey._generate_key('get', section, option)
+
+
+class LRUCache(Generic[_V]):
+    """
+    Process-local, thread-safe, size-bounded least-recently-used cache.
+
+    Used for deterministic values which are costly to compute but cheap to
+    keep in memory, and which don't need to be shared between processes
+    (for which MemcacheRegion must be used instead).
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict['Hashable', _V] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: 'Hashable') -> bool:
+        return key in self._data
+
+    def get(self, key: 'Hashable', default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: 'Hashable', value: _V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: 'Hashable') -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self) -> list[tuple['Hashable', _V]]:
+        """
+        Snapshot of the entries, from the least to the most recently used.
+        """
+        with self._lock:
+            return list(self._data.items())
+
+    def delete_matching(self, predicate: 'Callable[[Hashable], bool]') -> None:
+        """
+        Remove all entries whose key satisfies the predicate.
+        """
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
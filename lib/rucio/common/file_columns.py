@@ -0,0 +1,125 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from array import array
+from collections.abc import Iterator, Sequence
+from typing import TYPE_CHECKING, Any, Optional, Union, overload
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from rucio.common.types import InternalScope
+
+_NO_BYTES = -1
+
+
+class FileColumns(Sequence[dict[str, Any]]):
+    """
+    Compact, column-oriented list of files.
+
+    Rule evaluation holds every file of the evaluated DID in memory, as
+    {'scope':, 'name':, 'bytes':, 'md5':, 'adler32':} dictionaries. For containers with
+    hundreds of thousands of files, the per-file dictionaries and the InternalScope object
+    created for every row dominate the memory of the workers. FileColumns stores the files
+    in parallel columns instead: one shared InternalScope per distinct scope, the sizes in
+    an array of machine integers, and the names and checksums in plain lists.
+
+    It behaves as a read-only sequence of the usual file dictionaries, which are built on
+    access, so code iterating over the files does not need to know about the storage.
+    """
+
+    __slots__ = ('_scopes', '_scope_positions', '_scope_ids', '_names', '_bytes', '_md5', '_adler32')
+
+    def __init__(self, files: "Optional[Iterable[dict[str, Any]]]" = None):
+        self._scopes: list[InternalScope] = []
+        self._scope_positions: dict[InternalScope, int] = {}
+        self._scope_ids = array('I')
+        self._names: list[str] = []
+        self._bytes = array('q')
+        self._md5: list[Optional[str]] = []
+        self._adler32: list[Optional[str]] = []
+        for file in files or []:
+            self.append(file['scope'], file['name'], file.get('bytes'), file.get('md5'), file.get('adler32'))
+
+    def intern_scope(self, scope: "InternalScope") -> "InternalScope":
+        """
+        :returns: The InternalScope instance shared by all the files of this scope.
+        """
+        position = self._scope_positions.get(scope)
+        if position is None:
+            position = self._scope_positions[scope] = len(self._scopes)
+            self._scopes.append(scope)
+        return self._scopes[position]
+
+    def append(
+            self,
+            scope: "InternalScope",
+            name: str,
+            bytes_: Optional[int],
+            md5: Optional[str],
+            adler32: Optional[str]
+    ) -> "InternalScope":
+        """
+        Add a file.
+
+        :returns: The interned scope of the file, to be used in the keys of the lock and replica dictionaries.
+        """
+        scope = self.intern_scope(scope)
+        self._scope_ids.append(self._scope_positions[scope])
+        self._names.append(name)
+        self._bytes.append(_NO_BYTES if bytes_ is None else bytes_)
+        self._md5.append(md5)
+        self._adler32.append(adler32)
+        return scope
+
+    def total_bytes(self) -> int:
+        """
+        :returns: The sum of the sizes of the files.
+        """
+        return sum(bytes_ for bytes_ in self._bytes if bytes_ != _NO_BYTES)
+
+    def _file(self, index: int) -> dict[str, Any]:
+        bytes_ = self._bytes[index]
+        return {'scope': self._scopes[self._scope_ids[index]],
+                'name': self._names[index],
+                'bytes': None if bytes_ == _NO_BYTES else bytes_,
+                'md5': self._md5[index],
+                'adler32': self._adler32[index]}
+
+    @overload
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[dict[str, Any]]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict[str, Any], list[dict[str, Any]]]:
+        if isinstance(index, slice):
+            return [self._file(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('FileColumns index out of range')
+        return self._file(index)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for index in range(len(self._names)):
+            yield self._file(index)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __repr__(self) -> str:
+        return f'FileColumns({len(self)} files)'
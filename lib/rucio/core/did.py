@@ -19,7 +19,7 @@ from hashlib import md5
 from re import match
 from typing import TYPE_CHECKING, Any, Literal, Optional, Union
 
-from sqlalchemy import and_, delete, exists, insert, or_, update
+from sqlalchemy import Integer, and_, delete, exists, insert, or_, update
 from sqlalchemy.exc import DatabaseError, IntegrityError, NoResultFound
 from sqlalchemy.sql import func, not_
 from sqlalchemy.sql.expression import bindparam, case, false, null, select, true
@@ -1583,6 +1583,82 @@ def list_all_parent_dids(
             yield {'scope': pdid['scope'], 'name': pdid['name'], 'type': pdid['type']}
 
 
+@read_session
+def list_all_parent_dids_bulk(
+    dids: "Iterable[Mapping[str, Any]]",
+    *,
+    temp_table: Optional[Any] = None,
+    session: "Session"
+) -> "dict[tuple[InternalScope, str], list[dict[str, Any]]]":
+    """
+    List all parent datasets and containers, no matter on what level, for a batch of DIDs.
+
+    Equivalent to calling list_all_parent_dids for each input DID, but uses a single
+    recursive query for the whole batch.
+
+    :param dids:        The DIDs (dictionaries with 'scope' and 'name') to resolve.
+    :param temp_table:  A scope/name temporary table to load the DIDs into, replacing its rows.
+                        Lets callers resolving many batches reuse one table. Created if not given.
+    :param session:     The database session.
+    :returns:         Dictionary {(scope, name): [{'scope': ..., 'name': ..., 'type': ...}, ...]}
+                      containing an entry for each input DID.
+    """
+    result = {}
+    for did in dids:
+        result.setdefault((did['scope'], did['name']), [])
+    if not result:
+        return result
+
+    if temp_table is None:
+        temp_table = temp_table_mngr(session).create_scope_name_table()
+    else:
+        session.execute(delete(temp_table))
+    session.execute(insert(temp_table), [{'scope': scope, 'name': name} for scope, name in result])
+
+    # Uses a recursive SQL CTE (Common Table Expressions) which keeps track of
+    # the input DID each ancestor was reached from
+    initial_set = select(
+        models.DataIdentifierAssociation.child_scope.label('input_scope'),
+        models.DataIdentifierAssociation.child_name.label('input_name'),
+        models.DataIdentifierAssociation.scope,
+        models.DataIdentifierAssociation.name,
+        models.DataIdentifierAssociation.did_type,
+    ).join_from(
+        temp_table,
+        models.DataIdentifierAssociation,
+        and_(models.DataIdentifierAssociation.child_scope == temp_table.scope,
+             models.DataIdentifierAssociation.child_name == temp_table.name),
+    ).cte(
+        recursive=True,
+    )
+
+    # Oracle doesn't support union() in recursive CTEs, so use UNION ALL.
+    # Same as list_all_parent_dids, a DID reachable via multiple paths is returned multiple times.
+    parents_cte = initial_set.union_all(
+        select(
+            initial_set.c.input_scope,
+            initial_set.c.input_name,
+            models.DataIdentifierAssociation.scope,
+            models.DataIdentifierAssociation.name,
+            models.DataIdentifierAssociation.did_type,
+        ).where(
+            and_(models.DataIdentifierAssociation.child_scope == initial_set.c.scope,
+                 models.DataIdentifierAssociation.child_name == initial_set.c.name)
+        )
+    )
+
+    stmt = select(
+        parents_cte.c.input_scope,
+        parents_cte.c.input_name,
+        parents_cte.c.scope,
+        parents_cte.c.name,
+        parents_cte.c.did_type,
+    )
+    for input_scope, input_name, scope, name, did_type in session.execute(stmt).yield_per(1000):
+        result[input_scope, input_name].append({'scope': scope, 'name': name, 'type': did_type})
+    return result
+
+
 def list_child_dids_stmt(
         input_dids_table: Any,
         did_type: DIDType,
@@ -2472,6 +2548,11 @@ def touch_dids(
     """
     Update the accessed_at timestamp and the access_cnt of the given DIDs.
 
+    Repeated touches of the same DID are coalesced into a single update which keeps the
+    latest accessed_at and increments access_cnt by the number of touches (or by the
+    'count' of the entries, if given). The updates are issued in primary key order, so
+    concurrent callers lock the rows in the same order.
+
     :param replicas: the list of DIDs.
     :param session: The database session in use.
 
@@ -2479,23 +2560,35 @@ def touch_dids(
     """
 
     now = datetime.utcnow()
-    none_value = None
+    touches = {}
+    for did in dids:
+        key = (did['scope'].internal, did['name'], did['type'])
+        accessed_at, count = did.get('accessed_at') or now, did.get('count', 1)
+        if key in touches:
+            _, previous_accessed_at, previous_count = touches[key]
+            touches[key] = (did['scope'], max(previous_accessed_at, accessed_at), previous_count + count)
+        else:
+            touches[key] = (did['scope'], accessed_at, count)
+    if not touches:
+        return True
+
+    dids_table = models.DataIdentifier.__table__
+    count_param = bindparam('b_count', type_=Integer())
+    stmt = update(
+        dids_table
+    ).where(
+        and_(dids_table.c.scope == bindparam('b_scope'),
+             dids_table.c.name == bindparam('b_name'),
+             dids_table.c.did_type == bindparam('b_did_type'))
+    ).values({
+        dids_table.c.accessed_at: bindparam('b_accessed_at'),
+        dids_table.c.access_cnt: case((dids_table.c.access_cnt.is_(None), count_param),
+                                      else_=(dids_table.c.access_cnt + count_param))
+    })
+    values = [{'b_scope': scope, 'b_name': name, 'b_did_type': did_type, 'b_accessed_at': accessed_at, 'b_count': count}
+              for (_, name, did_type), (scope, accessed_at, count) in sorted(touches.items(), key=lambda item: item[0][:2])]
     try:
-        for did in dids:
-            stmt = update(
-                models.DataIdentifier
-            ).where(
-                and_(models.DataIdentifier.scope == did['scope'],
-                     models.DataIdentifier.name == did['name'],
-                     models.DataIdentifier.did_type == did['type'])
-            ).values({
-                models.DataIdentifier.accessed_at: did.get('accessed_at') or now,
-                models.DataIdentifier.access_cnt: case((models.DataIdentifier.access_cnt == none_value, 1),
-                                                       else_=(models.DataIdentifier.access_cnt + 1))  # type: ignore
-            }).execution_options(
-                synchronize_session=False
-            )
-            session.execute(stmt)
+        session.execute(stmt, values)
     except DatabaseError:
         return False
 
@@ -16,7 +16,7 @@ import datetime
 import hashlib
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy import and_, case, delete, func, insert, select, update
 
 from rucio.common.exception import DatabaseException
 from rucio.common.utils import pid_exists
@@ -24,6 +24,7 @@ from rucio.db.sqla.models import Heartbeat
 from rucio.db.sqla.session import read_session, transactional_session
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
     from threading import Thread
     from typing import TypedDict
 
@@ -39,6 +40,9 @@ if TYPE_CHECKING:
         payload: Optional[str]
         test: int
 
+    # the number of live heartbeats of an executable and the creation time of the most recent one
+    Membership = tuple[int, Optional[datetime.datetime]]
+
 DEFAULT_EXPIRATION_DELAY = datetime.timedelta(days=1).total_seconds()
 
 
@@ -192,6 +196,95 @@ def live(
                   payload=payload).save(session=session)
 
     # assign thread identifier
+    return assignment(_list_members(hash_executable, older_than, session=session), hostname, pid, thread_id)
+
+
+@transactional_session
+def live_threads(
+    executable: str,
+    hostname: str,
+    pid: int,
+    threads: "Sequence[tuple[Thread, Optional[str]]]",
+    older_than: int = 600,
+    hash_executable: Optional[str] = None,
+    membership: "Optional[Membership]" = None,
+    *,
+    session: "Session"
+) -> tuple["Membership", Optional[list[tuple[str, int, int]]]]:
+    """
+    Register the heartbeats of several threads of a process in one statement.
+    The list of the live heartbeats of the executable, from which the thread assignments are
+    computed, is only read if the membership changed since the given one.
+
+    :param executable: Executable name as a string, e.g., conveyor-submitter.
+    :param hostname: Hostname as a string, e.g., rucio-daemon-prod-01.cern.ch.
+    :param pid: UNIX Process ID as a number, e.g., 1234.
+    :param threads: The Python Thread Objects and their payloads.
+    :param older_than: Ignore specified heartbeats older than specified nr of seconds.
+    :param hash_executable: Hash of the executable.
+    :param membership: The membership returned by the previous call, None to read the list of heartbeats in any case.
+    :param session: The database session in use.
+
+    :returns: The current membership, and the (hostname, pid, thread_id) of the live heartbeats ordered as
+              expected by assignment(), or None if the membership did not change.
+    """
+    if not hash_executable:
+        hash_executable = calc_hash(executable)
+
+    # one heartbeat per thread identifier, which the interpreter reuses once a thread exited
+    threads_by_id = {thread.ident: (thread, payload) for thread, payload in threads}
+    payloads = {thread_id: payload for thread_id, (_, payload) in threads_by_id.items()}
+    stmt = update(
+        Heartbeat
+    ).where(
+        and_(Heartbeat.executable == hash_executable,
+             Heartbeat.hostname == hostname,
+             Heartbeat.pid == pid,
+             Heartbeat.thread_id.in_(payloads))
+    ).values({
+        Heartbeat.updated_at: datetime.datetime.utcnow(),
+        Heartbeat.payload: case(payloads, value=Heartbeat.thread_id)
+    }).execution_options(
+        synchronize_session=False
+    )
+    if session.execute(stmt).rowcount < len(payloads):
+        stmt = select(
+            Heartbeat.thread_id
+        ).where(
+            and_(Heartbeat.executable == hash_executable,
+                 Heartbeat.hostname == hostname,
+                 Heartbeat.pid == pid,
+                 Heartbeat.thread_id.in_(payloads))
+        )
+        existing = set(session.execute(stmt).scalars().all())
+        session.execute(insert(Heartbeat), [{'executable': hash_executable,
+                                             'readable': executable[:Heartbeat.readable.property.columns[0].type.length],
+                                             'hostname': hostname,
+                                             'pid': pid,
+                                             'thread_id': thread.ident,
+                                             'thread_name': thread.name,
+                                             'payload': payload}
+                                            for thread, payload in threads_by_id.values() if thread.ident not in existing])
+
+    stmt = select(
+        func.count(),
+        func.max(Heartbeat.created_at)
+    ).where(
+        and_(Heartbeat.executable == hash_executable,
+             Heartbeat.updated_at >= datetime.datetime.utcnow() - datetime.timedelta(seconds=older_than))
+    )
+    current = tuple(session.execute(stmt).one())
+    if current == membership:
+        return membership, None
+    return current, _list_members(hash_executable, older_than, session=session)
+
+
+def _list_members(
+    hash_executable: str,
+    older_than: int,
+    *,
+    session: "Session"
+) -> list[tuple[str, int, int]]:
     stmt = select(
         Heartbeat.hostname,
         Heartbeat.pid,
@@ -212,18 +305,30 @@ def live(
         Heartbeat.pid,
         Heartbeat.thread_id
     )
-    result = session.execute(stmt).all()
+    return [tuple(row) for row in session.execute(stmt).all()]
 
+
+def assignment(members: "Sequence[tuple[str, int, int]]", hostname: str, pid: int, thread_id: int) -> dict[str, int]:
+    """
+    Compute the assignment of a thread from the live heartbeats of its executable.
+
+    :param members: The (hostname, pid, thread_id) of the live heartbeats, as returned by live_threads.
+    :param hostname: Hostname of the thread.
+    :param pid: UNIX Process ID of the thread.
+    :param thread_id: Identifier of the thread.
+
+    :returns heartbeats: Dictionary {assign_thread, nr_threads}
+    """
     # there is no universally applicable rownumber in SQLAlchemy
     # so we have to do it in Python
     assign_thread = 0
-    for r in range(len(result)):
-        if result[r][0] == hostname and result[r][1] == pid and result[r][2] == thread_id:
+    for r in range(len(members)):
+        if members[r][0] == hostname and members[r][1] == pid and members[r][2] == thread_id:
             assign_thread = r
             break
 
     return {'assign_thread': assign_thread,
-            'nr_threads': len(result)}
+            'nr_threads': len(members)}
 
 
 @transactional_session
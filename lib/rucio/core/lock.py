@@ -13,22 +13,25 @@
 # limitations under the License.
 
 import logging
+from collections import defaultdict
 from datetime import datetime
 from typing import TYPE_CHECKING, Any, Optional, Union
 
 from sqlalchemy.exc import DatabaseError
-from sqlalchemy.sql.expression import and_, or_, select, true, update
+from sqlalchemy.sql.expression import and_, delete, insert, or_, select, true, update
 
 import rucio.core.did
 import rucio.core.rule
 from rucio.common.constants import RseAttr
 from rucio.common.exception import DataIdentifierNotFound
 from rucio.common.types import InternalScope, LoggerFunction
+from rucio.common.utils import chunks
 from rucio.core.lifetime_exception import define_eol
 from rucio.core.rse import get_rse_attribute, get_rse_name
 from rucio.db.sqla import filter_thread_work, models
-from rucio.db.sqla.constants import DIDType, LockState, RuleGrouping, RuleNotification, RuleState
+from rucio.db.sqla.constants import DIDType, LockState, ReplicaState, RuleGrouping, RuleNotification, RuleState
 from rucio.db.sqla.session import read_session, stream_session, transactional_session
+from rucio.db.sqla.util import temp_table_mngr
 
 if TYPE_CHECKING:
     from collections.abc import Iterable, Iterator
@@ -263,7 +266,7 @@ def get_files_and_replica_locks_of_dataset(scope: InternalScope, name: str, nowa
                            and as value: [LockObject]
     :raises:               NoResultFound
     """
-    locks = {}
+    locks, scopes = {}, {}
 
     rse_clause = [true()]
     if restrict_rses is not None:
@@ -289,7 +292,7 @@ def get_files_and_replica_locks_of_dataset(scope: InternalScope, name: str, nowa
                                            thread_id=thread_id, hash_variable='child_name')
 
         for child_scope, child_name in session.execute(base_stmt).yield_per(1000):
-            locks[(child_scope, child_name)] = []
+            locks[(scopes.setdefault(child_scope, child_scope), child_name)] = []
 
         stmt = stmt.where(
             and_(models.DataIdentifierAssociation.child_scope == models.ReplicaLock.scope,
@@ -317,8 +320,10 @@ def get_files_and_replica_locks_of_dataset(scope: InternalScope, name: str, nowa
         stmt = filter_thread_work(session=session, query=stmt, total_threads=total_threads,
                                   thread_id=thread_id, hash_variable='child_name')
 
-    for child_scope, child_name, lock in session.execute(stmt).all():
+    for child_scope, child_name, lock in session.execute(stmt).yield_per(1000):
         if (child_scope, child_name) not in locks:
+            # share one InternalScope instance between the keys of the same scope
+            child_scope = scopes.setdefault(child_scope, child_scope)
             if lock is None:
                 locks[(child_scope, child_name)] = []
             else:
@@ -527,6 +532,160 @@ def failed_transfer(scope: InternalScope, name: str, rse_id: str, error_message:
         rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
 
 
+@transactional_session
+def finished_transfers(replicas: "Iterable[dict[str, Any]]", nowait: bool = True, *, session: "Session", logger: LoggerFunction = logging.log) -> None:
+    """
+    Update the state of the replica locks and of their rules because of a batch of finished transfers.
+    Same as calling successful_transfer or failed_transfer for each replica, in order, but the locks and
+    rules are loaded with one query per RSE and the consequences of the rule changes (dataset locks,
+    notifications, updated collection replicas, rule history) are generated once per rule.
+
+    :param replicas:  List of dictionaries with the scope, name, rse_id and state (ReplicaState.AVAILABLE for a
+                      successful transfer, ReplicaState.UNAVAILABLE for a failed one) and optionally the error_message,
+                      broken_rule_id and broken_message of the failed_transfer call.
+    :param nowait:    Nowait parameter for the for_update queries.
+    :param session:   The database session in use.
+    """
+
+    replicas = list(replicas)
+    temp_table_cls = temp_table_mngr(session).create_scope_name_table()
+    locks_by_replica = defaultdict(list)
+    staging_required_rse_ids = set()
+    for rse_id in sorted({replica['rse_id'] for replica in replicas}):
+        if get_rse_attribute(rse_id, RseAttr.STAGING_REQUIRED, session=session):
+            staging_required_rse_ids.add(rse_id)
+        session.execute(delete(temp_table_cls))
+        session.execute(insert(temp_table_cls), [{'scope': scope, 'name': name}
+                                                 for scope, name in dict.fromkeys((r['scope'], r['name']) for r in replicas if r['rse_id'] == rse_id)])
+        stmt = select(
+            models.ReplicaLock
+        ).join_from(
+            temp_table_cls,
+            models.ReplicaLock,
+            and_(models.ReplicaLock.scope == temp_table_cls.scope,
+                 models.ReplicaLock.name == temp_table_cls.name,
+                 models.ReplicaLock.rse_id == rse_id)
+        ).with_for_update(
+            nowait=nowait,
+            of=models.ReplicaLock
+        )
+        for lock in session.execute(stmt).scalars().all():
+            locks_by_replica[lock.scope, lock.name, lock.rse_id].append(lock)
+
+    rules = {}
+    rule_ids = sorted({lock.rule_id for locks in locks_by_replica.values() for lock in locks})
+    for chunk in chunks(rule_ids, 1000):
+        stmt = select(
+            models.ReplicationRule
+        ).where(
+            models.ReplicationRule.id.in_(chunk)
+        ).with_for_update(
+            nowait=nowait
+        )
+        rules.update((rule.id, rule) for rule in session.execute(stmt).scalars().all())
+
+    # For each updated rule: the replicating locks before the batch, the new state of its dataset locks,
+    # whether it became OK, and the RSEs of its locks which became OK
+    replicating_locks_before, dataset_lock_states, ok_rule_ids, ok_rse_ids = {}, {}, set(), defaultdict(set)
+    for replica in replicas:
+        successful = replica['state'] == ReplicaState.AVAILABLE
+        for lock in locks_by_replica.get((replica['scope'], replica['name'], replica['rse_id']), []):
+            if successful and lock.state == LockState.OK:
+                continue
+            if not successful and (lock.state == LockState.STUCK or (lock.rse_id in staging_required_rse_ids and lock.state != LockState.REPLICATING)):
+                continue
+            rule = rules[lock.rule_id]
+            replicating_locks_before.setdefault(rule.id, rule.locks_replicating_cnt)
+
+            if lock.state == LockState.REPLICATING:
+                rule.locks_replicating_cnt -= 1
+            elif lock.state == LockState.STUCK:
+                rule.locks_stuck_cnt -= 1
+            elif lock.state == LockState.OK:
+                rule.locks_ok_cnt -= 1
+
+            if successful:
+                rule.locks_ok_cnt += 1
+                lock.state = LockState.OK
+                ok_rse_ids[rule.id].add(lock.rse_id)
+                if rule.state == RuleState.SUSPENDED:
+                    pass
+                elif rule.locks_stuck_cnt > 0:
+                    pass
+                elif rule.locks_replicating_cnt == 0 and rule.state == RuleState.REPLICATING:
+                    rule.state = RuleState.OK
+                    dataset_lock_states[rule.id] = LockState.OK
+                    ok_rule_ids.add(rule.id)
+            else:
+                rule.locks_stuck_cnt += 1
+                lock.state = LockState.STUCK
+                error_message, broken_message = replica.get('error_message'), replica.get('broken_message')
+                if rule.state == RuleState.SUSPENDED:
+                    pass
+                elif lock.rule_id == replica.get('broken_rule_id'):
+                    rule.state = RuleState.SUSPENDED
+                    if broken_message is not None and len(broken_message) > 245:
+                        rule.error = (broken_message[:245] + '...')
+                    else:
+                        rule.error = broken_message
+                    dataset_lock_states[rule.id] = LockState.STUCK
+                elif rule.locks_stuck_cnt > 0:
+                    if rule.state != RuleState.STUCK:
+                        rule.state = RuleState.STUCK
+                        dataset_lock_states[rule.id] = LockState.STUCK
+                    if rule.error != error_message:
+                        if error_message is not None and len(error_message) > 245:
+                            rule.error = (error_message[:245] + '...')
+                        else:
+                            rule.error = error_message
+
+    for rule_id in sorted(replicating_locks_before):
+        rule = rules[rule_id]
+        logger(logging.DEBUG, 'Updated rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+
+        # Insert UpdatedCollectionReplica
+        if rule.did_type == DIDType.DATASET:
+            for rse_id in ok_rse_ids[rule_id]:
+                models.UpdatedCollectionReplica(scope=rule.scope,
+                                                name=rule.name,
+                                                did_type=rule.did_type,
+                                                rse_id=rse_id).save(flush=False, session=session)
+        elif rule.did_type == DIDType.CONTAINER and ok_rse_ids[rule_id]:
+            # Resolve to all child datasets
+            for dataset in rucio.core.did.list_child_datasets(scope=rule.scope, name=rule.name, session=session):
+                for rse_id in ok_rse_ids[rule_id]:
+                    models.UpdatedCollectionReplica(scope=dataset['scope'],
+                                                    name=dataset['name'],
+                                                    did_type=DIDType.DATASET,
+                                                    rse_id=rse_id).save(flush=False, session=session)
+
+        # Update the DatasetLocks
+        if rule_id in dataset_lock_states and rule.grouping != RuleGrouping.NONE:
+            stmt = select(
+                models.DatasetLock
+            ).where(
+                models.DatasetLock.rule_id == rule.id
+            ).with_for_update(
+                nowait=nowait
+            )
+            for ds_lock in session.execute(stmt).scalars().all():
+                ds_lock.state = dataset_lock_states[rule_id]
+            session.flush()
+
+        if rule_id in ok_rule_ids and rule.state == RuleState.OK:
+            rucio.core.rule.generate_rule_notifications(rule=rule, replicating_locks_before=replicating_locks_before[rule_id], session=session)
+            if rule.notification == RuleNotification.YES:
+                rucio.core.rule.generate_email_for_rule_ok_notification(rule=rule, session=session)
+            # Try to release potential parent rules
+            rucio.core.rule.release_parent_rule(child_rule_id=rule.id, session=session)
+        elif ok_rse_ids[rule_id] and rule.locks_replicating_cnt > 0 and rule.state == RuleState.REPLICATING and rule.notification == RuleNotification.PROGRESS:
+            rucio.core.rule.generate_rule_notifications(rule=rule, replicating_locks_before=replicating_locks_before[rule_id], session=session)
+
+        # Insert rule history
+        rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+    session.flush()
+
+
 @transactional_session
 def touch_dataset_locks(dataset_locks: "Iterable[dict[str, Any]]", *, session: "Session") -> bool:
     """
@@ -22,6 +22,7 @@ from rucio.common.config import config_get_list
 from rucio.common.constants import MAX_MESSAGE_LENGTH, HermesService
 from rucio.common.exception import InvalidObject, RucioException
 from rucio.common.utils import APIEncoder, chunks
+from rucio.core.work_queue import claim_work
 from rucio.db.sqla import filter_thread_work
 from rucio.db.sqla.models import Message, MessageHistory
 from rucio.db.sqla.session import transactional_session
@@ -34,6 +35,8 @@ if TYPE_CHECKING:
     MessageType = dict[str, Any]
     MessagesListType = list[MessageType]
 
+WORK_QUEUE = 'messages'
+
 
 @transactional_session
 def add_messages(messages: "MessagesListType", *, session: "Session") -> None:
@@ -102,6 +105,8 @@ def retrieve_messages(bulk: int = 1000,
                       lock: bool = False,
                       old_mode: bool = True,
                       service_filter: "Optional[str]" = None,
+                      claim_owner: "Optional[str]" = None,
+                      lease_time: int = 600,
                       *, session: "Session") -> "MessagesListType":
     """
     Retrieve up to $bulk messages.
@@ -114,17 +119,19 @@ def retrieve_messages(bulk: int = 1000,
     :param old_mode: If True, doesn't return email if event_type is None.
     :param session: The database session to use.
     :param service_filter: When a service is supplied this queries the database for messages for that service.
+    :param claim_owner: If set, claim the messages in the WORK_QUEUE work queue for this owner instead of partitioning them by thread.
+    :param lease_time: Seconds during which the claimed messages are not returned to other owners.
 
     :returns messages: List of dictionaries {id, created_at, event_type, payload, services}
     """
-    messages = []
     try:
         stmt_subquery = select(
             Message.id
         ).order_by(
             Message.created_at
         )
-        stmt_subquery = filter_thread_work(session=session, query=stmt_subquery, total_threads=total_threads, thread_id=thread)
+        if not claim_owner:
+            stmt_subquery = filter_thread_work(session=session, query=stmt_subquery, total_threads=total_threads, thread_id=thread)
         if service_filter:
             stmt_subquery = stmt_subquery.where(
                 Message.services == service_filter
@@ -138,11 +145,6 @@ def retrieve_messages(bulk: int = 1000,
                 Message.event_type != 'email'
             )
 
-        # Step 1:
-        # MySQL does not support limits in nested queries, limit on the outer query instead.
-        # This is not as performant, but the best we can get from MySQL.
-        # FIXME: SQLAlchemy generates wrong nowait MySQL8 statement for MySQL5
-        #        Remove once this is resolved in SQLAlchemy
         stmt = select(
             Message.id,
             Message.created_at,
@@ -150,6 +152,18 @@ def retrieve_messages(bulk: int = 1000,
             Message.payload,
             Message.services
         )
+        if claim_owner:
+            message_ids = claim_work(queue=WORK_QUEUE, owner=claim_owner, candidates=stmt_subquery, limit=bulk, lease_time=lease_time, session=session)
+            rows = []
+            for chunk in chunks(message_ids, 1000):
+                rows.extend(session.execute(stmt.where(Message.id.in_(chunk)).order_by(Message.created_at)).all())
+            return _build_messages(rows, session=session)
+
+        # Step 1:
+        # MySQL does not support limits in nested queries, limit on the outer query instead.
+        # This is not as performant, but the best we can get from MySQL.
+        # FIXME: SQLAlchemy generates wrong nowait MySQL8 statement for MySQL5
+        #        Remove once this is resolved in SQLAlchemy
         if session.bind.dialect.name == 'mysql':
             stmt = stmt.where(
                 Message.id.in_(stmt_subquery)
@@ -174,31 +188,35 @@ def retrieve_messages(bulk: int = 1000,
 
         # Step 3:
         # Assemble message object
-        for id_, created_at, event_type, payload, services in session.execute(stmt).all():
-            message = {'id': id_,
-                       'created_at': created_at,
-                       'event_type': event_type,
-                       'services': services}
-
-            # Only switch SQL context when necessary
-            if payload == 'nolimit':
-                nolimit_stmt = select(
-                    Message.payload_nolimit
-                ).where(
-                    Message.id == id_
-                )
-                message['payload'] = json.loads(str(session.execute(nolimit_stmt).scalar_one()))
-            else:
-                message['payload'] = json.loads(str(payload))
-
-            messages.append(message)
-
-        return messages
+        return _build_messages(session.execute(stmt).all(), session=session)
 
     except IntegrityError as e:
         raise RucioException(e.args)
 
 
+def _build_messages(rows, *, session: "Session") -> "MessagesListType":
+    messages = []
+    for id_, created_at, event_type, payload, services in rows:
+        message = {'id': id_,
+                   'created_at': created_at,
+                   'event_type': event_type,
+                   'services': services}
+
+        # Only switch SQL context when necessary
+        if payload == 'nolimit':
+            nolimit_stmt = select(
+                Message.payload_nolimit
+            ).where(
+                Message.id == id_
+            )
+            message['payload'] = json.loads(str(session.execute(nolimit_stmt).scalar_one()))
+        else:
+            message['payload'] = json.loads(str(payload))
+
+        messages.append(message)
+    return messages
+
+
 @transactional_session
 def delete_messages(messages: "MessagesListType", *, session: "Session") -> None:
     """
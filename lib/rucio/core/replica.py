@@ -17,6 +17,7 @@ import heapq
 import logging
 import math
 import random
+import time
 from collections import defaultdict, namedtuple
 from curses.ascii import isprint
 from datetime import datetime, timedelta
@@ -24,29 +25,31 @@ from hashlib import sha256
 from itertools import groupby
 from re import match
 from struct import unpack
+from threading import Lock
 from traceback import format_exc
 from typing import TYPE_CHECKING, Any, Literal, Optional, Union
 
 import requests
 from dogpile.cache.api import NO_VALUE
-from sqlalchemy import and_, delete, exists, func, insert, not_, or_, union, update
+from sqlalchemy import DateTime, Integer, and_, delete, exists, func, insert, not_, or_, tuple_, union, update
 from sqlalchemy.exc import DatabaseError, IntegrityError
 from sqlalchemy.orm import aliased
 from sqlalchemy.orm.exc import FlushError, NoResultFound
-from sqlalchemy.sql.expression import ColumnElement, case, false, literal, literal_column, null, select, text, true
+from sqlalchemy.sql.expression import ColumnElement, bindparam, case, false, literal, literal_column, null, select, text, true
 
 import rucio.core.did
 import rucio.core.lock
 from rucio.common import exception
-from rucio.common.cache import MemcacheRegion
-from rucio.common.config import config_get, config_get_bool
+from rucio.common.cache import LRUCache, MemcacheRegion
+from rucio.common.config import config_get, config_get_bool, config_get_int
 from rucio.common.constants import DEFAULT_VO, RseAttr, SuspiciousAvailability
+from rucio.common.file_columns import FileColumns
 from rucio.common.types import InternalAccount, InternalScope, IPDict, LFNDict, is_str_list
 from rucio.common.utils import add_url_query, chunks, clean_pfns, str_to_date
 from rucio.core.credential import get_signed_url
 from rucio.core.message import add_messages
 from rucio.core.monitor import MetricManager
-from rucio.core.rse import get_rse, get_rse_attribute, get_rse_name, get_rse_vo, list_rses
+from rucio.core.rse import get_rse, get_rse_attribute, get_rse_name, list_rses
 from rucio.core.rse_counter import decrease, increase
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.db.sqla import filter_thread_work, models
@@ -68,6 +71,18 @@ if TYPE_CHECKING:
 REGION = MemcacheRegion(expiration_time=60)
 METRICS = MetricManager(module=__name__)
 
+# Process-wide caches used by list_replicas. Protocols are cached per (rse_id, domain, schemes, archive)
+# together with their expiration time; deterministic paths per (determinism_type, scope, name).
+# The protocols of an RSE are dropped when they are modified, other processes pick up the change
+# once their entries expire, same as the rse_info cached in memcache.
+PROTOCOLS_CACHE: LRUCache[tuple[float, 'list[tuple[str, RSEProtocol, int]]']] = LRUCache(
+    maxsize=config_get_int('core', 'list_replicas_protocols_cache_size', raise_exception=False, default=10000, check_config_table=False)
+)
+PROTOCOLS_CACHE_EXPIRATION = config_get_int('core', 'list_replicas_protocols_cache_expiration', raise_exception=False, default=900, check_config_table=False)
+PATHS_CACHE: LRUCache[str] = LRUCache(
+    maxsize=config_get_int('core', 'list_replicas_paths_cache_size', raise_exception=False, default=100000, check_config_table=False)
+)
+
 
 ScopeName = namedtuple('ScopeName', ['scope', 'name'])
 Association = namedtuple('Association', ['scope', 'name', 'child_scope', 'child_name'])
@@ -532,6 +547,101 @@ def declare_bad_file_replicas(
     return unknown_replicas
 
 
+def _pfn_authority(pfn: str) -> tuple[str, str]:
+    """
+    Split a PFN (or a protocol pattern) into its 'scheme://host[:port]' authority and the remaining path.
+    """
+    path_start = pfn.find('/', pfn.find('://') + 3)
+    if path_start < 0:
+        return pfn, ''
+    return pfn[:path_start], pfn[path_start:]
+
+
+class PFNToRSEIndex:
+    """
+    In-memory prefix index of all RSE protocols, used to resolve PFNs to RSEs.
+
+    The index is a two-level structure: 'scheme://host[:port]' authorities map to the
+    path prefixes registered for them, sorted by decreasing length. Resolving a PFN
+    is a dictionary lookup followed by a few prefix comparisons, instead of a scan of
+    all protocols of all RSEs.
+    """
+
+    def __init__(self, protocols: "Iterable[tuple[str, str, str, str, int, Optional[str]]]"):
+        """
+        :param protocols: (rse_id, vo, scheme, hostname, port, prefix) tuples
+        """
+        index: dict[str, dict[str, set[tuple[str, str]]]] = {}
+        for rse_id, vo, scheme, hostname, port, prefix in protocols:
+            # Each protocol can be referenced in PFNs with or without an explicit port
+            for pattern in ('%s://%s:%s%s' % (scheme, hostname, port, prefix or ''),
+                            '%s://%s%s' % (scheme, hostname, prefix or '')):
+                authority, path_prefix = _pfn_authority(pattern)
+                index.setdefault(authority, {}).setdefault(path_prefix, set()).add((rse_id, vo))
+        self._index = {
+            authority: sorted(prefixes.items(), key=lambda item: len(item[0]), reverse=True)
+            for authority, prefixes in index.items()
+        }
+
+    def lookup(self, pfn: str, vo: str = DEFAULT_VO) -> set[str]:
+        """
+        Return the ids of the RSEs of the given VO which have a protocol matching the PFN.
+        """
+        authority, path = _pfn_authority(pfn)
+        rse_ids = set()
+        for prefix, rses in self._index.get(authority, ()):
+            if path.startswith(prefix):
+                rse_ids.update(rse_id for rse_id, rse_vo in rses if rse_vo == vo)
+        return rse_ids
+
+
+_PFN_TO_RSE_INDEX: "Optional[tuple[Any, PFNToRSEIndex]]" = None
+_PFN_TO_RSE_INDEX_LOCK = Lock()
+
+
+@read_session
+def get_pfn_to_rse_index(*, session: "Session") -> PFNToRSEIndex:
+    """
+    Return the process-wide PFNToRSEIndex, rebuilding it if the RSE protocols changed since it was built.
+    """
+    global _PFN_TO_RSE_INDEX
+
+    stmt = select(
+        func.count(models.RSEProtocol.rse_id),
+        func.max(models.RSEProtocol.updated_at),
+        select(func.max(models.RSE.updated_at)).scalar_subquery(),
+    )
+    watermark = tuple(session.execute(stmt).one())
+
+    current = _PFN_TO_RSE_INDEX
+    if current is not None and current[0] == watermark:
+        return current[1]
+
+    with _PFN_TO_RSE_INDEX_LOCK:
+        current = _PFN_TO_RSE_INDEX
+        if current is not None and current[0] == watermark:
+            return current[1]
+
+        stmt = select(
+            models.RSEProtocol.rse_id,
+            models.RSE.vo,
+            models.RSEProtocol.scheme,
+            models.RSEProtocol.hostname,
+            models.RSEProtocol.port,
+            models.RSEProtocol.prefix
+        ).join(
+            models.RSE,
+            models.RSEProtocol.rse_id == models.RSE.id
+        ).where(
+            and_(models.RSE.deleted == false(),
+                 models.RSE.staging_area == false())
+        )
+        with METRICS.timer('pfn_to_rse_index.build'):
+            index = PFNToRSEIndex(session.execute(stmt).yield_per(10000))
+        _PFN_TO_RSE_INDEX = (watermark, index)
+    return index
+
+
 @read_session
 def get_pfn_to_rse(
     pfns: "Iterable[str]",
@@ -549,8 +659,6 @@ def get_pfn_to_rse(
     :returns: a tuple : scheme, {rse1 : [pfn1, pfn2, ...], rse2: [pfn3, pfn4, ...]}, {'unknown': [pfn5, pfn6, ...]}.
     """
     unknown_replicas = {}
-    storage_elements = []
-    se_condition = []
     dict_rse = {}
     cleaned_pfns = clean_pfns(pfns)
     scheme = cleaned_pfns[0].split(':')[0] if cleaned_pfns else None
@@ -558,59 +666,19 @@ def get_pfn_to_rse(
         if pfn.split(':')[0] != scheme:
             raise exception.InvalidType('The PFNs specified must have the same protocol')
 
-        split_se = pfn.split('/')[2].split(':')
-        storage_element = split_se[0]
-
-        if storage_element not in storage_elements:
-            storage_elements.append(storage_element)
-            se_condition.append(models.RSEProtocol.hostname == storage_element)
-    stmt = select(
-        models.RSEProtocol.rse_id,
-        models.RSEProtocol.scheme,
-        models.RSEProtocol.hostname,
-        models.RSEProtocol.port,
-        models.RSEProtocol.prefix
-    ).join(
-        models.RSE,
-        models.RSEProtocol.rse_id == models.RSE.id
-    ).where(
-        and_(or_(*se_condition),
-             models.RSEProtocol.scheme == scheme,
-             models.RSE.deleted == false(),
-             models.RSE.staging_area == false())
-    )
-
-    protocols = {}
+    if not cleaned_pfns:
+        return scheme, dict_rse, unknown_replicas
 
-    for rse_id, protocol, hostname, port, prefix in session.execute(stmt).yield_per(10000):
-        if rse_id not in protocols:
-            protocols[rse_id] = []
-        protocols[rse_id].append('%s://%s:%s%s' % (protocol, hostname, port, prefix))
-        if '%s://%s%s' % (protocol, hostname, prefix) not in protocols[rse_id]:
-            protocols[rse_id].append('%s://%s%s' % (protocol, hostname, prefix))
-    hint = None
+    index = get_pfn_to_rse_index(session=session)
     for pfn in cleaned_pfns:
-        if hint:
-            for pattern in protocols[hint]:
-                if pfn.find(pattern) > -1:
-                    dict_rse[hint].append(pfn)
+        rse_ids = index.lookup(pfn, vo=vo)
+        if len(rse_ids) > 1:
+            rse_names = ', '.join(sorted(get_rse_name(rse_id=rse_id, session=session) for rse_id in rse_ids))
+            raise exception.RucioException('ERROR, multiple matches : %s at %s' % (pfn, rse_names))
+        if rse_ids:
+            dict_rse.setdefault(rse_ids.pop(), []).append(pfn)
         else:
-            mult_rse_match = 0
-            for rse_id in protocols:
-                for pattern in protocols[rse_id]:
-                    if pfn.find(pattern) > -1 and get_rse_vo(rse_id=rse_id, session=session) == vo:
-                        mult_rse_match += 1
-                        if mult_rse_match > 1:
-                            print('ERROR, multiple matches : %s at %s' % (pfn, rse_id))
-                            raise exception.RucioException('ERROR, multiple matches : %s at %s' % (pfn, get_rse_name(rse_id=rse_id, session=session)))
-                        hint = rse_id
-                        if hint not in dict_rse:
-                            dict_rse[hint] = []
-                        dict_rse[hint].append(pfn)
-            if mult_rse_match == 0:
-                if 'unknown' not in unknown_replicas:
-                    unknown_replicas['unknown'] = []
-                unknown_replicas['unknown'].append(pfn)
+            unknown_replicas.setdefault('unknown', []).append(pfn)
     return scheme, dict_rse, unknown_replicas
 
 
@@ -933,6 +1001,55 @@ def _get_list_replicas_protocols(
     return protocols
 
 
+def _get_list_replicas_protocols_cached(
+        rse_id: str,
+        domain: str,
+        schemes: Optional[list[str]],
+        is_archive: bool,
+        session: "Session"
+) -> "list[tuple[str, RSEProtocol, int]]":
+    """
+    Same as _get_list_replicas_protocols, but served from the process-wide PROTOCOLS_CACHE.
+    """
+    key = (rse_id, domain, tuple(schemes) if schemes else (), is_archive)
+
+    now = time.monotonic()
+    cached = PROTOCOLS_CACHE.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    protocols = _get_list_replicas_protocols(
+        rse_id=rse_id,
+        domain=domain,
+        schemes=schemes,
+        # We want 'root' for archives even if it wasn't included into 'schemes'
+        additional_schemes=['root'] if is_archive else [],
+        session=session,
+    )
+    PROTOCOLS_CACHE.set(key, (now + PROTOCOLS_CACHE_EXPIRATION, protocols))
+    return protocols
+
+
+def invalidate_list_replicas_protocols_cache(rse_id: Optional[str] = None) -> None:
+    """
+    Drop the cached list_replicas protocols of the given RSE, or of all RSEs if rse_id is None.
+    """
+    if rse_id is None:
+        PROTOCOLS_CACHE.clear()
+    else:
+        PROTOCOLS_CACHE.delete_matching(lambda key: key[0] == rse_id)  # type: ignore
+
+
+def _export_list_replicas_caches_metrics() -> None:
+    """
+    Export the cumulated hits and misses, and the size, of the process-wide list_replicas caches.
+    """
+    for cache_name, cache in (('protocols', PROTOCOLS_CACHE), ('paths', PATHS_CACHE)):
+        METRICS.gauge('list_replicas.lru.{cache}.{stat}').labels(cache=cache_name, stat='hits').set(cache.hits)
+        METRICS.gauge('list_replicas.lru.{cache}.{stat}').labels(cache=cache_name, stat='misses').set(cache.misses)
+        METRICS.gauge('list_replicas.lru.{cache}.{stat}').labels(cache=cache_name, stat='size').set(len(cache))
+
+
 def _build_list_replicas_pfn(
         scope: "InternalScope",
         name: str,
@@ -1018,6 +1135,24 @@ def _build_list_replicas_pfn(
     return pfn
 
 
+def _resolve_list_replicas_parents(
+        files: "list[dict[str, Any]]",
+        temp_table: Any,
+        *,
+        session: "Session"
+) -> "list[dict[str, Any]]":
+    """
+    Fill the 'parents' of a batch of list_replicas files using a single bulk query.
+    The batch is loaded into temp_table, which is reused across the batches of a listing.
+    """
+    with METRICS.timer('list_replicas.resolve_parents'):
+        parents = rucio.core.did.list_all_parent_dids_bulk(files, temp_table=temp_table, session=session)
+    for file in files:
+        file['parents'] = ['%s:%s' % (parent['scope'].internal, parent['name'])
+                           for parent in parents[file['scope'], file['name']]]
+    return files
+
+
 def _list_replicas(
         replicas: "Iterable[tuple]",
         show_pfns: bool,
@@ -1030,6 +1165,7 @@ def _list_replicas(
         resolve_parents: bool,
         filters: dict[str, Any],
         by_rse_name: bool,
+        parents_batch_size: int = 1000,
         *,
         session: "Session"
 ) -> "Iterator[dict[str, Any]]":
@@ -1046,8 +1182,10 @@ def _list_replicas(
             except Exception:
                 pass  # do not hard fail if site cannot be resolved or is empty
 
-    file, pfns_cache = {}, {}
+    file = {}
     protocols_cache = defaultdict(dict)
+    files_wo_parents = []
+    parents_temp_table = temp_table_mngr(session).create_scope_name_table() if resolve_parents else None
 
     for _, replica_group in groupby(replicas, key=lambda x: (x[0], x[1])):  # Group by scope/name
         file = {}
@@ -1063,9 +1201,6 @@ def _list_replicas(
                 file['scope'], file['name'] = scope, name
                 file['bytes'], file['md5'], file['adler32'] = bytes_, md5, adler32
                 file['pfns'], file['rses'], file['states'] = {}, {}, {}
-                if resolve_parents:
-                    file['parents'] = ['%s:%s' % (parent['scope'].internal, parent['name'])
-                                       for parent in rucio.core.did.list_all_parent_dids(scope, name, session=session)]
 
             if not rse_id:
                 continue
@@ -1086,12 +1221,11 @@ def _list_replicas(
                     if local_rses and rse_id in local_rses:
                         domain = 'lan'
 
-                protocols = _get_list_replicas_protocols(
+                protocols = _get_list_replicas_protocols_cached(
                     rse_id=rse_id,
                     domain=domain,
                     schemes=schemes,
-                    # We want 'root' for archives even if it wasn't included into 'schemes'
-                    additional_schemes=['root'] if is_archive else [],
+                    is_archive=is_archive,
                     session=session,
                 )
                 protocols_cache[rse_id][is_archive] = protocols
@@ -1108,11 +1242,11 @@ def _list_replicas(
                     t_name = name
 
                 if 'determinism_type' in protocol.attributes:  # PFN is cacheable
-                    try:
-                        path = pfns_cache['%s:%s:%s' % (protocol.attributes['determinism_type'], t_scope.internal, t_name)]
-                    except KeyError:  # No cache entry scope:name found for this protocol
+                    path_key = (protocol.attributes['determinism_type'], t_scope.internal, t_name)
+                    path = PATHS_CACHE.get(path_key)
+                    if path is None:  # No cache entry scope:name found for this protocol
                         path = protocol._get_path(t_scope, t_name)  # type: ignore (t_scope is InternalScope instead of str)
-                        pfns_cache['%s:%s:%s' % (protocol.attributes['determinism_type'], t_scope.internal, t_name)] = path
+                        PATHS_CACHE.set(path_key, path)
 
                 try:
                     pfn = _build_list_replicas_pfn(
@@ -1169,7 +1303,19 @@ def _list_replicas(
                 file['rses'].setdefault(rse_key, []).append(pfn)
 
         if file:
-            yield file
+            if resolve_parents:
+                # Parents are resolved in bulk for a batch of files before these files are yielded
+                files_wo_parents.append(file)
+                if len(files_wo_parents) >= parents_batch_size:
+                    yield from _resolve_list_replicas_parents(files_wo_parents, parents_temp_table, session=session)
+                    files_wo_parents = []
+            else:
+                yield file
+
+    if files_wo_parents:
+        yield from _resolve_list_replicas_parents(files_wo_parents, parents_temp_table, session=session)
+
+    _export_list_replicas_caches_metrics()
 
     for scope, name, bytes_, md5, adler32 in _list_files_wo_replicas(files_wo_replica, session=session):
         yield {
@@ -1583,20 +1729,19 @@ def __bulk_add_new_file_dids(
     :param session: The database session in use.
     :returns: True is successful.
     """
-    for file in files:
-        new_did = models.DataIdentifier(scope=file['scope'], name=file['name'],
-                                        account=file.get('account') or account,
-                                        did_type=DIDType.FILE, bytes=file['bytes'],
-                                        md5=file.get('md5'), adler32=file.get('adler32'),
-                                        is_new=None)
-        new_did.save(session=session, flush=False)
-
-        if 'meta' in file and file['meta']:
-            rucio.core.did.set_metadata_bulk(scope=file['scope'], name=file['name'], meta=file['meta'], recursive=False, session=session)
-        if dataset_meta:
-            rucio.core.did.set_metadata_bulk(scope=file['scope'], name=file['name'], meta=dataset_meta, recursive=False, session=session)
+    new_dids = [{'scope': file['scope'], 'name': file['name'],
+                 'account': file.get('account') or account,
+                 'did_type': DIDType.FILE, 'bytes': file['bytes'],
+                 'md5': file.get('md5'), 'adler32': file.get('adler32'),
+                 'is_new': None} for file in files]
+    if not new_dids:
+        return True
     try:
-        session.flush()
+        stmt = insert(
+            models.DataIdentifier
+        )
+        # A list of parameters makes sqlalchemy use the most efficient multi-row insert of each dialect
+        session.execute(stmt, new_dids)
     except IntegrityError as error:
         if match('.*IntegrityError.*02291.*integrity constraint.*DIDS_SCOPE_FK.*violated - parent key not found.*', error.args[0]) \
                 or match('.*IntegrityError.*FOREIGN KEY constraint failed.*', error.args[0]) \
@@ -1606,6 +1751,12 @@ def __bulk_add_new_file_dids(
                 or match('.*ForeignKeyViolation.*insert or update on table.*violates foreign key constraint.*', error.args[0]) \
                 or match('.*IntegrityError.*foreign key constraints? failed.*', error.args[0]):
             raise exception.ScopeNotFound('Scope not found!')
+        if match('.*IntegrityError.*ORA-00001: unique constraint .*DIDS_PK.*violated.*', error.args[0]) \
+                or match('.*IntegrityError.*1062.*Duplicate entry.*', error.args[0]) \
+                or match('.*IntegrityError.*UNIQUE constraint failed.*', error.args[0]) \
+                or match('.*IntegrityError.*duplicate key value violates unique constraint.*', error.args[0]) \
+                or match('.*UniqueViolation.*duplicate key value violates unique constraint.*', error.args[0]):
+            raise exception.DataIdentifierAlreadyExists('Data Identifier already exists!')
 
         raise exception.RucioException(error.args)
     except DatabaseError as error:
@@ -1613,13 +1764,30 @@ def __bulk_add_new_file_dids(
             raise exception.ScopeNotFound('Scope not found!')
 
         raise exception.RucioException(error.args)
-    except FlushError as error:
-        if match('New instance .* with identity key .* conflicts with persistent instance', error.args[0]):
-            raise exception.DataIdentifierAlreadyExists('Data Identifier already exists!')
-        raise exception.RucioException(error.args)
+
+    for file in files:
+        if 'meta' in file and file['meta']:
+            rucio.core.did.set_metadata_bulk(scope=file['scope'], name=file['name'], meta=file['meta'], recursive=False, session=session)
+        if dataset_meta:
+            rucio.core.did.set_metadata_bulk(scope=file['scope'], name=file['name'], meta=dataset_meta, recursive=False, session=session)
     return True
 
 
+def __fill_scope_name_temp_table(
+    files: "Iterable[Mapping[str, Any]]",
+    *,
+    session: "Session"
+) -> Any:
+    """
+    Create a scope/name temporary table and fill it with the (deduplicated) input files.
+    """
+    temp_table = temp_table_mngr(session).create_scope_name_table()
+    values = {(file['scope'], file['name']): {'scope': file['scope'], 'name': file['name']} for file in files}
+    if values:
+        session.execute(insert(temp_table), list(values.values()))
+    return temp_table
+
+
 @transactional_session
 def __bulk_add_file_dids(
     files: "Iterable[dict[str, Any]]",
@@ -1636,38 +1804,33 @@ def __bulk_add_file_dids(
     :param session: The database session in use.
     :returns: list of replicas.
     """
-    condition = []
-    for f in files:
-        condition.append(and_(models.DataIdentifier.scope == f['scope'],
-                              models.DataIdentifier.name == f['name'],
-                              models.DataIdentifier.did_type == DIDType.FILE))
-
-    stmt = select(
-        models.DataIdentifier.scope,
-        models.DataIdentifier.name,
-        models.DataIdentifier.bytes,
-        models.DataIdentifier.md5,
-        models.DataIdentifier.adler32,
-    ).with_hint(
-        models.DataIdentifier,
-        'INDEX(DIDS DIDS_PK)',
-        'oracle'
-    ).where(
-        or_(*condition)
-    )
-    available_files = [res._asdict() for res in session.execute(stmt).all()]
-    new_files = list()
-    for file in files:
-        found = False
-        for available_file in available_files:
-            if file['scope'] == available_file['scope'] and file['name'] == available_file['name']:
-                found = True
-                break
-        if not found:
-            new_files.append(file)
-    __bulk_add_new_file_dids(files=new_files, account=account,
-                             dataset_meta=dataset_meta,
-                             session=session)
+    with METRICS.timer('add_replicas.check_dids'):
+        temp_table = __fill_scope_name_temp_table(files, session=session)
+        stmt = select(
+            models.DataIdentifier.scope,
+            models.DataIdentifier.name,
+            models.DataIdentifier.bytes,
+            models.DataIdentifier.md5,
+            models.DataIdentifier.adler32,
+        ).with_hint(
+            models.DataIdentifier,
+            'INDEX(DIDS DIDS_PK)',
+            'oracle'
+        ).join_from(
+            temp_table,
+            models.DataIdentifier,
+            and_(models.DataIdentifier.scope == temp_table.scope,
+                 models.DataIdentifier.name == temp_table.name)
+        ).where(
+            models.DataIdentifier.did_type == DIDType.FILE
+        )
+        available_files = [res._asdict() for res in session.execute(stmt).all()]
+    available_dids = {(f['scope'], f['name']) for f in available_files}
+    new_files = [file for file in files if (file['scope'], file['name']) not in available_dids]
+    with METRICS.timer('add_replicas.insert_dids'):
+        __bulk_add_new_file_dids(files=new_files, account=account,
+                                 dataset_meta=dataset_meta,
+                                 session=session)
     return new_files + available_files
 
 
@@ -1698,60 +1861,81 @@ def __bulk_add_replicas(
     """
     Bulk add new DIDs.
 
+    Replicas which already exist on the RSE are skipped. On dialects supporting it, this is
+    done with a single INSERT ... ON CONFLICT DO NOTHING ... RETURNING statement; otherwise the
+    existing replicas are first looked up via a temporary table.
+
     :param rse_id: the RSE id.
     :param dids: the list of files.
     :param account: The account owner.
     :param session: The database session in use.
-    :returns: True is successful.
+    :returns: The number of files and bytes added to the RSE.
     """
-    nbfiles, bytes_ = 0, 0
-    # Check for the replicas already available
-    condition = []
-    for f in files:
-        condition.append(and_(models.RSEFileAssociation.scope == f['scope'],
-                              models.RSEFileAssociation.name == f['name'],
-                              models.RSEFileAssociation.rse_id == rse_id))
-
-    stmt = select(
-        models.RSEFileAssociation.scope,
-        models.RSEFileAssociation.name,
-        models.RSEFileAssociation.rse_id,
-    ).with_hint(
-        models.RSEFileAssociation,
-        'INDEX(REPLICAS REPLICAS_PK)',
-        'oracle'
-    ).where(
-        or_(*condition)
-    )
-
-    available_replicas = [res._asdict() for res in session.execute(stmt).all()]
-
     default_tombstone_delay = get_rse_attribute(rse_id, RseAttr.TOMBSTONE_DELAY, session=session)
     default_tombstone = tombstone_from_delay(default_tombstone_delay)
 
-    new_replicas = []
-    for file in files:
-        found = False
-        for available_replica in available_replicas:
-            if file['scope'] == available_replica['scope'] and file['name'] == available_replica['name'] and rse_id == available_replica['rse_id']:
-                found = True
-                break
-        if not found:
-            nbfiles += 1
-            bytes_ += file['bytes']
-            new_replicas.append({'rse_id': rse_id, 'scope': file['scope'],
-                                 'name': file['name'], 'bytes': file['bytes'],
-                                 'path': file.get('path'),
-                                 'state': ReplicaState(file.get('state', 'A')),
-                                 'md5': file.get('md5'), 'adler32': file.get('adler32'),
-                                 'lock_cnt': file.get('lock_cnt', 0),
-                                 'tombstone': file.get('tombstone') or default_tombstone})
+    def _replica_row(file):
+        return {'rse_id': rse_id, 'scope': file['scope'],
+                'name': file['name'], 'bytes': file['bytes'],
+                'path': file.get('path'),
+                'state': ReplicaState(file.get('state', 'A')),
+                'md5': file.get('md5'), 'adler32': file.get('adler32'),
+                'lock_cnt': file.get('lock_cnt', 0),
+                'tombstone': file.get('tombstone') or default_tombstone}
+
+    dialect = session.bind.dialect  # type: ignore
     try:
-        stmt = insert(
-            models.RSEFileAssociation
-        )
-        new_replicas and session.execute(stmt, new_replicas)
-        session.flush()
+        if dialect.name in ('postgresql', 'sqlite') and getattr(dialect, 'insert_executemany_returning', False):
+            if dialect.name == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            new_replicas = [_replica_row(file) for file in files]
+            if not new_replicas:
+                return 0, 0
+            stmt = dialect_insert(
+                models.RSEFileAssociation
+            ).on_conflict_do_nothing(
+            ).returning(
+                models.RSEFileAssociation.bytes
+            )
+            with METRICS.timer('add_replicas.insert_replicas'):
+                inserted = session.execute(stmt, new_replicas).scalars().all()
+            return len(inserted), sum(inserted)
+
+        # Check for the replicas already available
+        with METRICS.timer('add_replicas.check_replicas'):
+            temp_table = __fill_scope_name_temp_table(files, session=session)
+            stmt = select(
+                models.RSEFileAssociation.scope,
+                models.RSEFileAssociation.name,
+            ).with_hint(
+                models.RSEFileAssociation,
+                'INDEX(REPLICAS REPLICAS_PK)',
+                'oracle'
+            ).join_from(
+                temp_table,
+                models.RSEFileAssociation,
+                and_(models.RSEFileAssociation.scope == temp_table.scope,
+                     models.RSEFileAssociation.name == temp_table.name,
+                     models.RSEFileAssociation.rse_id == rse_id)
+            )
+            available_replicas = {(scope, name) for scope, name in session.execute(stmt)}
+
+        nbfiles, bytes_ = 0, 0
+        new_replicas = []
+        for file in files:
+            if (file['scope'], file['name']) not in available_replicas:
+                nbfiles += 1
+                bytes_ += file['bytes']
+                new_replicas.append(_replica_row(file))
+
+        with METRICS.timer('add_replicas.insert_replicas'):
+            stmt = insert(
+                models.RSEFileAssociation
+            )
+            new_replicas and session.execute(stmt, new_replicas)
+            session.flush()
         return nbfiles, bytes_
     except IntegrityError as error:
         if match('.*IntegrityError.*ORA-00001: unique constraint .*REPLICAS_PK.*violated.*', error.args[0]) \
@@ -1775,13 +1959,14 @@ def add_replicas(
     session: "Session"
 ) -> None:
     """
-    Bulk add file replicas.
+    Bulk add file replicas. Files which already have a replica on the RSE are skipped.
 
     :param rse_id:  The RSE id.
-    :param files:   The list of files.
+    :param files:   The list of files, each given at most once.
     :param account: The account owner.
     :param ignore_availability: Ignore the RSE blocklisting.
     :param session: The database session in use.
+    :raises Duplicate: If a file is given more than once.
     """
 
     def _expected_pfns(lfns, rse_settings, scheme, operation='write', domain='wan', protocol_attr=None):
@@ -1797,10 +1982,15 @@ def add_replicas(
     if not replica_rse['availability_write'] and not ignore_availability:
         raise exception.ResourceTemporaryUnavailable('%s is temporary unavailable for writing' % replica_rse['rse'])
 
+    dids = set()
     for file in files:
         if 'pfn' not in file:
             if not replica_rse['deterministic']:
                 raise exception.UnsupportedOperation('PFN needed for this (non deterministic) RSE %s ' % (replica_rse['rse']))
+        # the bulk insert of the replicas would silently skip the copies of a file on some dialects
+        if (file['scope'], file['name']) in dids:
+            raise exception.Duplicate('File %s:%s is given more than once' % (file['scope'], file['name']))
+        dids.add((file['scope'], file['name']))
 
     __bulk_add_file_dids(files=files, account=account,
                          dataset_meta=dataset_meta,
@@ -1845,7 +2035,8 @@ def add_replicas(
                     raise exception.InvalidPath(f"One of the PFNs provided {pfns_scheme!r} for {lfns!r} does not match the Rucio expected PFNs: {expected_pfns!r}")
 
     nbfiles, bytes_ = __bulk_add_replicas(rse_id=rse_id, files=files, account=account, session=session)
-    increase(rse_id=rse_id, files=nbfiles, bytes_=bytes_, session=session)
+    with METRICS.timer('add_replicas.update_counters'):
+        increase(rse_id=rse_id, files=nbfiles, bytes_=bytes_, session=session)
 
 
 @transactional_session
@@ -2010,14 +2201,17 @@ def __cleanup_after_replica_deletion(
 ) -> None:
     """
     Perform update of collections/archive associations/DIDs after the removal of their replicas
+
+    The cleanup is a pipeline of set-based stages. Each stage handles all the affected DIDs at once,
+    through the scope/name and association temporary tables, and is timed separately.
+
     :param rse_id: the rse id
     :param files: list of files whose replica got deleted
     :param session: The database session in use.
     """
     clt_to_update, parents_to_analyze, affected_archives, clt_replicas_to_delete = set(), set(), set(), set()
-    dids_to_delete = set()
-    did_condition = []
-    incomplete_dids, messages, clt_to_set_not_archive = [], [], []
+    dids_to_delete, file_dids_to_check, collection_dids_to_check, incomplete_dids = set(), set(), set(), set()
+    messages, clt_to_set_not_archive = [], []
     for file in files:
 
         # Schedule update of all collections containing this file and having a collection replica in the RSE
@@ -2031,274 +2225,283 @@ def __cleanup_after_replica_deletion(
         parents_to_analyze.add(ScopeName(scope=file['scope'], name=file['name']))
 
         # 2) schedule removal of this file from the DID table
-        did_condition.append(
-            and_(models.DataIdentifier.scope == file['scope'],
-                 models.DataIdentifier.name == file['name'],
-                 models.DataIdentifier.availability != DIDAvailability.LOST,
-                 ~exists(select(1).prefix_with("/*+ INDEX(REPLICAS REPLICAS_PK) */", dialect='oracle')).where(
-                     and_(models.RSEFileAssociation.scope == file['scope'],
-                          models.RSEFileAssociation.name == file['name'])),
-                 ~exists(select(1).prefix_with("/*+ INDEX(ARCHIVE_CONTENTS ARCH_CONTENTS_PK) */", dialect='oracle')).where(
-                     and_(models.ConstituentAssociation.child_scope == file['scope'],
-                          models.ConstituentAssociation.child_name == file['name']))))
+        file_dids_to_check.add(ScopeName(scope=file['scope'], name=file['name']))
 
         # 3) if the file is an archive, schedule cleanup on the files from inside the archive
         affected_archives.add(ScopeName(scope=file['scope'], name=file['name']))
 
     if clt_to_update:
-        # Get all collection_replicas at RSE, insert them into UpdatedCollectionReplica
-        stmt = delete(scope_name_temp_table)
-        session.execute(stmt)
-        values = [sn._asdict() for sn in clt_to_update]
-        stmt = insert(scope_name_temp_table)
-        session.execute(stmt, values)
-        stmt = select(
-            models.DataIdentifierAssociation.scope,
-            models.DataIdentifierAssociation.name,
-        ).distinct(
-        ).join_from(
-            scope_name_temp_table,
-            models.DataIdentifierAssociation,
-            and_(scope_name_temp_table.scope == models.DataIdentifierAssociation.child_scope,
-                 scope_name_temp_table.name == models.DataIdentifierAssociation.child_name)
-        ).join(
-            models.CollectionReplica,
-            and_(models.CollectionReplica.scope == models.DataIdentifierAssociation.scope,
-                 models.CollectionReplica.name == models.DataIdentifierAssociation.name,
-                 models.CollectionReplica.rse_id == rse_id)
-        )
-        for parent_scope, parent_name in session.execute(stmt):
-            models.UpdatedCollectionReplica(scope=parent_scope,
-                                            name=parent_name,
-                                            did_type=DIDType.DATASET,
-                                            rse_id=rse_id). \
-                save(session=session, flush=False)
+        with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='collection_replicas_update'):
+            # Get all collection_replicas at RSE, insert them into UpdatedCollectionReplica
+            stmt = delete(scope_name_temp_table)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in clt_to_update]
+            stmt = insert(scope_name_temp_table)
+            session.execute(stmt, values)
+            stmt = select(
+                models.DataIdentifierAssociation.scope,
+                models.DataIdentifierAssociation.name,
+            ).distinct(
+            ).join_from(
+                scope_name_temp_table,
+                models.DataIdentifierAssociation,
+                and_(scope_name_temp_table.scope == models.DataIdentifierAssociation.child_scope,
+                     scope_name_temp_table.name == models.DataIdentifierAssociation.child_name)
+            ).join(
+                models.CollectionReplica,
+                and_(models.CollectionReplica.scope == models.DataIdentifierAssociation.scope,
+                     models.CollectionReplica.name == models.DataIdentifierAssociation.name,
+                     models.CollectionReplica.rse_id == rse_id)
+            )
+            values = [{'scope': parent_scope, 'name': parent_name, 'did_type': DIDType.DATASET, 'rse_id': rse_id}
+                      for parent_scope, parent_name in session.execute(stmt)]
+            if values:
+                stmt = insert(models.UpdatedCollectionReplica)
+                session.execute(stmt, values)
 
     # Delete DID from the content for the last DID
-    while parents_to_analyze:
-        did_associations_to_remove = set()
-
-        stmt = delete(scope_name_temp_table)
-        session.execute(stmt)
-        values = [sn._asdict() for sn in parents_to_analyze]
-        stmt = insert(scope_name_temp_table)
-        session.execute(stmt, values)
-        parents_to_analyze.clear()
-
-        stmt = select(
-            models.DataIdentifierAssociation.scope,
-            models.DataIdentifierAssociation.name,
-            models.DataIdentifierAssociation.did_type,
-            models.DataIdentifierAssociation.child_scope,
-            models.DataIdentifierAssociation.child_name,
-            models.DataIdentifierAssociation.child_type,
-        ).distinct(
-        ).join_from(
-            scope_name_temp_table,
-            models.DataIdentifierAssociation,
-            and_(scope_name_temp_table.scope == models.DataIdentifierAssociation.child_scope,
-                 scope_name_temp_table.name == models.DataIdentifierAssociation.child_name)
-        ).outerjoin(
-            models.DataIdentifier,
-            and_(models.DataIdentifier.availability == DIDAvailability.LOST,
-                 models.DataIdentifier.scope == models.DataIdentifierAssociation.child_scope,
-                 models.DataIdentifier.name == models.DataIdentifierAssociation.child_name)
-        ).where(
-            models.DataIdentifier.scope == null()
-        ).outerjoin(
-            models.RSEFileAssociation,
-            and_(models.RSEFileAssociation.scope == models.DataIdentifierAssociation.child_scope,
-                 models.RSEFileAssociation.name == models.DataIdentifierAssociation.child_name)
-        ).where(
-            models.RSEFileAssociation.scope == null()
-        ).outerjoin(
-            models.ConstituentAssociation,
-            and_(models.ConstituentAssociation.child_scope == models.DataIdentifierAssociation.child_scope,
-                 models.ConstituentAssociation.child_name == models.DataIdentifierAssociation.child_name)
-        ).where(
-            models.ConstituentAssociation.child_scope == null()
-        )
+    with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='dataset_detachment'):
+        while parents_to_analyze:
+            did_associations_to_remove = set()
 
-        clt_to_set_not_archive.append(set())
-        for parent_scope, parent_name, did_type, child_scope, child_name, child_type in session.execute(stmt):
-
-            # Schedule removal of child file/dataset/container from the parent dataset/container
-            did_associations_to_remove.add(Association(scope=parent_scope, name=parent_name,
-                                                       child_scope=child_scope, child_name=child_name))
-
-            # Create detachment messages for removal of child DID
-            for msg in rucio.core.did.generate_did_detach_messages(
-                parent_scope=parent_scope,
-                parent_name=parent_name,
-                parent_type=did_type,
-                child_scope=child_scope,
-                child_name=child_name,
-                child_type=child_type,
-            ):
-                messages.append(msg)
-
-            # Schedule setting is_archive = False on parents which don't have any children with is_archive == True anymore
-            clt_to_set_not_archive[-1].add(ScopeName(scope=parent_scope, name=parent_name))
-
-            # If the parent dataset/container becomes empty as a result of the child removal
-            # (it was the last children), metadata cleanup has to be done:
-            #
-            # 1) Schedule to remove the replicas of this empty collection
-            clt_replicas_to_delete.add(ScopeName(scope=parent_scope, name=parent_name))
-
-            # 2) Schedule removal of this empty collection from its own parent collections
-            parents_to_analyze.add(ScopeName(scope=parent_scope, name=parent_name))
-
-            # 3) Schedule removal of the entry from the DIDs table
-            remove_open_did = config_get_bool('reaper', 'remove_open_did', default=False, session=session)
-            if remove_open_did:
-                did_condition.append(
-                    and_(models.DataIdentifier.scope == parent_scope,
-                         models.DataIdentifier.name == parent_name,
-                         ~exists(1).where(
-                             and_(models.DataIdentifierAssociation.child_scope == parent_scope,
-                                  models.DataIdentifierAssociation.child_name == parent_name)),
-                         ~exists(1).where(
-                             and_(models.DataIdentifierAssociation.scope == parent_scope,
-                                  models.DataIdentifierAssociation.name == parent_name))))
-            else:
-                did_condition.append(
-                    and_(models.DataIdentifier.scope == parent_scope,
-                         models.DataIdentifier.name == parent_name,
-                         models.DataIdentifier.is_open == false(),
-                         ~exists(1).where(
-                             and_(models.DataIdentifierAssociation.child_scope == parent_scope,
-                                  models.DataIdentifierAssociation.child_name == parent_name)),
-                         ~exists(1).where(
-                             and_(models.DataIdentifierAssociation.scope == parent_scope,
-                                  models.DataIdentifierAssociation.name == parent_name))))
-
-        if did_associations_to_remove:
-            stmt = delete(association_temp_table)
+            stmt = delete(scope_name_temp_table)
             session.execute(stmt)
-            values = [a._asdict() for a in did_associations_to_remove]
-            stmt = insert(association_temp_table)
+            values = [sn._asdict() for sn in parents_to_analyze]
+            stmt = insert(scope_name_temp_table)
             session.execute(stmt, values)
+            parents_to_analyze.clear()
 
-            # get the list of modified parent scope, name
             stmt = select(
-                models.DataIdentifier.scope,
-                models.DataIdentifier.name,
-                models.DataIdentifier.did_type,
+                models.DataIdentifierAssociation.scope,
+                models.DataIdentifierAssociation.name,
+                models.DataIdentifierAssociation.did_type,
+                models.DataIdentifierAssociation.child_scope,
+                models.DataIdentifierAssociation.child_name,
+                models.DataIdentifierAssociation.child_type,
             ).distinct(
             ).join_from(
-                association_temp_table,
+                scope_name_temp_table,
+                models.DataIdentifierAssociation,
+                and_(scope_name_temp_table.scope == models.DataIdentifierAssociation.child_scope,
+                     scope_name_temp_table.name == models.DataIdentifierAssociation.child_name)
+            ).outerjoin(
                 models.DataIdentifier,
-                and_(association_temp_table.scope == models.DataIdentifier.scope,
-                     association_temp_table.name == models.DataIdentifier.name)
+                and_(models.DataIdentifier.availability == DIDAvailability.LOST,
+                     models.DataIdentifier.scope == models.DataIdentifierAssociation.child_scope,
+                     models.DataIdentifier.name == models.DataIdentifierAssociation.child_name)
+            ).where(
+                models.DataIdentifier.scope == null()
+            ).outerjoin(
+                models.RSEFileAssociation,
+                and_(models.RSEFileAssociation.scope == models.DataIdentifierAssociation.child_scope,
+                     models.RSEFileAssociation.name == models.DataIdentifierAssociation.child_name)
+            ).where(
+                models.RSEFileAssociation.scope == null()
+            ).outerjoin(
+                models.ConstituentAssociation,
+                and_(models.ConstituentAssociation.child_scope == models.DataIdentifierAssociation.child_scope,
+                     models.ConstituentAssociation.child_name == models.DataIdentifierAssociation.child_name)
             ).where(
-                or_(models.DataIdentifier.complete == true(),
-                    models.DataIdentifier.complete.is_(None)),
+                models.ConstituentAssociation.child_scope == null()
             )
-            for parent_scope, parent_name, parent_did_type in session.execute(stmt):
-                message = {
-                    'payload': {
-                        'scope': parent_scope,
-                        'name': parent_name,
-                        'did_type': parent_did_type,
-                    },
-                    'event_type': 'INCOMPLETE',
-                }
-                if message not in messages:
-                    messages.append(message)
-                    incomplete_dids.append(ScopeName(scope=parent_scope, name=parent_name))
-
-            content_to_delete_filter = exists(select(1)
-                                              .where(and_(association_temp_table.scope == models.DataIdentifierAssociation.scope,
-                                                          association_temp_table.name == models.DataIdentifierAssociation.name,
-                                                          association_temp_table.child_scope == models.DataIdentifierAssociation.child_scope,
-                                                          association_temp_table.child_name == models.DataIdentifierAssociation.child_name)))
-
-            rucio.core.did.insert_content_history(filter_=content_to_delete_filter, did_created_at=None, session=session)
 
+            clt_to_set_not_archive.append(set())
+            for parent_scope, parent_name, did_type, child_scope, child_name, child_type in session.execute(stmt):
+
+                # Schedule removal of child file/dataset/container from the parent dataset/container
+                did_associations_to_remove.add(Association(scope=parent_scope, name=parent_name,
+                                                           child_scope=child_scope, child_name=child_name))
+
+                # Create detachment messages for removal of child DID
+                for msg in rucio.core.did.generate_did_detach_messages(
+                    parent_scope=parent_scope,
+                    parent_name=parent_name,
+                    parent_type=did_type,
+                    child_scope=child_scope,
+                    child_name=child_name,
+                    child_type=child_type,
+                ):
+                    messages.append(msg)
+
+                # Schedule setting is_archive = False on parents which don't have any children with is_archive == True anymore
+                clt_to_set_not_archive[-1].add(ScopeName(scope=parent_scope, name=parent_name))
+
+                # If the parent dataset/container becomes empty as a result of the child removal
+                # (it was the last children), metadata cleanup has to be done:
+                #
+                # 1) Schedule to remove the replicas of this empty collection
+                clt_replicas_to_delete.add(ScopeName(scope=parent_scope, name=parent_name))
+
+                # 2) Schedule removal of this empty collection from its own parent collections
+                parents_to_analyze.add(ScopeName(scope=parent_scope, name=parent_name))
+
+                # 3) Schedule removal of the entry from the DIDs table
+                collection_dids_to_check.add(ScopeName(scope=parent_scope, name=parent_name))
+
+            if did_associations_to_remove:
+                stmt = delete(association_temp_table)
+                session.execute(stmt)
+                values = [a._asdict() for a in did_associations_to_remove]
+                stmt = insert(association_temp_table)
+                session.execute(stmt, values)
+
+                # get the list of modified parent scope, name
+                stmt = select(
+                    models.DataIdentifier.scope,
+                    models.DataIdentifier.name,
+                    models.DataIdentifier.did_type,
+                ).distinct(
+                ).join_from(
+                    association_temp_table,
+                    models.DataIdentifier,
+                    and_(association_temp_table.scope == models.DataIdentifier.scope,
+                         association_temp_table.name == models.DataIdentifier.name)
+                ).where(
+                    or_(models.DataIdentifier.complete == true(),
+                        models.DataIdentifier.complete.is_(None)),
+                )
+                for parent_scope, parent_name, parent_did_type in session.execute(stmt):
+                    parent = ScopeName(scope=parent_scope, name=parent_name)
+                    if parent not in incomplete_dids:
+                        messages.append({
+                            'payload': {
+                                'scope': parent_scope,
+                                'name': parent_name,
+                                'did_type': parent_did_type,
+                            },
+                            'event_type': 'INCOMPLETE',
+                        })
+                        incomplete_dids.add(parent)
+
+                content_to_delete_filter = exists(select(1)
+                                                  .where(and_(association_temp_table.scope == models.DataIdentifierAssociation.scope,
+                                                              association_temp_table.name == models.DataIdentifierAssociation.name,
+                                                              association_temp_table.child_scope == models.DataIdentifierAssociation.child_scope,
+                                                              association_temp_table.child_name == models.DataIdentifierAssociation.child_name)))
+
+                rucio.core.did.insert_content_history(filter_=content_to_delete_filter, did_created_at=None, session=session)
+
+                stmt = delete(
+                    models.DataIdentifierAssociation
+                ).where(
+                    content_to_delete_filter,
+                ).execution_options(
+                    synchronize_session=False
+                )
+                session.execute(stmt)
+
+    # Get collection replicas of collections which became empty
+    with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='collection_replicas_delete'):
+        if clt_replicas_to_delete:
+            stmt = delete(scope_name_temp_table)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in clt_replicas_to_delete]
+            stmt = insert(scope_name_temp_table)
+            session.execute(stmt, values)
+            stmt = delete(scope_name_temp_table2)
+            session.execute(stmt)
+            stmt = select(
+                models.CollectionReplica.scope,
+                models.CollectionReplica.name,
+            ).distinct(
+            ).join_from(
+                scope_name_temp_table,
+                models.CollectionReplica,
+                and_(scope_name_temp_table.scope == models.CollectionReplica.scope,
+                     scope_name_temp_table.name == models.CollectionReplica.name),
+            ).join(
+                models.DataIdentifier,
+                and_(models.DataIdentifier.scope == models.CollectionReplica.scope,
+                     models.DataIdentifier.name == models.CollectionReplica.name)
+            ).outerjoin(
+                models.DataIdentifierAssociation,
+                and_(models.DataIdentifierAssociation.scope == models.CollectionReplica.scope,
+                     models.DataIdentifierAssociation.name == models.CollectionReplica.name)
+            ).where(
+                models.DataIdentifierAssociation.scope == null()
+            )
+            stmt = insert(
+                scope_name_temp_table2
+            ).from_select(
+                ['scope', 'name'],
+                stmt
+            )
+            session.execute(stmt)
+            # Delete the retrieved collection replicas of empty collections
             stmt = delete(
-                models.DataIdentifierAssociation
+                models.CollectionReplica,
             ).where(
-                content_to_delete_filter,
+                exists(select(1)
+                       .where(and_(models.CollectionReplica.scope == scope_name_temp_table2.scope,
+                                   models.CollectionReplica.name == scope_name_temp_table2.name)))
             ).execution_options(
                 synchronize_session=False
             )
             session.execute(stmt)
 
-    # Get collection replicas of collections which became empty
-    if clt_replicas_to_delete:
-        stmt = delete(scope_name_temp_table)
-        session.execute(stmt)
-        values = [sn._asdict() for sn in clt_replicas_to_delete]
-        stmt = insert(scope_name_temp_table)
-        session.execute(stmt, values)
-        stmt = delete(scope_name_temp_table2)
-        session.execute(stmt)
-        stmt = select(
-            models.CollectionReplica.scope,
-            models.CollectionReplica.name,
-        ).distinct(
-        ).join_from(
-            scope_name_temp_table,
-            models.CollectionReplica,
-            and_(scope_name_temp_table.scope == models.CollectionReplica.scope,
-                 scope_name_temp_table.name == models.CollectionReplica.name),
-        ).join(
-            models.DataIdentifier,
-            and_(models.DataIdentifier.scope == models.CollectionReplica.scope,
-                 models.DataIdentifier.name == models.CollectionReplica.name)
-        ).outerjoin(
-            models.DataIdentifierAssociation,
-            and_(models.DataIdentifierAssociation.scope == models.CollectionReplica.scope,
-                 models.DataIdentifierAssociation.name == models.CollectionReplica.name)
-        ).where(
-            models.DataIdentifierAssociation.scope == null()
-        )
-        stmt = insert(
-            scope_name_temp_table2
-        ).from_select(
-            ['scope', 'name'],
-            stmt
-        )
-        session.execute(stmt)
-        # Delete the retrieved collection replicas of empty collections
-        stmt = delete(
-            models.CollectionReplica,
-        ).where(
-            exists(select(1)
-                   .where(and_(models.CollectionReplica.scope == scope_name_temp_table2.scope,
-                               models.CollectionReplica.name == scope_name_temp_table2.name)))
-        ).execution_options(
-            synchronize_session=False
-        )
-        session.execute(stmt)
-
     # Update incomplete state
-    if incomplete_dids:
-        stmt = delete(scope_name_temp_table)
-        session.execute(stmt)
-        values = [sn._asdict() for sn in incomplete_dids]
-        stmt = insert(scope_name_temp_table)
-        session.execute(stmt, values)
-        stmt = update(
-            models.DataIdentifier
-        ).where(
-            exists(select(1)
-                   .where(and_(models.DataIdentifier.scope == scope_name_temp_table.scope,
-                               models.DataIdentifier.name == scope_name_temp_table.name)))
-        ).where(
-            models.DataIdentifier.complete != false(),
-        ).values({
-            models.DataIdentifier.complete: False
-        }).execution_options(
-            synchronize_session=False
-        )
+    with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='incomplete_dids'):
+        if incomplete_dids:
+            stmt = delete(scope_name_temp_table)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in incomplete_dids]
+            stmt = insert(scope_name_temp_table)
+            session.execute(stmt, values)
+            stmt = update(
+                models.DataIdentifier
+            ).where(
+                exists(select(1)
+                       .where(and_(models.DataIdentifier.scope == scope_name_temp_table.scope,
+                                   models.DataIdentifier.name == scope_name_temp_table.name)))
+            ).where(
+                models.DataIdentifier.complete != false(),
+            ).values({
+                models.DataIdentifier.complete: False
+            }).execution_options(
+                synchronize_session=False
+            )
 
-        session.execute(stmt)
+            session.execute(stmt)
 
-    # delete empty DIDs
-    if did_condition:
-        for chunk in chunks(did_condition, 10):
+    # delete empty DIDs: files without any replica left, and collections which became empty
+    with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='empty_dids'):
+        empty_dids_stmts = []
+        if file_dids_to_check:
+            stmt = delete(scope_name_temp_table)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in file_dids_to_check]
+            stmt = insert(scope_name_temp_table)
+            session.execute(stmt, values)
+            stmt = select(
+                models.DataIdentifier.scope,
+                models.DataIdentifier.name,
+                models.DataIdentifier.did_type,
+            ).with_hint(
+                models.DataIdentifier,
+                'INDEX(DIDS DIDS_PK)',
+                'oracle'
+            ).join_from(
+                scope_name_temp_table,
+                models.DataIdentifier,
+                and_(models.DataIdentifier.scope == scope_name_temp_table.scope,
+                     models.DataIdentifier.name == scope_name_temp_table.name)
+            ).where(
+                and_(models.DataIdentifier.availability != DIDAvailability.LOST,
+                     ~exists(select(1).prefix_with("/*+ INDEX(REPLICAS REPLICAS_PK) */", dialect='oracle')).where(
+                         and_(models.RSEFileAssociation.scope == models.DataIdentifier.scope,
+                              models.RSEFileAssociation.name == models.DataIdentifier.name)),
+                     ~exists(select(1).prefix_with("/*+ INDEX(ARCHIVE_CONTENTS ARCH_CONTENTS_PK) */", dialect='oracle')).where(
+                         and_(models.ConstituentAssociation.child_scope == models.DataIdentifier.scope,
+                              models.ConstituentAssociation.child_name == models.DataIdentifier.name)))
+            )
+            empty_dids_stmts.append(stmt)
+        if collection_dids_to_check:
+            stmt = delete(scope_name_temp_table2)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in collection_dids_to_check]
+            stmt = insert(scope_name_temp_table2)
+            session.execute(stmt, values)
+            remove_open_did = config_get_bool('reaper', 'remove_open_did', default=False, session=session)
             stmt = select(
                 models.DataIdentifier.scope,
                 models.DataIdentifier.name,
@@ -2307,9 +2510,23 @@ def __cleanup_after_replica_deletion(
                 models.DataIdentifier,
                 'INDEX(DIDS DIDS_PK)',
                 'oracle'
+            ).join_from(
+                scope_name_temp_table2,
+                models.DataIdentifier,
+                and_(models.DataIdentifier.scope == scope_name_temp_table2.scope,
+                     models.DataIdentifier.name == scope_name_temp_table2.name)
             ).where(
-                or_(*chunk)
+                ~exists(1).where(
+                    and_(models.DataIdentifierAssociation.child_scope == models.DataIdentifier.scope,
+                         models.DataIdentifierAssociation.child_name == models.DataIdentifier.name)),
+                ~exists(1).where(
+                    and_(models.DataIdentifierAssociation.scope == models.DataIdentifier.scope,
+                         models.DataIdentifierAssociation.name == models.DataIdentifier.name)),
             )
+            if not remove_open_did:
+                stmt = stmt.where(models.DataIdentifier.is_open == false())
+            empty_dids_stmts.append(stmt)
+        for stmt in empty_dids_stmts:
             for scope, name, did_type in session.execute(stmt):
                 if did_type == DIDType.DATASET:
                     messages.append({'event_type': 'ERASE',
@@ -2320,195 +2537,203 @@ def __cleanup_after_replica_deletion(
 
     # Remove Archive Constituents
     constituent_associations_to_delete = set()
-    if affected_archives:
-        stmt = delete(scope_name_temp_table)
-        session.execute(stmt)
-        values = [sn._asdict() for sn in affected_archives]
-        stmt = insert(scope_name_temp_table)
-        session.execute(stmt, values)
-
-        stmt = select(
-            models.ConstituentAssociation
-        ).distinct(
-        ).join_from(
-            scope_name_temp_table,
-            models.ConstituentAssociation,
-            and_(scope_name_temp_table.scope == models.ConstituentAssociation.scope,
-                 scope_name_temp_table.name == models.ConstituentAssociation.name),
-        ).outerjoin(
-            models.DataIdentifier,
-            and_(models.DataIdentifier.availability == DIDAvailability.LOST,
-                 models.DataIdentifier.scope == models.ConstituentAssociation.scope,
-                 models.DataIdentifier.name == models.ConstituentAssociation.name)
-        ).where(
-            models.DataIdentifier.scope == null()
-        ).outerjoin(
-            models.RSEFileAssociation,
-            and_(models.RSEFileAssociation.scope == models.ConstituentAssociation.scope,
-                 models.RSEFileAssociation.name == models.ConstituentAssociation.name)
-        ).where(
-            models.RSEFileAssociation.scope == null()
-        )
-
-        for constituent in session.execute(stmt).scalars().all():
-            constituent_associations_to_delete.add(Association(scope=constituent.scope, name=constituent.name,
-                                                               child_scope=constituent.child_scope, child_name=constituent.child_name))
-            models.ConstituentAssociationHistory(
-                child_scope=constituent.child_scope,
-                child_name=constituent.child_name,
-                scope=constituent.scope,
-                name=constituent.name,
-                bytes=constituent.bytes,
-                adler32=constituent.adler32,
-                md5=constituent.md5,
-                guid=constituent.guid,
-                length=constituent.length,
-                updated_at=constituent.updated_at,
-                created_at=constituent.created_at,
-            ).save(session=session, flush=False)
-
-    if constituent_associations_to_delete:
-        stmt = delete(association_temp_table)
-        session.execute(stmt)
-        values = [a._asdict() for a in constituent_associations_to_delete]
-        stmt = insert(association_temp_table)
-        session.execute(stmt, values)
-        stmt = delete(
-            models.ConstituentAssociation
-        ).where(
-            exists(select(1)
-                   .where(and_(association_temp_table.scope == models.ConstituentAssociation.scope,
-                               association_temp_table.name == models.ConstituentAssociation.name,
-                               association_temp_table.child_scope == models.ConstituentAssociation.child_scope,
-                               association_temp_table.child_name == models.ConstituentAssociation.child_name)))
-        ).execution_options(
-            synchronize_session=False
-        )
-        session.execute(stmt)
+    with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='archive_constituents'):
+        if affected_archives:
+            stmt = delete(scope_name_temp_table)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in affected_archives]
+            stmt = insert(scope_name_temp_table)
+            session.execute(stmt, values)
 
-        removed_constituents = {ScopeName(scope=c.child_scope, name=c.child_name) for c in constituent_associations_to_delete}
-        for chunk in chunks(removed_constituents, 200):
-            __cleanup_after_replica_deletion(scope_name_temp_table=scope_name_temp_table,
-                                             scope_name_temp_table2=scope_name_temp_table2,
-                                             association_temp_table=association_temp_table,
-                                             rse_id=rse_id, files=[sn._asdict() for sn in chunk], session=session)
+            stmt = select(
+                models.ConstituentAssociation
+            ).distinct(
+            ).join_from(
+                scope_name_temp_table,
+                models.ConstituentAssociation,
+                and_(scope_name_temp_table.scope == models.ConstituentAssociation.scope,
+                     scope_name_temp_table.name == models.ConstituentAssociation.name),
+            ).outerjoin(
+                models.DataIdentifier,
+                and_(models.DataIdentifier.availability == DIDAvailability.LOST,
+                     models.DataIdentifier.scope == models.ConstituentAssociation.scope,
+                     models.DataIdentifier.name == models.ConstituentAssociation.name)
+            ).where(
+                models.DataIdentifier.scope == null()
+            ).outerjoin(
+                models.RSEFileAssociation,
+                and_(models.RSEFileAssociation.scope == models.ConstituentAssociation.scope,
+                     models.RSEFileAssociation.name == models.ConstituentAssociation.name)
+            ).where(
+                models.RSEFileAssociation.scope == null()
+            )
 
-    if dids_to_delete:
-        stmt = delete(scope_name_temp_table)
-        session.execute(stmt)
-        values = [sn._asdict() for sn in dids_to_delete]
-        stmt = insert(scope_name_temp_table)
-        session.execute(stmt, values)
+            constituents_history = []
+            for constituent in session.execute(stmt).scalars().all():
+                constituent_associations_to_delete.add(Association(scope=constituent.scope, name=constituent.name,
+                                                                   child_scope=constituent.child_scope, child_name=constituent.child_name))
+                constituents_history.append({
+                    'child_scope': constituent.child_scope,
+                    'child_name': constituent.child_name,
+                    'scope': constituent.scope,
+                    'name': constituent.name,
+                    'bytes': constituent.bytes,
+                    'adler32': constituent.adler32,
+                    'md5': constituent.md5,
+                    'guid': constituent.guid,
+                    'length': constituent.length,
+                    'updated_at': constituent.updated_at,
+                    'created_at': constituent.created_at,
+                })
+            if constituents_history:
+                stmt = insert(models.ConstituentAssociationHistory)
+                session.execute(stmt, constituents_history)
+
+        if constituent_associations_to_delete:
+            stmt = delete(association_temp_table)
+            session.execute(stmt)
+            values = [a._asdict() for a in constituent_associations_to_delete]
+            stmt = insert(association_temp_table)
+            session.execute(stmt, values)
+            stmt = delete(
+                models.ConstituentAssociation
+            ).where(
+                exists(select(1)
+                       .where(and_(association_temp_table.scope == models.ConstituentAssociation.scope,
+                                   association_temp_table.name == models.ConstituentAssociation.name,
+                                   association_temp_table.child_scope == models.ConstituentAssociation.child_scope,
+                                   association_temp_table.child_name == models.ConstituentAssociation.child_name)))
+            ).execution_options(
+                synchronize_session=False
+            )
+            session.execute(stmt)
 
-        # Remove rules in Waiting for approval or Suspended
-        stmt = delete(
-            models.ReplicationRule,
-        ).where(
-            exists(select(1)
-                   .where(and_(models.ReplicationRule.scope == scope_name_temp_table.scope,
-                               models.ReplicationRule.name == scope_name_temp_table.name)))
-        ).where(
-            models.ReplicationRule.state.in_((RuleState.SUSPENDED, RuleState.WAITING_APPROVAL))
-        ).execution_options(
-            synchronize_session=False
-        )
-        session.execute(stmt)
+    # Outside of the timed stage: the cleanup of the constituents times its own stages
+    removed_constituents = {ScopeName(scope=c.child_scope, name=c.child_name) for c in constituent_associations_to_delete}
+    for chunk in chunks(removed_constituents, 200):
+        __cleanup_after_replica_deletion(scope_name_temp_table=scope_name_temp_table,
+                                         scope_name_temp_table2=scope_name_temp_table2,
+                                         association_temp_table=association_temp_table,
+                                         rse_id=rse_id, files=[sn._asdict() for sn in chunk], session=session)
+
+    with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='did_deletion'):
+        if dids_to_delete:
+            stmt = delete(scope_name_temp_table)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in dids_to_delete]
+            stmt = insert(scope_name_temp_table)
+            session.execute(stmt, values)
 
-        # Remove DID Metadata
-        must_delete_did_meta = True
-        if session.bind.dialect.name == 'oracle':
-            oracle_version = int(session.connection().connection.version.split('.')[0])
-            if oracle_version < 12:
-                must_delete_did_meta = False
-        if must_delete_did_meta:
+            # Remove rules in Waiting for approval or Suspended
             stmt = delete(
-                models.DidMeta,
+                models.ReplicationRule,
             ).where(
                 exists(select(1)
-                       .where(and_(models.DidMeta.scope == scope_name_temp_table.scope,
-                                   models.DidMeta.name == scope_name_temp_table.name)))
+                       .where(and_(models.ReplicationRule.scope == scope_name_temp_table.scope,
+                                   models.ReplicationRule.name == scope_name_temp_table.name)))
+            ).where(
+                models.ReplicationRule.state.in_((RuleState.SUSPENDED, RuleState.WAITING_APPROVAL))
             ).execution_options(
                 synchronize_session=False
             )
             session.execute(stmt)
 
-        for chunk in chunks(messages, 100):
-            add_messages(chunk, session=session)
+            # Remove DID Metadata
+            must_delete_did_meta = True
+            if session.bind.dialect.name == 'oracle':
+                oracle_version = int(session.connection().connection.version.split('.')[0])
+                if oracle_version < 12:
+                    must_delete_did_meta = False
+            if must_delete_did_meta:
+                stmt = delete(
+                    models.DidMeta,
+                ).where(
+                    exists(select(1)
+                           .where(and_(models.DidMeta.scope == scope_name_temp_table.scope,
+                                       models.DidMeta.name == scope_name_temp_table.name)))
+                ).execution_options(
+                    synchronize_session=False
+                )
+                session.execute(stmt)
 
-        # Delete DIDs
-        dids_to_delete_filter = exists(select(1)
-                                       .where(and_(models.DataIdentifier.scope == scope_name_temp_table.scope,
-                                                   models.DataIdentifier.name == scope_name_temp_table.name)))
-        archive_dids = config_get_bool('deletion', 'archive_dids', default=False, session=session)
-        if archive_dids:
-            rucio.core.did.insert_deleted_dids(filter_=dids_to_delete_filter, session=session)
-        stmt = delete(
-            models.DataIdentifier,
-        ).where(
-            dids_to_delete_filter,
-        ).execution_options(
-            synchronize_session=False
-        )
-        session.execute(stmt)
+            for chunk in chunks(messages, 100):
+                add_messages(chunk, session=session)
+
+            # Delete DIDs
+            dids_to_delete_filter = exists(select(1)
+                                           .where(and_(models.DataIdentifier.scope == scope_name_temp_table.scope,
+                                                       models.DataIdentifier.name == scope_name_temp_table.name)))
+            archive_dids = config_get_bool('deletion', 'archive_dids', default=False, session=session)
+            if archive_dids:
+                rucio.core.did.insert_deleted_dids(filter_=dids_to_delete_filter, session=session)
+            stmt = delete(
+                models.DataIdentifier,
+            ).where(
+                dids_to_delete_filter,
+            ).execution_options(
+                synchronize_session=False
+            )
+            session.execute(stmt)
 
     # Set is_archive = false on collections which don't have archive children anymore
-    while clt_to_set_not_archive:
-        to_update = clt_to_set_not_archive.pop(0)
-        if not to_update:
-            continue
-        stmt = delete(scope_name_temp_table)
-        session.execute(stmt)
-        values = [sn._asdict() for sn in to_update]
-        stmt = insert(scope_name_temp_table)
-        session.execute(stmt, values)
-        stmt = delete(scope_name_temp_table2)
-        session.execute(stmt)
+    with METRICS.timer('cleanup_after_replica_deletion.{stage}').labels(stage='archive_flags'):
+        while clt_to_set_not_archive:
+            to_update = clt_to_set_not_archive.pop(0)
+            if not to_update:
+                continue
+            stmt = delete(scope_name_temp_table)
+            session.execute(stmt)
+            values = [sn._asdict() for sn in to_update]
+            stmt = insert(scope_name_temp_table)
+            session.execute(stmt, values)
+            stmt = delete(scope_name_temp_table2)
+            session.execute(stmt)
 
-        data_identifier_alias = aliased(models.DataIdentifier, name='did_alias')
-        # Fetch rows to be updated
-        stmt = select(
-            models.DataIdentifier.scope,
-            models.DataIdentifier.name,
-        ).distinct(
-        ).where(
-            models.DataIdentifier.is_archive == true()
-        ).join_from(
-            scope_name_temp_table,
-            models.DataIdentifier,
-            and_(scope_name_temp_table.scope == models.DataIdentifier.scope,
-                 scope_name_temp_table.name == models.DataIdentifier.name)
-        ).join(
-            models.DataIdentifierAssociation,
-            and_(models.DataIdentifier.scope == models.DataIdentifierAssociation.scope,
-                 models.DataIdentifier.name == models.DataIdentifierAssociation.name)
-        ).outerjoin(
-            data_identifier_alias,
-            and_(data_identifier_alias.scope == models.DataIdentifierAssociation.child_scope,
-                 data_identifier_alias.name == models.DataIdentifierAssociation.child_name,
-                 data_identifier_alias.is_archive == true())
-        ).where(
-            data_identifier_alias.scope == null()
-        )
-        stmt = insert(
-            scope_name_temp_table2
-        ).from_select(
-            ['scope', 'name'],
-            stmt
-        )
-        session.execute(stmt)
-        # update the fetched rows
-        stmt = update(
-            models.DataIdentifier,
-        ).where(
-            exists(select(1)
-                   .where(and_(models.DataIdentifier.scope == scope_name_temp_table2.scope,
-                               models.DataIdentifier.name == scope_name_temp_table2.name)))
-        ).values({
-            models.DataIdentifier.is_archive: False
-        }).execution_options(
-            synchronize_session=False
-        )
-        session.execute(stmt)
+            data_identifier_alias = aliased(models.DataIdentifier, name='did_alias')
+            # Fetch rows to be updated
+            stmt = select(
+                models.DataIdentifier.scope,
+                models.DataIdentifier.name,
+            ).distinct(
+            ).where(
+                models.DataIdentifier.is_archive == true()
+            ).join_from(
+                scope_name_temp_table,
+                models.DataIdentifier,
+                and_(scope_name_temp_table.scope == models.DataIdentifier.scope,
+                     scope_name_temp_table.name == models.DataIdentifier.name)
+            ).join(
+                models.DataIdentifierAssociation,
+                and_(models.DataIdentifier.scope == models.DataIdentifierAssociation.scope,
+                     models.DataIdentifier.name == models.DataIdentifierAssociation.name)
+            ).outerjoin(
+                data_identifier_alias,
+                and_(data_identifier_alias.scope == models.DataIdentifierAssociation.child_scope,
+                     data_identifier_alias.name == models.DataIdentifierAssociation.child_name,
+                     data_identifier_alias.is_archive == true())
+            ).where(
+                data_identifier_alias.scope == null()
+            )
+            stmt = insert(
+                scope_name_temp_table2
+            ).from_select(
+                ['scope', 'name'],
+                stmt
+            )
+            session.execute(stmt)
+            # update the fetched rows
+            stmt = update(
+                models.DataIdentifier,
+            ).where(
+                exists(select(1)
+                       .where(and_(models.DataIdentifier.scope == scope_name_temp_table2.scope,
+                                   models.DataIdentifier.name == scope_name_temp_table2.name)))
+            ).values({
+                models.DataIdentifier.is_archive: False
+            }).execution_options(
+                synchronize_session=False
+            )
+            session.execute(stmt)
 
 
 @transactional_session
@@ -2542,6 +2767,107 @@ def get_replica(
         raise exception.ReplicaNotFound("No row found for scope: %s name: %s rse: %s" % (scope, name, get_rse_name(rse_id=rse_id, session=session)))
 
 
+def _claim_deletion_candidates(
+    rse_id: Optional[str],
+    limit: int,
+    after: "Optional[tuple[datetime, datetime, InternalScope, str]]" = None,
+    delay_seconds: int = 600,
+    only_delete_obsolete: bool = False,
+    *,
+    session: "Session"
+) -> "list[tuple[datetime, datetime, InternalScope, str]]":
+    """
+    Lock and return the next unlocked replicas of an RSE which are due for deletion.
+
+    The candidates are walked in (tombstone, updated_at, scope, name) order: least recently
+    updated first among equal tombstones, scope and name make the order total. It is served by
+    REPLICAS_DELETION_QUEUE_IDX: the database maintains this index on every replica update,
+    so the cost of a call is proportional to `limit` and not to the number
+    of replicas with a tombstone on the RSE. Rows locked by other reaper workers are skipped.
+
+    :param rse_id:                   The rse_id.
+    :param limit:                    Maximum number of candidates to return.
+    :param after:                    The last candidate returned by the previous call, to continue the walk after it.
+    :param delay_seconds:            The delay to query replicas in BEING_DELETED state
+    :param only_delete_obsolete      If set to True, will only return the replicas with EPOCH tombstone
+    :param session:                  The database session in use.
+
+    :returns: a list of (tombstone, updated_at, scope, name) tuples, in queue order.
+    """
+    # in the order of REPLICAS_DELETION_QUEUE_IDX, after its rse_id and lock_cnt columns
+    queue_columns = (
+        models.RSEFileAssociation.tombstone,
+        models.RSEFileAssociation.updated_at,
+        models.RSEFileAssociation.scope,
+        models.RSEFileAssociation.name,
+    )
+
+    stmt = select(
+        *queue_columns
+    ).with_hint(
+        models.RSEFileAssociation,
+        'INDEX(%(name)s REPLICAS_DELETION_QUEUE_IDX)',
+        'oracle'
+    ).where(
+        models.RSEFileAssociation.rse_id == rse_id,
+        models.RSEFileAssociation.lock_cnt == 0,
+        models.RSEFileAssociation.tombstone == OBSOLETE if only_delete_obsolete else models.RSEFileAssociation.tombstone < datetime.utcnow(),
+    ).where(
+        or_(models.RSEFileAssociation.state.in_((ReplicaState.AVAILABLE, ReplicaState.UNAVAILABLE, ReplicaState.BAD)),
+            and_(models.RSEFileAssociation.state == ReplicaState.BEING_DELETED, models.RSEFileAssociation.updated_at < datetime.utcnow() - timedelta(seconds=delay_seconds)))
+    ).where(
+        # Only try to delete replicas if they are not used as sources in any transfers
+        ~exists(select(1).where(
+            models.Source.scope == models.RSEFileAssociation.scope,
+            models.Source.name == models.RSEFileAssociation.name,
+            models.Source.rse_id == models.RSEFileAssociation.rse_id))
+    )
+
+    if after is not None:
+        # Keyset pagination: strictly after the last candidate, in queue order
+        if session.bind.dialect.name == 'oracle':  # type: ignore
+            # oracle does not support the comparison of row values
+            condition = queue_columns[-1] > after[-1]
+            for column, value in zip(reversed(queue_columns[:-1]), reversed(after[:-1])):
+                condition = or_(column > value, and_(column == value, condition))
+        else:
+            condition = tuple_(*queue_columns) > tuple(after)
+        stmt = stmt.where(condition)
+
+    stmt = stmt.order_by(
+        *queue_columns
+    ).limit(
+        limit
+    )
+
+    # Oracle does not support chaining order_by(), limit(), and
+    # with_for_update(). Use a nested query to overcome this.
+    if session.bind.dialect.name == 'oracle':  # type: ignore
+        candidates = stmt.subquery()
+        stmt = select(
+            *queue_columns
+        ).where(
+            models.RSEFileAssociation.rse_id == rse_id,
+            models.RSEFileAssociation.scope == candidates.c.scope,
+            models.RSEFileAssociation.name == candidates.c.name,
+        ).order_by(
+            *queue_columns
+        ).with_for_update(
+            skip_locked=True,
+            # oracle: we must specify a column, not a table; however, it doesn't matter which column, the lock is put on the whole row
+            of=models.RSEFileAssociation.scope,
+        )
+        return [tuple(row) for row in session.execute(stmt)]
+
+    stmt = stmt.with_for_update(
+        skip_locked=True,
+        # postgresql/mysql: sqlalchemy driver automatically converts it to a table name
+        # sqlite: this is completely ignored
+        of=models.RSEFileAssociation.scope,
+    )
+    return [tuple(row) for row in session.execute(stmt)]
+
+
 @transactional_session
 def list_and_mark_unlocked_replicas(
     limit: int,
@@ -2573,38 +2899,25 @@ def list_and_mark_unlocked_replicas(
 
     replicas_alias = aliased(models.RSEFileAssociation, name='replicas_alias')
 
-    stmt = select(
-        models.RSEFileAssociation.scope,
-        models.RSEFileAssociation.name,
-    ).where(
-        models.RSEFileAssociation.lock_cnt == 0,
-        models.RSEFileAssociation.rse_id == rse_id,
-        models.RSEFileAssociation.tombstone == OBSOLETE if only_delete_obsolete else models.RSEFileAssociation.tombstone < datetime.utcnow(),
-    ).where(
-        or_(models.RSEFileAssociation.state.in_((ReplicaState.AVAILABLE, ReplicaState.UNAVAILABLE, ReplicaState.BAD)),
-            and_(models.RSEFileAssociation.state == ReplicaState.BEING_DELETED, models.RSEFileAssociation.updated_at < datetime.utcnow() - timedelta(seconds=delay_seconds)))
-    ).outerjoin(
-        models.Source,
-        and_(models.RSEFileAssociation.scope == models.Source.scope,
-             models.RSEFileAssociation.name == models.Source.name,
-             models.RSEFileAssociation.rse_id == models.Source.rse_id)
-    ).where(
-        models.Source.scope.is_(None)  # Only try to delete replicas if they are not used as sources in any transfers
-    ).order_by(
-        models.RSEFileAssociation.tombstone,
-        models.RSEFileAssociation.updated_at
-    ).with_for_update(
-        skip_locked=True,
-        # oracle: we must specify a column, not a table; however, it doesn't matter which column, the lock is put on the whole row
-        # postgresql/mysql: sqlalchemy driver automatically converts it to a table name
-        # sqlite: this is completely ignored
-        of=models.RSEFileAssociation.scope,
-    )
+    batch_size = math.ceil(1.25 * limit)
+    last_candidate = None
+    while True:
+        with METRICS.timer('list_and_mark_unlocked_replicas.claim_candidates'):
+            chunk = _claim_deletion_candidates(
+                rse_id=rse_id,
+                limit=batch_size,
+                after=last_candidate,
+                delay_seconds=delay_seconds,
+                only_delete_obsolete=only_delete_obsolete,
+                session=session
+            )
+        if not chunk:
+            break
+        last_candidate = chunk[-1]
 
-    for chunk in chunks(session.execute(stmt).yield_per(2 * limit), math.ceil(1.25 * limit)):
         stmt = delete(temp_table_cls)
         session.execute(stmt)
-        values = [{'scope': scope, 'name': name} for scope, name in chunk]
+        values = [{'scope': scope, 'name': name} for _, _, scope, name in chunk]
         stmt = insert(temp_table_cls)
         session.execute(stmt, values)
 
@@ -2675,6 +2988,8 @@ def list_and_mark_unlocked_replicas(
                          'state': state, 'datatype': datatype})
         if len(rows) >= limit or (not only_delete_obsolete and needed_space is not None and total_bytes > needed_space):
             break
+        if len(chunk) < batch_size:
+            break
 
     if rows:
         stmt = delete(temp_table_cls)
@@ -2808,6 +3123,117 @@ def update_replicas_states(
     return True
 
 
+@transactional_session
+def update_transferred_replicas_states(
+    replicas: "Iterable[dict[str, Any]]",
+    nowait: bool = False,
+    *,
+    session: "Session",
+    logger: "LoggerFunction" = logging.log
+) -> None:
+    """
+    Bulk version of update_replicas_states for the replicas of finished transfers.
+
+    The replicas are checked and locked with one query per RSE, the replica locks and rules
+    are updated by rucio.core.lock.finished_transfers and the new states are written with
+    a single executemany. Only the AVAILABLE and UNAVAILABLE states are supported.
+
+    :param replicas:        The list of replicas.
+    :param nowait:          Nowait parameter for the for_update queries.
+    :param session:         The database session in use.
+    :param logger:          Optional decorated logger that can be passed from the calling daemons or servers.
+    """
+    replicas = list(replicas)
+    for replica in replicas:
+        if isinstance(replica['state'], str):
+            replica['state'] = ReplicaState(replica['state'])
+        if replica['state'] not in (ReplicaState.AVAILABLE, ReplicaState.UNAVAILABLE):
+            raise exception.UnsupportedOperation('State %(state)s for replica %(scope)s:%(name)s cannot be updated in bulk' % replica)
+    if not replicas:
+        return
+
+    temp_table_cls = temp_table_mngr(session).create_scope_name_table()
+    recovered = []
+    with METRICS.timer('update_transferred_replicas_states.{stage}').labels(stage='replicas'):
+        for rse_id, rse_replicas in groupby(sorted(replicas, key=lambda r: (r['rse_id'], r['scope'].internal, r['name'])), key=lambda r: r['rse_id']):
+            rse_replicas = list(rse_replicas)
+            session.execute(delete(temp_table_cls))
+            session.execute(insert(temp_table_cls), [{'scope': scope, 'name': name} for scope, name in dict.fromkeys((r['scope'], r['name']) for r in rse_replicas)])
+            stmt = select(
+                models.RSEFileAssociation.scope,
+                models.RSEFileAssociation.name,
+            ).join_from(
+                temp_table_cls,
+                models.RSEFileAssociation,
+                and_(models.RSEFileAssociation.scope == temp_table_cls.scope,
+                     models.RSEFileAssociation.name == temp_table_cls.name,
+                     models.RSEFileAssociation.rse_id == rse_id)
+            ).order_by(
+                models.RSEFileAssociation.scope,
+                models.RSEFileAssociation.name
+            ).with_for_update(
+                nowait=nowait,
+                of=models.RSEFileAssociation.scope,
+            )
+            found = {(scope.internal, name) for scope, name in session.execute(stmt)}
+            for replica in rse_replicas:
+                if (replica['scope'].internal, replica['name']) not in found:
+                    raise exception.ReplicaNotFound("No row found for scope: %s name: %s rse: %s" % (replica['scope'], replica['name'], get_rse_name(rse_id, session=session)))
+
+            if any(replica['state'] == ReplicaState.AVAILABLE for replica in rse_replicas):
+                stmt = select(
+                    models.BadReplica.scope,
+                    models.BadReplica.name,
+                ).join_from(
+                    temp_table_cls,
+                    models.BadReplica,
+                    and_(models.BadReplica.scope == temp_table_cls.scope,
+                         models.BadReplica.name == temp_table_cls.name,
+                         models.BadReplica.rse_id == rse_id,
+                         models.BadReplica.state == BadFilesStatus.BAD)
+                )
+                bad = {(scope.internal, name) for scope, name in session.execute(stmt)}
+                recovered.extend({'b_rse_id': rse_id, 'b_scope': replica['scope'], 'b_name': replica['name']}
+                                 for replica in rse_replicas
+                                 if replica['state'] == ReplicaState.AVAILABLE and (replica['scope'].internal, replica['name']) in bad)
+
+    with METRICS.timer('update_transferred_replicas_states.{stage}').labels(stage='locks'):
+        rucio.core.lock.finished_transfers(replicas, nowait=nowait, session=session, logger=logger)
+
+    with METRICS.timer('update_transferred_replicas_states.{stage}').labels(stage='states'):
+        if recovered:
+            bad_replicas_table = models.BadReplica.__table__
+            stmt = update(
+                bad_replicas_table
+            ).where(
+                and_(bad_replicas_table.c.state == BadFilesStatus.BAD,
+                     bad_replicas_table.c.rse_id == bindparam('b_rse_id'),
+                     bad_replicas_table.c.scope == bindparam('b_scope'),
+                     bad_replicas_table.c.name == bindparam('b_name'))
+            ).values({
+                bad_replicas_table.c.state: BadFilesStatus.RECOVERED,
+                bad_replicas_table.c.updated_at: datetime.utcnow()
+            })
+            session.execute(stmt, recovered)
+
+        replicas_table = models.RSEFileAssociation.__table__
+        for with_path, group in groupby(sorted(replicas, key=lambda r: bool(r.get('path'))), key=lambda r: bool(r.get('path'))):
+            values = {replicas_table.c.state: bindparam('b_state', type_=replicas_table.c.state.type)}
+            if with_path:
+                values[replicas_table.c.path] = bindparam('b_path')
+            stmt = update(
+                replicas_table
+            ).where(
+                and_(replicas_table.c.rse_id == bindparam('b_rse_id'),
+                     replicas_table.c.scope == bindparam('b_scope'),
+                     replicas_table.c.name == bindparam('b_name'))
+            ).prefix_with(
+                '/*+ INDEX(REPLICAS REPLICAS_PK) */', dialect='oracle'
+            ).values(values)
+            session.execute(stmt, [{'b_rse_id': r['rse_id'], 'b_scope': r['scope'], 'b_name': r['name'], 'b_state': r['state'], **({'b_path': r['path']} if with_path else {})}
+                                   for r in group])
+
+
 @transactional_session
 def touch_replica(
     replica: dict[str, Any],
@@ -2901,6 +3327,130 @@ def touch_replica(
     return True
 
 
+@transactional_session
+def touch_replicas(
+    replicas: "Iterable[dict[str, Any]]",
+    *,
+    session: "Session"
+) -> list[dict[str, Any]]:
+    """
+    Bulk version of touch_replica: update the accessed_at timestamp of the given file
+    replicas and DIDs, skipping the rows locked by another transaction.
+
+    The replicas must be distinct on (scope, name, rse_id). Each one can carry a 'count',
+    the number of accesses it stands for, by which the access_cnt of the DID is incremented.
+    Rows are locked and updated in primary key order, so that concurrent callers cannot
+    deadlock each other. Replicas which do not exist are ignored, as in touch_replica.
+
+    :param replicas: a list of dictionaries with the scope, name, rse_id and accessed_at of the replicas.
+    :param session: The database session in use.
+
+    :returns: The replicas which were not updated because their rows were locked.
+    """
+    now = datetime.utcnow()
+    replicas = sorted(replicas, key=lambda r: (r['rse_id'], r['scope'].internal, r['name']))
+    if not replicas:
+        return []
+
+    existing, locked = set(), set()
+    for chunk in chunks(replicas, 1000):
+        stmt = select(
+            models.RSEFileAssociation.rse_id,
+            models.RSEFileAssociation.scope,
+            models.RSEFileAssociation.name,
+        ).where(
+            tuple_(models.RSEFileAssociation.rse_id,
+                   models.RSEFileAssociation.scope,
+                   models.RSEFileAssociation.name).in_([(r['rse_id'], r['scope'], r['name']) for r in chunk])
+        )
+        existing.update((rse_id, scope.internal, name) for rse_id, scope, name in session.execute(stmt))
+        stmt = stmt.order_by(
+            models.RSEFileAssociation.rse_id,
+            models.RSEFileAssociation.scope,
+            models.RSEFileAssociation.name
+        ).with_for_update(
+            skip_locked=True,
+            of=models.RSEFileAssociation.scope,
+        )
+        locked.update((rse_id, scope.internal, name) for rse_id, scope, name in session.execute(stmt))
+
+    temp_table_cls = temp_table_mngr(session).create_scope_name_table()
+    session.execute(insert(temp_table_cls), [{'scope': scope, 'name': name}
+                                             for scope, name in sorted({(r['scope'], r['name']) for r in replicas}, key=lambda did: (did[0].internal, did[1]))])
+    stmt = select(
+        models.DataIdentifier.scope,
+        models.DataIdentifier.name,
+    ).join_from(
+        temp_table_cls,
+        models.DataIdentifier,
+        and_(models.DataIdentifier.scope == temp_table_cls.scope,
+             models.DataIdentifier.name == temp_table_cls.name,
+             models.DataIdentifier.did_type == DIDType.FILE)
+    ).order_by(
+        models.DataIdentifier.scope,
+        models.DataIdentifier.name
+    ).with_for_update(
+        skip_locked=True,
+        of=models.DataIdentifier.scope,
+    )
+    locked_dids = {(scope.internal, name) for scope, name in session.execute(stmt)}
+
+    touched, failed, dids = [], [], {}
+    for replica in replicas:
+        key = (replica['rse_id'], replica['scope'].internal, replica['name'])
+        if key not in existing:
+            continue
+        if key not in locked or key[1:] not in locked_dids:
+            failed.append(replica)
+            continue
+        accessed_at = replica.get('accessed_at') or now
+        touched.append({'b_rse_id': replica['rse_id'], 'b_scope': replica['scope'], 'b_name': replica['name'], 'b_accessed_at': accessed_at})
+        did = dids.setdefault(key[1:], {'b_scope': replica['scope'], 'b_name': replica['name'], 'b_accessed_at': accessed_at, 'b_count': 0})
+        did['b_accessed_at'] = max(did['b_accessed_at'], accessed_at)
+        did['b_count'] += replica.get('count', 1)
+
+    if touched:
+        replicas_table = models.RSEFileAssociation.__table__
+        accessed_at_param = bindparam('b_accessed_at', type_=DateTime())
+        stmt = update(
+            replicas_table
+        ).where(
+            and_(replicas_table.c.rse_id == bindparam('b_rse_id'),
+                 replicas_table.c.scope == bindparam('b_scope'),
+                 replicas_table.c.name == bindparam('b_name'))
+        ).prefix_with(
+            '/*+ INDEX(REPLICAS REPLICAS_PK) */', dialect='oracle'
+        ).values({
+            replicas_table.c.accessed_at: accessed_at_param,
+            # Same condition as the tombstone.not_in([OBSOLETE, None]) of touch_replica: expanding IN
+            # parameters cannot be used in an executemany
+            replicas_table.c.tombstone: case(
+                (and_(replicas_table.c.tombstone.is_not(None), replicas_table.c.tombstone != OBSOLETE),
+                 accessed_at_param),
+                else_=replicas_table.c.tombstone)
+        })
+        session.execute(stmt, touched)
+
+        dids_table = models.DataIdentifier.__table__
+        count_param = bindparam('b_count', type_=Integer())
+        stmt = update(
+            dids_table
+        ).where(
+            and_(dids_table.c.scope == bindparam('b_scope'),
+                 dids_table.c.name == bindparam('b_name'),
+                 dids_table.c.did_type == DIDType.FILE)
+        ).prefix_with(
+            '/*+ INDEX(DIDS DIDS_PK) */', dialect='oracle'
+        ).values({
+            dids_table.c.accessed_at: bindparam('b_accessed_at'),
+            dids_table.c.access_cnt: case((dids_table.c.access_cnt.is_(None), count_param),
+                                          else_=(dids_table.c.access_cnt + count_param))
+        })
+        session.execute(stmt, [did for _, did in sorted(dids.items())])
+
+    return failed
+
+
 @transactional_session
 def update_replica_state(
     rse_id: str,
@@ -3004,7 +3554,7 @@ def get_and_lock_file_replicas_for_dataset(
     thread_id: Optional[int] = None,
     *,
     session: "Session"
-) -> tuple[list[dict[str, Any]], dict[tuple[InternalScope, str], Any]]:
+) -> tuple[FileColumns, dict[tuple[InternalScope, str], Any]]:
     """
     Get file replicas for all files of a dataset.
 
@@ -3017,7 +3567,7 @@ def get_and_lock_file_replicas_for_dataset(
     :param session:        The db session in use.
     :returns:              (files in dataset, replicas in dataset)
     """
-    files, replicas = {}, {}
+    files, replicas = FileColumns(), {}
 
     base_stmt = select(
         models.DataIdentifierAssociation.child_scope,
@@ -3051,11 +3601,7 @@ def get_and_lock_file_replicas_for_dataset(
                                            hash_variable='child_name')
 
         for child_scope, child_name, bytes_, md5, adler32 in session.execute(base_stmt).yield_per(1000):
-            files[(child_scope, child_name)] = {'scope': child_scope,
-                                                'name': child_name,
-                                                'bytes': bytes_,
-                                                'md5': md5,
-                                                'adler32': adler32}
+            child_scope = files.append(child_scope, child_name, bytes_, md5, adler32)
             replicas[(child_scope, child_name)] = []
 
         stmt = stmt.where(or_(*rse_clause))
@@ -3087,22 +3633,15 @@ def get_and_lock_file_replicas_for_dataset(
     )
 
     for child_scope, child_name, bytes_, md5, adler32, replica in session.execute(stmt).yield_per(1000):
-        if (child_scope, child_name) not in files:
-            files[(child_scope, child_name)] = {'scope': child_scope,
-                                                'name': child_name,
-                                                'bytes': bytes_,
-                                                'md5': md5,
-                                                'adler32': adler32}
-
-        if (child_scope, child_name) in replicas:
-            if replica is not None:
-                replicas[(child_scope, child_name)].append(replica)
-        else:
-            replicas[(child_scope, child_name)] = []
-            if replica is not None:
-                replicas[(child_scope, child_name)].append(replica)
-
-    return (list(files.values()), replicas)
+        # every file of the dataset has an entry in replicas, possibly empty
+        file_replicas = replicas.get((child_scope, child_name))
+        if file_replicas is None:
+            child_scope = files.append(child_scope, child_name, bytes_, md5, adler32)
+            file_replicas = replicas[(child_scope, child_name)] = []
+        if replica is not None:
+            file_replicas.append(replica)
+
+    return (files, replicas)
 
 
 @transactional_session
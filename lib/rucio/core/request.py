@@ -337,7 +337,7 @@ def queue_requests(
             rses[req['dest_rse_id']] = get_rse_name(req['dest_rse_id'], session=session)
 
     # Check existing requests
-    existing_requests = []
+    existing_requests = set()
     if request_clause:
         for requests_condition in chunks(request_clause, 1000):
             stmt = select(
@@ -351,7 +351,7 @@ def queue_requests(
             ).where(
                 or_(*requests_condition)
             )
-            existing_requests.extend(session.execute(stmt))
+            existing_requests.update(tuple(row) for row in session.execute(stmt))
 
     new_requests, sources, messages = [], [], []
     for request in requests:
@@ -1132,6 +1132,33 @@ def get_request(
         raise RucioException(error.args)
 
 
+@read_session
+def get_requests(
+    request_ids: 'Iterable[str]',
+    *,
+    session: "Session"
+) -> dict[str, dict[str, Any]]:
+    """
+    Retrieve a bulk of requests by their IDs.
+
+    :param request_ids:  Request-IDs as 32 character hex strings.
+    :param session:      Database session to use.
+    :returns:            Dictionary {request_id: request as a dictionary} of the requests which exist.
+    """
+    requests = {}
+    for chunk in chunks(list(set(request_ids)), 1000):
+        stmt = select(
+            models.Request
+        ).where(
+            models.Request.id.in_(chunk)
+        )
+        for request in session.execute(stmt).scalars():
+            request_dict = request.to_dict()
+            request_dict['attributes'] = json.loads(str(request_dict['attributes'] or '{}'))
+            requests[request_dict['id']] = request_dict
+    return requests
+
+
 @METRICS.count_it
 @read_session
 def get_request_by_did(
@@ -1288,69 +1315,104 @@ def archive_request(
     :param session:     Database session to use.
     """
 
-    req = get_request(request_id=request_id, session=session)
-
-    if req:
-        hist_request = models.RequestHistory(id=req['id'],
-                                             created_at=req['created_at'],
-                                             request_type=req['request_type'],
-                                             scope=req['scope'],
-                                             name=req['name'],
-                                             dest_rse_id=req['dest_rse_id'],
-                                             source_rse_id=req['source_rse_id'],
-                                             attributes=json.dumps(req['attributes']) if isinstance(req['attributes'], dict) else req['attributes'],
-                                             state=req['state'],
-                                             account=req['account'],
-                                             external_id=req['external_id'],
-                                             retry_count=req['retry_count'],
-                                             err_msg=req['err_msg'],
-                                             previous_attempt_id=req['previous_attempt_id'],
-                                             external_host=req['external_host'],
-                                             rule_id=req['rule_id'],
-                                             activity=req['activity'],
-                                             bytes=req['bytes'],
-                                             md5=req['md5'],
-                                             adler32=req['adler32'],
-                                             dest_url=req['dest_url'],
-                                             requested_at=req['requested_at'],
-                                             submitted_at=req['submitted_at'],
-                                             staging_started_at=req['staging_started_at'],
-                                             staging_finished_at=req['staging_finished_at'],
-                                             started_at=req['started_at'],
-                                             estimated_started_at=req['estimated_started_at'],
-                                             estimated_at=req['estimated_at'],
-                                             transferred_at=req['transferred_at'],
-                                             estimated_transferred_at=req['estimated_transferred_at'],
-                                             transfertool=req['transfertool'])
-        hist_request.save(session=session)
-        try:
-            time_diff = req['updated_at'] - req['created_at']
-            time_diff_s = time_diff.seconds + time_diff.days * 24 * 3600
-            METRICS.timer('archive_request_per_activity.{activity}').labels(activity=req['activity'].replace(' ', '_')).observe(time_diff_s)
-            stmt = delete(
-                models.Source
-            ).where(
-                models.Source.request_id == request_id
-            )
-            session.execute(stmt)
+    archive_requests([request_id], session=session)
+
+
+@transactional_session
+def archive_requests(
+    request_ids: "Iterable[str]",
+    *,
+    session: "Session"
+) -> int:
+    """
+    Move requests to the history table.
+
+    The requests are copied with an INSERT ... SELECT and deleted, together with their sources
+    and transfer hops, with one statement per table. The ids of the requests are passed through
+    a temporary table when there are several of them.
+
+    :param request_ids:  Request-IDs as 32 character hex strings.
+    :param session:      Database session to use.
+    :returns:            The number of archived requests.
+    """
 
+    request_ids = list(dict.fromkeys(request_ids))
+    if not request_ids:
+        return 0
+
+    if len(request_ids) == 1:
+        def _in_requests(column):
+            return column == request_ids[0]
+    else:
+        temp_table_cls = temp_table_mngr(session).create_id_table()
+        session.execute(insert(temp_table_cls), [{'id': request_id} for request_id in request_ids])
+
+        def _in_requests(column):
+            return exists(select(1).where(column == temp_table_cls.id))
+
+    stmt = select(
+        models.Request.activity,
+        models.Request.created_at,
+        models.Request.updated_at,
+    ).where(
+        _in_requests(models.Request.id)
+    )
+    requests = session.execute(stmt).all()
+    if not requests:
+        return 0
+    for activity, created_at, updated_at in requests:
+        time_diff = updated_at - created_at
+        time_diff_s = time_diff.seconds + time_diff.days * 24 * 3600
+        METRICS.timer('archive_request_per_activity.{activity}').labels(activity=activity.replace(' ', '_')).observe(time_diff_s)
+
+    columns = ['id', 'created_at', 'request_type', 'scope', 'name', 'dest_rse_id', 'source_rse_id', 'attributes', 'state', 'account',
+               'external_id', 'retry_count', 'err_msg', 'previous_attempt_id', 'external_host', 'rule_id', 'activity', 'bytes', 'md5',
+               'adler32', 'dest_url', 'requested_at', 'submitted_at', 'staging_started_at', 'staging_finished_at', 'started_at',
+               'estimated_started_at', 'estimated_at', 'transferred_at', 'estimated_transferred_at', 'transfertool']
+    stmt = insert(
+        models.RequestHistory
+    ).from_select(
+        columns,
+        select(
+            *(getattr(models.Request, column) for column in columns)
+        ).where(
+            _in_requests(models.Request.id)
+        )
+    )
+    session.execute(stmt)
+
+    try:
+        stmt = delete(
+            models.Source
+        ).where(
+            _in_requests(models.Source.request_id)
+        ).execution_options(
+            synchronize_session=False
+        )
+        session.execute(stmt)
+
+        # one statement per column, so that each of them can use the index of the column
+        for column in (models.TransferHop.request_id, models.TransferHop.next_hop_request_id, models.TransferHop.initial_request_id):
             stmt = delete(
                 models.TransferHop
             ).where(
-                or_(models.TransferHop.request_id == request_id,
-                    models.TransferHop.next_hop_request_id == request_id,
-                    models.TransferHop.initial_request_id == request_id)
+                _in_requests(column)
+            ).execution_options(
+                synchronize_session=False
             )
             session.execute(stmt)
 
-            stmt = delete(
-                models.Request
-            ).where(
-                models.Request.id == request_id
-            )
-            session.execute(stmt)
-        except IntegrityError as error:
-            raise RucioException(error.args)
+        stmt = delete(
+            models.Request
+        ).where(
+            _in_requests(models.Request.id)
+        ).execution_options(
+            synchronize_session=False
+        )
+        session.execute(stmt)
+    except IntegrityError as error:
+        raise RucioException(error.args)
+    return len(requests)
 
 
 @METRICS.count_it
@@ -1398,7 +1460,7 @@ def cancel_request_did(
         # is there a transfer already in transfertool? if so, schedule to cancel them
         if req[1] is not None:
             transfers_to_cancel.setdefault(req[2], set()).add(req[1])
-        archive_request(request_id=req[0], session=session)
+    archive_requests([req[0] for req in reqs], session=session)
     return transfers_to_cancel
 
 
@@ -2132,6 +2194,54 @@ def get_request_stats(
         raise RucioException(error.args)
 
 
+@stream_session
+def list_waiting_request_changes(
+        updated_since: Optional[datetime.datetime] = None,
+        *,
+        session: "Session"
+) -> "Iterator[Row[tuple[uuid.UUID, RequestState, Optional[InternalAccount], uuid.UUID, Optional[uuid.UUID], Optional[str], Optional[datetime.datetime], datetime.datetime]]]":
+    """
+    List the requests needed to maintain a view of the waiting requests outside of the database.
+
+    :param updated_since: If given, list the waiting or queued requests updated since this date: the
+                          requests which became waiting, or were released. The other transitions out
+                          of the waiting state are rare and only caught by a full listing.
+                          Otherwise, list all the waiting requests.
+    :param session:       The database session.
+    """
+    stmt = select(
+        models.Request.id,
+        models.Request.state,
+        models.Request.account,
+        models.Request.dest_rse_id,
+        models.Request.source_rse_id,
+        models.Request.activity,
+        models.Request.requested_at,
+        models.Request.updated_at,
+    ).where(
+        models.Request.request_type.in_([RequestType.TRANSFER, RequestType.STAGEIN, RequestType.STAGEOUT])
+    )
+    if updated_since is None:
+        stmt = stmt.with_hint(
+            models.Request,
+            'INDEX(REQUESTS REQUESTS_TYP_STA_UPD_IDX)',
+            'oracle'
+        ).where(
+            models.Request.state == RequestState.WAITING
+        )
+    else:
+        stmt = stmt.with_hint(
+            models.Request,
+            'INDEX(REQUESTS REQUESTS_TYP_STA_UPD_IDX_OLD)',
+            'oracle'
+        ).where(
+            models.Request.state.in_([RequestState.WAITING, RequestState.QUEUED]),
+            models.Request.updated_at >= updated_since
+        )
+    for row in session.execute(stmt).yield_per(1000):
+        yield row
+
+
 @transactional_session
 def release_waiting_requests_per_deadline(
         dest_rse_id: Optional[str] = None,
@@ -2524,6 +2634,35 @@ def release_all_waiting_requests(
         raise RucioException(error.args)
 
 
+@transactional_session
+def release_waiting_requests_by_id(
+        request_ids: "Iterable[str]",
+        *,
+        session: "Session"
+) -> int:
+    """
+    Release the given requests, if they are still waiting.
+
+    :param request_ids: The ids of the requests to release.
+    :param session:     The database session.
+    :returns:           The number of released requests.
+    """
+    temp_table_cls = temp_table_mngr(session).create_id_table()
+    session.execute(insert(temp_table_cls), [{'id': request_id} for request_id in request_ids])
+
+    stmt = update(
+        models.Request
+    ).where(
+        models.Request.id.in_(select(temp_table_cls.id)),
+        models.Request.state == RequestState.WAITING,
+    ).execution_options(
+        synchronize_session=False
+    ).values({
+        models.Request.state: RequestState.QUEUED
+    })
+    return session.execute(stmt).rowcount
+
+
 @stream_session
 def list_transfer_limits(
         *,
@@ -1513,6 +1513,7 @@ def add_protocol(
             raise exception.InvalidObject('Missing values!')
 
         raise exception.RucioException(error.args)
+    _invalidate_protocols_caches(rse_id)
     return new_protocol
 
 
@@ -1721,6 +1722,7 @@ def update_protocols(
             msg = 'RSE \'%s\' does not support protocol \'%s\' for hostname \'%s\' on port \'%s\'' % (rse, scheme, hostname, port)
             raise exception.RSEProtocolNotSupported(msg)
         up.update(data, flush=True, session=session)
+        _invalidate_protocols_caches(rse_id)
     except (IntegrityError, OperationalError) as error:
         if 'UNIQUE'.lower() in error.args[0].lower() or 'Duplicate' in error.args[0]:  # Covers SQLite, Oracle and MySQL error
             raise exception.Duplicate('Protocol \'%s\' on port %s already registered for  \'%s\' with hostname \'%s\'.' % (scheme, port, rse, hostname))
@@ -1780,6 +1782,18 @@ def del_protocols(
 
     for row in p:
         row.delete(session=session)
+    _invalidate_protocols_caches(rse_id)
+
+
+def _invalidate_protocols_caches(rse_id: str) -> None:
+    """
+    Drop the process-local caches built from the protocols of an RSE.
+
+    The other processes pick up the change once their cached entries expire.
+    """
+    # rucio.core.replica depends on this module
+    from rucio.core.replica import invalidate_list_replicas_protocols_cache
+    invalidate_list_replicas_protocols_cache(rse_id)
 
 
 MUTABLE_RSE_PROPERTIES = {
@@ -2027,7 +2041,7 @@ def fill_rse_expired(
         func.count().label("length")
     ).with_hint(
         models.RSEFileAssociation,
-        'INDEX(REPLICAS REPLICAS_RSE_ID_TOMBSTONE_IDX)',
+        'INDEX(REPLICAS REPLICAS_DELETION_QUEUE_IDX)',
         'oracle'
     ).where(
         and_(models.RSEFileAssociation.tombstone < datetime.utcnow(),
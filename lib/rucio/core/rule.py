@@ -23,7 +23,7 @@ from string import Template
 from typing import TYPE_CHECKING, Any, Literal, Optional, TypeVar, Union
 
 from dogpile.cache.api import NoValue
-from sqlalchemy import delete, desc, select, update
+from sqlalchemy import delete, desc, insert, select, update
 from sqlalchemy.exc import (
     IntegrityError,
     NoResultFound,  # https://pydoc.dev/sqlalchemy/latest/sqlalchemy.exc.NoResultFound.html
@@ -62,6 +62,7 @@ from rucio.common.exception import (
     UndefinedPolicy,
     UnsupportedOperation,
 )
+from rucio.common.file_columns import FileColumns
 from rucio.common.plugins import PolicyPackageAlgorithms
 from rucio.common.policy import get_scratchdisk_lifetime, policy_filter
 from rucio.common.schema import validate_schema
@@ -81,9 +82,10 @@ from rucio.core.rule_grouping import apply_rule, apply_rule_grouping, create_tra
 from rucio.db.sqla import filter_thread_work, models
 from rucio.db.sqla.constants import OBSOLETE, BadFilesStatus, DIDAvailability, DIDReEvaluation, DIDType, LockState, ReplicaState, RequestType, RSEType, RuleGrouping, RuleNotification, RuleState
 from rucio.db.sqla.session import read_session, stream_session, transactional_session
+from rucio.db.sqla.util import temp_table_mngr
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Iterator, Sequence
+    from collections.abc import Callable, Iterable, Iterator, Sequence
 
     from sqlalchemy.orm import Session
 
@@ -511,40 +513,84 @@ def add_rules(
     with METRICS.timer('add_rules.total'):
         rule_ids = {}
 
-        # 1. Fetch the RSEs from the RSE expression to restrict further queries just on these RSEs
-        restrict_rses = []
-        all_source_rses = []
+        # 1. Resolve the RSE expressions, once per distinct expression. Rules sharing the account, expression, copies
+        #    and grouping are resolved together: they get the same RSEs and a single RSESelector, so the quota
+        #    consumed by one DID is seen when placing the next ones.
+        parsed_expressions = {}
+
+        def _parse_expression(expression: str, vo: str, availability_write: bool) -> list[dict[str, Any]]:
+            key = (expression, vo, availability_write)
+            if key not in parsed_expressions:
+                filter_ = {'vo': vo, 'availability_write': True} if availability_write else {'vo': vo}
+                parsed_expressions[key] = parse_expression(expression, filter_=filter_, session=session)
+            return parsed_expressions[key]
+
+        rule_contexts = []
+        rse_selectors = {}
         with METRICS.timer('add_rules.parse_rse_expressions'):
             for rule in rules:
                 vo = rule['account'].vo
-                if rule.get('ignore_availability'):
-                    restrict_rses.extend(parse_expression(rule['rse_expression'], filter_={'vo': vo}, session=session))
-                else:
-                    restrict_rses.extend(parse_expression(rule['rse_expression'], filter_={'vo': vo, 'availability_write': True}, session=session))
-            restrict_rses = list(set([rse['id'] for rse in restrict_rses]))
+                rses = _parse_expression(rule['rse_expression'], vo, not rule.get('ignore_availability'))
+
+                if rule.get('lifetime', None) is None:  # Check if one of the rses is a staging area
+                    if [rse for rse in rses if rse.get('staging_area', False)]:
+                        raise StagingAreaRuleRequiresLifetime()
+
+                # Check SCRATCHDISK Policy
+                try:
+                    lifetime = get_scratch_policy(rule.get('account'), rses, rule.get('lifetime', None), session=session)
+                except UndefinedPolicy:
+                    lifetime = rule.get('lifetime', None)
+
+                rule['lifetime'] = lifetime
+
+                # Auto-lock rules for TAPE rses
+                if not rule.get('locked', False) and rule.get('lifetime', None) is None:
+                    if [rse for rse in rses if rse.get('rse_type', RSEType.DISK) == RSEType.TAPE]:
+                        rule['locked'] = True
+
+                # Block manual approval if RSE does not allow it
+                if rule.get('ask_approval', False):
+                    for rse in rses:
+                        if list_rse_attributes(rse_id=rse['id'], session=session).get(RseAttr.BLOCK_MANUAL_APPROVAL, False):
+                            raise ManualRuleApprovalBlocked()
 
-            for rule in rules:
                 src_rep_exp = rule.get('source_replica_expression')
-                if src_rep_exp:
-                    vo = rule['account'].vo
-                    all_source_rses.extend(parse_expression(src_rep_exp, filter_={'vo': vo}, session=session))
-            all_source_rses = list(set([rse['id'] for rse in all_source_rses]))
+                source_rses = _parse_expression(src_rep_exp, vo, False) if src_rep_exp else []
+
+                rule_group = (rule['account'], rule['rse_expression'], rule['copies'], str(rule.get('grouping')),
+                              rule.get('weight'), bool(rule.get('ignore_availability')), bool(rule.get('ask_approval', False)))
+                if rule_group not in rse_selectors:
+                    with METRICS.timer('add_rules.create_rse_selector'):
+                        rse_selectors[rule_group] = RSESelector(account=rule['account'], rses=rses, weight=rule.get('weight'), copies=rule['copies'], ignore_account_limit=rule.get('ask_approval', False), session=session)
+                rule_contexts.append((rule, rses, source_rses, rse_selectors[rule_group]))
+
+            # Restrict further queries just on these RSEs
+            restrict_rses = list({rse['id'] for _, rses, _, _ in rule_contexts for rse in rses})
+            all_source_rses = list({rse['id'] for _, _, source_rses, _ in rule_contexts for rse in source_rses})
+
+        # 2. Get the DIDs
+        with METRICS.timer('add_rules.get_dids'):
+            try:
+                temp_table = temp_table_mngr(session).create_scope_name_table()
+                values = [{'scope': scope, 'name': name} for scope, name in {(elem['scope'], elem['name']) for elem in dids}]
+                if values:
+                    session.execute(insert(temp_table), values)
+                stmt = select(
+                    models.DataIdentifier
+                ).join(
+                    temp_table,
+                    and_(models.DataIdentifier.scope == temp_table.scope,
+                         models.DataIdentifier.name == temp_table.name)
+                )
+                existing_dids = {(did.scope, did.name): did for did in session.execute(stmt).scalars()}
+            except TypeError as error:
+                raise InvalidObject(error.args) from error
 
         for elem in dids:
-            # 2. Get the DID
-            with METRICS.timer('add_rules.get_did'):
-                try:
-                    stmt = select(
-                        models.DataIdentifier
-                    ).where(
-                        and_(models.DataIdentifier.scope == elem['scope'],
-                             models.DataIdentifier.name == elem['name'])
-                    )
-                    did = session.execute(stmt).scalar_one()
-                except NoResultFound as exc:
-                    raise DataIdentifierNotFound('Data identifier %s:%s is not valid.' % (elem['scope'], elem['name'])) from exc
-                except TypeError as error:
-                    raise InvalidObject(error.args) from error
+            did = existing_dids.get((elem['scope'], elem['name']))
+            if did is None:
+                raise DataIdentifierNotFound('Data identifier %s:%s is not valid.' % (elem['scope'], elem['name']))
 
             # 2.1 If the DID is a constituent, relay the rule to the archive
             if did.did_type == DIDType.FILE and did.constituent:  # Check if a single replica of this DID exists
@@ -603,51 +649,11 @@ def add_rules(
                                                                                                      source_rses=all_source_rses,
                                                                                                      session=session)
 
-            for rule in rules:
+            for rule, rses, source_rses, rseselector in rule_contexts:
                 with METRICS.timer('add_rules.add_rule'):
-                    # 4. Resolve the rse_expression into a list of RSE-ids
-                    vo = rule['account'].vo
-                    if rule.get('ignore_availability'):
-                        rses = parse_expression(rule['rse_expression'], filter_={'vo': vo}, session=session)
-                    else:
-                        rses = parse_expression(rule['rse_expression'], filter_={'vo': vo, 'availability_write': True}, session=session)
-
-                    if rule.get('lifetime', None) is None:  # Check if one of the rses is a staging area
-                        if [rse for rse in rses if rse.get('staging_area', False)]:
-                            raise StagingAreaRuleRequiresLifetime()
-
-                    # Check SCRATCHDISK Policy
-                    try:
-                        lifetime = get_scratch_policy(rule.get('account'), rses, rule.get('lifetime', None), session=session)
-                    except UndefinedPolicy:
-                        lifetime = rule.get('lifetime', None)
-
-                    rule['lifetime'] = lifetime
-
                     # 4.5 Get the lifetime
                     eol_at = define_eol(did.scope, did.name, rses, session=session)
 
-                    # Auto-lock rules for TAPE rses
-                    if not rule.get('locked', False) and rule.get('lifetime', None) is None:
-                        if [rse for rse in rses if rse.get('rse_type', RSEType.DISK) == RSEType.TAPE]:
-                            rule['locked'] = True
-
-                    # Block manual approval if RSE does not allow it
-                    if rule.get('ask_approval', False):
-                        for rse in rses:
-                            if list_rse_attributes(rse_id=rse['id'], session=session).get(RseAttr.BLOCK_MANUAL_APPROVAL, False):
-                                raise ManualRuleApprovalBlocked()
-
-                    src_rep_exp = rule.get('source_replica_expression')
-                    if src_rep_exp:
-                        source_rses = parse_expression(src_rep_exp, filter_={'vo': vo}, session=session)
-                    else:
-                        source_rses = []
-
-                    # 5. Create the RSE selector
-                    with METRICS.timer('add_rules.create_rse_selector'):
-                        rseselector = RSESelector(account=rule['account'], rses=rses, weight=rule.get('weight'), copies=rule['copies'], ignore_account_limit=rule.get('ask_approval', False), session=session)
-
                     # 4. Create the replication rule
                     with METRICS.timer('add_rules.create_rule'):
                         grouping = {'ALL': RuleGrouping.ALL, 'NONE': RuleGrouping.NONE}.get(str(rule.get('grouping')), RuleGrouping.DATASET)
@@ -2114,7 +2120,7 @@ def move_rule(
 def re_evaluate_did(
     scope: InternalScope,
     name: str,
-    rule_evaluation_action: DIDReEvaluation,
+    rule_evaluation_action: Union[DIDReEvaluation, "Iterable[DIDReEvaluation]"],
     *,
     session: "Session",
     logger: LoggerFunction = logging.log
@@ -2122,13 +2128,21 @@ def re_evaluate_did(
     """
     Re-Evaluates a DID.
 
+    Several pending actions of the same DID are evaluated in one pass: the detach is evaluated
+    first, so that the locks of the removed children are gone before the new children are
+    resolved, and the parents of the DID are only listed once.
+
     :param scope:                   The scope of the DID to be re-evaluated.
     :param name:                    The name of the DID to be re-evaluated.
-    :param rule_evaluation_action:  The Rule evaluation action.
+    :param rule_evaluation_action:  The Rule evaluation action, or the set of pending actions of the DID.
     :param session:                 The database session in use.
     :param logger:                  Optional decorated logger that can be passed from the calling daemons or servers.
     :raises:                        DataIdentifierNotFound
     """
+    if isinstance(rule_evaluation_action, DIDReEvaluation):
+        actions = {rule_evaluation_action}
+    else:
+        actions = set(rule_evaluation_action)
 
     try:
         stmt = select(
@@ -2141,10 +2155,11 @@ def re_evaluate_did(
     except NoResultFound as exc:
         raise DataIdentifierNotFound() from exc
 
-    if rule_evaluation_action == DIDReEvaluation.ATTACH:
-        __evaluate_did_attach(did, session=session, logger=logger)
-    else:
-        __evaluate_did_detach(did, session=session, logger=logger)
+    parent_dids = list(rucio.core.did.list_all_parent_dids(scope=scope, name=name, session=session))
+    if DIDReEvaluation.DETACH in actions:
+        __evaluate_did_detach(did, parent_dids=parent_dids, session=session, logger=logger)
+    if DIDReEvaluation.ATTACH in actions:
+        __evaluate_did_attach(did, parent_dids=parent_dids, session=session, logger=logger)
 
     # Update size and length of DID
     if session.bind.dialect.name == 'oracle':
@@ -2405,6 +2420,27 @@ def get_stuck_rules(
         return [rule for rule in session.execute(stmt).scalars().all() if rule not in blocked_rules]
 
 
+@read_session
+def count_updated_dids(
+    total_workers: int,
+    worker_number: int,
+    *,
+    session: "Session"
+) -> int:
+    """
+    Count the updated DIDs waiting for this worker.
+
+    :param total_workers:      Number of total workers.
+    :param worker_number:      id of the executing worker.
+    :param session:            Database session in use.
+    """
+    stmt = select(
+        func.count(models.UpdatedDID.id)
+    )
+    stmt = filter_thread_work(session=session, query=stmt, total_threads=total_workers, thread_id=worker_number, hash_variable='name')
+    return session.execute(stmt).scalar_one()
+
+
 @transactional_session
 def delete_updated_did(
     id_: str,
@@ -2425,6 +2461,29 @@ def delete_updated_did(
     session.execute(stmt)
 
 
+@transactional_session
+def delete_updated_dids(
+    ids: "Iterable[str]",
+    *,
+    session: "Session"
+) -> None:
+    """
+    Delete updated_dids by id.
+
+    :param ids:                     Ids of the rows to delete.
+    :param session:                 The database session in use.
+    """
+    for chunk in chunks(list(ids), 1000):
+        stmt = delete(
+            models.UpdatedDID
+        ).where(
+            models.UpdatedDID.id.in_(chunk)
+        ).execution_options(
+            synchronize_session=False
+        )
+        session.execute(stmt)
+
+
 @transactional_session
 def update_rules_for_lost_replica(
     scope: InternalScope,
@@ -3462,15 +3521,17 @@ def __find_stuck_locks_and_repair_them(
 def __evaluate_did_detach(
     eval_did: models.DataIdentifier,
     *,
+    parent_dids: Optional[list[dict[str, Any]]] = None,
     session: "Session",
     logger: LoggerFunction = logging.log
 ) -> None:
     """
     Evaluate a parent DID which has children removed.
 
-    :param eval_did:  The DID object in use.
-    :param session:   The database session in use.
-    :param logger:    Optional decorated logger that can be passed from the calling daemons or servers.
+    :param eval_did:     The DID object in use.
+    :param parent_dids:  The parent DIDs of eval_did, if already known.
+    :param session:      The database session in use.
+    :param logger:       Optional decorated logger that can be passed from the calling daemons or servers.
     """
 
     logger(logging.INFO, "Re-Evaluating did %s:%s for DETACH", eval_did.scope, eval_did.name)
@@ -3478,7 +3539,8 @@ def __evaluate_did_detach(
 
     with METRICS.timer('evaluate_did_detach.total'):
         # Get all parent DID's
-        parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
+        if parent_dids is None:
+            parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
 
         # Get all RR from parents and eval_did
         stmt = select(
@@ -3622,16 +3684,18 @@ def __oldest_file_under(
 def __evaluate_did_attach(
     eval_did: models.DataIdentifier,
     *,
+    parent_dids: Optional[list[dict[str, Any]]] = None,
     session: "Session",
     logger: LoggerFunction = logging.log
 ) -> None:
     """
     Evaluate a parent DID which has new children
 
-    :param eval_did:  The DID object in use.
-    :param session:   The database session in use.
-    :param logger:    Optional decorated logger that can be passed from the calling daemons or servers.
-    :raises:          ReplicationRuleCreationTemporaryFailed
+    :param eval_did:     The DID object in use.
+    :param parent_dids:  The parent DIDs of eval_did, if already known.
+    :param session:      The database session in use.
+    :param logger:       Optional decorated logger that can be passed from the calling daemons or servers.
+    :raises:             ReplicationRuleCreationTemporaryFailed
     """
 
     logger(logging.INFO, "Re-Evaluating did %s:%s for ATTACH", eval_did.scope, eval_did.name)
@@ -3639,7 +3703,8 @@ def __evaluate_did_attach(
     with METRICS.timer('evaluate_did_attach.total'):
         # Get all parent DID's
         with METRICS.timer('evaluate_did_attach.list_parent_dids'):
-            parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
+            if parent_dids is None:
+                parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
 
         # Get immediate new child DID's
         with METRICS.timer('evaluate_did_attach.list_new_child_dids'):
@@ -3889,31 +3954,29 @@ def __resolve_did_to_locks_and_replicas(
     :returns:              (datasetfiles, locks, replicas, source_replicas)
     """
 
-    datasetfiles = []     # List of Datasets and their files in the Tree [{'scope':, 'name':, 'files': []}]
+    datasetfiles = []     # List of Datasets and their files in the Tree [{'scope':, 'name':, 'files': FileColumns}]
     # Files are in the format [{'scope':, 'name':, 'bytes':, 'md5':, 'adler32':}]
     locks = {}            # {(scope,name): [SQLAlchemy]}
     replicas = {}         # {(scope, name): [SQLAlchemy]}
     source_replicas = {}  # {(scope, name): [rse_id]
 
     if did.did_type == DIDType.FILE:
+        files = FileColumns()
+        files.append(did.scope, did.name, did.bytes, did.md5, did.adler32)
         datasetfiles = [{'scope': None,
                          'name': None,
-                         'files': [{'scope': did.scope,
-                                    'name': did.name,
-                                    'bytes': did.bytes,
-                                    'md5': did.md5,
-                                    'adler32': did.adler32}]}]
+                         'files': files}]
         locks[(did.scope, did.name)] = rucio.core.lock.get_replica_locks(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, session=session)
         replicas[(did.scope, did.name)] = rucio.core.replica.get_and_lock_file_replicas(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, session=session)
         if source_rses:
             source_replicas[(did.scope, did.name)] = rucio.core.replica.get_source_replicas(scope=did.scope, name=did.name, source_rses=source_rses, session=session)
 
     elif did.did_type == DIDType.DATASET and only_stuck:
-        files = []
+        files = FileColumns()
         locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, only_stuck=True, session=session)
         for file in locks:
             file_did = rucio.core.did.get_did(scope=file[0], name=file[1], session=session)
-            files.append({'scope': file[0], 'name': file[1], 'bytes': file_did['bytes'], 'md5': file_did['md5'], 'adler32': file_did['adler32']})
+            files.append(file[0], file[1], file_did['bytes'], file_did['md5'], file_did['adler32'])
             replicas[(file[0], file[1])] = rucio.core.replica.get_and_lock_file_replicas(scope=file[0], name=file[1], nowait=nowait, restrict_rses=restrict_rses, session=session)
             if source_rses:
                 source_replicas[(file[0], file[1])] = rucio.core.replica.get_source_replicas(scope=file[0], name=file[1], source_rses=source_rses, session=session)
@@ -3933,12 +3996,12 @@ def __resolve_did_to_locks_and_replicas(
     elif did.did_type == DIDType.CONTAINER and only_stuck:
 
         for dataset in rucio.core.did.list_child_datasets(scope=did.scope, name=did.name, session=session):
-            files = []
+            files = FileColumns()
             tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, only_stuck=True, session=session)
-            locks = dict(list(locks.items()) + list(tmp_locks.items()))
+            locks.update(tmp_locks)
             for file in tmp_locks:
                 file_did = rucio.core.did.get_did(scope=file[0], name=file[1], session=session)
-                files.append({'scope': file[0], 'name': file[1], 'bytes': file_did['bytes'], 'md5': file_did['md5'], 'adler32': file_did['adler32']})
+                files.append(file[0], file[1], file_did['bytes'], file_did['md5'], file_did['adler32'])
                 replicas[(file[0], file[1])] = rucio.core.replica.get_and_lock_file_replicas(scope=file[0], name=file[1], nowait=nowait, restrict_rses=restrict_rses, session=session)
                 if source_rses:
                     source_replicas[(file[0], file[1])] = rucio.core.replica.get_source_replicas(scope=file[0], name=file[1], source_rses=source_rses, session=session)
@@ -3951,14 +4014,14 @@ def __resolve_did_to_locks_and_replicas(
         for dataset in rucio.core.did.list_child_datasets(scope=did.scope, name=did.name, session=session):
             files, tmp_replicas = rucio.core.replica.get_and_lock_file_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
             if source_rses:
-                tmp_source_replicas = rucio.core.replica.get_source_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], source_rses=source_rses, session=session)
-                source_replicas = dict(list(source_replicas.items()) + list(tmp_source_replicas.items()))
+                source_replicas.update(rucio.core.replica.get_source_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], source_rses=source_rses, session=session))
             tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
             datasetfiles.append({'scope': dataset['scope'],
                                  'name': dataset['name'],
                                  'files': files})
-            replicas = dict(list(replicas.items()) + list(tmp_replicas.items()))
-            locks = dict(list(locks.items()) + list(tmp_locks.items()))
+            # merge in place: rebuilding the dictionaries for every dataset is quadratic in the size of the container
+            replicas.update(tmp_replicas)
+            locks.update(tmp_locks)
 
         # order datasetfiles for deterministic result
         try:
@@ -4005,16 +4068,12 @@ def __resolve_dids_to_locks_and_replicas(
     if dids[0].child_type == DIDType.FILE:
         # All the DIDs will be files!
         # Prepare the datasetfiles
-        files = []
+        files = FileColumns()
         for did in dids:
-            files.append({'scope': did.child_scope,
-                          'name': did.child_name,
-                          'bytes': did.bytes,
-                          'md5': did.md5,
-                          'adler32': did.adler32})
-            locks[(did.child_scope, did.child_name)] = []
-            replicas[(did.child_scope, did.child_name)] = []
-            source_replicas[(did.child_scope, did.child_name)] = []
+            child_scope = files.append(did.child_scope, did.child_name, did.bytes, did.md5, did.adler32)
+            locks[(child_scope, did.child_name)] = []
+            replicas[(child_scope, did.child_name)] = []
+            source_replicas[(child_scope, did.child_name)] = []
         datasetfiles = [{'scope': dids[0].scope, 'name': dids[0].name, 'files': files}]
 
         # Prepare the locks and files
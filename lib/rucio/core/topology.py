@@ -20,11 +20,13 @@ import weakref
 from decimal import Decimal
 from typing import TYPE_CHECKING, Any, Generic, Optional, TypeVar, Union, cast
 
-from sqlalchemy import and_, select
+from sqlalchemy import and_, func, select
 
+from rucio.common.cache import LRUCache
 from rucio.common.config import config_get, config_get_int
 from rucio.common.exception import InvalidRSEExpression, NoDistance, RSEProtocolNotSupported
 from rucio.common.utils import PriorityQueue
+from rucio.core.monitor import MetricManager
 from rucio.core.rse import RseCollection, RseData
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.db.sqla import models
@@ -61,6 +63,8 @@ if TYPE_CHECKING:
 DEFAULT_HOP_PENALTY = 10
 INF = float('inf')
 
+METRICS = MetricManager(module=__name__)
+
 
 class Node(RseData):
     def __init__(self, rse_id: str) -> None:
@@ -127,6 +131,7 @@ class Topology(RseCollection, Generic[TN, TE]):
             ignore_availability: bool = False,
             node_cls: type[TN] = Node,
             edge_cls: type[TE] = Edge,
+            cache_paths: bool = True,
     ) -> None:
         super().__init__(rse_ids=rse_ids, rse_data_cls=node_cls)
         self._edge_cls = edge_cls
@@ -136,6 +141,13 @@ class Topology(RseCollection, Generic[TN, TE]):
         self._hop_penalty = DEFAULT_HOP_PENALTY
         self.ignore_availability = ignore_availability
 
+        # Shortest path trees towards each destination: {(dst_node, operation_src, operation_dest, domain, limit_dest_schemes): _ShortestPathTree}
+        self.cache_paths = cache_paths
+        self._path_trees: LRUCache[_ShortestPathTree] = LRUCache(maxsize=config_get_int('transfers', 'path_cache_size', default=10000, raise_exception=False))
+        self._paths_version = 0
+        # The per-RSE watermarks of the data as of the last refresh. See Topology.refreshed
+        self._watermarks: Optional[dict[str, dict[str, tuple[int, Optional[datetime.datetime]]]]] = None
+
         self._lock = threading.RLock()
 
     @transactional_session
@@ -198,8 +210,41 @@ class Topology(RseCollection, Generic[TN, TE]):
 
     def delete_edge(self, src_node: TN, dst_node: TN) -> None:
         with self._lock:
-            edge = self._edges[src_node, dst_node]
+            edge = self._edges.pop((src_node, dst_node))
             edge.remove_from_nodes()
+            self._invalidate_paths(src_node, dst_node, None)
+
+    def update_edge(self, src_node: TN, dst_node: TN, cost: _Number) -> "TE":
+        """
+        Create the edge or change its cost. Only the cached paths which can be affected by the change are dropped.
+        """
+        with self._lock:
+            edge = self._edges.get((src_node, dst_node))
+            old_cost = edge.cost if edge else None
+            edge = self.get_or_create_edge(src_node, dst_node)
+            edge.cost = cost
+            if old_cost != cost:
+                self._invalidate_paths(src_node, dst_node, cost)
+        return edge
+
+    @property
+    def paths_version(self) -> int:
+        """
+        Incremented each time the cached paths are, partially or fully, invalidated.
+        """
+        return self._paths_version
+
+    def _invalidate_paths(self, src_node: TN, dst_node: TN, new_cost: Optional[_Number]) -> None:
+        with self._lock:
+            self._paths_version += 1
+            for key, tree in self._path_trees.items():
+                if not tree.update_edge(src_node, dst_node, new_cost):
+                    self._path_trees.delete(key)
+
+    def _clear_paths(self) -> None:
+        with self._lock:
+            self._paths_version += 1
+            self._path_trees.clear()
 
     @property
     def multihop_enabled(self) -> bool:
@@ -224,6 +269,7 @@ class Topology(RseCollection, Generic[TN, TE]):
                 if not multihop_rse_ids:
                     logger(logging.WARNING, 'multihop_rse_expression is not empty, but returned no RSEs')
 
+        previous_multihop_nodes, previous_hop_penalty = set(self._multihop_nodes), self._hop_penalty
         for node in self._multihop_nodes:
             node.used_for_multihop = False
 
@@ -236,6 +282,8 @@ class Topology(RseCollection, Generic[TN, TE]):
                 self._multihop_nodes.add(node)
 
         self._hop_penalty = config_get_int('transfers', 'hop_penalty', default=DEFAULT_HOP_PENALTY, session=session)
+        if self._multihop_nodes != previous_multihop_nodes or self._hop_penalty != previous_hop_penalty:
+            self._clear_paths()
         return self
 
     @read_session
@@ -249,7 +297,10 @@ class Topology(RseCollection, Generic[TN, TE]):
         with self._lock:
             return self._ensure_edges_loaded(session=session)
 
-    def _ensure_edges_loaded(self, *, session: "Session") -> None:
+    def _ensure_edges_loaded(self, src_rse_ids: Optional[set[str]] = None, *, session: "Session") -> None:
+        """
+        Load the edges from the database. If src_rse_ids is set, only (re-)load the edges leaving these nodes.
+        """
         stmt = select(
             models.Distance
         ).where(
@@ -258,6 +309,10 @@ class Topology(RseCollection, Generic[TN, TE]):
                 models.Distance.dest_rse_id.in_(self.rse_id_to_data_map.keys()),
             )
         )
+        if src_rse_ids is not None:
+            stmt = stmt.where(
+                models.Distance.src_rse_id.in_(src_rse_ids)
+            )
 
         loaded_edges = set()
         for distance in session.execute(stmt).scalars():
@@ -266,21 +321,97 @@ class Topology(RseCollection, Generic[TN, TE]):
 
             src_node = self[distance.src_rse_id]
             dst_node = self[distance.dest_rse_id]
-            edge = self.get_or_create_edge(src_node, dst_node)
 
             sanitized_dist = int(distance.distance) if distance.distance >= 0 else 0
-            edge.cost = sanitized_dist
+            self.update_edge(src_node, dst_node, sanitized_dist)
 
             loaded_edges.add((src_node, dst_node))
 
-        if len(loaded_edges) != len(self._edges):
+        known_edges = set(self._edges)
+        if src_rse_ids is not None:
+            known_edges = {(src_node, dst_node) for src_node, dst_node in known_edges if src_node.id in src_rse_ids}
+        if len(loaded_edges) != len(known_edges):
             # Remove edges which don't exist in the database anymore
-            to_remove = set(self._edges).difference(loaded_edges)
+            to_remove = known_edges.difference(loaded_edges)
             for src_node, dst_node in to_remove:
                 self.delete_edge(src_node, dst_node)
 
         self._edges_loaded = True
 
+    @read_session
+    def refreshed(self, *, session: "Session", logger: "LoggerFunction" = logging.log) -> "Self":
+        """
+        Return an up-to-date copy of this topology. The copy is built without modifying this
+        object, which can be used by other threads meanwhile.
+
+        The RSEs and the distances which did not change in the database since the previous
+        refresh are copied instead of being reloaded. Changes are detected by comparing, for
+        each RSE of the topology, the number of rows and the latest updated_at of its RSE,
+        attribute, protocol and outgoing distance rows. If nothing changed, this topology is
+        returned as is. The shortest path trees which were in use are rebuilt, so that they
+        are warm on first use.
+        """
+        with METRICS.timer('refresh'):
+            with self._lock:
+                rse_ids = list(self.rse_id_to_data_map)
+            watermarks = _load_watermarks(rse_ids, session=session)
+            if self._watermarks is None:
+                # First refresh: we don't know when the data was loaded
+                changed_rse_ids = changed_src_rse_ids = None
+            else:
+                changed_rse_ids = set().union(*(_changed_rse_ids(self._watermarks[table], watermarks[table])
+                                                for table in ('rses', 'attributes', 'protocols')))
+                changed_src_rse_ids = _changed_rse_ids(self._watermarks['distances'], watermarks['distances'])
+                if not changed_rse_ids and not changed_src_rse_ids:
+                    METRICS.counter('refresh.unchanged').inc()
+                    return self
+
+            with self._lock:
+                nodes = list(self.rse_id_to_data_map.values())
+                edges = list(self._edges.values())
+                edges_loaded = self._edges_loaded
+                multihop_rse_ids = {node.id for node in self._multihop_nodes}
+                path_tree_keys = [key for key, _ in self._path_trees.items()]
+
+            topology = self.__class__(ignore_availability=self.ignore_availability, node_cls=self._rse_data_cls,
+                                      edge_cls=self._edge_cls, cache_paths=self.cache_paths)
+            topology._watermarks = watermarks
+            to_reload = {}
+            for node in nodes:
+                new_node = topology._rse_data_cls(node.id)
+                topology.rse_id_to_data_map[node.id] = new_node
+                if changed_rse_ids is None or node.id in changed_rse_ids:
+                    if any(data is not None for data in (node._name, node._columns, node._attributes, node._info)):
+                        to_reload[node.id] = new_node
+                else:
+                    # The usage and limits change independently of the watermarks; they are lazy-loaded again
+                    new_node._name, new_node._columns, new_node._attributes, new_node._info = node._name, node._columns, node._attributes, node._info
+            RseData.bulk_load(to_reload, load_name=True, load_columns=True, load_attributes=True, load_info=True, include_deleted=True, session=session)
+
+            if edges_loaded:
+                for edge in edges:
+                    if changed_src_rse_ids is not None and edge.src_node.id not in changed_src_rse_ids:
+                        topology.update_edge(topology[edge.src_node.id], topology[edge.dst_node.id], edge.cost)
+                if changed_src_rse_ids is None or changed_src_rse_ids:
+                    topology._ensure_edges_loaded(src_rse_ids=changed_src_rse_ids, session=session)
+                topology._edges_loaded = True
+
+            topology._hop_penalty = self._hop_penalty
+            for rse_id in multihop_rse_ids:
+                node = topology[rse_id].ensure_loaded(load_columns=True, session=session)
+                if topology.ignore_availability or (node.columns['availability_read'] and node.columns['availability_write']):
+                    node.used_for_multihop = True
+                    topology._multihop_nodes.add(node)
+
+            if edges_loaded:
+                for dst_node, operation_src, operation_dest, domain, limit_dest_schemes in path_tree_keys:
+                    topology.shortest_path_tree(topology[dst_node.id], operation_src, operation_dest, domain, list(limit_dest_schemes), session=session)
+
+            METRICS.counter('refresh.changed_rses').inc(len(to_reload))
+            logger(logging.DEBUG, 'Refreshed topology: %d RSEs reloaded, %s RSEs with reloaded distances, %d path trees rebuilt',
+                   len(to_reload), 'all' if changed_src_rse_ids is None else len(changed_src_rse_ids), len(path_tree_keys))
+            return topology
+
     @read_session
     def search_shortest_paths(
             self,
@@ -297,6 +428,13 @@ class Topology(RseCollection, Generic[TN, TE]):
         Find the shortest paths from multiple sources towards dest_rse_id.
         """
 
+        if self.cache_paths:
+            for rse in itertools.chain(src_nodes, [dst_node]):
+                rse.ensure_loaded(load_attributes=True, load_info=True, session=session)
+            self.ensure_edges_loaded(session=session)
+            tree = self.shortest_path_tree(dst_node, operation_src, operation_dest, domain, limit_dest_schemes, session=session)
+            return tree.paths(src_nodes)
+
         for rse in itertools.chain(src_nodes, [dst_node], self._multihop_nodes):
             rse.ensure_loaded(load_attributes=True, load_info=True, session=session)
         self.ensure_edges_loaded(session=session)
@@ -382,6 +520,34 @@ class Topology(RseCollection, Generic[TN, TE]):
                 result[node] = []
         return result
 
+    @read_session
+    def shortest_path_tree(
+            self,
+            dst_node: TN,
+            operation_src: str,
+            operation_dest: str,
+            domain: str,
+            limit_dest_schemes: Optional[list[str]],
+            *,
+            session: "Session",
+    ) -> "_ShortestPathTree[TN, TE]":
+        """
+        Return the, possibly cached, shortest paths from all nodes towards dst_node.
+        The edges must already be loaded.
+        """
+        key = (dst_node, operation_src, operation_dest, domain, tuple(limit_dest_schemes or ()))
+        tree = self._path_trees.get(key)
+        if tree is None:
+            version = self._paths_version
+            for rse in itertools.chain([dst_node], self._multihop_nodes):
+                rse.ensure_loaded(load_attributes=True, load_info=True, session=session)
+            tree = _ShortestPathTree(self, dst_node, operation_src, operation_dest, domain, limit_dest_schemes)
+            with self._lock:
+                # Don't cache a tree computed while the topology was changing
+                if version == self._paths_version:
+                    self._path_trees.set(key, tree)
+        return tree
+
     def dijkstra_spf(
             self,
             dst_node: TN,
@@ -424,33 +590,272 @@ class Topology(RseCollection, Generic[TN, TE]):
                             priority_q[adjacent_node] = new_adjacent_dist
 
 
+class _ShortestPathTree(Generic[TN, TE]):
+    """
+    Shortest paths from every node of a topology towards one destination, for one set of
+    scheme-matching parameters.
+
+    Only the destination and the multihop nodes can be intermediate hops of a path. The paths
+    between them are computed once, with a backwards Dijkstra restricted to these nodes. Any
+    other node can only be the source of a path: its path is its best edge towards one of
+    these nodes, followed by the path of that node. It is resolved on the first lookup and
+    memoized, so that the lookups of a request are dictionary hits once the tree is warm.
+    """
+
+    def __init__(
+            self,
+            topology: "Topology[TN, TE]",
+            dst_node: TN,
+            operation_src: str,
+            operation_dest: str,
+            domain: str,
+            limit_dest_schemes: Optional[list[str]],
+    ) -> None:
+        self.dst_node = dst_node
+        self.operation_src = operation_src
+        self.operation_dest = operation_dest
+        self.domain = domain
+        self.limit_dest_schemes = limit_dest_schemes
+        self.scheme_mismatch: set[TN] = set()
+        # {node: (distance to dst_node, hop penalty of the node, first hop)} for dst_node and the reachable multihop nodes
+        self.core: dict[TN, tuple[_Number, _Number, Optional[dict[str, Any]]]] = {dst_node: (0, 0, None)}
+        # {node: (distance to dst_node, first hop) or None if unreachable} for the other nodes
+        self.leaves: dict[TN, Optional[tuple[_Number, dict[str, Any]]]] = {}
+
+        tree = self
+        hop_penalty = topology._hop_penalty
+
+        class _NodeStateProvider:
+            def __init__(self, node: TN) -> None:
+                self.enabled: bool = True
+                self.cost: _Number = tree.node_cost(node, hop_penalty)
+
+        class _EdgeStateProvider:
+            def __init__(self, edge: TE) -> None:
+                self.edge = edge
+                self.chosen_scheme = None
+
+            @property
+            def cost(self) -> _Number:
+                return self.edge.cost
+
+            @property
+            def enabled(self) -> bool:
+                self.chosen_scheme = tree.match_schemes(self.edge)
+                return self.chosen_scheme is not None
+
+        # With an empty nodes_to_find, only the multihop nodes are visited
+        for node, distance, node_state, edge_to_next_hop, edge_state in topology.dijkstra_spf(dst_node=dst_node,
+                                                                                              nodes_to_find=set(),
+                                                                                              node_state_provider=_NodeStateProvider,
+                                                                                              edge_state_provider=_EdgeStateProvider):
+            edge_state = cast("_EdgeStateProvider", edge_state)
+            self.core[node] = distance, node_state.cost, self._hop(node, edge_to_next_hop, distance, edge_state.chosen_scheme)  # type: ignore
+
+    def node_cost(self, node: TN, hop_penalty: _Number) -> _Number:
+        if node == self.dst_node:
+            return 0
+        try:
+            return int(node.attributes.get('hop_penalty', hop_penalty))
+        except ValueError:
+            return hop_penalty
+
+    def match_schemes(self, edge: TE) -> Optional[dict[str, Any]]:
+        try:
+            matching_scheme = rsemgr.find_matching_scheme(
+                rse_settings_src=edge.src_node.info,
+                rse_settings_dest=edge.dst_node.info,
+                operation_src=self.operation_src,
+                operation_dest=self.operation_dest,
+                domain=self.domain,
+                scheme=self.limit_dest_schemes if edge.dst_node == self.dst_node and self.limit_dest_schemes else None,
+            )
+        except RSEProtocolNotSupported:
+            self.scheme_mismatch.add(edge.src_node)
+            return None
+        return {
+            'source_scheme': matching_scheme[1],
+            'dest_scheme': matching_scheme[0],
+            'source_scheme_priority': matching_scheme[3],
+            'dest_scheme_priority': matching_scheme[2],
+        }
+
+    @staticmethod
+    def _hop(node: TN, edge: TE, distance: _Number, chosen_scheme: dict[str, Any]) -> dict[str, Any]:
+        return {
+            'source_rse': node,
+            'dest_rse': edge.dst_node,
+            'hop_distance': edge.cost,
+            'cumulated_distance': distance,
+            **chosen_scheme,
+        }
+
+    def _resolve_leaf(self, node: TN) -> Optional[tuple[_Number, dict[str, Any]]]:
+        candidates = []
+        for next_node, edge in node.out_edges.items():
+            next_node_distance = self.core.get(next_node)
+            if next_node_distance is not None:
+                candidates.append((next_node_distance[0] + next_node_distance[1] + edge.cost, len(candidates), edge))
+        for distance, _, edge in sorted(candidates, key=lambda c: c[:2]):
+            chosen_scheme = self.match_schemes(edge)
+            if chosen_scheme is not None:
+                return distance, self._hop(node, edge, distance, chosen_scheme)
+        return None
+
+    def first_hop(self, node: TN) -> Optional[dict[str, Any]]:
+        """
+        :returns: The first hop of the shortest path from node, None if there is no path.
+        """
+        core = self.core.get(node)
+        if core is not None:
+            return core[2]
+        if node not in self.leaves:
+            self.leaves[node] = self._resolve_leaf(node)
+        leaf = self.leaves[node]
+        return leaf[1] if leaf is not None else None
+
+    def path(self, node: TN) -> Optional[list[dict[str, Any]]]:
+        """
+        :returns: The list of hops of the shortest path from node. None if there is no path.
+        """
+        if node == self.dst_node:
+            return []
+        path = []
+        hop = self.first_hop(node)
+        while hop is not None:
+            path.append(hop)
+            hop = self.core[hop['dest_rse']][2]
+        return path or None
+
+    def paths(self, src_nodes: "Iterable[TN]") -> dict[TN, list[dict[str, Any]]]:
+        """
+        Same result as Topology.search_shortest_paths
+        """
+        result = {}
+        for node in src_nodes:
+            path = self.path(node)
+            if path is not None:
+                result[node] = path
+            elif node in self.scheme_mismatch:
+                result[node] = []
+        return result
+
+    def update_edge(self, src_node: TN, dst_node: TN, new_cost: Optional[_Number]) -> bool:
+        """
+        Take into account the change of the cost of one edge; new_cost is None if the edge was removed.
+
+        :returns: False if the tree is not valid anymore and must be rebuilt.
+        """
+        if src_node == self.dst_node:
+            # Nothing goes out of the destination
+            return True
+        if not src_node.used_for_multihop:
+            # The node can only be the source of a path: nothing else depends on its path
+            self.leaves.pop(src_node, None)
+            self.scheme_mismatch.discard(src_node)
+            return True
+        core = self.core.get(src_node)
+        if core is not None and core[2] is not None and core[2]['dest_rse'] == dst_node:
+            # The edge is used by the tree
+            return False
+        next_node = self.core.get(dst_node)
+        if new_cost is not None and next_node is not None \
+                and next_node[0] + next_node[1] + new_cost < (core[0] if core is not None else INF):
+            # The edge makes a shorter path possible
+            return False
+        return True
+
+
+_WATERMARKED_TABLES = {
+    'rses': (models.RSE, models.RSE.id),
+    'attributes': (models.RSEAttrAssociation, models.RSEAttrAssociation.rse_id),
+    'protocols': (models.RSEProtocol, models.RSEProtocol.rse_id),
+    'distances': (models.Distance, models.Distance.src_rse_id),
+}
+
+
+@read_session
+def _load_watermarks(rse_ids: "Iterable[str]", *, session: "Session") -> dict[str, dict[str, tuple[int, Optional[datetime.datetime]]]]:
+    """
+    :returns: {table: {rse_id: (number of rows, latest updated_at)}} for the tables the topology is built from.
+    """
+    rse_ids = list(rse_ids)
+    watermarks = {}
+    for table, (model, rse_id_column) in _WATERMARKED_TABLES.items():
+        watermarks[table] = {}
+        if not rse_ids:
+            continue
+        stmt = select(
+            rse_id_column,
+            func.count(),
+            func.max(model.updated_at),
+        ).where(
+            rse_id_column.in_(rse_ids)
+        ).group_by(
+            rse_id_column
+        )
+        watermarks[table] = {str(rse_id): (count, updated_at) for rse_id, count, updated_at in session.execute(stmt)}
+    return watermarks
+
+
+def _changed_rse_ids(
+        previous: dict[str, tuple[int, Optional[datetime.datetime]]],
+        current: dict[str, tuple[int, Optional[datetime.datetime]]],
+) -> set[str]:
+    return {rse_id for rse_id in itertools.chain(previous, current) if previous.get(rse_id) != current.get(rse_id)}
+
+
 class ExpiringObjectCache(Generic[ExpiringObjectCacheNewObject]):
     """
     Thread-safe container which builds and object with the function passed in parameter and
     caches it for the TTL duration.
+
+    If refresh_fnc is set, the expired object is refreshed in a background thread by calling
+    refresh_fnc on it, and keeps being served until the new one replaces it. Callers of get()
+    then only wait for the initial creation of the object.
     """
 
     def __init__(
             self,
             ttl: int,
-            new_obj_fnc: "Callable[[], ExpiringObjectCacheNewObject]"
+            new_obj_fnc: "Callable[[], ExpiringObjectCacheNewObject]",
+            refresh_fnc: "Optional[Callable[[ExpiringObjectCacheNewObject], ExpiringObjectCacheNewObject]]" = None,
     ) -> None:
         self._lock = threading.Lock()
         self._object: Optional[ExpiringObjectCacheNewObject] = None
         self._creation_time: Optional[datetime.datetime] = None
         self._new_obj_fnc = new_obj_fnc
+        self._refresh_fnc = refresh_fnc
+        self._refreshing = False
         self._ttl = ttl
 
     def get(self, logger: "LoggerFunction" = logging.log) -> ExpiringObjectCacheNewObject:
         with self._lock:
-            if not self._object \
-                    or not self._creation_time \
-                    or datetime.datetime.utcnow() - self._creation_time > datetime.timedelta(seconds=self._ttl):
+            expired = not self._creation_time \
+                or datetime.datetime.utcnow() - self._creation_time > datetime.timedelta(seconds=self._ttl)
+            if self._object is None or (expired and not self._refresh_fnc):
                 self._object = self._new_obj_fnc()
                 self._creation_time = datetime.datetime.utcnow()
                 logger(logging.INFO, "Refreshed topology object")
+            elif expired and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, args=(self._object, logger), name='topology-refresh', daemon=True).start()
             return self._object
 
+    def _refresh(self, obj: ExpiringObjectCacheNewObject, logger: "LoggerFunction") -> None:
+        new_obj = obj
+        try:
+            new_obj = self._refresh_fnc(obj)  # type: ignore
+        except Exception:
+            METRICS.counter('refresh.errors').inc()
+            logger(logging.WARNING, "Failed to refresh topology object, keeping the previous one", exc_info=True)
+        with self._lock:
+            self._object = new_obj
+            self._creation_time = datetime.datetime.utcnow()
+            self._refreshing = False
+        if new_obj is not obj:
+            logger(logging.INFO, "Refreshed topology object")
+
 
 @transactional_session
 def get_hops(
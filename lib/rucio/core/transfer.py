@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import datetime
+import itertools
 import logging
 import operator
 import re
@@ -30,6 +31,7 @@ from sqlalchemy.exc import IntegrityError
 from rucio.common.config import config_get, config_get_list
 from rucio.common.constants import DEFAULT_VO, SCHEME_MAP, SUPPORTED_PROTOCOLS, RseAttr, TransferLimitDirection
 from rucio.common.exception import InvalidRSEExpression, RequestNotFound, RSEProtocolNotSupported, RucioException, UnsupportedOperation
+from rucio.common.extra import import_extras
 from rucio.common.utils import construct_non_deterministic_pfn
 from rucio.core import did
 from rucio.core import message as message_core
@@ -70,6 +72,8 @@ Requests accessed by request_id  are covered in the core request.py
 REGION_ACCOUNTS = make_region().configure('dogpile.cache.memory', expiration_time=600)
 METRICS = MetricManager(module=__name__)
 
+EXTRA_MODULES = import_extras(['numpy'])
+
 WEBDAV_TRANSFER_MODE = config_get('conveyor', 'webdav_transfer_mode', False, None)
 
 DEFAULT_MULTIHOP_TOMBSTONE_DELAY = int(datetime.timedelta(hours=2).total_seconds())
@@ -910,12 +914,85 @@ class RequestRankingContext:
         return verdict
 
 
+class RankingBatch:
+    """
+    The sources of a batch of requests, to be ranked together by a SourceRankingStrategy.
+
+    If NumPy is available, the (request, source) pairs are also flattened in arrays with one
+    cell per pair, which allows strategies to compute their verdict once per distinct RSE or
+    request and to broadcast it to all the pairs, instead of calling apply() for each source.
+    """
+
+    def __init__(self, contexts: "Sequence[RequestRankingContext]", sources: "Sequence[Sequence[RequestSource]]"):
+        self.contexts = contexts
+        self.sources = sources
+        self.np = EXTRA_MODULES['numpy']
+        if not self.np:
+            return
+
+        self.rses: list[RseData] = []
+        rse_positions = {}
+        rse_index, request_index = [], []
+        for position, request_sources in enumerate(sources):
+            for source in request_sources:
+                rse_position = rse_positions.get(source.rse)
+                if rse_position is None:
+                    rse_position = rse_positions[source.rse] = len(self.rses)
+                    self.rses.append(source.rse)
+                rse_index.append(rse_position)
+                request_index.append(position)
+        self.rse_index = self.np.array(rse_index, dtype=self.np.intp)
+        self.request_index = self.np.array(request_index, dtype=self.np.intp)
+        self._bounds = list(itertools.accumulate((len(request_sources) for request_sources in sources), initial=0))
+
+    @property
+    def vectorized(self) -> bool:
+        return self.np is not None
+
+    def per_rse(self, fnc: "Callable[[RseData], Any]", dtype: "Any" = None) -> "Any":
+        """
+        :returns: the array of fnc(source.rse) for all pairs, with fnc called once per distinct RSE.
+        """
+        return self.np.array([fnc(rse) for rse in self.rses], dtype=dtype)[self.rse_index]
+
+    def per_request(self, fnc: "Callable[[RequestRankingContext], Any]", dtype: "Any" = None) -> "Any":
+        """
+        :returns: the array of fnc(ctx) for all pairs, with fnc called once per request.
+        """
+        return self.np.array([fnc(ctx) for ctx in self.contexts], dtype=dtype)[self.request_index]
+
+    def per_source(self, fnc: "Callable[[RequestSource], Any]", dtype: "Any" = None) -> "Any":
+        """
+        :returns: the array of fnc(source) for all pairs.
+        """
+        return self.np.array([fnc(source) for request_sources in self.sources for source in request_sources], dtype=dtype)
+
+    def _split(self, flat: list) -> "list[list[Any]]":
+        return [flat[start:end] for start, end in zip(self._bounds, self._bounds[1:])]
+
+    def costs(self, costs: "Any") -> "list[list[int | _SkipSource]]":
+        """
+        :returns: the verdicts of a strategy for all pairs, given the array of their costs.
+        """
+        return self._split(costs.tolist())
+
+    def skip_where(self, skip: "Any") -> "list[list[int | _SkipSource]]":
+        """
+        :returns: the verdicts of a filter strategy for all pairs, given the boolean array of the pairs to skip.
+        """
+        return self._split([SKIP_SOURCE if skipped else sys.maxsize for skipped in skip.tolist()])
+
+
 class SourceRankingStrategy:
     """
     Represents a source ranking strategy. Used to order the sources of a request and decide
     which will be the actual source used for the transfer.
 
     If filter_only is True, any value other than SKIP_SOURCE returned by apply() will be ignored.
+
+    Strategies are applied to a batch of requests at once by apply_batch(). Strategies which
+    can compute their verdicts with array operations implement apply_vectorized(); the other
+    ones are applied source by source.
     """
     filter_only: bool = False
 
@@ -941,6 +1018,25 @@ class SourceRankingStrategy:
         """
         pass
 
+    def apply_batch(self, batch: RankingBatch) -> "list[list[int | _SkipSource]]":
+        """
+        Apply the strategy to all the sources of a batch of requests.
+
+        :returns: for each request of the batch, the verdicts for its sources, as returned by RequestRankingContext.apply().
+        """
+        if batch.vectorized:
+            verdicts = self.apply_vectorized(batch)
+            if verdicts is not None:
+                return verdicts
+        return [[ctx.apply(source) for source in sources] for ctx, sources in zip(batch.contexts, batch.sources)]
+
+    def apply_vectorized(self, batch: RankingBatch) -> "Optional[list[list[int | _SkipSource]]]":
+        """
+        Same as apply_batch(), using the arrays of the batch. Must give the same verdicts as apply().
+        Returns None if the strategy doesn't support it.
+        """
+        return None
+
     class _ClassNameDescriptor:
         """
         Automatically set the external_name of the strategy to the class name.
@@ -1001,6 +1097,11 @@ class SkipRestrictedRSEs(SourceFilterStrategy):
         if source.rse.attributes.get(RseAttr.RESTRICTED_READ) and ctx.rws.account not in self.admin_accounts:
             return SKIP_SOURCE
 
+    def apply_vectorized(self, batch: RankingBatch) -> "Optional[list[list[int | _SkipSource]]]":
+        restricted = batch.per_rse(lambda rse: bool(rse.attributes.get(RseAttr.RESTRICTED_READ)), dtype=bool)
+        admin = batch.per_request(lambda ctx: ctx.rws.account in self.admin_accounts, dtype=bool)
+        return batch.skip_where(restricted & ~admin)
+
 
 class SkipBlocklistedRSEs(SourceFilterStrategy):
 
@@ -1013,6 +1114,11 @@ class SkipBlocklistedRSEs(SourceFilterStrategy):
         if not source.rse.columns['availability_read'] and not self.topology.ignore_availability:
             return SKIP_SOURCE
 
+    def apply_vectorized(self, batch: RankingBatch) -> "Optional[list[list[int | _SkipSource]]]":
+        if self.topology.ignore_availability:
+            return batch.skip_where(batch.np.zeros(len(batch.rse_index), dtype=bool))
+        return batch.skip_where(batch.per_rse(lambda rse: not rse.columns['availability_read'], dtype=bool))
+
 
 class EnforceStagingBuffer(SourceFilterStrategy):
     def apply(self, ctx: RequestRankingContext, source: RequestSource) -> "Optional[int | _SkipSource]":
@@ -1027,17 +1133,30 @@ class RestrictTapeSources(SourceFilterStrategy):
         if source.rse.is_tape_or_staging_required() and not ctx.rws.attributes.get("allow_tape_source", True):
             return SKIP_SOURCE
 
+    def apply_vectorized(self, batch: RankingBatch) -> "Optional[list[list[int | _SkipSource]]]":
+        tape = batch.per_rse(lambda rse: rse.is_tape_or_staging_required(), dtype=bool)
+        no_tape_allowed = batch.per_request(lambda ctx: not ctx.rws.attributes.get("allow_tape_source", True), dtype=bool)
+        return batch.skip_where(tape & no_tape_allowed)
+
 
 class HighestAdjustedRankingFirst(SourceRankingStrategy):
     def apply(self, ctx: RequestRankingContext, source: RequestSource) -> "Optional[int | _SkipSource]":
         source_ranking_penalty = 1 if source.rse.is_tape_or_staging_required() else 0
         return - source.ranking + source_ranking_penalty
 
+    def apply_vectorized(self, batch: RankingBatch) -> "Optional[list[list[int | _SkipSource]]]":
+        rankings = batch.per_source(lambda source: source.ranking, dtype=batch.np.int64)
+        penalties = batch.per_rse(lambda rse: 1 if rse.is_tape_or_staging_required() else 0, dtype=batch.np.int64)
+        return batch.costs(- rankings + penalties)
+
 
 class PreferDiskOverTape(SourceRankingStrategy):
     def apply(self, ctx: RequestRankingContext, source: RequestSource) -> "Optional[int | _SkipSource]":
         return int(source.rse.is_tape_or_staging_required())  # rely on the fact that False < True
 
+    def apply_vectorized(self, batch: RankingBatch) -> "Optional[list[list[int | _SkipSource]]]":
+        return batch.costs(batch.per_rse(lambda rse: int(rse.is_tape_or_staging_required()), dtype=batch.np.int64))
+
 
 class PathDistance(SourceRankingStrategy):
 
@@ -1113,6 +1232,10 @@ class FailureRate(SourceRankingStrategy):
         failure_rate = cast('FailureRate', ctx.strategy).source_stats.get(source.rse.id, self._FailureRateStat()).get_failure_rate()
         return failure_rate
 
+    def apply_vectorized(self, batch: RankingBatch) -> "Optional[list[list[int | _SkipSource]]]":
+        no_stat = self._FailureRateStat()
+        return batch.costs(batch.per_rse(lambda rse: self.source_stats.get(rse.id, no_stat).get_failure_rate(), dtype=batch.np.int64))
+
 
 class SkipSchemeMissmatch(PathDistance):
     filter_only = True
@@ -1221,6 +1344,7 @@ def build_transfer_paths(
 
     candidate_paths_by_request_id, reqs_no_source, reqs_only_tape_source, reqs_scheme_mismatch = {}, set(), set(), set()
     reqs_unsupported_transfertool = set()
+    ranked_requests = []
     for rws in requests_with_sources:
 
         rws.dest_rse.ensure_loaded(load_name=True, load_info=True, load_attributes=True, load_columns=True, session=session)
@@ -1260,20 +1384,29 @@ def build_transfer_paths(
         rejected_sources = defaultdict(list)
         # Cost of each accepted source (lists of ordered costs: one for each ranking strategy)
         cost_vectors = {s: [] for s in rws.sources}
-        for strategy in strategies:
+        ranked_requests.append((rws, all_sources, rejected_sources, cost_vectors))
+
+    # Each strategy ranks the sources of all the requests at once
+    for strategy in strategies:
+        # Requests for which all sources where filtered by previous strategies are not ranked any further
+        batch_requests = [(rws, rejected_sources, cost_vectors) for rws, _, rejected_sources, cost_vectors in ranked_requests if cost_vectors]
+        if not batch_requests:
+            break
+        contexts, batch_sources = [], []
+        for rws, _, cost_vectors in batch_requests:
             sources = list(cost_vectors)
-            if not sources:
-                # All sources where filtered by previous strategies. It's worthless to continue.
-                break
-            rws_strategy = strategy.for_request(rws, sources, logger=logger, session=session)
-            for source in sources:
-                verdict = rws_strategy.apply(source)
+            contexts.append(strategy.for_request(rws, sources, logger=logger, session=session))
+            batch_sources.append(sources)
+        verdicts = strategy.apply_batch(RankingBatch(contexts, batch_sources))
+        for (rws, rejected_sources, cost_vectors), sources, request_verdicts in zip(batch_requests, batch_sources, verdicts):
+            for source, verdict in zip(sources, request_verdicts):
                 if verdict is SKIP_SOURCE:
                     rejected_sources[strategy.external_name].append(source)
                     cost_vectors.pop(source)
                 elif not strategy.filter_only:
                     cost_vectors[source].append(verdict)
 
+    for rws, all_sources, rejected_sources, cost_vectors in ranked_requests:
         transfers_by_rse = transfer_path_builder.build_or_return_cached(rws, cost_vectors, logger=logger, session=session)
         candidate_paths = ((s, transfers_by_rse[s.rse]) for s, _ in sorted(cost_vectors.items(), key=operator.itemgetter(1)))
         if not preparer_mode:
@@ -0,0 +1,245 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Claim-based work queues.
+
+Instead of splitting the items to process between the workers of a daemon by hashing
+their ids (filter_thread_work), each worker claims the items it is going to process: it
+selects candidates nobody holds a lease on, locking them with FOR UPDATE SKIP LOCKED so
+that concurrent workers pick different items, and records a lease for each of them. The
+lease outlives the transaction: the items stay claimed until the worker releases them or
+the lease expires. The items of a worker which died are picked up by the others once its
+leases expire, and a change in the number of workers leaves no item unprocessed.
+
+SQLite has no row locks: concurrent claims of the same item are resolved by the primary
+key of the leases, the worker whose lease could not be inserted skips the item.
+"""
+
+import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from rucio.common.utils import chunks
+from rucio.core.monitor import MetricManager
+from rucio.db.sqla.models import WorkLease
+from rucio.db.sqla.session import transactional_session
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from sqlalchemy.orm import Session
+    from sqlalchemy.sql import Select
+
+METRICS = MetricManager(module=__name__)
+
+
+@METRICS.time_it
+@transactional_session
+def claim_work(
+        queue: str,
+        owner: str,
+        candidates: "Select",
+        limit: int,
+        lease_time: int = 600,
+        *,
+        session: "Session"
+) -> list[str]:
+    """
+    Claim up to limit items of a work queue.
+
+    :param queue:      Name of the queue, shared by all the workers processing the same items.
+    :param owner:      Identifier of the claiming worker.
+    :param candidates: Statement selecting the ids of the items to process, in the order in which they must be claimed.
+    :param limit:      Maximum number of items to claim.
+    :param lease_time: Seconds after which the items can be claimed by other workers, unless the lease is renewed.
+    :param session:    The database session in use.
+    :returns:          The ids of the claimed items.
+    """
+    now = datetime.datetime.utcnow()
+    item_id = candidates.selected_columns[0]
+    stmt = candidates.where(
+        ~select(
+            WorkLease.item_id
+        ).where(
+            WorkLease.queue == queue,
+            WorkLease.item_id == item_id,
+            WorkLease.expires_at >= now
+        ).exists()
+    ).limit(
+        limit
+    )
+    dialect = session.bind.dialect.name  # type: ignore
+    if dialect == 'oracle':
+        stmt = select(
+            item_id
+        ).where(
+            item_id.in_(stmt)
+        ).with_for_update(
+            skip_locked=True
+        )
+    else:
+        stmt = stmt.with_for_update(
+            skip_locked=True
+        )
+    item_ids = session.execute(stmt).scalars().all()
+    if not item_ids:
+        return []
+
+    # The candidates are locked by this transaction: their expired leases cannot be renewed concurrently
+    for chunk in chunks(item_ids, 1000):
+        stmt = delete(
+            WorkLease
+        ).where(
+            WorkLease.queue == queue,
+            WorkLease.item_id.in_(chunk),
+            WorkLease.expires_at < now
+        ).execution_options(
+            synchronize_session=False
+        )
+        session.execute(stmt)
+
+    expires_at = now + datetime.timedelta(seconds=lease_time)
+    leases = [{'queue': queue, 'item_id': id_, 'owner': owner, 'expires_at': expires_at} for id_ in item_ids]
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        claimed = []
+        for chunk in chunks(leases, 1000):
+            stmt = dialect_insert(
+                WorkLease
+            ).values(
+                chunk
+            ).on_conflict_do_nothing(
+            ).returning(
+                WorkLease.item_id
+            )
+            claimed.extend(session.execute(stmt).scalars())
+    else:
+        try:
+            session.execute(insert(WorkLease), leases)
+            claimed = list(item_ids)
+        except IntegrityError:
+            # claimed in the meantime by a worker which read the leases before this one
+            claimed = []
+            for lease in leases:
+                try:
+                    session.execute(insert(WorkLease).values(lease))
+                    claimed.append(lease['item_id'])
+                except IntegrityError:
+                    continue
+
+    METRICS.counter('claimed.{queue}').labels(queue=queue).inc(len(claimed))
+    METRICS.counter('conflicts.{queue}').labels(queue=queue).inc(len(item_ids) - len(claimed))
+    return claimed
+
+
+@transactional_session
+def renew_work(
+        queue: str,
+        owner: str,
+        item_ids: "Iterable[str]",
+        lease_time: int = 600,
+        *,
+        session: "Session"
+) -> int:
+    """
+    Extend the leases of items still being processed. Expired leases are not renewed,
+    as the items may already have been claimed by another worker.
+
+    :param queue:      Name of the queue.
+    :param owner:      Identifier of the worker holding the leases.
+    :param item_ids:   The ids of the items.
+    :param lease_time: Seconds, from now, after which the leases expire.
+    :param session:    The database session in use.
+    :returns:          The number of renewed leases.
+    """
+    now = datetime.datetime.utcnow()
+    renewed = 0
+    for chunk in chunks(list(item_ids), 1000):
+        stmt = update(
+            WorkLease
+        ).where(
+            WorkLease.queue == queue,
+            WorkLease.owner == owner,
+            WorkLease.item_id.in_(chunk),
+            WorkLease.expires_at >= now
+        ).execution_options(
+            synchronize_session=False
+        ).values({
+            WorkLease.expires_at: now + datetime.timedelta(seconds=lease_time)
+        })
+        renewed += session.execute(stmt).rowcount
+    return renewed
+
+
+@transactional_session
+def release_work(
+        queue: str,
+        owner: str,
+        item_ids: "Iterable[str]",
+        *,
+        session: "Session"
+) -> int:
+    """
+    Release the leases of processed items.
+
+    :param queue:    Name of the queue.
+    :param owner:    Identifier of the worker holding the leases.
+    :param item_ids: The ids of the items.
+    :param session:  The database session in use.
+    :returns:        The number of released leases.
+    """
+    released = 0
+    for chunk in chunks(list(item_ids), 1000):
+        stmt = delete(
+            WorkLease
+        ).where(
+            WorkLease.queue == queue,
+            WorkLease.owner == owner,
+            WorkLease.item_id.in_(chunk)
+        ).execution_options(
+            synchronize_session=False
+        )
+        released += session.execute(stmt).rowcount
+    return released
+
+
+@transactional_session
+def expire_work_leases(
+        queue: str,
+        *,
+        session: "Session"
+) -> int:
+    """
+    Delete the expired leases of a queue, left over by workers which died or which did not
+    release the items they processed.
+
+    :param queue:   Name of the queue.
+    :param session: The database session in use.
+    :returns:       The number of deleted leases.
+    """
+    stmt = delete(
+        WorkLease
+    ).where(
+        WorkLease.queue == queue,
+        WorkLease.expires_at < datetime.datetime.utcnow()
+    ).execution_options(
+        synchronize_session=False
+    )
+    return session.execute(stmt).rowcount
@@ -12,23 +12,41 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import cProfile
 import datetime
 import functools
+import glob
 import logging
+import multiprocessing
 import os
 import queue
+import random
+import re
+import signal
 import socket
+import sys
+import tempfile
 import threading
 import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from typing import TYPE_CHECKING, Any, Generic, Optional, TypeVar, Union
 
-from rucio.common.logging import formatted_logger
+from sqlalchemy import event
+
+from rucio.common.config import config_get, config_get_bool, config_get_float, config_get_int
+from rucio.common.logging import formatted_logger, setup_logging
 from rucio.common.utils import PriorityQueue
 from rucio.core import heartbeat as heartbeat_core
 from rucio.core.monitor import MetricManager
+from rucio.db.sqla.session import get_engine
 
 if TYPE_CHECKING:
     from collections.abc import Callable, Generator, Iterator, Sequence
+    from multiprocessing.synchronize import Event
+    from types import FrameType
+
+    from sqlalchemy.engine import Engine
 
     from rucio.common.types import LoggerFunction
 
@@ -36,6 +54,82 @@ T = TypeVar('T')
 METRICS = MetricManager(module=__name__)
 
 
+class HeartbeatAgent:
+    """
+    Renews together the heartbeats of the threads of a process running the same executable: the first thread whose
+    heartbeat must be renewed renews, in one statement, the heartbeats of all the threads which were alive during the
+    last renewal interval. The list of the heartbeats of the executable, from which the thread assignments are
+    computed, is only read when the membership changed.
+    """
+
+    _agents: "dict[tuple[int, str, str, int], HeartbeatAgent]" = {}
+    _agents_lock = threading.Lock()
+
+    def __init__(self, executable: str, hostname: str, older_than: int):
+        self.executable = executable
+        self.hash_executable = heartbeat_core.calc_hash(executable)
+        self.hostname = hostname
+        self.pid = os.getpid()
+        self.older_than = older_than
+        self._lock = threading.Lock()
+        self._threads: dict[int, tuple[threading.Thread, Optional[str], float]] = {}
+        self._renewed_at: dict[int, float] = {}
+        self._membership = None
+        self._members = []
+
+    @classmethod
+    def get(cls, executable: str, hostname: str, older_than: int) -> 'HeartbeatAgent':
+        """
+        The agent of the executable in the current process.
+        """
+        key = (os.getpid(), executable, hostname, older_than)
+        with cls._agents_lock:
+            agent = cls._agents.get(key)
+            if agent is None:
+                agent = cls._agents[key] = cls(executable, hostname, older_than)
+            return agent
+
+    def beat(
+            self,
+            thread: threading.Thread,
+            renewal_interval: float,
+            payload: Optional[str] = None,
+            force_renew: bool = False
+    ) -> tuple[dict[str, int], bool]:
+        """
+        :return: a tuple: <the assignment of the thread>, <whether the heartbeats were renewed in the database>
+        """
+        now = time.monotonic()
+        with self._lock:
+            previous = self._threads.get(thread.ident)
+            self._threads[thread.ident] = (thread, payload, now)
+            renewed_at = self._renewed_at.get(thread.ident)
+            renew = force_renew or previous is None or renewed_at is None or now - renewed_at >= renewal_interval or previous[1] != payload
+            if renew:
+                self._renew(now - renewal_interval, force_renew)
+            return heartbeat_core.assignment(self._members, self.hostname, self.pid, thread.ident), renew
+
+    def _renew(self, alive_since: float, force_renew: bool) -> None:
+        threads = {ident: (thread, payload) for ident, (thread, payload, last_beat) in self._threads.items() if last_beat >= alive_since}
+        start_time = time.perf_counter()
+        membership, members = heartbeat_core.live_threads(self.executable, self.hostname, self.pid, list(threads.values()), older_than=self.older_than,
+                                                          hash_executable=self.hash_executable, membership=None if force_renew else self._membership)
+        METRICS.timer('heartbeat.renewal').observe(time.perf_counter() - start_time)
+        METRICS.counter('heartbeat.renewals').inc()
+        METRICS.counter('heartbeat.renewed_threads').inc(len(threads))
+        now = time.monotonic()
+        self._renewed_at.update((ident, now) for ident in threads)
+        self._membership = membership
+        if members is not None:
+            METRICS.counter('heartbeat.assignments').inc()
+            self._members = members
+
+    def unregister(self, thread: threading.Thread) -> None:
+        with self._lock:
+            self._threads.pop(thread.ident, None)
+            self._renewed_at.pop(thread.ident, None)
+
+
 class HeartbeatHandler:
     """
     Simple contextmanager which sets a heartbeat and associated logger on entry and cleans up the heartbeat on exit.
@@ -45,7 +139,8 @@ class HeartbeatHandler:
         """
         :param executable: the executable name which will be set in heartbeats
         :param renewal_interval: the interval at which the heartbeat will be renewed in the database.
-        Calls to live() in-between intervals will reuse the locally cached heartbeat.
+        Calls to live() in-between intervals will reuse the locally cached heartbeat, which can also be renewed by the
+        other threads of the process running the same executable (see HeartbeatAgent).
         """
         self.executable = executable
         self._hash_executable = None
@@ -69,6 +164,7 @@ class HeartbeatHandler:
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         if self.last_heart_beat:
+            HeartbeatAgent.get(self.executable, self.hostname, self.older_than or 600).unregister(self.hb_thread)
             heartbeat_core.die(self.executable, self.hostname, self.pid, self.hb_thread)
             if self.logger:
                 self.logger(logging.INFO, 'Heartbeat cleaned up')
@@ -83,6 +179,13 @@ class HeartbeatHandler:
     def short_executable(self) -> str:
         return min(self.executable, self.hash_executable, key=len)
 
+    @property
+    def worker_id(self) -> str:
+        """
+        Identifier of this worker, unique among all the running daemons; used as owner of claimed work.
+        """
+        return f'{self.short_executable}@{self.hostname}:{self.pid}:{self.hb_thread.ident}'
+
     def live(
             self,
             force_renew: bool = False,
@@ -91,19 +194,14 @@ class HeartbeatHandler:
         """
         :return: a tuple: <the number of the current worker>, <total number of workers>, <decorated logger>
         """
-        if force_renew \
-                or not self.last_time \
-                or not self.last_heart_beat \
-                or self.last_time < datetime.datetime.now() - datetime.timedelta(seconds=self.renewal_interval) \
-                or self.last_payload != payload:
-            if self.older_than:
-                self.last_heart_beat = heartbeat_core.live(self.executable, self.hostname, self.pid, self.hb_thread, payload=payload, older_than=self.older_than)
-            else:
-                self.last_heart_beat = heartbeat_core.live(self.executable, self.hostname, self.pid, self.hb_thread, payload=payload)
-
+        agent = HeartbeatAgent.get(self.executable, self.hostname, self.older_than or 600)
+        heart_beat, renewed = agent.beat(self.hb_thread, self.renewal_interval or 0, payload=payload, force_renew=force_renew)
+        if renewed or heart_beat != self.last_heart_beat:
+            self.last_heart_beat = heart_beat
             prefix = '[%i/%i]: ' % (self.last_heart_beat['assign_thread'], self.last_heart_beat['nr_threads'])
             self.logger = formatted_logger(self.logger_func, prefix + '%s')
 
+        if renewed:
             if not self.last_time:
                 self.logger(logging.DEBUG, 'First heartbeat set')
             else:
@@ -114,15 +212,311 @@ class HeartbeatHandler:
         return self.last_heart_beat['assign_thread'], self.last_heart_beat['nr_threads'], self.logger
 
 
+class QueryLatency:
+    """
+    Exponentially weighted moving average of the duration of the SQL statements sent by this process.
+    """
+
+    def __init__(self, alpha: float = 0.05):
+        self.alpha = alpha
+        self.value = 0.0
+
+    def install(self, engine: "Engine") -> 'QueryLatency':
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        event.listen(engine, 'handle_error', self._error)
+        return self
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        start_times = conn.info.get('query_start_time')
+        if not start_times:
+            # the statement started before the listeners were installed
+            return
+        duration = time.perf_counter() - start_times.pop()
+        self.value += self.alpha * (duration - self.value)
+        METRICS.gauge('query_latency').set(self.value)
+
+    def _error(self, exception_context) -> None:
+        if exception_context.connection is not None and exception_context.connection.info.get('query_start_time'):
+            exception_context.connection.info['query_start_time'].pop()
+
+
+_QUERY_LATENCY: Optional[QueryLatency] = None
+_QUERY_LATENCY_LOCK = threading.Lock()
+
+
+def query_latency() -> QueryLatency:
+    """
+    :returns: The query latency of this process, measured from the first call on.
+    """
+    global _QUERY_LATENCY
+    with _QUERY_LATENCY_LOCK:
+        if _QUERY_LATENCY is None:
+            _QUERY_LATENCY = QueryLatency().install(get_engine())
+    return _QUERY_LATENCY
+
+
+class AdaptiveSleep:
+    """
+    Computes the time to sleep before the next iteration of a daemon activity, instead of the fixed sleep_time:
+
+    - an iteration which asks not to sleep (typically after a full batch) is followed immediately by the next one;
+    - consecutive iterations which ask to sleep back off exponentially, from sleep_time up to max_sleep_time;
+    - while the average query latency of the process is above target_latency, the database is considered
+      overloaded and even full batches are followed by a sleep, proportional to the excess latency;
+    - sleeps are spread by a random jitter, so that workers started together do not query the database together.
+
+    Enabled with the `adaptive_sleep` option of the [daemons] section; the other options of the policy are
+    read from the same section.
+    """
+
+    def __init__(
+            self,
+            sleep_time: float,
+            max_sleep_time: Optional[float] = None,
+            backoff_factor: float = 2,
+            jitter: float = 0.1,
+            target_latency: Optional[float] = None,
+            latency: Optional[QueryLatency] = None,
+    ):
+        self.sleep_time = sleep_time
+        self.max_sleep_time = max(sleep_time, max_sleep_time or sleep_time * 8)
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.target_latency = target_latency
+        self.latency = latency
+        self.idle_cycles = defaultdict(int)
+
+    @classmethod
+    def from_config(cls, sleep_time: float) -> 'Optional[AdaptiveSleep]':
+        """
+        :returns: The sleep policy configured for a daemon, or None if adaptive sleeps are disabled.
+        """
+        if not config_get_bool('daemons', 'adaptive_sleep', raise_exception=False, default=False):
+            return None
+        target_latency = config_get_float('daemons', 'backpressure_latency', raise_exception=False, default=0)
+        return cls(
+            sleep_time=sleep_time,
+            max_sleep_time=config_get_int('daemons', 'max_sleep_time', raise_exception=False, default=0),
+            backoff_factor=config_get_float('daemons', 'backoff_factor', raise_exception=False, default=2),
+            jitter=config_get_float('daemons', 'sleep_jitter', raise_exception=False, default=0.1),
+            target_latency=target_latency,
+            latency=query_latency() if target_latency else None,
+        )
+
+    def next_sleep(self, activity: Optional[str], start_time: float, must_sleep: bool) -> float:
+        """
+        :param activity: the activity which was just handled
+        :param start_time: the time when the handling of the activity started
+        :param must_sleep: whether the iteration asked to sleep
+        :returns: The number of seconds to sleep before handling the activity again.
+        """
+        METRICS.counter('cycles').inc()
+        if must_sleep:
+            METRICS.counter('cycles.empty').inc()
+            self.idle_cycles[activity] += 1
+            backoff = min(self.max_sleep_time, self.sleep_time * self.backoff_factor ** (self.idle_cycles[activity] - 1))
+            time_to_sleep = max(1.0, backoff - (time.time() - start_time))
+        else:
+            self.idle_cycles[activity] = 0
+            time_to_sleep = 0.0
+
+        if self.latency and self.target_latency and self.latency.value > self.target_latency:
+            METRICS.counter('cycles.backpressure').inc()
+            pressure = self.latency.value / self.target_latency - 1
+            time_to_sleep = max(time_to_sleep, min(self.max_sleep_time, self.sleep_time * pressure))
+
+        time_to_sleep *= random.uniform(1 - self.jitter, 1 + self.jitter)  # noqa: S311
+        METRICS.gauge('backoff.{activity}').labels(activity=activity or 'default').set(time_to_sleep)
+        return time_to_sleep
+
+
+# Shortest interval between two stack samples, so that the sampler does not busy loop
+_MIN_PROFILE_INTERVAL = 0.001
+
+# Categories of the time spent in an iteration, recognized by the first matching frame from the top of the stack
+PROFILE_CATEGORIES = (
+    ('db', ('/sqlalchemy/', '/psycopg', '/oracledb/', '/cx_Oracle', '/MySQLdb/', '/pymysql/', '/sqlite3/')),
+    ('fts', ('/rucio/transfertool/', )),
+    ('storage', ('/rucio/rse/', )),
+    ('stomp', ('/stomp/', )),
+)
+
+
+class _Recording:
+    """
+    The stack samples of one thread during one iteration.
+    """
+
+    def __init__(self, keep_stacks: bool):
+        self.keep_stacks = keep_stacks
+        self.categories = Counter()
+        self.stacks = Counter()
+
+    def add(self, frame: "Optional[FrameType]") -> None:
+        category = None
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            if category is None:
+                category = next((name for name, patterns in PROFILE_CATEGORIES if any(p in code.co_filename for p in patterns)), None)
+                if category and not self.keep_stacks:
+                    break
+            if self.keep_stacks:
+                names.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+            frame = frame.f_back
+        self.categories[category or 'python'] += 1
+        if names:
+            self.stacks[';'.join(reversed(names))] += 1
+
+
+class _StackSampler:
+    """
+    Samples the stacks of the registered threads from a background thread, which runs while threads are registered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recordings: dict[int, tuple[_Recording, float]] = {}
+        self._thread = None
+
+    def start(self, ident: int, interval: float, keep_stacks: bool) -> _Recording:
+        recording = _Recording(keep_stacks)
+        with self._lock:
+            self._recordings[ident] = (recording, interval)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        return recording
+
+    def stop(self, ident: int) -> None:
+        with self._lock:
+            self._recordings.pop(ident, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._recordings:
+                    self._thread = None
+                    return
+                recordings = list(self._recordings.items())
+            frames = sys._current_frames()
+            for ident, (recording, _) in recordings:
+                recording.add(frames.get(ident))
+            del frames
+            time.sleep(min(interval for _, (_, interval) in recordings))
+
+
+_STACK_SAMPLER = _StackSampler()
+
+
+class CycleProfiler:
+    """
+    Opt-in profiling of the iterations of a daemon thread, configured at runtime with the options of the [daemons]
+    section of the config table, read at every iteration:
+
+    - profile_every: profile one iteration out of N (0, the default, disables it);
+    - profile_mode: `cprofile` to write a cProfile dump of the iteration, or `sampling` to write its stack
+      samples in the folded format of flame graph tools;
+    - profile_dir and profile_keep: the directory of the profiles, which has a subdirectory per executable, and how
+      many profiles of each executable it keeps;
+    - profile_breakdown: sample every iteration to log and export the time spent in the database, in the
+      transfertools (fts), in the RSE protocols (storage), in STOMP and in the rest of the python code;
+    - profile_interval: the sampling interval in seconds, 1ms at least.
+    """
+
+    def __init__(self, executable: str):
+        self.executable = executable
+        self.cycles = 0
+
+    @contextmanager
+    def cycle(self, logger: "LoggerFunction" = logging.log) -> "Iterator[None]":
+        self.cycles += 1
+        every = config_get_int('daemons', 'profile_every', raise_exception=False, default=0)
+        breakdown = config_get_bool('daemons', 'profile_breakdown', raise_exception=False, default=False)
+        profile = bool(every) and self.cycles % every == 0
+        if not profile and not breakdown:
+            yield
+            return
+
+        mode = config_get('daemons', 'profile_mode', raise_exception=False, default='cprofile') if profile else None
+        interval = max(_MIN_PROFILE_INTERVAL, config_get_float('daemons', 'profile_interval', raise_exception=False, default=0.01))
+        ident = threading.get_ident()
+        recording = _STACK_SAMPLER.start(ident, interval, keep_stacks=mode == 'sampling') if breakdown or mode == 'sampling' else None
+        profiler = None
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # only one cProfile can be active at a time on recent python versions
+                logger(logging.DEBUG, 'Another thread is being profiled, skipping the profile of this iteration')
+                profiler = None
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            if profiler:
+                profiler.disable()
+            if recording:
+                _STACK_SAMPLER.stop(ident)
+            try:
+                if profiler or mode == 'sampling':
+                    self._write_profile(profiler, recording, logger)
+                if breakdown and recording:
+                    self._report_breakdown(recording, duration, logger)
+            except Exception:
+                logger(logging.WARNING, 'Failed to record the profile of the iteration', exc_info=True)
+
+    def _write_profile(self, profiler: Optional[cProfile.Profile], recording: Optional[_Recording], logger: "LoggerFunction") -> None:
+        directory = config_get('daemons', 'profile_dir', raise_exception=False, default=os.path.join(tempfile.gettempdir(), 'rucio_profiles'))
+        keep = config_get_int('daemons', 'profile_keep', raise_exception=False, default=50)
+        prefix = re.sub(r'[^\w.-]', '_', self.executable)
+        # one subdirectory per executable, so that the rotation never removes the profiles of another one
+        directory = os.path.join(directory, prefix)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{prefix}-{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}-{time.time():.0f}-{self.cycles}')
+        if profiler:
+            path += '.prof'
+            profiler.dump_stats(path)
+        elif recording:
+            path += '.folded'
+            with open(path, 'w') as f:
+                for stack, count in recording.stacks.items():
+                    f.write(f'{stack} {count}\n')
+        METRICS.counter('profiles').inc()
+        logger(logging.INFO, 'Profile of the iteration written to %s', path)
+
+        profiles = sorted(glob.glob(os.path.join(glob.escape(directory), '*')), key=os.path.getmtime)
+        for old_profile in profiles[:max(0, len(profiles) - keep)]:
+            os.remove(old_profile)
+
+    def _report_breakdown(self, recording: _Recording, duration: float, logger: "LoggerFunction") -> None:
+        samples = sum(recording.categories.values())
+        if not samples:
+            return
+        times = {category: duration * recording.categories[category] / samples for category, _ in PROFILE_CATEGORIES}
+        times['python'] = duration - sum(times.values())
+        for category, seconds in times.items():
+            METRICS.counter('cycle_time.{category}').labels(category=category).inc(seconds)
+        logger(logging.INFO, 'Iteration took %.3fs: %s (%d samples)', duration, ', '.join(f'{category} {seconds:.3f}s' for category, seconds in times.items()), samples)
+
+
 def _activity_looper(
         once: bool,
         sleep_time: int,
         activities: Optional['Sequence[str]'],
         heartbeat_handler: HeartbeatHandler,
+        sleep_policy: Optional[AdaptiveSleep] = None,
 ) -> 'Generator[tuple[Optional[str], float], tuple[float, bool], None]':
     """
     Generator which loops (either once, or indefinitely) over all activities while ensuring that `sleep_time`
-    passes between handling twice the same activity.
+    passes between handling twice the same activity, or the time decided by `sleep_policy` if given.
 
     Returns an activity and how much time the calling context must sleep before handling that activity
     and expects to get in return the time when the activity started to be executed and whether next
@@ -164,7 +558,9 @@ def _activity_looper(
         actual_exe_time, must_sleep = yield activity, time_to_sleep
 
         if not once:
-            if must_sleep:
+            if sleep_policy:
+                activity_next_exe_time[activity] = time.time() + sleep_policy.next_sleep(activity, actual_exe_time, must_sleep)
+            elif must_sleep:
                 time_diff = time.time() - actual_exe_time
                 time_to_sleep = max(1.0, sleep_time - time_diff)
                 activity_next_exe_time[activity] = time.time() + time_to_sleep
@@ -207,7 +603,10 @@ def db_workqueue(
                     graceful_stop.wait(partition_wait_time)
                     _, _, logger = heartbeat_handler.live(force_renew=True)
 
-                activity_loop = _activity_looper(once=once, sleep_time=sleep_time, activities=activities, heartbeat_handler=heartbeat_handler)
+                sleep_policy = None if once else AdaptiveSleep.from_config(sleep_time)
+                cycle_profiler = CycleProfiler(executable)
+                activity_loop = _activity_looper(once=once, sleep_time=sleep_time, activities=activities, heartbeat_handler=heartbeat_handler,
+                                                 sleep_policy=sleep_policy)
                 activity, time_to_sleep = next(activity_loop, (None, None))
                 while time_to_sleep is not None:
                     if graceful_stop.is_set():
@@ -221,7 +620,8 @@ def db_workqueue(
                     must_sleep = True
                     start_time = time.time()
                     try:
-                        result = run_once_fnc(heartbeat_handler=heartbeat_handler, activity=activity)
+                        with cycle_profiler.cycle(logger):
+                            result = run_once_fnc(heartbeat_handler=heartbeat_handler, activity=activity)
 
                         # Handle return values already existing in the code
                         # TODO: update all existing daemons to always explicitly return (must_sleep, ret_value)
@@ -404,3 +804,76 @@ class ProducerConsumerDaemon(Generic[T]):
             for thread in consumer_threads:
                 thread.join(timeout=3.14)
             consumer_threads = [thread for thread in consumer_threads if thread.is_alive()]
+
+
+def _process_main(
+        target: 'Callable[..., None]',
+        stop_fnc: 'Callable[[], None]',
+        stop_event: 'Event',
+        process_name: str,
+        kwargs: dict[str, Any],
+) -> None:
+    """
+    Entry point of the worker processes started by run_processes.
+    """
+    setup_logging(process_name=process_name)
+
+    # Interrupts are sent to the whole process group: only the parent handles them and forwards the stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_fnc())
+
+    def _forward_stop() -> None:
+        stop_event.wait()
+        stop_fnc()
+    threading.Thread(target=_forward_stop, name='graceful-stop', daemon=True).start()
+
+    target(**kwargs)
+
+
+def run_processes(
+        target: 'Callable[..., None]',
+        stop_fnc: 'Callable[[], None]',
+        processes: int,
+        graceful_stop: threading.Event,
+        process_name: str,
+        kwargs: Optional[dict[str, Any]] = None,
+) -> None:
+    """
+    Run the daemon function `target` in `processes` worker processes and wait for them to finish.
+
+    The processes are spawned, not forked: each of them starts from a fresh interpreter and creates its own
+    database engine, and its threads get their own heartbeats, so the work is partitioned between all the
+    threads of all the processes. Setting graceful_stop in the parent calls stop_fnc in every process.
+    Both target and the kwargs must be picklable: module-level functions and plain data.
+
+    :param target: the daemon function run by each process, e.g. the function otherwise run by each daemon thread
+    :param stop_fnc: the stop() function of the daemon, setting its graceful_stop event
+    :param processes: the number of processes to start
+    :param graceful_stop: the threading.Event() object used for graceful stop of the daemon in the parent process
+    :param process_name: the name of the processes, used in their logs
+    :param kwargs: the keyword arguments given to target
+    """
+    context = multiprocessing.get_context('spawn')
+    stop_event = context.Event()
+    workers = [context.Process(target=_process_main,
+                               name=f'{process_name}-{i}',
+                               args=(target, stop_fnc, stop_event, process_name, kwargs or {}))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    logging.info('Started %d %s processes: %s', processes, process_name, [worker.pid for worker in workers])
+
+    try:
+        while workers:
+            if graceful_stop.is_set():
+                stop_event.set()
+            # Interruptible joins require a timeout.
+            workers[0].join(timeout=3.14)
+            for worker in workers:
+                if not worker.is_alive() and worker.exitcode and not stop_event.is_set():
+                    logging.error('Process %s (%s) exited with code %s', worker.name, worker.pid, worker.exitcode)
+            workers = [worker for worker in workers if worker.is_alive()]
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join()
@@ -21,7 +21,11 @@ import functools
 import itertools
 import logging
 import re
-from typing import TYPE_CHECKING, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Optional, TypeVar
+from urllib.parse import urlparse
 
 from rucio.common.config import config_get_bool
 from rucio.common.constants import DEFAULT_VO, RseAttr
@@ -42,7 +46,8 @@ from rucio.db.sqla.session import db_session, transactional_session
 from rucio.rse import rsemanager as rsemgr
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable, Mapping, Sequence
+    from collections.abc import Callable, Iterable, Mapping, Sequence
+    from concurrent.futures import Future
 
     from sqlalchemy.orm import Session
 
@@ -54,6 +59,8 @@ if TYPE_CHECKING:
 
 METRICS = MetricManager(module=__name__)
 
+T = TypeVar('T')
+
 
 def pick_and_prepare_submission_path(
         requests_with_sources: "Mapping[str, RequestWithSources]",
@@ -390,6 +397,83 @@ def __create_missing_replicas_and_requests(
     return creation_successful, must_skip_submission
 
 
+class SubmissionPool:
+    """
+    Submits jobs concurrently, with one bounded pool of worker threads per external host.
+
+    Each external host gets its own executor with at most `max_workers_per_host` submissions
+    in flight, so a slow or unresponsive transfertool server only delays the jobs queued for
+    it, while the jobs for the other servers keep being submitted. The worker threads live as
+    long as the pool, which lets them keep their HTTP connections to the server alive between
+    consecutive submissions.
+    """
+
+    def __init__(self, max_workers_per_host: int = 4):
+        self.max_workers_per_host = max_workers_per_host
+        self._lock = threading.Lock()
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._queue_depth: dict[str, int] = {}
+
+    @staticmethod
+    def _host_label(external_host: str) -> str:
+        # graphite does not like the dots in the FQDN
+        return (urlparse(external_host).hostname or external_host).replace('.', '_')
+
+    def _executor(self, external_host: str) -> ThreadPoolExecutor:
+        executor = self._executors.get(external_host)
+        if executor is None:
+            executor = self._executors[external_host] = ThreadPoolExecutor(
+                max_workers=self.max_workers_per_host,
+                thread_name_prefix='submit-%s' % self._host_label(external_host),
+            )
+        return executor
+
+    def _update_queue_depth(self, external_host: str, delta: int) -> None:
+        with self._lock:
+            depth = self._queue_depth[external_host] = self._queue_depth.get(external_host, 0) + delta
+        METRICS.gauge('submission_pool.queue_depth.{host}').labels(host=self._host_label(external_host)).set(depth)
+
+    def queue_depth(self, external_host: str) -> int:
+        """
+        :returns: The number of jobs queued or being submitted to the given host.
+        """
+        return self._queue_depth.get(external_host, 0)
+
+    def submit(self, external_host: str, fnc: "Callable[..., T]", *args, **kwargs) -> "Future[T]":
+        """
+        Schedule the call of fnc(*args, **kwargs) on the workers dedicated to external_host.
+        """
+        labels = {'host': self._host_label(external_host)}
+        queued_at = time.monotonic()
+
+        def _run() -> "T":
+            started_at = time.monotonic()
+            METRICS.timer('submission_pool.wait.{host}').labels(**labels).observe(started_at - queued_at)
+            try:
+                return fnc(*args, **kwargs)
+            finally:
+                METRICS.timer('submission_pool.latency.{host}').labels(**labels).observe(time.monotonic() - started_at)
+                self._update_queue_depth(external_host, -1)
+
+        with self._lock:
+            executor = self._executor(external_host)
+        self._update_queue_depth(external_host, 1)
+        try:
+            return executor.submit(_run)
+        except RuntimeError:
+            self._update_queue_depth(external_host, -1)
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers of all hosts.
+        """
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+
 def submit_transfer(
         transfertool_obj: "Transfertool",
         transfers: "Sequence[DirectTransfer]",
@@ -116,6 +116,7 @@ def _handle_requests(
         bulk: int,
         suspicious_patterns: list[re.Pattern],
         retry_protocol_mismatches: bool,
+        bulk_mode: bool = False,
         *,
         logger: LoggerFunction = logging.log,
 ) -> None:
@@ -131,7 +132,7 @@ def _handle_requests(
         for chunk in chunks(reqs, bulk):
             try:
                 stopwatch = Stopwatch()
-                _finish_requests(topology, chunk, suspicious_patterns, retry_protocol_mismatches, logger=logger)
+                _finish_requests(topology, chunk, suspicious_patterns, retry_protocol_mismatches, bulk_mode=bulk_mode, logger=logger)
                 METRICS.timer('handle_requests_time').observe(stopwatch.elapsed / (len(chunk) or 1))
                 METRICS.counter('handle_requests').inc(len(chunk))
             except Exception as error:
@@ -168,6 +169,7 @@ def finisher(
     logging.log(logging.DEBUG, "Suspicious patterns: %s" % [pat.pattern for pat in suspicious_patterns])
 
     retry_protocol_mismatches = config_get_bool('conveyor', 'retry_protocol_mismatches', default=False)
+    bulk_mode = config_get_bool('conveyor', 'finisher_bulk_mode', default=True)
 
     executable = DAEMON_NAME
     if activities:
@@ -201,6 +203,7 @@ def finisher(
             bulk=bulk,
             suspicious_patterns=suspicious_patterns,
             retry_protocol_mismatches=retry_protocol_mismatches,
+            bulk_mode=bulk_mode,
         )
 
     ProducerConsumerDaemon(
@@ -234,7 +237,7 @@ def run(
     if rucio.db.sqla.util.is_old_db():
         raise DatabaseException('Database was not updated, daemon won\'t start')
 
-    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology())
+    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(), refresh_fnc=lambda topology: topology.refreshed())
     finisher(
         once=once,
         activities=activities,
@@ -251,6 +254,7 @@ def _finish_requests(
         reqs: list[RequestDict],
         suspicious_patterns: list[re.Pattern],
         retry_protocol_mismatches: bool,
+        bulk_mode: bool = False,
         logger: LoggerFunction = logging.log
 ) -> None:
     """
@@ -259,6 +263,7 @@ def _finish_requests(
     :param reqs:                         List of requests.
     :param suspicious_patterns:          List of suspicious patterns.
     :param retry_protocol_mismatches:    Boolean to retry the transfer in case of protocol mismatch.
+    :param bulk_mode:                    Boolean to update the replicas, locks and rules of all the requests with set-based statements.
     """
 
     failed_during_submission = [RequestState.SUBMITTING, RequestState.SUBMISSION_FAILED, RequestState.LOST]
@@ -345,7 +350,7 @@ def _finish_requests(
                                                                                                                req['dest_rse_id'],
                                                                                                                str(error)))
 
-    __handle_terminated_replicas(replicas, logger=logger)
+    __handle_terminated_replicas(replicas, bulk_mode=bulk_mode, logger=logger)
 
 
 def __get_undeterministic_rses(logger: LoggerFunction = logging.log) -> list[str]:
@@ -405,14 +410,37 @@ def __check_suspicious_files(
 
 def __handle_terminated_replicas(
         replicas: dict[str, dict[str, list[dict[str, Any]]]],
+        bulk_mode: bool = False,
         logger: LoggerFunction = logging.log
 ) -> None:
     """
     Used by finisher to handle available and unavailable replicas.
 
-    :param replicas: List of replicas.
+    :param replicas:  List of replicas.
+    :param bulk_mode: Boolean to first try to handle all the replicas in one transaction with set-based statements.
+                      The replicas are handled rule by rule if it fails.
     """
 
+    if bulk_mode:
+        all_replicas = [replica for req_type in replicas for rule_id in replicas[req_type] for replica in replicas[req_type][rule_id]]
+        try:
+            if all_replicas:
+                __update_replicas_in_bulk(all_replicas, logger=logger)
+            return
+        except (UnsupportedOperation, ReplicaNotFound) as error:
+            logger(logging.WARNING, 'Problem to update the replicas states in bulk, will do it rule by rule: %s', str(error))
+        except (DatabaseException, DatabaseError) as error:
+            if (re.match(ORACLE_RESOURCE_BUSY_REGEX, error.args[0])
+                    or re.match(ORACLE_DEADLOCK_DETECTED_REGEX, error.args[0])
+                    or re.match(PSQL_PSYCOPG_LOCK_NOT_AVAILABLE_REGEX, str(error.args[0]))
+                    or MYSQL_LOCK_WAIT_TIMEOUT_EXCEEDED in error.args[0]):
+                logger(logging.WARNING, 'Locks detected when updating the replicas states in bulk, will do it rule by rule')
+            else:
+                logger(logging.ERROR, 'Could not update the replicas states in bulk, will do it rule by rule', exc_info=True)
+        except Exception:
+            logger(logging.ERROR, 'Something unexpected happened when updating the replicas states in bulk, will do it rule by rule', exc_info=True)
+        METRICS.counter('bulk_fallback').inc()
+
     for req_type in replicas:
         for rule_id in replicas[req_type]:
             try:
@@ -476,6 +504,35 @@ def __update_bulk_replicas(
     return True
 
 
+@transactional_session
+def __update_replicas_in_bulk(
+    replicas: list[dict[str, Any]],
+    *,
+    session: "Session",
+    logger: LoggerFunction = logging.log
+) -> None:
+    """
+    Used by finisher to handle the available and unavailable replicas of several rules in one transaction,
+    with set-based statements for the replicas, the locks and rules, and the archival of the requests.
+
+    :param replicas:              List of replicas, grouped by rule.
+    :param session:               The database session to use.
+    """
+    stopwatch = Stopwatch()
+    with METRICS.timer('bulk_update.{stage}').labels(stage='replicas'):
+        replica_core.update_transferred_replicas_states(replicas, nowait=True, session=session, logger=logger)
+    replicas_duration = stopwatch.elapsed
+
+    with METRICS.timer('bulk_update.{stage}').labels(stage='archive'):
+        request_core.archive_requests([replica['request_id'] for replica in replicas if not replica['archived']], session=session)
+    logger(logging.DEBUG, 'Updated %d replicas in %.3f seconds and archived their requests in %.3f seconds',
+           len(replicas), replicas_duration, stopwatch.elapsed - replicas_duration)
+
+    for replica in replicas:
+        logger(logging.INFO, "HANDLED REQUEST %s DID %s:%s AT RSE %s STATE %s", replica['request_id'], replica['scope'], replica['name'], replica['rse_id'], str(replica['state']))
+    METRICS.counter('bulk_update.replicas').inc(len(replicas))
+
+
 @transactional_session
 def __update_replica(
     replica: dict[str, Any],
@@ -17,12 +17,14 @@ Conveyor is a daemon to manage file transfers.
 """
 
 import datetime
+import functools
 import itertools
 import json
 import logging
 import re
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import groupby
 from typing import TYPE_CHECKING, Any, Optional
 
@@ -30,7 +32,7 @@ from requests.exceptions import RequestException
 from sqlalchemy.exc import DatabaseError
 
 import rucio.db.sqla.util
-from rucio.common.config import config_get, config_get_bool, config_get_float
+from rucio.common.config import config_get, config_get_bool, config_get_float, config_get_int
 from rucio.common.exception import DatabaseException, TransferToolTimeout, TransferToolWrongAnswer
 from rucio.common.logging import setup_logging
 from rucio.common.stopwatch import Stopwatch
@@ -59,6 +61,93 @@ TRANSFER_TOOL = config_get('conveyor', 'transfertool', False, None)  # NOTE: Thi
 FILTER_TRANSFERTOOL = config_get('conveyor', 'filter_transfertool', False, None)  # NOTE: TRANSFERTOOL to filter requests on
 
 
+class PollScheduler:
+    """
+    Decides which of the fetched transfers are worth polling now.
+
+    In the fixed-interval mode, every SUBMITTED transfer which was not updated for `older_than`
+    seconds is polled, whether its job was submitted a minute or a week ago. The scheduler keeps,
+    for each job, the time at which it should be polled next. The interval starts at
+    `min_interval` and doubles each time a poll finds no state change in the job, up to
+    `max_interval`; it is reset when some files of the job changed state. The interval never
+    exceeds `age_factor` times the age of the job, so that young jobs, which are the most likely
+    to progress, are polled often.
+
+    The schedule is kept in memory and is shared by the consumer threads of a poller. A job which
+    is not known yet (new job, restarted poller, job handled by another instance) is always due.
+    """
+
+    def __init__(
+            self,
+            min_interval: float,
+            max_interval: float,
+            age_factor: float = 0.5,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.age_factor = age_factor
+        self._lock = threading.Lock()
+        self._schedule: dict[tuple[str, str], tuple[float, int]] = {}  # {(external_host, external_id): (next_poll, unchanged_polls)}
+        self._next_purge = time.monotonic() + self.max_interval
+
+    def __len__(self) -> int:
+        return len(self._schedule)
+
+    def filter_due(self, transfs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        :returns: The transfers whose job is due for polling.
+        """
+        now = time.monotonic()
+        due, due_jobs, skipped_jobs = [], set(), set()
+        with self._lock:
+            if now > self._next_purge:
+                # Forget the jobs which were not seen for a long time, they were most probably finished by someone else
+                horizon = now - 2 * self.max_interval
+                self._schedule = {key: value for key, value in self._schedule.items() if value[0] > horizon}
+                self._next_purge = now + self.max_interval
+            for transfer in transfs:
+                key = (transfer['external_host'], transfer['external_id'])
+                scheduled = self._schedule.get(key)
+                if scheduled is None or scheduled[0] <= now:
+                    due.append(transfer)
+                    due_jobs.add(key)
+                else:
+                    skipped_jobs.add(key)
+        # In the fixed-interval mode, each of the skipped jobs would have been polled
+        METRICS.counter('scheduler.polls').inc(len(due_jobs))
+        METRICS.counter('scheduler.polls_saved').inc(len(skipped_jobs))
+        METRICS.gauge('scheduler.scheduled_jobs').set(len(self._schedule))
+        return due
+
+    def polled(
+            self,
+            external_host: str,
+            external_id: str,
+            submitted_at: Optional[datetime.datetime],
+            changed: bool,
+            finished: bool,
+    ) -> None:
+        """
+        Schedule the next poll of a job after it was polled.
+
+        :param changed:  Whether the state of some files of the job changed since the last poll.
+        :param finished: Whether all the transfers of the job are in a final state.
+        """
+        key = (external_host, external_id)
+        with self._lock:
+            if finished:
+                self._schedule.pop(key, None)
+                return
+            unchanged_polls = 0
+            if not changed and key in self._schedule:
+                unchanged_polls = self._schedule[key][1] + 1
+            interval = min(self.max_interval, self.min_interval * 2 ** min(unchanged_polls, 32))
+            if submitted_at:
+                age = (datetime.datetime.utcnow() - submitted_at).total_seconds()
+                interval = min(interval, max(self.min_interval, self.age_factor * age))
+            self._schedule[key] = (time.monotonic() + interval, unchanged_polls)
+
+
 def _fetch_requests(
         db_bulk: int,
         older_than: int,
@@ -117,19 +206,66 @@ def _handle_requests(
         transfertool: str,
         transfer_stats_manager: request_core.TransferStatsManager,
         oidc_support: bool,
+        scheduler: Optional[PollScheduler] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
         *,
         logger: "LoggerFunction" = logging.log,
 ) -> None:
+    if scheduler is not None:
+        nb_fetched = len(transfs)
+        transfs = scheduler.filter_due(transfs)
+        if len(transfs) < nb_fetched:
+            logger(logging.DEBUG, 'Skipping %i transfers which are not due for polling yet', nb_fetched - len(transfs))
+
     transfs.sort(key=lambda t: (t['external_host'] or '',
                                 t['scope'].vo if multi_vo else '',
                                 t['external_id'] or '',
                                 t['request_id'] or ''))
+    transfers_by_eid_by_host = {}
     for (external_host, vo), transfers_for_host in groupby(transfs, key=lambda t: (t['external_host'],
                                                                                    t['scope'].vo if multi_vo else None)):
-        transfers_by_eid = {}
+        transfers_by_eid = transfers_by_eid_by_host[external_host, vo] = {}
         for external_id, xfers in groupby(transfers_for_host, key=lambda t: t['external_id']):
             transfers_by_eid[external_id] = {t['request_id']: t for t in xfers}
 
+    _poll_host_fnc = functools.partial(
+        _poll_host,
+        fts_bulk=fts_bulk,
+        timeout=timeout,
+        transfertool=transfertool,
+        transfer_stats_manager=transfer_stats_manager,
+        oidc_support=oidc_support,
+        scheduler=scheduler,
+        logger=logger,
+    )
+    if executor is None or len(transfers_by_eid_by_host) < 2:
+        for (external_host, vo), transfers_by_eid in transfers_by_eid_by_host.items():
+            _poll_host_fnc(external_host, vo, transfers_by_eid)
+    else:
+        # The hosts are queried in parallel, a slow host doesn't delay the polling of the others
+        futures = [executor.submit(_poll_host_fnc, external_host, vo, transfers_by_eid)
+                   for (external_host, vo), transfers_by_eid in transfers_by_eid_by_host.items()]
+        for future in as_completed(futures):
+            future.result()
+
+
+def _poll_host(
+        external_host: str,
+        vo: Optional[str],
+        transfers_by_eid: dict[str, dict[str, Any]],
+        fts_bulk: int,
+        timeout: Optional[int],
+        transfertool: str,
+        transfer_stats_manager: request_core.TransferStatsManager,
+        oidc_support: bool,
+        scheduler: Optional[PollScheduler] = None,
+        *,
+        logger: "LoggerFunction" = logging.log,
+) -> None:
+    """
+    Poll, chunk after chunk, the given jobs of one external host.
+    """
+    with METRICS.timer('poll_host'):
         for chunk in dict_chunks(transfers_by_eid, fts_bulk):
             try:
                 transfertool_cls = transfer_core.TRANSFERTOOL_CLASSES_BY_NAME.get(transfertool, FTS3Transfertool)
@@ -147,6 +283,7 @@ def _handle_requests(
                     transfers_by_eid=chunk,
                     transfer_stats_manager=transfer_stats_manager,
                     timeout=timeout,
+                    scheduler=scheduler,
                     logger=logger,
                 )
             except Exception:
@@ -184,6 +321,17 @@ def poller(
     if filter_transfertool:
         executable += ' --filter-transfertool ' + filter_transfertool
 
+    scheduler = None
+    if config_get_bool('conveyor', 'poller_adaptive_scheduling', default=False, raise_exception=False):
+        scheduler = PollScheduler(
+            min_interval=older_than,
+            max_interval=config_get_float('conveyor', 'poller_max_poll_interval', default=3600, raise_exception=False),
+        )
+    executor = ThreadPoolExecutor(
+        max_workers=config_get_int('conveyor', 'poller_host_concurrency', default=4, raise_exception=False),
+        thread_name_prefix='poll-host',
+    )
+
     transfer_stats_manager = request_core.TransferStatsManager()
 
     @db_workqueue(
@@ -220,9 +368,11 @@ def poller(
             oidc_support=oidc_support,
             transfertool=transfertool,  # type: ignore (transfertool is not None)
             transfer_stats_manager=transfer_stats_manager,
+            scheduler=scheduler,
+            executor=executor,
         )
 
-    with transfer_stats_manager:
+    with transfer_stats_manager, executor:
         ProducerConsumerDaemon(
             producers=[_db_producer],
             consumers=[_consumer for _ in range(total_threads)],
@@ -276,7 +426,7 @@ def run(
         parsed_activity_shares.update((share, int(percentage * db_bulk)) for share, percentage in parsed_activity_shares.items())
         logging.info('activity shares enabled: %s' % parsed_activity_shares)
 
-    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology())
+    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(), refresh_fnc=lambda topology: topology.refreshed())
     poller(
         once=once,
         fts_bulk=fts_bulk,
@@ -295,7 +445,8 @@ def poll_transfers(
         transfers_by_eid: 'Mapping[str, Mapping[str, Any]]',
         transfer_stats_manager: request_core.TransferStatsManager,
         timeout: "Optional[int]" = None,
-        logger: "LoggerFunction" = logging.log
+        logger: "LoggerFunction" = logging.log,
+        scheduler: Optional[PollScheduler] = None,
 ) -> None:
     """
     Poll a list of transfers from an FTS server
@@ -303,7 +454,7 @@ def poll_transfers(
 
     poll_individual_transfers = False
     try:
-        _poll_transfers(transfertool_obj, transfers_by_eid, transfer_stats_manager, timeout, logger)
+        _poll_transfers(transfertool_obj, transfers_by_eid, transfer_stats_manager, timeout, logger, scheduler)
     except TransferToolWrongAnswer:
         poll_individual_transfers = True
 
@@ -312,7 +463,7 @@ def poll_transfers(
         for external_id, transfers in transfers_by_eid.items():
             logger(logging.DEBUG, 'Checking %s on %s' % (external_id, transfertool_obj))
             try:
-                _poll_transfers(transfertool_obj, {external_id: transfers}, transfer_stats_manager, timeout, logger)
+                _poll_transfers(transfertool_obj, {external_id: transfers}, transfer_stats_manager, timeout, logger, scheduler)
             except Exception as err:
                 logger(logging.ERROR, 'Problem querying %s on %s . Error returned : %s' % (external_id, transfertool_obj, str(err)))
 
@@ -322,7 +473,8 @@ def _poll_transfers(
         transfers_by_eid: 'Mapping[str, Mapping[str, Any]]',
         transfer_stats_manager: request_core.TransferStatsManager,
         timeout: "Optional[int]" = None,
-        logger: "LoggerFunction" = logging.log
+        logger: "LoggerFunction" = logging.log,
+        scheduler: Optional[PollScheduler] = None,
 ) -> None:
     """
     Helper function for poll_transfers which performs the actual polling and database update.
@@ -363,10 +515,12 @@ def _poll_transfers(
             #             is Exception: Failed to get fts job status.
             #             is {}: No terminated jobs.
             #             is {request_id: {file_status}}: terminated jobs.
+            changed, finished = False, False
             if transf_resp is None:
                 for request_id, request in transfers_by_eid[transfer_id].items():
                     transfer_core.mark_transfer_lost(request, logger=logger)
                 METRICS.counter('transfer_lost').inc()
+                finished = True
             elif isinstance(transf_resp, Exception):
                 logger(logging.WARNING, "Failed to poll FTS(%s) job (%s): %s" % (transfertool_obj, transfer_id, transf_resp))
                 METRICS.counter('query_transfer_exception').inc()
@@ -379,9 +533,15 @@ def _poll_transfers(
                     )
                     cnt += ret
                     if ret:
+                        changed = True
                         METRICS.counter('update_request_state.{updated}').labels(updated=True).inc(delta=ret)
                     else:
                         METRICS.counter('update_request_state.{updated}').labels(updated=False).inc()
+                finished = all(request_id in transf_resp for request_id in transfers_by_eid.get(transfer_id, {}))
+
+            if scheduler is not None:
+                submitted_at = next((t.get('submitted_at') for t in transfers_by_eid.get(transfer_id, {}).values()), None)
+                scheduler.polled(transfertool_obj.external_host, transfer_id, submitted_at=submitted_at, changed=changed, finished=finished)
 
             # should touch transfers.
             # Otherwise if one bulk transfer includes many requests and one is not terminated, the transfer will be poll again.
@@ -18,6 +18,7 @@ Conveyor is a daemon to manage file transfers.
 
 import json
 import logging
+import queue
 import socket
 import threading
 import time
@@ -28,7 +29,7 @@ import stomp
 
 import rucio.db.sqla.util
 from rucio.common import exception
-from rucio.common.config import config_get, config_get_bool, config_get_int, config_get_list
+from rucio.common.config import config_get, config_get_bool, config_get_float, config_get_int, config_get_list
 from rucio.common.logging import setup_logging
 from rucio.common.policy import get_policy
 from rucio.core import request as request_core
@@ -39,9 +40,11 @@ from rucio.db.sqla.session import transactional_session
 from rucio.transfertool.fts3 import FTS3CompletionMessageTransferStatusReport
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable
     from types import FrameType
 
     from sqlalchemy.orm import Session
+    from stomp import Connection12
     from stomp.utils import Frame
 
     from rucio.common.types import LoggerFunction
@@ -53,7 +56,39 @@ GRACEFUL_STOP = threading.Event()
 DAEMON_NAME = 'conveyor-receiver'
 
 
+class _DeferredStats:
+    """
+    Records the transfer statistics observed while applying a message, to hand them over to
+    the TransferStatsManager only once the transaction applying it is committed.
+    """
+
+    def __init__(self):
+        self.observations = []
+
+    def observe(self, *args, session: "Optional[Session]" = None, **kwargs) -> None:
+        self.observations.append((args, kwargs))
+
+    def replay(self, stats_manager: request_core.TransferStatsManager) -> None:
+        for args, kwargs in self.observations:
+            stats_manager.observe(*args, **kwargs)
+
+
 class Receiver:
+    """
+    Listener of the FTS completion messages.
+
+    With a batch_size of 1, each message is applied to the database in its own transaction,
+    by the thread of the STOMP connection. Otherwise, the messages are buffered in a bounded
+    queue and applied by a dedicated thread in micro-batches of at most batch_size messages,
+    or of the messages received during batch_window seconds, each batch in a single
+    transaction, and each message in a savepoint of it: a message which fails to apply only
+    rolls back its own changes. If the batch itself fails, its messages are applied one by
+    one. If the queue is full, the connection thread blocks until it drains.
+
+    The messages are acknowledged to the broker only once the transaction applying them is
+    committed, so the messages buffered when the daemon dies are delivered again. The messages
+    of a batch which could not be applied at all are negatively acknowledged.
+    """
 
     def __init__(
             self,
@@ -63,6 +98,10 @@ class Receiver:
             transfer_stats_manager: request_core.TransferStatsManager,
             all_vos: bool = False,
             voname: Optional[str] = None,
+            batch_size: int = 1,
+            batch_window: float = 1,
+            queue_size: int = 10000,
+            conn: "Optional[Connection12]" = None,
     ):
         self.__all_vos = all_vos
         self.__voname = voname
@@ -70,6 +109,17 @@ class Receiver:
         self.__id = id_
         self.__total_threads = total_threads
         self._transfer_stats_manager = transfer_stats_manager
+        self._batch_size = batch_size
+        self._batch_window = batch_window
+        self._conn = conn
+        self._ack_lock = threading.Lock()
+        self._queue: "queue.Queue[tuple[dict[str, Any], float, Optional[str]]]" = queue.Queue(maxsize=queue_size)
+        self._prefetched_requests: dict[str, dict[str, Any]] = {}
+        self._stop_event = threading.Event()
+        self._applier = None
+        if batch_size > 1:
+            self._applier = threading.Thread(target=self._apply_loop, name='receiver-applier', daemon=True)
+            self._applier.start()
 
     @METRICS.count_it
     def on_error(self, frame: "Frame") -> None:
@@ -77,12 +127,34 @@ class Receiver:
 
     @METRICS.count_it
     def on_message(self, frame: "Frame") -> None:
-        msg = json.loads(frame.body)  # type: ignore
-
+        ack_id = frame.headers.get('ack')
+        try:
+            msg = json.loads(frame.body)  # type: ignore
+        except ValueError:
+            logging.error('[%s] Discarding a message which is not valid JSON: %s' % (self.__broker, frame.body))
+            self._acknowledge([ack_id])
+            return
+
+        if not self._is_rucio_completion(msg):
+            self._acknowledge([ack_id])
+            return
+
+        METRICS.counter('message_rucio').inc()
+        if self._applier is None:
+            self._perform_request_update(msg)
+            self._acknowledge([ack_id])
+        else:
+            self._queue.put((msg, time.monotonic(), ack_id))
+            METRICS.gauge('queue_depth').set(self._queue.qsize())
+
+    def _is_rucio_completion(self, msg: dict[str, Any]) -> bool:
+        """
+        Check if the message is the completion message of a transfer submitted by rucio for this VO.
+        """
         if not self.__all_vos:
             voname = self.__voname or get_policy()
             if 'vo' not in msg or msg['vo'] != voname:
-                return
+                return False
 
         if 'job_metadata' in msg.keys() \
            and isinstance(msg['job_metadata'], dict) \
@@ -90,9 +162,150 @@ class Receiver:
            and str(msg['job_metadata']['issuer']) == 'rucio':
 
             if 'job_state' in msg.keys() and (str(msg['job_state']) != 'ACTIVE' or msg.get('job_multihop', False) is True):
-                METRICS.counter('message_rucio').inc()
+                return True
+        return False
+
+    def _acknowledge(self, ack_ids: "Iterable[Optional[str]]", applied: bool = True) -> None:
+        """
+        Acknowledge the messages to the broker, or negatively acknowledge them if they could not be applied.
+        After a reconnection, the broker delivers again the messages which were not acknowledged in time.
+        """
+        if self._conn is None:
+            return
+        with self._ack_lock:
+            for ack_id in ack_ids:
+                if ack_id is None:
+                    continue
+                try:
+                    if applied:
+                        self._conn.ack(ack_id)
+                    else:
+                        self._conn.nack(ack_id)
+                except Exception:
+                    METRICS.counter('ack_failed').inc()
+                    logging.warning('[%s] Failed to acknowledge message %s', self.__broker, ack_id, exc_info=True)
+
+    def stop(self) -> None:
+        """
+        Apply and acknowledge the buffered messages, and stop the applier thread.
+        """
+        self._stop_event.set()
+        if self._applier is not None:
+            self._applier.join()
+
+    def _next_batch(self) -> list[tuple[dict[str, Any], float, Optional[str]]]:
+        """
+        Wait for the first message, then collect the messages received during the batch window, up to batch_size.
+        """
+        try:
+            batch = [self._queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self._batch_window
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply_loop(self) -> None:
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._apply_batch(batch)
+                except Exception:
+                    logging.critical(traceback.format_exc())
+
+    @staticmethod
+    def _coalesce(msgs: "Iterable[dict[str, Any]]") -> dict[str, list[dict[str, Any]]]:
+        """
+        Group the messages by request, in the order of their completion time.
+        Identical messages, which the broker may deliver more than once, are kept only once.
+        """
+        msgs_by_request_id = {}
+        for msg in msgs:
+            msgs_by_request_id.setdefault(msg['file_metadata'].get('request_id', None), []).append(msg)
+        for request_id, request_msgs in msgs_by_request_id.items():
+            unique_msgs = {}
+            for msg in request_msgs:
+                unique_msgs.setdefault((msg.get('tr_id'), msg.get('t_final_transfer_state'), msg.get('tr_timestamp_complete')), msg)
+            msgs_by_request_id[request_id] = sorted(unique_msgs.values(), key=lambda m: float(m.get('tr_timestamp_complete') or 0))
+        return msgs_by_request_id
+
+    def _pick_message(self, request_id: Optional[str], msgs: list[dict[str, Any]]) -> dict[str, Any]:
+        """
+        Out of the messages received for one request, pick the one to apply: the latest message of the
+        job currently associated with the request. Messages of previous jobs of the request, which can
+        arrive late, would be ignored anyway.
+        """
+        request = self._prefetched_requests.get(request_id)  # type: ignore
+        if request:
+            current_msgs = [msg for msg in msgs if str(msg.get('tr_id', '')).split('__')[-1] == request['external_id']]
+            if current_msgs:
+                return current_msgs[-1]
+        return msgs[-1]
+
+    def _apply_batch(self, batch: list[tuple[dict[str, Any], float, Optional[str]]]) -> None:
+        start = time.monotonic()
+        METRICS.gauge('batch_size').set(len(batch))
+        METRICS.gauge('queue_depth').set(self._queue.qsize())
+        METRICS.timer('queue_lag').observe(start - batch[0][1])
+
+        msgs_by_request_id = self._coalesce(msg for msg, _, _ in batch)
+        METRICS.counter('messages_coalesced').inc(len(batch) - len(msgs_by_request_id))
+        try:
+            try:
+                stats = self._perform_request_updates(msgs_by_request_id)
+            except Exception:
+                logging.warning('Failed to apply a batch of %d messages, applying them one by one', len(batch), exc_info=True)
+                self._prefetched_requests = request_core.get_requests([request_id for request_id in msgs_by_request_id if request_id])
+                for request_id, msgs in msgs_by_request_id.items():
+                    self._perform_request_update(self._pick_message(request_id, msgs))
+            else:
+                stats.replay(self._transfer_stats_manager)
+        except Exception:
+            self._acknowledge([ack_id for _, _, ack_id in batch], applied=False)
+            raise
+        else:
+            self._acknowledge([ack_id for _, _, ack_id in batch])
+        finally:
+            self._prefetched_requests = {}
+
+        end = time.monotonic()
+        METRICS.timer('batch_apply').observe(end - start)
+        for _, received_at, _ in batch:
+            METRICS.timer('apply_latency').observe(end - received_at)
 
-                self._perform_request_update(msg)
+    @transactional_session
+    def _perform_request_updates(
+        self,
+        msgs_by_request_id: dict[str, list[dict[str, Any]]],
+        *,
+        session: Optional["Session"] = None,
+        logger: "LoggerFunction" = logging.log
+    ) -> _DeferredStats:
+        """
+        Apply, in one transaction, the messages of a batch, each in a savepoint.
+
+        :returns: The transfer statistics of the applied messages, to record once the transaction is committed.
+        """
+        self._prefetched_requests = request_core.get_requests([request_id for request_id in msgs_by_request_id if request_id], session=session)
+        batch_stats = _DeferredStats()
+        for request_id, msgs in msgs_by_request_id.items():
+            msg = self._pick_message(request_id, msgs)
+            stats = _DeferredStats()
+            try:
+                with session.begin_nested():  # type: ignore
+                    self._update_request(msg, stats_manager=stats, session=session, logger=logger)  # type: ignore
+            except Exception:
+                METRICS.counter('update_request_state.failed').inc()
+                logging.critical(traceback.format_exc())
+                continue
+            batch_stats.observations.extend(stats.observations)
+        return batch_stats
 
     @transactional_session
     def _perform_request_update(
@@ -102,26 +315,37 @@ class Receiver:
         session: Optional["Session"] = None,
         logger: "LoggerFunction" = logging.log
     ) -> None:
-        external_host = msg.get('endpnt', None)
-        request_id = msg['file_metadata'].get('request_id', None)
         try:
-            tt_status_report = FTS3CompletionMessageTransferStatusReport(external_host, request_id=request_id, fts_message=msg)
-            if tt_status_report.get_db_fields_to_update(session=session, logger=logger):  # type: ignore
-                logging.info('RECEIVED %s', tt_status_report)
-
-                ret = transfer_core.update_transfer_state(
-                    tt_status_report=tt_status_report,
-                    stats_manager=self._transfer_stats_manager,
-                    session=session,
-                    logger=logger,
-                )
-                if ret:
-                    METRICS.counter('update_request_state.{updated}').labels(updated=True).inc(delta=ret)
-                else:
-                    METRICS.counter('update_request_state.{updated}').labels(updated=False).inc()
+            self._update_request(msg, stats_manager=self._transfer_stats_manager, session=session, logger=logger)  # type: ignore
         except Exception:
             logging.critical(traceback.format_exc())
 
+    def _update_request(
+        self,
+        msg: dict[str, Any],
+        *,
+        stats_manager: "request_core.TransferStatsManager | _DeferredStats",
+        session: "Session",
+        logger: "LoggerFunction" = logging.log
+    ) -> None:
+        external_host = msg.get('endpnt', None)
+        request_id = msg['file_metadata'].get('request_id', None)
+        tt_status_report = FTS3CompletionMessageTransferStatusReport(external_host, request_id=request_id, fts_message=msg,
+                                                                     request=self._prefetched_requests.get(request_id))
+        if tt_status_report.get_db_fields_to_update(session=session, logger=logger):  # type: ignore
+            logging.info('RECEIVED %s', tt_status_report)
+
+            ret = transfer_core.update_transfer_state(
+                tt_status_report=tt_status_report,
+                stats_manager=stats_manager,  # type: ignore
+                session=session,
+                logger=logger,
+            )
+            if ret:
+                METRICS.counter('update_request_state.{updated}').labels(updated=True).inc(delta=ret)
+            else:
+                METRICS.counter('update_request_state.{updated}').labels(updated=False).inc()
+
 
 def receiver(
         id_: str,
@@ -180,10 +404,15 @@ def receiver(
     if voname is not None:
         logger(logging.INFO, "Using voname=%s from configuration", voname)
 
+    batch_size = config_get_int('messaging-fts3', 'batch_size', default=100, raise_exception=False)
+    batch_window = config_get_float('messaging-fts3', 'batch_window', default=1, raise_exception=False)
+    queue_size = config_get_int('messaging-fts3', 'queue_size', default=10000, raise_exception=False)
+
     logger(logging.INFO, 'receiver started')
 
     with (HeartbeatHandler(executable=DAEMON_NAME, renewal_interval=30) as heartbeat_handler,
           request_core.TransferStatsManager() as transfer_stats_manager):
+        listeners = {}
         while not GRACEFUL_STOP.is_set():
 
             _, _, logger = heartbeat_handler.live()
@@ -194,20 +423,36 @@ def receiver(
                     logger(logging.INFO, 'connecting to %s' % conn.transport._Transport__host_and_ports[0][0])
                     METRICS.counter('reconnect.{host}').labels(host=conn.transport._Transport__host_and_ports[0][0].split('.')[0]).inc()
 
-                    conn.set_listener(
-                        'rucio-messaging-fts3',
-                        Receiver(
+                    # The listener, and the messages it buffered, survive the reconnections
+                    listener = listeners.get(id(conn))
+                    if listener is None:
+                        listener = listeners[id(conn)] = Receiver(
                             broker=conn.transport._Transport__host_and_ports[0],
                             id_=id_,
                             total_threads=total_threads,
                             transfer_stats_manager=transfer_stats_manager,
                             all_vos=all_vos,
                             voname=voname,
-                        ))
+                            batch_size=batch_size,
+                            batch_window=batch_window,
+                            queue_size=queue_size,
+                            conn=conn,
+                        )
+                    conn.set_listener('rucio-messaging-fts3', listener)
                     conn.connect(wait=True, **auth_kwargs)
-                    conn.subscribe(destination=destination, id='rucio-messaging-fts3', ack='auto')
+                    conn.subscribe(destination=destination, id='rucio-messaging-fts3', ack='client-individual')
             time.sleep(1)
 
+        # Apply and acknowledge the buffered messages before disconnecting
+        for conn in conns:
+            try:
+                conn.unsubscribe(id='rucio-messaging-fts3')
+            except Exception:
+                pass
+
+        for listener in listeners.values():
+            listener.stop()
+
         for conn in conns:
             try:
                 conn.disconnect()
@@ -17,6 +17,7 @@ Conveyor transfer submitter is a daemon to manage non-tape file transfers.
 """
 import logging
 import threading
+from concurrent.futures import as_completed
 from typing import TYPE_CHECKING, Optional
 
 import rucio.db.sqla.util
@@ -30,8 +31,8 @@ from rucio.core.monitor import MetricManager
 from rucio.core.request import RequestWithSources, list_and_mark_transfer_requests_and_source_replicas
 from rucio.core.topology import ExpiringObjectCache, Topology
 from rucio.core.transfer import DEFAULT_MULTIHOP_TOMBSTONE_DELAY, TRANSFERTOOL_CLASSES_BY_NAME, ProtocolFactory, list_transfer_admin_accounts, transfer_path_str
-from rucio.daemons.common import ProducerConsumerDaemon, db_workqueue
-from rucio.daemons.conveyor.common import get_conveyor_rses, pick_and_prepare_submission_path, submit_transfer
+from rucio.daemons.common import ProducerConsumerDaemon, db_workqueue, run_processes
+from rucio.daemons.conveyor.common import SubmissionPool, get_conveyor_rses, pick_and_prepare_submission_path, submit_transfer
 from rucio.db.sqla.constants import RequestState, RequestType
 from rucio.transfertool.fts3 import FTS3Transfertool
 from rucio.transfertool.globus import GlobusTransferTool
@@ -124,6 +125,7 @@ def _handle_requests(
         timeout: Optional[float],
         transfertool_kwargs: dict,
         metrics: MetricManager,
+        submission_pool: Optional[SubmissionPool] = None,
         logger: "LoggerFunction" = logging.log,
 ) -> None:
     topology, requests_with_sources = batch
@@ -145,6 +147,7 @@ def _handle_requests(
         logger=logger,
     )
 
+    futures = {}
     for builder, transfer_paths in transfers.items():
         # Globus Transfertool is not yet production-ready, but we need to partially activate it
         # in all submitters if we want to enable native multi-hopping between transfertools.
@@ -168,8 +171,19 @@ def _handle_requests(
         logger(logging.DEBUG, 'Starting to submit transfers for %s', transfertool_obj)
         for job in grouped_jobs:
             logger(logging.DEBUG, 'submitjob: transfers=%s, job_params=%s' % ([str(t) for t in job['transfers']], job['job_params']))
-            submit_transfer(transfertool_obj=transfertool_obj, transfers=job['transfers'], job_params=job['job_params'],
-                            timeout=timeout, logger=logger)  # type: ignore (unclear whether timeout is supposed to be float or int)
+            submit_kwargs = {'transfertool_obj': transfertool_obj, 'transfers': job['transfers'], 'job_params': job['job_params'],
+                             'timeout': timeout, 'logger': logger}
+            if submission_pool is None:
+                submit_transfer(**submit_kwargs)
+            else:
+                # Jobs towards different hosts are submitted concurrently. A slow host only delays its own jobs.
+                futures[submission_pool.submit(transfertool_obj.external_host, submit_transfer, **submit_kwargs)] = transfertool_obj
+
+    for future in as_completed(futures):
+        try:
+            future.result()
+        except Exception:
+            logger(logging.ERROR, 'Failed to submit a job to %s', futures[future], exc_info=True)
 
 
 def _get_max_time_in_queue_conf() -> dict[str, int]:
@@ -260,6 +274,10 @@ def submitter(
     else:
         rse_ids = None
 
+    submission_pool = SubmissionPool(
+        max_workers_per_host=config_get_int('conveyor', 'submit_concurrency_per_host', default=4, raise_exception=False),
+    )
+
     transfertool_kwargs = {
         FTS3Transfertool: {
             'group_policy': group_policy,
@@ -312,13 +330,28 @@ def submitter(
             timeout=timeout,
             transfertool_kwargs=transfertool_kwargs,
             metrics=metrics,
+            submission_pool=submission_pool,
         )
 
-    ProducerConsumerDaemon(
-        producers=[_db_producer],
-        consumers=[_consumer for _ in range(total_threads)],
-        graceful_stop=GRACEFUL_STOP,
-    ).run()
+    try:
+        ProducerConsumerDaemon(
+            producers=[_db_producer],
+            consumers=[_consumer for _ in range(total_threads)],
+            graceful_stop=GRACEFUL_STOP,
+        ).run()
+    finally:
+        submission_pool.shutdown()
+
+
+def _submitter_process(**kwargs) -> None:
+    """
+    Run the submitter in a worker process of run_processes, with a topology cache of its own.
+    """
+    submitter(cached_topology=_topology_cache(kwargs.get('ignore_availability', False)), **kwargs)
+
+
+def _topology_cache(ignore_availability: bool) -> ExpiringObjectCache:
+    return ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(ignore_availability=ignore_availability), refresh_fnc=lambda topology: topology.refreshed())
 
 
 def stop(signum: Optional[int] = None, frame: Optional["FrameType"] = None) -> None:
@@ -345,10 +378,11 @@ def run(
         max_sources: int = 4,
         archive_timeout_override: Optional[int] = None,
         total_threads: int = 1,
+        processes: int = 1,
         **_kwargs
 ) -> None:
     """
-    Starts up the conveyor threads.
+    Starts up the conveyor threads, in each of `processes` processes.
     """
     setup_logging(process_name=DAEMON_NAME)
 
@@ -386,8 +420,7 @@ def run(
                 if activity in activities:
                     activities.remove(activity)
 
-    cached_topology = ExpiringObjectCache(ttl=300, new_obj_fnc=lambda: Topology(ignore_availability=ignore_availability))
-    submitter(
+    kwargs = dict(
         once=once,
         rses=working_rses,
         bulk=bulk,
@@ -399,6 +432,9 @@ def run(
         max_sources=max_sources,
         source_strategy=source_strategy,
         archive_timeout_override=archive_timeout_override,
-        cached_topology=cached_topology,
         total_threads=total_threads,
     )
+    if processes > 1:
+        run_processes(target=_submitter_process, stop_fnc=stop, processes=processes, graceful_stop=GRACEFUL_STOP, process_name=DAEMON_NAME, kwargs=kwargs)
+    else:
+        submitter(cached_topology=_topology_cache(ignore_availability), **kwargs)
@@ -15,31 +15,45 @@
 """
 Conveyor throttler is a daemon to manage rucio internal queue.
 """
+import datetime
+import heapq
 import logging
 import math
 import threading
 import traceback
 from collections import defaultdict
-from typing import TYPE_CHECKING, Optional, TypedDict, Union
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional, TypedDict, Union
 
 from sqlalchemy import null
 
 import rucio.db.sqla.util
 from rucio.common import exception
+from rucio.common.config import config_get_bool, config_get_int
 from rucio.common.constants import TransferLimitDirection
 from rucio.common.logging import setup_logging
+from rucio.common.types import InternalAccount
 from rucio.core.monitor import MetricManager
-from rucio.core.request import get_request_stats, re_sync_all_transfer_limits, release_all_waiting_requests, release_waiting_requests_fifo, release_waiting_requests_grouped_fifo, reset_stale_waiting_requests, set_transfer_limit_stats
+from rucio.core.request import (
+    get_request_stats,
+    list_waiting_request_changes,
+    re_sync_all_transfer_limits,
+    release_all_waiting_requests,
+    release_waiting_requests_by_id,
+    release_waiting_requests_fifo,
+    release_waiting_requests_grouped_fifo,
+    reset_stale_waiting_requests,
+    set_transfer_limit_stats,
+)
 from rucio.core.rse import RseCollection, RseData
 from rucio.core.transfer import applicable_rse_transfer_limits
 from rucio.daemons.common import ProducerConsumerDaemon, db_workqueue
 from rucio.db.sqla.constants import RequestState
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Iterable, Iterator
     from types import FrameType
 
-    from rucio.common.types import InternalAccount, LoggerFunction
+    from rucio.common.types import LoggerFunction
     from rucio.daemons.common import HeartbeatHandler
 
     class LimitDict(TypedDict):
@@ -82,6 +96,9 @@ GRACEFUL_STOP = threading.Event()
 METRICS = MetricManager(module=__name__)
 DAEMON_NAME = 'conveyor-throttler'
 
+ACTIVE_STATES = [RequestState.QUEUED, RequestState.SUBMITTING, RequestState.SUBMITTED]
+_ANY_ACCOUNT = object()
+
 
 def throttler(
         once: bool = False,
@@ -94,6 +111,10 @@ def throttler(
 
     logging.info('Throttler starting')
 
+    engine = None
+    if config_get_bool('conveyor', 'throttler_in_memory_engine', default=False):
+        engine = ThrottlingEngine(resync_interval=config_get_int('conveyor', 'throttler_resync_interval', default=3600))
+
     @db_workqueue(
         once=once,
         graceful_stop=GRACEFUL_STOP,
@@ -112,7 +133,12 @@ def throttler(
 
         re_sync_all_transfer_limits()
         rse_collection = RseCollection()
-        release_groups = _get_request_stats(rse_collection, logger=logger)
+        db_stats = None
+        if engine is not None:
+            with engine.lock:
+                engine.refresh(logger=logger)
+                db_stats = list(get_request_stats(state=ACTIVE_STATES)) + list(engine.waiting_stats())  # type: ignore (Session parameter is missing)
+        release_groups = _get_request_stats(rse_collection, db_stats=db_stats, logger=logger)
         return True, release_groups
 
     def _consumer(release_groups: Optional["ReleaseGroupsDict"]) -> None:
@@ -121,7 +147,12 @@ def throttler(
         logger = logging.log
         logger(logging.INFO, "Throttler - schedule requests")
         try:
-            _handle_requests(release_groups, logger=logger)
+            if engine is not None:
+                with engine.lock:
+                    _handle_requests(release_groups, logger=logger, releaser=engine)
+                    engine.flush(logger=logger)
+            else:
+                _handle_requests(release_groups, logger=logger)
         except Exception:
             logger(logging.CRITICAL, "Failed to schedule requests, error: %s" % (traceback.format_exc()))
         reset_stale_waiting_requests()
@@ -247,6 +278,8 @@ class RequestGrouper:
 def _get_request_stats(
         rse_collection: RseCollection,
         *,
+        db_stats: "Optional[Iterable[Any]]" = None,
+        update_limit_stats: bool = True,
         logger: "LoggerFunction" = logging.log
 ) -> "ReleaseGroupsDict":
     """
@@ -262,15 +295,16 @@ def _get_request_stats(
 
     For each limit, compute the total number of active and waiting transfers
     subject to that limit.
+
+    The statistics are retrieved from the database, unless they are given in db_stats.
+    If update_limit_stats is False, the computed totals are not stored in the limits.
     """
     logging.info("Throttler retrieve requests statistics")
 
-    db_stats = get_request_stats(  # type: ignore (Session parameter is missing)
-        state=[RequestState.QUEUED,
-               RequestState.SUBMITTING,
-               RequestState.SUBMITTED,
-               RequestState.WAITING],
-    )
+    if db_stats is None:
+        db_stats = get_request_stats(  # type: ignore (Session parameter is missing)
+            state=ACTIVE_STATES + [RequestState.WAITING],
+        )
 
     # for each active limit, compute how many waiting and active transfers are currently in the database
     limit_stats = {}
@@ -375,7 +409,7 @@ def _get_request_stats(
         if waiting:
             logger(logging.DEBUG, "%s: can release %s out of %s waiting requests", log_str, residual_capacity, waiting)
 
-        if waiting != limit['waitings'] or active != limit['transfers']:
+        if update_limit_stats and (waiting != limit['waitings'] or active != limit['transfers']):
             set_transfer_limit_stats(limit['id'], waitings=waiting, transfers=active)
 
         for account, to_release_for_account in _split_threshold_per_account(stat['accounts'], total_to_release=residual_capacity):  # type: ignore (stat['accounts'] is not None)
@@ -454,7 +488,8 @@ def _combine_limits(
 
 def _handle_requests(
         release_groups: "ReleaseGroupsDict",
-        logger: "LoggerFunction"
+        logger: "LoggerFunction",
+        releaser: "Optional[DatabaseReleaser]" = None
 ) -> None:
     """
     Release (set to queued state) waiting requests in groups defined by release_groups.
@@ -462,8 +497,13 @@ def _handle_requests(
     The same limit can be shared by multiple groups. Because of that, releasing requests
     from one group can impact how many requests may be released in other groups subjected
     to the same limit.
+
+    The requests are released by the given releaser, by default directly in the database.
     """
 
+    if releaser is None:
+        releaser = DatabaseReleaser()
+
     for (source_rse, dest_rse, activity), applicable_limits in release_groups.items():
 
         # Skip if dest_rse is blocklisted for write or src_rse is blocklisted for read
@@ -485,19 +525,15 @@ def _handle_requests(
             total_released = 0
         elif to_release == math.inf:
             logger(logging.DEBUG, "will release all waiting requests%s", log_str)
-            total_released = release_all_waiting_requests(dest_rse_id=dest_rse_id, source_rse_id=source_rse_id, activity=activity)
+            total_released = releaser.release_all(source_rse_id=source_rse_id, dest_rse_id=dest_rse_id, activity=activity)
         elif strategy == 'grouped_fifo':
             logger(logging.DEBUG, "will release %s remaining requests%s", to_release, log_str)
-            additional_kwargs = {}
-            if volume is not None:
-                additional_kwargs['volume'] = volume
-            if deadline is not None:
-                additional_kwargs['deadline'] = deadline
-            total_released = release_waiting_requests_grouped_fifo(
+            total_released = releaser.release_grouped_fifo(
                 source_rse_id=source_rse_id,
                 dest_rse_id=dest_rse_id,
-                count=to_release,
-                **additional_kwargs,
+                count=to_release,  # type: ignore (to_release is finite here)
+                volume=volume,
+                deadline=deadline,
             )
         else:
             total_released = 0
@@ -514,12 +550,12 @@ def _handle_requests(
                     continue
 
                 logger(logging.DEBUG, 'releasing %s waiting requests%s%s', to_release_account, log_str, f' account {account}' if account is not None else '')
-                nb_released = release_waiting_requests_fifo(
+                nb_released = releaser.release_fifo(
                     source_rse_id=source_rse_id,
                     dest_rse_id=dest_rse_id,
-                    count=to_release_account,
                     activity=activity,
                     account=account,
+                    count=to_release_account,
                 )
                 total_released += nb_released
 
@@ -531,3 +567,244 @@ def _handle_requests(
                 rse_expression = limit_stat['limit']['rse_expression']
                 limit_stat['stat']['residual_capacity'] -= total_released
                 METRICS.counter('released_waiting_requests.{activity}.{rse}').labels(activity=activity, rse=rse_expression).inc(total_released)
+
+
+class DatabaseReleaser:
+    """
+    Releases the waiting requests of each group with its own database statement.
+    """
+
+    def release_all(
+            self,
+            source_rse_id: Optional[str],
+            dest_rse_id: Optional[str],
+            activity: Optional[str]
+    ) -> int:
+        return release_all_waiting_requests(dest_rse_id=dest_rse_id, source_rse_id=source_rse_id, activity=activity)
+
+    def release_fifo(
+            self,
+            source_rse_id: Optional[str],
+            dest_rse_id: Optional[str],
+            activity: Optional[str],
+            account: Any,
+            count: int
+    ) -> int:
+        return release_waiting_requests_fifo(source_rse_id=source_rse_id, dest_rse_id=dest_rse_id, count=count, activity=activity, account=account)
+
+    def release_grouped_fifo(
+            self,
+            source_rse_id: Optional[str],
+            dest_rse_id: Optional[str],
+            count: int,
+            volume: Optional[int],
+            deadline: Optional[int]
+    ) -> int:
+        additional_kwargs = {}
+        if volume is not None:
+            additional_kwargs['volume'] = volume
+        if deadline is not None:
+            additional_kwargs['deadline'] = deadline
+        return release_waiting_requests_grouped_fifo(
+            source_rse_id=source_rse_id,
+            dest_rse_id=dest_rse_id,
+            count=count,
+            **additional_kwargs,
+        )
+
+
+class WaitingStat(NamedTuple):
+    """
+    Same fields as the rows returned by get_request_stats.
+    """
+    account: Optional[InternalAccount]
+    state: RequestState
+    dest_rse_id: str
+    source_rse_id: Optional[str]
+    activity: Optional[str]
+    counter: int
+
+
+class ThrottlingEngine(DatabaseReleaser):
+    """
+    In-memory view of the waiting requests, kept between the cycles of the throttler.
+
+    The waiting requests are loaded once, then refreshed from the waiting or queued requests
+    whose updated_at moved since the previous refresh. They are fully reloaded every
+    `resync_interval` seconds, to forget the waiting requests deleted or moved to another state
+    in between. The fifo and "release all" decisions
+    pick the requests to release in memory; `flush` then releases all of them with a single
+    statement. Grouped fifo decisions depend on the datasets of the requests and are still
+    released by the database.
+
+    Only the waiting requests are tracked. Requests are usually archived in the same
+    transaction which terminates them, so these transitions never show up in the requests
+    table; the number of active requests is aggregated by the database at each cycle.
+    """
+
+    def __init__(
+            self,
+            resync_interval: float = 3600,
+            overlap: float = 60
+    ):
+        """
+        :param resync_interval: Seconds between two full reloads of the waiting requests.
+        :param overlap:         Seconds by which consecutive refreshes overlap, to tolerate clock differences between the writers.
+        """
+        self.resync_interval = resync_interval
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.lock = threading.Lock()
+        self._requests: dict[str, tuple[tuple, datetime.datetime]] = {}
+        self._requests_by_group: dict[tuple, dict[str, datetime.datetime]] = defaultdict(dict)
+        self._groups_by_dest: dict[str, set[tuple]] = defaultdict(set)
+        self._released: dict[str, datetime.datetime] = {}
+        self._to_release: list[str] = []
+        self._watermark: Optional[datetime.datetime] = None
+        self._last_resync: Optional[datetime.datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def _forget(self, request_id: str) -> None:
+        group, _ = self._requests.pop(request_id)
+        requests = self._requests_by_group[group]
+        del requests[request_id]
+        if not requests:
+            del self._requests_by_group[group]
+            self._groups_by_dest[group[1]].discard(group)
+
+    def apply_changes(self, rows: "Iterable[Any]") -> None:
+        """
+        Update the view with the current state of some requests.
+
+        :param rows: Objects with the id, state, account, dest_rse_id, source_rse_id, activity,
+                     requested_at and updated_at of the requests.
+        """
+        for row in rows:
+            known = self._requests.get(row.id)
+            updated_at = known[1] if known else self._released.get(row.id)
+            if updated_at is not None and row.updated_at <= updated_at:
+                # already seen, or changed by the release of the request
+                continue
+            self._released.pop(row.id, None)
+            if known:
+                self._forget(row.id)
+            if row.state == RequestState.WAITING:
+                group = (row.account, row.dest_rse_id, row.source_rse_id, row.activity)
+                self._requests[row.id] = (group, row.updated_at)
+                self._requests_by_group[group][row.id] = row.requested_at or datetime.datetime.min
+                self._groups_by_dest[row.dest_rse_id].add(group)
+            if self._watermark is None or row.updated_at > self._watermark:
+                self._watermark = row.updated_at
+
+    def resync(self, rows: "Iterable[Any]", now: datetime.datetime) -> None:
+        """
+        Replace the view by the given waiting requests.
+
+        :param rows: All the waiting requests, as in `apply_changes`.
+        :param now:  The time at which the rows were read.
+        """
+        self._requests.clear()
+        self._requests_by_group.clear()
+        self._groups_by_dest.clear()
+        self._released.clear()
+        self._to_release.clear()
+        self._watermark = now
+        self._last_resync = now
+        self.apply_changes(rows)
+
+    def refresh(self, *, logger: "LoggerFunction" = logging.log) -> None:
+        """
+        Bring the view up to date with the database.
+        """
+        now = datetime.datetime.utcnow()
+        if self._last_resync is None or (now - self._last_resync).total_seconds() >= self.resync_interval:
+            with METRICS.timer('engine.resync'):
+                self.resync(list_waiting_request_changes(), now=now)  # type: ignore (Session parameter is missing)
+            logger(logging.INFO, 'Loaded %d waiting requests', len(self))
+        else:
+            with METRICS.timer('engine.refresh'):
+                self.apply_changes(list_waiting_request_changes(updated_since=self._watermark - self.overlap))  # type: ignore
+            logger(logging.DEBUG, 'Refreshed the view of the waiting requests, %d waiting', len(self))
+        METRICS.gauge('engine.waiting').set(len(self))
+
+    def waiting_stats(self) -> "Iterator[WaitingStat]":
+        """
+        :returns: The number of waiting requests per account, destination, source and activity.
+        """
+        for (account, dest_rse_id, source_rse_id, activity), requests in self._requests_by_group.items():
+            yield WaitingStat(account, RequestState.WAITING, dest_rse_id, source_rse_id, activity, len(requests))
+
+    def _release(
+            self,
+            source_rse_id: Optional[str],
+            dest_rse_id: Optional[str],
+            activity: Optional[str],
+            account: Any,
+            count: Optional[int]
+    ) -> int:
+        if dest_rse_id is not None:
+            groups = list(self._groups_by_dest.get(dest_rse_id, ()))
+        else:
+            groups = list(self._requests_by_group)
+        groups = [group for group in groups
+                  if (account is _ANY_ACCOUNT or group[0] == account)
+                  and (source_rse_id is None or group[2] == source_rse_id)
+                  and (activity is None or group[3] == activity)]
+        candidates = ((requested_at, request_id, group) for group in groups for request_id, requested_at in self._requests_by_group[group].items())
+        if count is not None:
+            candidates = heapq.nsmallest(count, candidates)
+
+        released = 0
+        for _, request_id, _ in list(candidates):
+            self._released[request_id] = self._requests[request_id][1]
+            self._forget(request_id)
+            self._to_release.append(request_id)
+            released += 1
+        return released
+
+    def release_all(
+            self,
+            source_rse_id: Optional[str],
+            dest_rse_id: Optional[str],
+            activity: Optional[str]
+    ) -> int:
+        return self._release(source_rse_id=source_rse_id, dest_rse_id=dest_rse_id, activity=activity, account=_ANY_ACCOUNT, count=None)
+
+    def release_fifo(
+            self,
+            source_rse_id: Optional[str],
+            dest_rse_id: Optional[str],
+            activity: Optional[str],
+            account: Any,
+            count: int
+    ) -> int:
+        if not isinstance(account, InternalAccount):
+            # null(): the requests without account
+            account = None
+        return self._release(source_rse_id=source_rse_id, dest_rse_id=dest_rse_id, activity=activity, account=account, count=int(count))
+
+    def flush(self, *, logger: "LoggerFunction" = logging.log) -> int:
+        """
+        Release the requests picked since the previous flush.
+
+        :returns: The number of released requests.
+        """
+        if not self._to_release:
+            return 0
+        to_release = self._to_release
+        try:
+            with METRICS.timer('engine.flush'):
+                released = release_waiting_requests_by_id(to_release)  # type: ignore (Session parameter is missing)
+        except Exception:
+            # the requests are still waiting in the database, but were already removed
+            # from the view: reload it at the next refresh instead of waiting for the resync
+            self._last_resync = None
+            raise
+        self._to_release = []
+        if released < len(to_release):
+            # the view was outdated; the next refresh will catch up
+            logger(logging.DEBUG, '%d of the %d requests to release were not waiting anymore', len(to_release) - released, len(to_release))
+            METRICS.counter('engine.not_waiting').inc(len(to_release) - released)
+        logger(logging.INFO, 'Released %d waiting requests', released)
+        return released
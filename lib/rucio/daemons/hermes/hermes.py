@@ -47,8 +47,9 @@ from rucio.common.config import (
 )
 from rucio.common.exception import DatabaseException
 from rucio.common.logging import setup_logging
-from rucio.core.message import delete_messages, retrieve_messages
+from rucio.core.message import WORK_QUEUE, delete_messages, retrieve_messages
 from rucio.core.monitor import MetricManager
+from rucio.core.work_queue import expire_work_leases, release_work
 from rucio.daemons.common import run_daemon
 
 if TYPE_CHECKING:
@@ -633,6 +634,8 @@ def build_message_dict(
         message_dict: dict[str, list[dict[str, Any]]],
         logger: "LoggerFunction",
         service: Optional[str] = None,
+        claim_owner: Optional[str] = None,
+        lease_time: int = 600,
 ) -> None:
     """
     Retrieves messages from the database and builds a dictionary with the keys being the services, and the values a list of the messages (built up of dictionary / json information)
@@ -643,6 +646,8 @@ def build_message_dict(
     :param message_dict:       Either empty dictionary to be built, or build upon when using query_by_service.
     :param logger:             The logger object.
     :param service:            When passed, only returns messages table for this specific service.
+    :param claim_owner:        When passed, claim the messages for this worker instead of partitioning them by thread.
+    :param lease_time:         Seconds after which claimed messages which were not deleted can be claimed again.
 
     :returns:                  None, but builds on the dictionary message_dict passed to this fuction (for when querying multiple services).
     """
@@ -653,6 +658,8 @@ def build_message_dict(
         thread=thread,
         total_threads=total_threads,
         service_filter=service,
+        claim_owner=claim_owner,
+        lease_time=lease_time,
     )
 
     if messages:
@@ -759,6 +766,10 @@ def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> boo
     worker_number, total_workers, logger = heartbeat_handler.live()
     message_dict = {}
     query_by_service = config_get_bool("hermes", "query_by_service", default=False)
+    # claim_messages replaces the partitioning of the messages by worker number with claims: messages are
+    # not left behind when workers come and go, and messages which failed are retried by any worker.
+    claim_owner = heartbeat_handler.worker_id if config_get_bool("hermes", "claim_messages", default=False) else None
+    lease_time = config_get_int("hermes", "claim_lease_time", default=600)
 
     # query_by_service is a toggleable behaviour switch between collecting bulk number of messages across all services when false, to collecting bulk messages from each service when true.
     if query_by_service:
@@ -770,6 +781,8 @@ def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> boo
                 message_dict=message_dict,
                 logger=logger,
                 service=service,
+                claim_owner=claim_owner,
+                lease_time=lease_time,
             )
     else:
         build_message_dict(
@@ -777,7 +790,9 @@ def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> boo
             thread=worker_number,
             total_threads=total_workers,
             message_dict=message_dict,
-            logger=logger
+            logger=logger,
+            claim_owner=claim_owner,
+            lease_time=lease_time,
         )
 
     if message_dict:
@@ -915,6 +930,11 @@ def run_once(heartbeat_handler: "HeartbeatHandler", bulk: int, **_kwargs) -> boo
             for message in to_delete
         ]
         delete_messages(messages=to_delete)
+        if claim_owner:
+            release_work(WORK_QUEUE, claim_owner, [message["id"] for message in to_delete])
+
+    if claim_owner:
+        expire_work_leases(WORK_QUEUE)
 
     must_sleep = True
     return must_sleep
@@ -34,8 +34,8 @@ from rucio.common.exception import DatabaseException, DataIdentifierNotFound, Re
 from rucio.common.logging import setup_logging
 from rucio.common.types import InternalScope
 from rucio.core.monitor import MetricManager
-from rucio.core.rule import delete_updated_did, get_updated_dids, re_evaluate_did
-from rucio.daemons.common import HeartbeatHandler, run_daemon
+from rucio.core.rule import count_updated_dids, delete_updated_dids, get_updated_dids, re_evaluate_did
+from rucio.daemons.common import HeartbeatHandler, run_daemon, run_processes
 from rucio.db.sqla.constants import MYSQL_LOCK_NOWAIT_REGEX, ORACLE_CONNECTION_LOST_CONTACT_REGEX, ORACLE_RESOURCE_BUSY_REGEX, ORACLE_UNIQUE_CONSTRAINT_VIOLATED_REGEX, PSQL_PSYCOPG_LOCK_NOT_AVAILABLE_REGEX
 
 if TYPE_CHECKING:
@@ -72,14 +72,14 @@ def re_evaluator(
 
 def run_once(
         paused_dids: dict[tuple[str, str], datetime],
-        did_limit: int,
+        did_limit: Optional[int],
         heartbeat_handler: HeartbeatHandler,
         **_kwargs
 ) -> None:
     worker_number, total_workers, logger = heartbeat_handler.live()
 
     # heartbeat
-    start = time.time()  # NOQA
+    start = time.time()
 
     # Refresh paused DIDs
     iter_paused_dids = copy.copy(paused_dids)
@@ -100,38 +100,44 @@ def run_once(
         logger(logging.DEBUG, 'Did not get any work (paused_dids=%s)', str(len(paused_dids)))
         return
 
-    done_dids = {}
+    # Coalesce the pending rows of each DID, so that all its attach and detach actions are evaluated in one pass
+    pending_dids = {}  # {(scope, name): ([id, ...], {rule_evaluation_action, ...})}
     for did in dids:
+        ids, actions = pending_dids.setdefault((did.scope, did.name), ([], set()))
+        ids.append(did.id)
+        actions.add(did.rule_evaluation_action)
+    METRICS.counter('updated_dids.coalesced').inc(len(dids) - len(pending_dids))
+
+    # Size of the backlog of this worker, only counted if it did not fit into this cycle
+    backlog = len(dids)
+    if did_limit and len(dids) >= did_limit:
+        backlog = count_updated_dids(total_workers=total_workers, worker_number=worker_number)
+    METRICS.gauge('backlog.{worker_number}').labels(worker_number=worker_number).set(backlog)
+
+    drained = 0
+    for (scope, name), (ids, actions) in pending_dids.items():
         _, _, logger = heartbeat_handler.live()
         if graceful_stop.is_set():
             break
 
-        # Check if this DID has already been operated on
-        did_tag = '%s:%s' % (did.scope.internal, did.name)
-        if did_tag in done_dids:
-            if did.rule_evaluation_action in done_dids[did_tag]:
-                logger(logging.DEBUG, 'evaluation of %s:%s already done', did.scope, did.name)
-                delete_updated_did(id_=did.id)
-                continue
-        else:
-            done_dids[did_tag] = []
-
         # Jump paused DIDs
-        if (did.scope.internal, did.name) in paused_dids:
+        if (scope.internal, name) in paused_dids:
             continue
 
         try:
             start_time = time.time()
-            re_evaluate_did(scope=did.scope, name=did.name, rule_evaluation_action=did.rule_evaluation_action, logger=logger)
-            logger(logging.DEBUG, 'evaluation of %s:%s took %f', did.scope, did.name, time.time() - start_time)
-            delete_updated_did(id_=did.id)
-            done_dids[did_tag].append(did.rule_evaluation_action)
+            re_evaluate_did(scope=scope, name=name, rule_evaluation_action=actions, logger=logger)
+            logger(logging.DEBUG, 'evaluation of %s:%s (%d updates) took %f', scope, name, len(ids), time.time() - start_time)
+            delete_updated_dids(ids=ids)
+            drained += len(ids)
+            METRICS.counter('dids.evaluated').inc()
         except DataIdentifierNotFound:
-            delete_updated_did(id_=did.id)
+            delete_updated_dids(ids=ids)
+            drained += len(ids)
         except (DatabaseException, DatabaseError) as e:
             if match(ORACLE_UNIQUE_CONSTRAINT_VIOLATED_REGEX, str(e.args[0])) or match(ORACLE_RESOURCE_BUSY_REGEX, str(e.args[0])) or match(PSQL_PSYCOPG_LOCK_NOT_AVAILABLE_REGEX, str(e.args[0])) or match(MYSQL_LOCK_NOWAIT_REGEX, str(e.args[0])):
-                paused_dids[(did.scope.internal, did.name)] = datetime.utcnow() + timedelta(seconds=randint(60, 600))  # noqa: S311
-                logger(logging.WARNING, 'Locks detected for %s:%s', did.scope, did.name)
+                paused_dids[(scope.internal, name)] = datetime.utcnow() + timedelta(seconds=randint(60, 600))  # noqa: S311
+                logger(logging.WARNING, 'Locks detected for %s:%s', scope, name)
                 METRICS.counter('exceptions.{exception}').labels(exception='LocksDetected').inc()
             elif match('.*QueuePool.*', str(e.args[0])):
                 logger(logging.WARNING, traceback.format_exc())
@@ -144,10 +150,16 @@ def run_once(
                 METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
         except ReplicationRuleCreationTemporaryFailed as e:
             METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-            logger(logging.WARNING, 'Replica Creation temporary failed, retrying later for %s:%s', did.scope, did.name)
+            logger(logging.WARNING, 'Replica Creation temporary failed, retrying later for %s:%s', scope, name)
         except FlushError as e:
             METRICS.counter('exceptions.{exception}').labels(exception=e.__class__.__name__).inc()
-            logger(logging.WARNING, 'Flush error for %s:%s', did.scope, did.name)
+            logger(logging.WARNING, 'Flush error for %s:%s', scope, name)
+
+    # Drain rate of the backlog, to be compared with the rate at which updated DIDs are created when sizing the evaluators
+    duration = time.time() - start
+    METRICS.counter('updated_dids.drained').inc(drained)
+    METRICS.gauge('drain_rate.{worker_number}').labels(worker_number=worker_number).set(drained / duration if duration > 0 else 0)
+    logger(logging.INFO, 'Drained %d of %d updated DIDs (%d DIDs) in %f seconds, backlog was %d', drained, len(dids), len(pending_dids), duration, backlog)
 
 
 def stop(signum: Optional[int] = None, frame: Optional["FrameType"] = None) -> None:
@@ -162,10 +174,11 @@ def run(
         once: bool = False,
         threads: int = 1,
         sleep_time: int = 30,
-        did_limit: int = 100
+        did_limit: int = 100,
+        processes: int = 1
 ) -> None:
     """
-    Starts up the Judge-Eval threads.
+    Starts up the Judge-Eval threads, in each of `processes` processes.
     """
     setup_logging(process_name=DAEMON_NAME)
 
@@ -174,12 +187,24 @@ def run(
 
     if once:
         re_evaluator(once=once, did_limit=did_limit)
+    elif processes > 1:
+        logging.info('Evaluator starting %s processes' % str(processes))
+        run_processes(target=_run_threads, stop_fnc=stop, processes=processes, graceful_stop=graceful_stop, process_name=DAEMON_NAME,
+                      kwargs={'threads': threads, 'sleep_time': sleep_time, 'did_limit': did_limit})
     else:
-        logging.info('Evaluator starting %s threads' % str(threads))
-        thread_list = [threading.Thread(target=re_evaluator, kwargs={'once': once,
-                                                                     'sleep_time': sleep_time,
-                                                                     'did_limit': did_limit}) for i in range(0, threads)]
-        [t.start() for t in thread_list]
-        # Interruptible joins require a timeout.
-        while thread_list[0].is_alive():
-            [t.join(timeout=3.14) for t in thread_list]
+        _run_threads(threads=threads, sleep_time=sleep_time, did_limit=did_limit)
+
+
+def _run_threads(
+        threads: int,
+        sleep_time: int,
+        did_limit: int
+) -> None:
+    logging.info('Evaluator starting %s threads' % str(threads))
+    thread_list = [threading.Thread(target=re_evaluator, kwargs={'once': False,
+                                                                 'sleep_time': sleep_time,
+                                                                 'did_limit': did_limit}) for i in range(0, threads)]
+    [t.start() for t in thread_list]
+    # Interruptible joins require a timeout.
+    while thread_list[0].is_alive():
+        [t.join(timeout=3.14) for t in thread_list]
@@ -0,0 +1,235 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Coalescing of replica touches between two bulk updates of the database.
+"""
+
+import fcntl
+import json
+import logging
+import os
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Optional
+
+from rucio.common.exception import ConfigurationError
+from rucio.common.types import InternalScope
+from rucio.common.utils import chunks
+from rucio.core.monitor import MetricManager
+from rucio.core.replica import touch_replicas
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from rucio.common.types import LoggerFunction
+
+METRICS = MetricManager(module=__name__)
+
+
+class TouchAccumulator:
+    """
+    Accumulates replica touches and writes them to the database in bulk.
+
+    Touches of the same (scope, name, rse_id) are coalesced: only the latest accessed_at
+    is kept, together with the number of touches, which is added to the access_cnt of the
+    DID. The pending touches are written by `flush`, in batches ordered by primary key.
+    Touches whose rows are locked stay pending until the next flush.
+
+    If a journal file is given, every touch is appended to it before `add` returns and the
+    journal is compacted after each flush, so the touches acknowledged to the broker survive
+    a stop of the process between two flushes. The journal is replayed on construction, and
+    locked for the lifetime of the accumulator: each process needs its own journal. It is
+    synced to disk at most every sync_interval seconds, and at each flush, so only the touches
+    of the last interval can be lost if the host itself crashes.
+    """
+
+    def __init__(
+            self,
+            window: float = 60,
+            max_pending: int = 100000,
+            batch_size: int = 1000,
+            journal_path: Optional[str] = None,
+            sync_interval: float = 1,
+            logger: "LoggerFunction" = logging.log
+    ):
+        """
+        :param window:       Maximum number of seconds a touch stays pending before being flushed.
+        :param max_pending:  Number of distinct pending replicas after which a flush is due.
+        :param batch_size:   Number of replicas updated per database transaction.
+        :param journal_path: Path of the journal file. No journal is kept if None.
+        :param sync_interval: Minimum number of seconds between two syncs of the journal to disk.
+        :param logger:       Optional decorated logger that can be passed from the calling daemons or servers.
+        """
+        self.window = window
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.journal_path = journal_path
+        self.sync_interval = sync_interval
+        self.logger = logger
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._pending: dict[tuple[str, str, str], list[Any]] = {}
+        self._window_start: Optional[float] = None
+        self._journal = None
+        self._journal_lock = None
+        self._synced_at = monotonic()
+        if journal_path:
+            self._lock_journal()
+            self._replay_journal()
+            self._journal = open(journal_path, 'a')
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _coalesce(self, scope: InternalScope, name: str, rse_id: str, accessed_at: datetime, count: int) -> None:
+        key = (rse_id, scope.internal, name)
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [scope, accessed_at, count]
+            if self._window_start is None:
+                self._window_start = monotonic()
+        else:
+            entry[1] = max(entry[1], accessed_at)
+            entry[2] += count
+            METRICS.counter('coalesced').inc()
+
+    @staticmethod
+    def _journal_line(rse_id: str, scope: InternalScope, name: str, accessed_at: datetime, count: int) -> str:
+        return json.dumps({'rse_id': rse_id, 'scope': scope.internal, 'name': name,
+                           'accessed_at': accessed_at.isoformat(), 'count': count}) + '\n'
+
+    def _lock_journal(self) -> None:
+        """ Prevent another process from replaying and appending to the same journal. """
+        self._journal_lock = open(self.journal_path + '.lock', 'a')  # type: ignore
+        try:
+            fcntl.flock(self._journal_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._journal_lock.close()
+            self._journal_lock = None
+            raise ConfigurationError('Touch journal %s is used by another process' % self.journal_path)
+
+    def _replay_journal(self) -> None:
+        if not os.path.exists(self.journal_path):  # type: ignore
+            return
+        replayed = 0
+        with open(self.journal_path) as journal:  # type: ignore
+            for line in journal:
+                try:
+                    touch = json.loads(line)
+                    self._coalesce(InternalScope(touch['scope'], from_external=False), touch['name'], touch['rse_id'],
+                                   datetime.fromisoformat(touch['accessed_at']), touch['count'])
+                    replayed += 1
+                except (ValueError, KeyError):
+                    # a line truncated by a crash while it was written
+                    self.logger(logging.WARNING, 'Skipping corrupted line in touch journal %s', self.journal_path)
+        self.logger(logging.INFO, 'Replayed %d touches (%d replicas) from %s', replayed, len(self._pending), self.journal_path)
+
+    def _compact_journal(self) -> None:
+        """ Rewrite the journal with the pending touches only. Must be called with self._lock held. """
+        tmp_path = self.journal_path + '.tmp'  # type: ignore
+        with open(tmp_path, 'w') as journal:
+            for (rse_id, _, name), (scope, accessed_at, count) in self._pending.items():
+                journal.write(self._journal_line(rse_id, scope, name, accessed_at, count))
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._journal.close()  # type: ignore
+        os.replace(tmp_path, self.journal_path)  # type: ignore
+        self._journal = open(self.journal_path, 'a')  # type: ignore
+        self._synced_at = monotonic()
+
+    def add(self, replicas: "Iterable[dict[str, Any]]") -> None:
+        """
+        Add touches to the pending ones.
+
+        :param replicas: dictionaries with the scope, name, rse_id and accessed_at of the touched replicas.
+        """
+        with self._lock:
+            lines = []
+            for replica in replicas:
+                accessed_at, count = replica.get('accessed_at') or datetime.utcnow(), replica.get('count', 1)
+                self._coalesce(replica['scope'], replica['name'], replica['rse_id'], accessed_at, count)
+                if self._journal:
+                    lines.append(self._journal_line(replica['rse_id'], replica['scope'], replica['name'], accessed_at, count))
+                METRICS.counter('touches').inc()
+            if self._journal and lines:
+                self._journal.writelines(lines)
+                self._journal.flush()
+                if monotonic() - self._synced_at >= self.sync_interval:
+                    os.fsync(self._journal.fileno())
+                    self._synced_at = monotonic()
+            METRICS.gauge('pending').set(len(self._pending))
+
+    def is_due(self) -> bool:
+        """
+        :returns: True if the pending touches must be flushed, because of their number or age.
+        """
+        return len(self._pending) >= self.max_pending or (self._window_start is not None and monotonic() - self._window_start >= self.window)
+
+    def flush(self) -> int:
+        """
+        Write the pending touches to the database.
+
+        :returns: The number of replicas updated.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, window_start = self._pending, self._window_start
+                self._pending, self._window_start = {}, None
+            if not pending:
+                return 0
+
+            updated, retry = 0, []
+            with METRICS.timer('flush'):
+                touches = [{'rse_id': rse_id, 'scope': scope, 'name': name, 'accessed_at': accessed_at, 'count': count}
+                           for (rse_id, _, name), (scope, accessed_at, count) in sorted(pending.items())]
+                for batch in chunks(touches, self.batch_size):
+                    try:
+                        failed = touch_replicas(batch)
+                    except Exception:
+                        self.logger(logging.ERROR, 'Cannot update replicas.', exc_info=True)
+                        METRICS.counter('update_error').inc()
+                        failed = batch
+                    updated += len(batch) - len(failed)
+                    retry.extend(failed)
+
+            with self._lock:
+                # touches which hit a locked row are retried at the next flush
+                for touch in retry:
+                    self._coalesce(touch['scope'], touch['name'], touch['rse_id'], touch['accessed_at'], touch['count'])
+                if retry and self._window_start is not None:
+                    self._window_start = min(self._window_start, window_start)  # type: ignore
+                if self._journal:
+                    self._compact_journal()
+                METRICS.gauge('pending').set(len(self._pending))
+
+            METRICS.counter('updated').inc(updated)
+            METRICS.counter('retried').inc(len(retry))
+            METRICS.timer('flush_latency').observe(monotonic() - window_start)  # type: ignore
+            self.logger(logging.DEBUG, 'Flushed %d touched replicas, %d to retry', updated, len(retry))
+            return updated
+
+    def close(self) -> None:
+        """
+        Flush the pending touches and close the journal. Touches which cannot be written stay in the journal.
+        """
+        self.flush()
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+            if self._journal_lock:
+                self._journal_lock.close()
+                self._journal_lock = None
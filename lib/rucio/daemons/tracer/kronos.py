@@ -18,10 +18,11 @@ This daemon consumes tracer messages from ActiveMQ and updates the atime for rep
 
 import functools
 import logging
+import os
 import re
+import tempfile
 from configparser import NoOptionError, NoSectionError
 from datetime import datetime
-from json import dumps as jdumps
 from json import loads as jloads
 from queue import Queue
 from threading import Event, Thread
@@ -29,19 +30,20 @@ from time import time
 from typing import TYPE_CHECKING, Optional
 
 import rucio.db.sqla.util
-from rucio.common.config import config_get, config_get_bool, config_get_int, config_get_list
+from rucio.common.config import config_get, config_get_bool, config_get_float, config_get_int, config_get_list
 from rucio.common.constants import DEFAULT_VO
-from rucio.common.exception import DatabaseException, RSENotFound
+from rucio.common.exception import ConfigurationError, DatabaseException, RSENotFound
 from rucio.common.logging import setup_logging
 from rucio.common.stomp_utils import StompConnectionManager
-from rucio.common.stopwatch import Stopwatch
 from rucio.common.types import InternalAccount, InternalScope, LoggerFunction
+from rucio.common.utils import chunks
 from rucio.core.did import list_parent_dids, touch_dids
 from rucio.core.lock import touch_dataset_locks
 from rucio.core.monitor import MetricManager
-from rucio.core.replica import declare_bad_file_replicas, touch_collection_replicas, touch_replica
+from rucio.core.replica import declare_bad_file_replicas, touch_collection_replicas
 from rucio.core.rse import get_rse_id
 from rucio.daemons.common import HeartbeatHandler, run_daemon
+from rucio.daemons.tracer.accumulator import TouchAccumulator
 from rucio.db.sqla.constants import BadFilesStatus, DIDType
 
 if TYPE_CHECKING:
@@ -65,17 +67,16 @@ class AMQConsumer:
             self,
             broker: str,
             conn: "Connection",
-            queue: str,
             chunksize: int,
             subscription_id: str,
             excluded_usrdns: "Set[str]",
             dataset_queue: Queue,
             bad_files_patterns: list[re.Pattern],
+            touches: TouchAccumulator,
             logger: LoggerFunction = logging.log
     ):
         self.__broker = broker
         self.__conn = conn
-        self.__queue = queue
         self.__reports = []
         self.__ids = []
         self.__chunksize = chunksize
@@ -86,6 +87,7 @@ class AMQConsumer:
         self.__excluded_usrdns = excluded_usrdns
         self.__dataset_queue = dataset_queue
         self.__bad_files_patterns = bad_files_patterns
+        self.__touches = touches
         self.__logger = logger
 
     @METRICS.count_it
@@ -136,6 +138,9 @@ class AMQConsumer:
             self.__reports = []
             self.__ids = []
 
+            if self.__touches.is_due():
+                self.__touches.flush()
+
     def __update_atime(self) -> None:
         """
         Bulk update atime.
@@ -285,36 +290,14 @@ class AMQConsumer:
         if not len(replicas):
             return
 
-        self.__logger(logging.DEBUG, "trying to update replicas: %s", replicas)
-
-        stopwatch = Stopwatch()
-        try:
-            for replica in replicas:
-                # if touch replica hits a locked row put the trace back into queue for later retry
-                if not touch_replica(replica):
-                    resubmit = {'filename': replica['name'],
-                                'scope': replica['scope'].external,
-                                'remoteSite': replica['rse'],
-                                'traceTimeentryUnix': replica['traceTimeentryUnix'],
-                                'eventType': 'get',
-                                'usrdn': 'someuser',
-                                'clientState': 'DONE',
-                                'eventVersion': replica['eventVersion']}
-                    if replica['scope'].vo != DEFAULT_VO:
-                        resubmit['vo'] = replica['scope'].vo
-                    self.__conn.send(body=jdumps(resubmit), destination=self.__queue, headers={'appversion': 'rucio', 'resubmitted': '1'})
-                    METRICS.counter('sent_resubmitted').inc()
-            METRICS.timer('update_atime').observe(stopwatch.elapsed)
-        except Exception:
-            self.__logger(logging.ERROR, "Cannot update replicas.", exc_info=True)
-            METRICS.counter('update_error').inc()
-
-        METRICS.counter('updated_replicas').inc()
+        self.__logger(logging.DEBUG, "adding touched replicas: %s", replicas)
+        self.__touches.add(replicas)
 
 
 def kronos_file(
         once: bool = False,
         dataset_queue: Optional[Queue] = None,
+        touches: Optional[TouchAccumulator] = None,
         sleep_time: int = 60
 ) -> None:
     """
@@ -331,13 +314,14 @@ def kronos_file(
             run_once_kronos_file,
             stomp_conn_mngr=stomp_conn_mngr,
             dataset_queue=dataset_queue,  # type: ignore
+            touches=touches,  # type: ignore
             sleep_time=sleep_time,
         )
     )
     stomp_conn_mngr.disconnect()
 
 
-def run_once_kronos_file(heartbeat_handler: HeartbeatHandler, stomp_conn_mngr: StompConnectionManager, dataset_queue: Queue, sleep_time: int, **kwargs) -> None:
+def run_once_kronos_file(heartbeat_handler: HeartbeatHandler, stomp_conn_mngr: StompConnectionManager, dataset_queue: Queue, touches: TouchAccumulator, sleep_time: int, **kwargs) -> None:
     """
     Run the amq consumer once.
     """
@@ -393,12 +377,12 @@ def run_once_kronos_file(heartbeat_handler: HeartbeatHandler, stomp_conn_mngr: S
             METRICS.counter('reconnect.{host}').labels(host=conn.transport._Transport__host_and_ports[0][0]).inc()
             conn.set_listener('rucio-tracer-kronos', AMQConsumer(broker=conn.transport._Transport__host_and_ports[0],
                                                                  conn=conn,
-                                                                 queue=config_get('tracer-kronos', 'queue'),
                                                                  chunksize=chunksize,
                                                                  subscription_id=subscription_id,
                                                                  excluded_usrdns=excluded_usrdns,
                                                                  dataset_queue=dataset_queue,
                                                                  bad_files_patterns=bad_files_patterns,
+                                                                 touches=touches,
                                                                  logger=logger))
             if not use_ssl:
                 conn.connect(username, password)
@@ -406,6 +390,10 @@ def run_once_kronos_file(heartbeat_handler: HeartbeatHandler, stomp_conn_mngr: S
                 conn.connect()
             conn.subscribe(destination=config_get('tracer-kronos', 'queue'), ack='client-individual', id=subscription_id, headers={'activemq.prefetchSize': prefetch_size})
 
+    # flush touches left pending when the message rate is too low to trigger it from the consumers
+    if touches.is_due():
+        touches.flush()
+
 
 def kronos_dataset(dataset_queue: Queue, once: bool = False, sleep_time: int = 60) -> None:
     return_values = {'heartbeat_handler': HeartbeatHandler("kronos-dataset", 10)}
@@ -457,16 +445,19 @@ def run_once_kronos_dataset(dataset_queue: Queue, return_values: dict, heartbeat
     logger(logging.INFO, 'fetched %d datasets from queue (%ds)' % (len_ds, time() - now))
 
     total, failed, start = 0, 0, time()
+    update_dids = []
     for did, accessed_at in datasets.items():
         scope, name = did.split(':')
         scope = InternalScope(scope, from_external=False)
-        update_did = {'scope': scope, 'name': name, 'type': DIDType.DATASET, 'accessed_at': accessed_at}
+        update_dids.append({'scope': scope, 'name': name, 'type': DIDType.DATASET, 'accessed_at': accessed_at})
+    for chunk in chunks(update_dids, config_get_int('tracer-kronos', 'touch_batch_size', raise_exception=False, default=1000)):
         # if update fails, put back in queue and retry next time
-        if not touch_dids((update_did,)):
-            update_did['rse_id'] = None
-            dataset_queue.put(update_did)
-            failed += 1
-        total += 1
+        if not touch_dids(chunk):
+            for update_did in chunk:
+                update_did['rse_id'] = None
+                dataset_queue.put(update_did)
+            failed += len(chunk)
+        total += len(chunk)
     logger(logging.INFO, 'update done for %d datasets, %d failed (%ds)' % (total, failed, time() - start))
 
     total, failed, start = 0, 0, time()
@@ -496,6 +487,28 @@ def run_once_kronos_dataset(dataset_queue: Queue, return_values: dict, heartbeat
     logger(logging.INFO, 'update done for %d collection replicas, %d failed (%ds)' % (total, failed, time() - start))
 
 
+def _make_touch_accumulator(**kwargs) -> TouchAccumulator:
+    """
+    Create the touch accumulator of the process, with its journal.
+
+    The journal is tracer-kronos.touch_journal if set, and disabled if it is set to an empty value.
+    Otherwise, the process takes the first journal of tracer-kronos.touch_journal_dir which no other
+    kronos process of the host holds, and replays the touches a stopped process left in it.
+    """
+    journal_path = config_get('tracer-kronos', 'touch_journal', raise_exception=False, default=None)
+    if journal_path is not None:
+        return TouchAccumulator(journal_path=journal_path or None, **kwargs)
+
+    directory = config_get('tracer-kronos', 'touch_journal_dir', raise_exception=False, default=os.path.join(tempfile.gettempdir(), 'rucio_kronos'))
+    os.makedirs(directory, exist_ok=True)
+    idx = 0
+    while True:
+        try:
+            return TouchAccumulator(journal_path=os.path.join(directory, f'touches_{idx}.journal'), **kwargs)
+        except ConfigurationError:
+            idx += 1  # held by another process
+
+
 def stop(signum: Optional[int] = None, frame: Optional["FrameType"] = None) -> None:
     """
     Graceful exit.
@@ -518,13 +531,20 @@ def run(
         raise DatabaseException('Database was not updated, daemon won\'t start')
 
     dataset_queue = Queue()
+    touches = _make_touch_accumulator(
+        window=config_get_int('tracer-kronos', 'touch_window', raise_exception=False, default=60),
+        max_pending=config_get_int('tracer-kronos', 'touch_max_pending', raise_exception=False, default=100000),
+        batch_size=config_get_int('tracer-kronos', 'touch_batch_size', raise_exception=False, default=1000),
+        sync_interval=config_get_float('tracer-kronos', 'touch_journal_sync_interval', raise_exception=False, default=1),
+    )
     logging.info('starting tracer consumer threads')
 
     thread_list = []
     for _ in range(0, threads):
         thread_list.append(Thread(target=kronos_file, kwargs={'once': once,
                                                               'sleep_time': sleep_time_files,
-                                                              'dataset_queue': dataset_queue}))
+                                                              'dataset_queue': dataset_queue,
+                                                              'touches': touches}))
         thread_list.append(Thread(target=kronos_dataset, kwargs={'once': once,
                                                                  'sleep_time': sleep_time_datasets,
                                                                  'dataset_queue': dataset_queue}))
@@ -535,3 +555,5 @@ def run(
 
     while len(thread_list) > 0:
         thread_list = [thread.join(timeout=3) for thread in thread_list if thread and thread.is_alive()]
+
+    touches.close()
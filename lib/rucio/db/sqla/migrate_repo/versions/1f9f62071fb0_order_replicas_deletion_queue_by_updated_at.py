@@ -0,0 +1,41 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' order the replicas deletion queue by updated_at and drop the replicas rse_id tombstone index '''
+
+from alembic.op import create_index, drop_index
+
+# Alembic revision identifiers
+revision = '1f9f62071fb0'
+down_revision = 'b0e3a2c9d4f1'
+
+
+def upgrade():
+    '''
+    Upgrade the database to this revision
+    '''
+
+    drop_index('REPLICAS_DELETION_QUEUE_IDX', 'replicas')
+    create_index('REPLICAS_DELETION_QUEUE_IDX', 'replicas', ['rse_id', 'lock_cnt', 'tombstone', 'updated_at', 'scope', 'name'])
+    drop_index('REPLICAS_RSE_ID_TOMBSTONE_IDX', 'replicas')
+
+
+def downgrade():
+    '''
+    Downgrade the database to the previous revision
+    '''
+
+    create_index('REPLICAS_RSE_ID_TOMBSTONE_IDX', 'replicas', ['rse_id', 'tombstone'])
+    drop_index('REPLICAS_DELETION_QUEUE_IDX', 'replicas')
+    create_index('REPLICAS_DELETION_QUEUE_IDX', 'replicas', ['rse_id', 'lock_cnt', 'tombstone', 'scope', 'name'])
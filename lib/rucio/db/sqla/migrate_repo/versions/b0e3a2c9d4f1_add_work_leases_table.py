@@ -0,0 +1,57 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' add work_leases table '''
+
+import datetime
+
+import sqlalchemy as sa
+from alembic import context
+from alembic.op import create_check_constraint, create_index, create_primary_key, create_table, drop_table
+
+from rucio.db.sqla.types import GUID
+
+# Alembic revision identifiers
+revision = 'b0e3a2c9d4f1'
+down_revision = 'fa76885b2037'
+
+
+def upgrade():
+    '''
+    Upgrade the database to this revision
+    '''
+
+    if context.get_context().dialect.name in ['oracle', 'mysql', 'postgresql']:
+        create_table('work_leases',
+                     sa.Column('queue', sa.String(64)),
+                     sa.Column('item_id', GUID()),
+                     sa.Column('owner', sa.String(255)),
+                     sa.Column('expires_at', sa.DateTime),
+                     sa.Column('created_at', sa.DateTime, default=datetime.datetime.utcnow),
+                     sa.Column('updated_at', sa.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow))
+        create_primary_key('WORK_LEASES_PK', 'work_leases', ['queue', 'item_id'])
+        create_check_constraint('WORK_LEASES_OWNER_NN', 'work_leases', 'owner is not null')
+        create_check_constraint('WORK_LEASES_EXPIRES_AT_NN', 'work_leases', 'expires_at is not null')
+        create_check_constraint('WORK_LEASES_CREATED_NN', 'work_leases', 'created_at is not null')
+        create_check_constraint('WORK_LEASES_UPDATED_NN', 'work_leases', 'updated_at is not null')
+        create_index('WORK_LEASES_EXPIRES_AT_IDX', 'work_leases', ['queue', 'expires_at'])
+
+
+def downgrade():
+    '''
+    Downgrade the database to the previous revision
+    '''
+
+    if context.get_context().dialect.name in ['oracle', 'mysql', 'postgresql']:
+        drop_table('work_leases')
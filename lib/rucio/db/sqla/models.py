@@ -1109,7 +1109,7 @@ class RSEFileAssociation(BASE, ModelBase):
                    CheckConstraint('lock_cnt IS NOT NULL', name='REPLICAS_LOCK_CNT_NN'),
                    Index('REPLICAS_PATH_IDX', 'path', mysql_length=common_schema.get_schema_value('NAME_LENGTH')),
                    Index('REPLICAS_STATE_IDX', 'state'),
-                   Index('REPLICAS_RSE_ID_TOMBSTONE_IDX', 'rse_id', 'tombstone'))
+                   Index('REPLICAS_DELETION_QUEUE_IDX', 'rse_id', 'lock_cnt', 'tombstone', 'updated_at', 'scope', 'name'))
 
 
 class CollectionReplica(BASE, ModelBase):
@@ -1752,6 +1752,19 @@ class Heartbeat(BASE, ModelBase):
     _table_args = (PrimaryKeyConstraint('executable', 'hostname', 'pid', 'thread_id', name='HEARTBEATS_PK'), )
 
 
+class WorkLease(BASE, ModelBase):
+    """Represents the items of a work queue claimed by a daemon worker until the lease expires"""
+    __tablename__ = 'work_leases'
+    queue: Mapped[str] = mapped_column(String(64))
+    item_id: Mapped[str] = mapped_column(GUID())
+    owner: Mapped[str] = mapped_column(String(255))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+    _table_args = (PrimaryKeyConstraint('queue', 'item_id', name='WORK_LEASES_PK'),
+                   CheckConstraint('OWNER IS NOT NULL', name='WORK_LEASES_OWNER_NN'),
+                   CheckConstraint('EXPIRES_AT IS NOT NULL', name='WORK_LEASES_EXPIRES_AT_NN'),
+                   Index('WORK_LEASES_EXPIRES_AT_IDX', 'queue', 'expires_at'))
+
+
 class NamingConvention(BASE, ModelBase):
     """Represents naming conventions for name within a scope"""
     __tablename__ = 'naming_conventions'
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import logging
+import re
 from datetime import datetime
 from hashlib import sha256
 from os import urandom
@@ -34,12 +35,13 @@ from rucio import alembicrevision
 from rucio.common.cache import MemcacheRegion
 from rucio.common.config import config_get, config_get_list
 from rucio.common.constants import DEFAULT_VO
+from rucio.common.exception import UnsupportedOperation
 from rucio.common.schema import get_schema_value
 from rucio.common.types import InternalAccount, LoggerFunction
 from rucio.common.utils import generate_uuid
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import AccountStatus, AccountType, IdentityType
-from rucio.db.sqla.session import get_dump_engine, get_engine, get_session
+from rucio.db.sqla.session import get_dump_engine, get_engine, get_session, transactional_session
 from rucio.db.sqla.types import InternalScopeString, String
 
 if TYPE_CHECKING:
@@ -564,3 +566,164 @@ def temp_table_mngr(session: "Session") -> TempTableManager:
         mngr = TempTableManager(session)
         session.info[key] = mngr
     return mngr
+
+
+REQUESTS_HISTORY_PARTITION_PREFIX = 'requests_history_'
+
+
+def _month_start(date: datetime, months: int = 0) -> datetime:
+    """ Returns the first day of the month of the given date, shifted by the given number of months. """
+    month = date.year * 12 + date.month - 1 + months
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def _check_partitioning_supported(session: "Session") -> None:
+    if session.bind.dialect.name != 'postgresql':
+        raise UnsupportedOperation('Partitioning of the requests history is only supported on PostgreSQL')
+
+
+def _qualified_name(name: str, session: "Session") -> str:
+    preparer = session.bind.dialect.identifier_preparer
+    schema = models.BASE.metadata.schema
+    return f'{preparer.quote_schema(schema)}.{preparer.quote(name)}' if schema else preparer.quote(name)
+
+
+def _is_requests_history_partitioned(session: "Session") -> bool:
+    stmt = text('SELECT relkind FROM pg_class WHERE oid = CAST(:table AS regclass)')
+    return session.execute(stmt, {'table': _qualified_name(models.RequestHistory.__tablename__, session)}).scalar() == 'p'
+
+
+def _requests_history_partitions(session: "Session") -> dict[str, Optional[datetime]]:
+    """
+    :returns: The names of the partitions of the requests history, with their exclusive upper bound. None for the default partition.
+    """
+    stmt = text('SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE i.inhparent = CAST(:table AS regclass)')
+    partitions = {}
+    for name, bound in session.execute(stmt, {'table': _qualified_name(models.RequestHistory.__tablename__, session)}):
+        match = re.search(r"TO \('([^']+)'\)", bound)
+        partitions[name] = datetime.fromisoformat(match.group(1)) if match else None
+    return partitions
+
+
+def _move_rows(source: str, target: str, condition: str, session: "Session", params: Optional[dict[str, Any]] = None) -> int:
+    """
+    Move the rows matching the condition between two tables with the same columns, in the same order.
+
+    :returns: The number of moved rows.
+    """
+    stmt = text(f'WITH moved AS (DELETE FROM {source} WHERE {condition} RETURNING *) INSERT INTO {target} SELECT * FROM moved')
+    return session.execute(stmt, params or {}).rowcount
+
+
+@transactional_session
+def partition_requests_history(months_ahead: int = 2, *, session: "Session") -> bool:
+    """
+    Convert the requests history into a table partitioned by month on created_at, so that old requests
+    can be removed by dropping whole partitions. Only supported on PostgreSQL.
+
+    The existing table becomes the partition of all the requests created before the first monthly
+    partition. A default partition receives the requests which don't fall in any monthly partition,
+    including the ones without created_at.
+
+    :param months_ahead: Number of monthly partitions to create after the current month.
+    :param session:      The database session in use.
+    :returns:            False if the table was already partitioned.
+    """
+    _check_partitioning_supported(session)
+    if _is_requests_history_partitioned(session):
+        return False
+
+    preparer = session.bind.dialect.identifier_preparer
+    name = models.RequestHistory.__tablename__
+    table = _qualified_name(name, session)
+    legacy_name = f'{REQUESTS_HISTORY_PARTITION_PREFIX}legacy'
+    last_created_at = session.execute(text(f'SELECT MAX(created_at) FROM {table}')).scalar()
+    first_month = _month_start(last_created_at, 1) if last_created_at else _month_start(datetime.utcnow())
+    indexes = inspect(session.connection()).get_indexes(name, schema=models.BASE.metadata.schema)
+
+    session.execute(text(f'ALTER TABLE {table} RENAME TO {preparer.quote(legacy_name)}'))
+    for index in indexes:
+        session.execute(text(f'ALTER INDEX {_qualified_name(index["name"], session)} RENAME TO {preparer.quote(index["name"] + "_legacy")}'))
+    session.execute(text(f'CREATE TABLE {table} (LIKE {_qualified_name(legacy_name, session)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                         'PARTITION BY RANGE (created_at)'))
+    default_table = _qualified_name(f'{REQUESTS_HISTORY_PARTITION_PREFIX}default', session)
+    session.execute(text(f'CREATE TABLE {default_table} PARTITION OF {table} DEFAULT'))
+    # A NULL partition key only fits in the default partition: the legacy one could not be attached with these rows
+    moved = _move_rows(_qualified_name(legacy_name, session), default_table, 'created_at IS NULL', session)
+    if moved:
+        LOG.info('Moved %d requests without created_at to the default partition of the requests history', moved)
+    session.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {_qualified_name(legacy_name, session)} "
+                         f"FOR VALUES FROM (MINVALUE) TO ('{first_month.isoformat(sep=' ')}')"))
+    for index in indexes:
+        # The equivalent index of the legacy partition is attached to the new one
+        session.execute(text(f'CREATE INDEX {preparer.quote(index["name"])} ON {table} '
+                             f'({", ".join(preparer.quote(column) for column in index["column_names"])})'))
+    create_requests_history_partitions(months_ahead=months_ahead, session=session)
+    return True
+
+
+@transactional_session
+def create_requests_history_partitions(months_ahead: int = 2, *, session: "Session") -> list[str]:
+    """
+    Create the missing monthly partitions of the requests history, up to the given number of months
+    after the current one. Must be run regularly on a partitioned requests history.
+
+    The requests of the default partition which belong to a new partition are moved into it.
+
+    :param months_ahead: Number of monthly partitions to create after the current month.
+    :param session:      The database session in use.
+    :returns:            The names of the created partitions.
+    """
+    _check_partitioning_supported(session)
+    if not _is_requests_history_partitioned(session):
+        raise UnsupportedOperation('The requests history is not partitioned')
+
+    table = _qualified_name(models.RequestHistory.__tablename__, session)
+    partitions = _requests_history_partitions(session)
+    start = max(bound for bound in partitions.values() if bound is not None)
+    default_table = next((_qualified_name(name, session) for name, bound in partitions.items() if bound is None), None)
+    created = []
+    while start < _month_start(datetime.utcnow(), months_ahead + 1):
+        end = _month_start(start, 1)
+        name = f'{REQUESTS_HISTORY_PARTITION_PREFIX}{start:%Y%m}'
+        partition = _qualified_name(name, session)
+        bounds = f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+        params = {'start': start, 'end': end}
+        in_range = 'created_at >= :start AND created_at < :end'
+        if default_table and session.execute(text(f'SELECT 1 FROM {default_table} WHERE {in_range} LIMIT 1'), params).scalar():
+            # Creating the partition would fail: move these requests into it, then attach it
+            session.execute(text(f'CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+            moved = _move_rows(default_table, partition, in_range, session, params)
+            session.execute(text(f'ALTER TABLE {table} ATTACH PARTITION {partition} {bounds}'))
+            LOG.info('Moved %d requests from the default partition of the requests history to %s', moved, name)
+        else:
+            session.execute(text(f'CREATE TABLE {partition} PARTITION OF {table} {bounds}'))
+        created.append(name)
+        start = end
+    return created
+
+
+@transactional_session
+def drop_requests_history_partitions(older_than: datetime, *, session: "Session") -> list[str]:
+    """
+    Drop the partitions of the requests history which only contain requests created before the given date.
+
+    :param older_than: Date before which the requests history can be removed.
+    :param session:    The database session in use.
+    :returns:          The names of the dropped partitions.
+    """
+    _check_partitioning_supported(session)
+    if not _is_requests_history_partitioned(session):
+        raise UnsupportedOperation('The requests history is not partitioned')
+
+    table = _qualified_name(models.RequestHistory.__tablename__, session)
+    dropped = []
+    for name, bound in sorted(_requests_history_partitions(session).items(), key=lambda partition: partition[1] or datetime.max):
+        if bound is None or bound > older_than:
+            continue
+        session.execute(text(f'ALTER TABLE {table} DETACH PARTITION {_qualified_name(name, session)}'))
+        session.execute(text(f'DROP TABLE {_qualified_name(name, session)}'))
+        LOG.info('Dropped partition %s of the requests history', name)
+        dropped.append(name)
+    return dropped
@@ -12,15 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import copy
+import time
+from contextlib import contextmanager
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import and_, delete, exists, select
+from sqlalchemy import and_, delete, event, exists, select
 from sqlalchemy.orm import Session, aliased
 
 from rucio.core import config as core_config
 from rucio.core.vo import map_vo
 from rucio.db.sqla import models
-from rucio.db.sqla.session import get_session, transactional_session
+from rucio.db.sqla.session import get_engine, get_session, transactional_session
 
 from .common import get_long_vo
 
@@ -152,3 +154,48 @@ def get_vo() -> str:
     :returns: VO name string.
     """
     return map_vo(get_long_vo())
+
+
+class QueryCounter:
+    """
+    Records the SQL statements sent to the database while active, and their durations.
+    """
+
+    def __init__(self):
+        self.statements: list[str] = []
+        self.durations: list[float] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def matching(self, fragment: str) -> int:
+        """
+        Number of recorded statements containing the given (case-insensitive) fragment
+        """
+        return sum(1 for s in self.statements if fragment.lower() in s.lower())
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+        conn.info.setdefault('query_counter_start', []).append(time.perf_counter())
+
+    def _on_executed(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        starts = conn.info.get('query_counter_start')
+        if starts:
+            self.durations.append(time.perf_counter() - starts.pop())
+
+
+@contextmanager
+def count_queries() -> "Iterator[QueryCounter]":
+    """
+    Context manager counting the database round trips done by the code in its body.
+    """
+    counter = QueryCounter()
+    engine = get_engine()
+    event.listen(engine, 'before_cursor_execute', counter._on_execute)
+    event.listen(engine, 'after_cursor_execute', counter._on_executed)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._on_execute)
+        event.remove(engine, 'after_cursor_execute', counter._on_executed)
@@ -16,6 +16,7 @@ import datetime
 import json
 import logging
 import pathlib
+import threading
 import traceback
 import uuid
 from configparser import NoOptionError, NoSectionError
@@ -110,6 +111,8 @@ _SCITAGS_NEXT_REFRESH = datetime.datetime.utcnow()
 _SCITAGS_EXP_ID = None
 _SCITAGS_ACTIVITY_IDS = {}
 
+_HTTP_SESSIONS = threading.local()
+
 FTS_FILE_EXISTS_ERROR_MSG = 'Destination file exists and is on tape'  # used in FTS  >= 3.12.12
 FTS_FILE_EXISTS_ERROR_MSG_LEGACY = 'Destination file exists and overwrite is not enabled'  # Error message used in FTS < 3.12.12, checked in Rucio for backwards compatibility
 
@@ -165,6 +168,23 @@ def _scitags_ids(logger: "LoggerFunction" = logging.log) -> "tuple[int | None, d
     return _SCITAGS_EXP_ID, _SCITAGS_ACTIVITY_IDS
 
 
+def _http_session(external_host: str) -> requests.Session:
+    """
+    Return the keep-alive HTTP session of the calling thread towards the given FTS host.
+
+    The sessions outlive the transfertool objects, which are re-created at each submission cycle,
+    so that consecutive submissions to the same host reuse the established TLS connection.
+    requests.Session is not guaranteed to be thread-safe, hence one session per thread.
+    """
+    sessions = getattr(_HTTP_SESSIONS, 'by_host', None)
+    if sessions is None:
+        sessions = _HTTP_SESSIONS.by_host = {}
+    session = sessions.get(external_host)
+    if session is None:
+        session = sessions[external_host] = requests.Session()
+    return session
+
+
 def _pick_cert_file(vo: Optional[str]) -> Optional[str]:
     cert = None
     if vo:
@@ -696,8 +716,8 @@ class FTS3CompletionMessageTransferStatusReport(Fts3TransferStatusReport):
     """
     Parses FTS Completion messages received via the message queue
     """
-    def __init__(self, external_host: str, request_id: str, fts_message: dict[str, Any]):
-        super().__init__(external_host=external_host, request_id=request_id)
+    def __init__(self, external_host: str, request_id: str, fts_message: dict[str, Any], request: Optional[dict[str, Any]] = None):
+        super().__init__(external_host=external_host, request_id=request_id, request=request)
 
         self.fts_message = fts_message
 
@@ -1081,12 +1101,12 @@ class FTS3Transfertool(Transfertool):
         post_result = None
         stopwatch = Stopwatch()
         try:
-            post_result = requests.post('%s/jobs' % self.external_host,
-                                        verify=self.verify,
-                                        cert=self.cert,
-                                        data=params_str,
-                                        headers=self.headers,
-                                        timeout=timeout)
+            post_result = _http_session(self.external_host).post('%s/jobs' % self.external_host,
+                                                                 verify=self.verify,
+                                                                 cert=self.cert,
+                                                                 data=params_str,
+                                                                 headers=self.headers,
+                                                                 timeout=timeout)
             labels = {'host': self.__extract_host(self.external_host)}
             METRICS.timer('submit_transfer.{host}').labels(**labels).observe(stopwatch.elapsed / (len(files) or 1))
         except ReadTimeout as error:
@@ -105,6 +105,7 @@ server_requirements_table = {
             'PyYAML<=6.0.3',
             'globus-sdk<=4.8.1',
         ],
+        'numpy': ['numpy<=2.0.2'],
         'dev': dev_requirements
     }
 }
@@ -19,7 +19,7 @@ from dogpile.cache.backends.null import NullBackend
 from dogpile.cache.util import function_key_generator
 
 import rucio.common.cache as cache
-from rucio.common.cache import CacheKey, MemcacheRegion
+from rucio.common.cache import CacheKey, LRUCache, MemcacheRegion
 
 
 class TestCache:
@@ -94,3 +94,36 @@ class TestCache:
         def test_value(self):
             expected = "get_test_test2"
             assert CacheKey.value(self.section, self.option) == expected
+
+    class TestLRUCache:
+        def test_eviction_order(self):
+            lru = LRUCache(maxsize=2)
+            lru.set('a', 1)
+            lru.set('b', 2)
+            assert lru.get('a') == 1  # 'a' becomes the most recently used
+            lru.set('c', 3)
+            assert 'b' not in lru
+            assert lru.get('a') == 1
+            assert lru.get('c') == 3
+            assert len(lru) == 2
+
+        def test_hits_and_misses(self):
+            lru = LRUCache(maxsize=10)
+            assert lru.get('missing') is None
+            lru.set('key', 'value')
+            assert lru.get('key') == 'value'
+            assert (lru.hits, lru.misses) == (1, 1)
+
+        def test_delete_matching(self):
+            lru = LRUCache(maxsize=10)
+            lru.set(('rse1', 'wan'), 1)
+            lru.set(('rse1', 'lan'), 2)
+            lru.set(('rse2', 'wan'), 3)
+            lru.delete_matching(lambda key: key[0] == 'rse1')
+            assert len(lru) == 1
+            assert lru.get(('rse2', 'wan')) == 3
+
+        def test_disabled(self):
+            lru = LRUCache(maxsize=0)
+            lru.set('key', 'value')
+            assert lru.get('key') is None
@@ -0,0 +1,46 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from rucio.common.file_columns import FileColumns
+from rucio.common.types import InternalScope
+
+
+class TestFileColumns:
+
+    def test_sequence_of_file_dicts(self):
+        files = [{'scope': InternalScope('mock', vo='def'), 'name': f'file_{i}', 'bytes': i, 'md5': None, 'adler32': f'{i:08x}'} for i in range(5)]
+        files.append({'scope': InternalScope('user.jdoe', vo='def'), 'name': 'no_size', 'bytes': None, 'md5': None, 'adler32': None})
+        columns = FileColumns(files)
+
+        assert len(columns) == 6
+        assert list(columns) == files
+        assert columns[0] == files[0]
+        assert columns[-1] == files[-1]
+        assert columns[1:3] == files[1:3]
+        assert columns.total_bytes() == 10
+        with pytest.raises(IndexError):
+            columns[6]
+
+    def test_scopes_are_interned(self):
+        columns = FileColumns()
+        first = columns.append(InternalScope('mock', vo='def'), 'file_1', 1, None, None)
+        second = columns.append(InternalScope('mock', vo='def'), 'file_2', 1, None, None)
+        other = columns.append(InternalScope('mock', vo='tst'), 'file_3', 1, None, None)
+
+        assert first is second
+        assert other is not first
+        assert columns[1]['scope'] is first
+        assert columns[2]['scope'] == InternalScope('mock', vo='tst')
@@ -16,11 +16,11 @@ import threading
 import time
 from datetime import datetime, timedelta
 from tempfile import TemporaryDirectory
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import pytest
-from sqlalchemy import and_, delete, select, update
+from sqlalchemy import and_, delete, insert, select, update
 
 import rucio.daemons.reaper.reaper
 from rucio.common.checksum import adler32
@@ -39,7 +39,7 @@ from rucio.core import rse as rse_core
 from rucio.core import rule as rule_core
 from rucio.core.account_limit import set_local_account_limit
 from rucio.daemons.conveyor.finisher import finisher
-from rucio.daemons.conveyor.poller import poller
+from rucio.daemons.conveyor.poller import PollScheduler, poller
 from rucio.daemons.conveyor.preparer import preparer
 from rucio.daemons.conveyor.receiver import GRACEFUL_STOP as RECEIVER_GRACEFUL_STOP
 from rucio.daemons.conveyor.receiver import Receiver, receiver
@@ -1030,6 +1030,68 @@ def test_failed_transfers_to_mas_existing_replica(rse_factory, did_factory, root
     assert rule_core.get_rule(rule2_id)['state'] == RuleState.STUCK
 
 
+@pytest.mark.noparallel(groups=[NoParallelGroups.FINISHER])
+@pytest.mark.parametrize("file_config_mock", [
+    {"overrides": [('conveyor', 'finisher_bulk_mode', 'True')]},
+    {"overrides": [('conveyor', 'finisher_bulk_mode', 'False')]},
+], indirect=True)
+def test_finisher_rule_and_lock_transitions(rse_factory, did_factory, root_account, file_config_mock):
+    """
+    The finisher updates the replicas, locks and rules of several terminated requests and archives them,
+    with and without the set-based updates of the bulk mode
+    """
+    _, src_rse_id = rse_factory.make_mock_rse()
+    dst1_rse, dst1_rse_id = rse_factory.make_mock_rse()
+    dst2_rse, dst2_rse_id = rse_factory.make_mock_rse()
+
+    dataset = did_factory.make_dataset()
+    files = [did_factory.random_file_did() for _ in range(4)]
+    replica_core.add_replicas(rse_id=src_rse_id, files=[{**file, 'bytes': 1, 'adler32': 'beefdead'} for file in files], account=root_account)
+    did_core.attach_dids(dids=files, account=root_account, **dataset)
+
+    dataset_rule_id = rule_core.add_rule(dids=[dataset], account=root_account, copies=1, rse_expression=dst1_rse, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+    ok_rule_id = rule_core.add_rule(dids=files[:1], account=root_account, copies=1, rse_expression=dst2_rse, grouping='NONE', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+    stuck_rule_id = rule_core.add_rule(dids=files[1:2], account=root_account, copies=1, rse_expression=dst2_rse, grouping='NONE', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+
+    for file in files:
+        request = request_core.get_request_by_did(rse_id=dst1_rse_id, **file)
+        request_core.transition_request_state(request_id=request['id'], state=RequestState.DONE)
+    request = request_core.get_request_by_did(rse_id=dst2_rse_id, **files[0])
+    request_core.transition_request_state(request_id=request['id'], state=RequestState.DONE)
+    request = request_core.get_request_by_did(rse_id=dst2_rse_id, **files[1])
+    request_core.transition_request_state(request_id=request['id'], state=RequestState.NO_SOURCES)
+
+    finisher(once=True, partition_wait_time=0)
+
+    rule = rule_core.get_rule(dataset_rule_id)
+    assert rule['state'] == RuleState.OK
+    assert (rule['locks_ok_cnt'], rule['locks_replicating_cnt'], rule['locks_stuck_cnt']) == (4, 0, 0)
+    assert all(lock['state'] == LockState.OK for lock in lock_core.get_replica_locks_for_rule_id(rule_id=dataset_rule_id))
+    assert [lock['state'] for lock in lock_core.get_dataset_locks(**dataset)] == [LockState.OK]
+    with db_session(DatabaseOperationType.READ) as session:
+        stmt = select(models.UpdatedCollectionReplica).where(and_(models.UpdatedCollectionReplica.scope == dataset['scope'],
+                                                                  models.UpdatedCollectionReplica.name == dataset['name'],
+                                                                  models.UpdatedCollectionReplica.rse_id == dst1_rse_id))
+        assert session.execute(stmt).first()
+    for file in files:
+        assert replica_core.get_replica(rse_id=dst1_rse_id, **file)['state'] == ReplicaState.AVAILABLE
+        with pytest.raises(RequestNotFound):
+            request_core.get_request_by_did(rse_id=dst1_rse_id, **file)
+        assert request_core.get_request_history_by_did(rse_id=dst1_rse_id, **file)['state'] == RequestState.DONE
+
+    rule = rule_core.get_rule(ok_rule_id)
+    assert rule['state'] == RuleState.OK
+    assert replica_core.get_replica(rse_id=dst2_rse_id, **files[0])['state'] == ReplicaState.AVAILABLE
+
+    rule = rule_core.get_rule(stuck_rule_id)
+    assert rule['state'] == RuleState.STUCK
+    assert (rule['locks_ok_cnt'], rule['locks_replicating_cnt'], rule['locks_stuck_cnt']) == (0, 0, 1)
+    assert rule['error'] == request_core.get_transfer_error(RequestState.NO_SOURCES)
+    assert lock_core.get_replica_locks_for_rule_id(rule_id=stuck_rule_id)[0]['state'] == LockState.STUCK
+    assert replica_core.get_replica(rse_id=dst2_rse_id, **files[1])['state'] == ReplicaState.UNAVAILABLE
+    assert request_core.get_request_history_by_did(rse_id=dst2_rse_id, **files[1])['state'] == RequestState.NO_SOURCES
+
+
 @skip_rse_tests_with_accounts
 @pytest.mark.noparallel(groups=[NoParallelGroups.SUBMITTER, NoParallelGroups.POLLER, NoParallelGroups.FINISHER])
 def test_lost_transfers(rse_factory, did_factory, root_account):
@@ -1811,3 +1873,133 @@ def test_bittorrent_submission(did_factory, root_account, vo, download_client, f
             'no_subdir': True,
         }])
         assert adler32(f'{tmp_dir}/{did["name"]}') == did_core.get_did(**did)['adler32']
+
+
+def test_poll_scheduler_backoff():
+    """
+    Jobs in which nothing changes are polled less and less often, but never less often
+    than a fraction of their age. Unknown jobs are always due.
+    """
+    scheduler = PollScheduler(min_interval=60, max_interval=3600, age_factor=0.5)
+    old_job = {'external_host': TEST_FTS_HOST, 'external_id': 'old', 'submitted_at': datetime.utcnow() - timedelta(days=2)}
+    young_job = {'external_host': TEST_FTS_HOST, 'external_id': 'young', 'submitted_at': datetime.utcnow() - timedelta(seconds=90)}
+    assert scheduler.filter_due([old_job, young_job]) == [old_job, young_job]
+
+    with patch('rucio.daemons.conveyor.poller.time.monotonic') as monotonic:
+        monotonic.return_value = 0
+        for job in (old_job, young_job):
+            scheduler.polled(TEST_FTS_HOST, job['external_id'], submitted_at=job['submitted_at'], changed=False, finished=False)
+
+        # 60s after the first poll, both jobs are due again
+        monotonic.return_value = 60
+        assert scheduler.filter_due([old_job, young_job]) == [old_job, young_job]
+        for job in (old_job, young_job):
+            scheduler.polled(TEST_FTS_HOST, job['external_id'], submitted_at=job['submitted_at'], changed=False, finished=False)
+
+        # The interval of the old job doubled, the one of the young job is capped by its age
+        monotonic.return_value = 120
+        assert scheduler.filter_due([old_job, young_job]) == [young_job]
+        monotonic.return_value = 180
+        assert scheduler.filter_due([old_job, young_job]) == [old_job, young_job]
+
+        # A state change resets the backoff; a finished job is forgotten
+        scheduler.polled(TEST_FTS_HOST, 'old', submitted_at=old_job['submitted_at'], changed=True, finished=False)
+        scheduler.polled(TEST_FTS_HOST, 'young', submitted_at=young_job['submitted_at'], changed=True, finished=True)
+        assert len(scheduler) == 1
+        monotonic.return_value = 240
+        assert scheduler.filter_due([old_job]) == [old_job]
+
+
+def test_receiver_coalesce_messages():
+    """
+    Duplicated messages are applied once; out-of-order messages are applied in completion order,
+    and only the message of the job currently associated with the request is kept.
+    """
+    def _msg(request_id, tr_id, state, completed_at):
+        return {'file_metadata': {'request_id': request_id}, 'tr_id': '2024-01-01-0000__%s' % tr_id,
+                't_final_transfer_state': state, 'tr_timestamp_complete': completed_at}
+
+    receiver_obj = Receiver(broker='broker', id_='0', total_threads=1, transfer_stats_manager=None)  # type: ignore
+    first_attempt = _msg('req1', 'job1', 'Error', 1000)
+    second_attempt = _msg('req1', 'job2', 'Ok', 2000)
+    other_request = _msg('req2', 'job3', 'Ok', 1500)
+    msgs_by_request_id = receiver_obj._coalesce([second_attempt, other_request, first_attempt, dict(other_request)])
+
+    assert msgs_by_request_id == {'req1': [first_attempt, second_attempt], 'req2': [other_request]}
+
+    receiver_obj._prefetched_requests = {'req1': {'id': 'req1', 'external_id': 'job1'}}
+    assert receiver_obj._pick_message('req1', msgs_by_request_id['req1']) is first_attempt
+    receiver_obj._prefetched_requests = {'req1': {'id': 'req1', 'external_id': 'job2'}}
+    assert receiver_obj._pick_message('req1', msgs_by_request_id['req1']) is second_attempt
+    assert receiver_obj._pick_message('req2', msgs_by_request_id['req2']) is other_request
+
+
+def test_receiver_batch_failures():
+    """
+    A message which fails to apply only rolls back its own changes; if the whole batch fails, its messages
+    are applied one by one. The transfer statistics of each message are recorded exactly once, and the
+    messages are acknowledged once applied.
+    """
+    event_type = 'receiver-test-%s' % generate_uuid()
+    request_ids = [generate_uuid() for _ in range(5)]
+    bad_request_id = request_ids[1]
+    stats_manager = MagicMock()
+
+    class StatusReport:
+        def __init__(self, external_host, request_id, fts_message, request):
+            self.request_id = request_id
+
+        def get_db_fields_to_update(self, session, logger):
+            return {'state': RequestState.DONE}
+
+    def _update_transfer_state(tt_status_report, stats_manager, session, logger):
+        session.execute(insert(models.Message).values(event_type=event_type, payload=tt_status_report.request_id, services='test'))
+        if tt_status_report.request_id == bad_request_id:
+            raise RuntimeError('failed to update the request')
+        stats_manager.observe(src_rse_id='src', dst_rse_id='dst', activity='test', state=RequestState.DONE, file_size=1, session=session)
+        return 1
+
+    def _applied():
+        with db_session(DatabaseOperationType.READ) as session:
+            stmt = select(models.Message.payload).where(models.Message.event_type == event_type)
+            return sorted(session.execute(stmt).scalars())
+
+    def _batch(request_ids):
+        return [({'file_metadata': {'request_id': request_id}, 'tr_id': '2024-01-01-0000__%s' % request_id, 'tr_timestamp_complete': 1000},
+                 time.monotonic(), 'ack-%s' % request_id) for request_id in request_ids]
+
+    conn = MagicMock()
+    receiver_obj = Receiver(broker='broker', id_='0', total_threads=1, transfer_stats_manager=stats_manager, conn=conn)
+    with patch('rucio.daemons.conveyor.receiver.FTS3CompletionMessageTransferStatusReport', StatusReport), \
+            patch('rucio.core.transfer.update_transfer_state', side_effect=_update_transfer_state) as update_transfer_state:
+        receiver_obj._apply_batch(_batch(request_ids[:3]))
+        assert update_transfer_state.call_count == 3
+        assert _applied() == sorted([request_ids[0], request_ids[2]])
+        assert stats_manager.observe.call_count == 2
+        assert [call.args[0] for call in conn.ack.call_args_list] == ['ack-%s' % request_id for request_id in request_ids[:3]]
+
+        # the batch fails before applying any message; the messages are picked again and applied one by one
+        pick_message = Receiver._pick_message
+        picked = []
+
+        def _pick_message(self, request_id, msgs):
+            picked.append(request_id)
+            if len(picked) == 1:
+                raise RuntimeError('failed to apply the batch')
+            return pick_message(self, request_id, msgs)
+
+        with patch.object(Receiver, '_pick_message', _pick_message):
+            receiver_obj._apply_batch(_batch(request_ids[3:]))
+        assert picked == [request_ids[3], request_ids[3], request_ids[4]]
+        assert update_transfer_state.call_count == 5
+        assert _applied() == sorted([request_ids[0], *request_ids[2:]])
+        assert stats_manager.observe.call_count == 4
+        assert conn.ack.call_count == 5
+
+        # the messages which cannot be applied at all are negatively acknowledged
+        with patch('rucio.core.request.get_requests', side_effect=RuntimeError('database unavailable')), \
+                pytest.raises(RuntimeError):
+            receiver_obj._apply_batch(_batch(request_ids[:1]))
+        assert update_transfer_state.call_count == 5
+        assert conn.ack.call_count == 5
+        assert [call.args[0] for call in conn.nack.call_args_list] == ['ack-%s' % request_ids[0]]
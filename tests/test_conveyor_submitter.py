@@ -13,6 +13,10 @@
 # limitations under the License.
 
 import itertools
+import json
+import threading
+import time
+from concurrent.futures import wait
 from datetime import datetime, timedelta
 from random import randint
 from unittest.mock import patch
@@ -22,17 +26,21 @@ from sqlalchemy import and_, delete, func, select, update
 
 from rucio.common.constants import RseAttr
 from rucio.common.exception import RequestNotFound
+from rucio.common.utils import generate_uuid
 from rucio.core import config as core_config
 from rucio.core import distance as distance_core
 from rucio.core import replica as replica_core
 from rucio.core import request as request_core
 from rucio.core import rse as rse_core
 from rucio.core import rule as rule_core
+from rucio.daemons.conveyor.common import SubmissionPool
 from rucio.daemons.conveyor.submitter import submitter
 from rucio.daemons.reaper.reaper import reaper
 from rucio.db.sqla.constants import DatabaseOperationType, RequestState
 from rucio.db.sqla.models import Request, Source
 from rucio.db.sqla.session import db_session
+from rucio.transfertool.fts3 import FTS3Transfertool, _http_session
+from tests.mocks.mock_http_server import MockServer
 from tests.ruciopytest import NoParallelGroups
 
 
@@ -486,3 +494,124 @@ def test_hop_penalty(rse_factory, did_factory, root_account, file_config_mock, c
     request_core.get_request_by_did(rse_id=rse2_id, **did)
     with pytest.raises(RequestNotFound):
         request_core.get_request_by_did(rse_id=rse5_id, **did)
+
+
+def test_submission_pool_isolates_slow_hosts():
+    """
+    A host which doesn't answer only delays the jobs queued for it. The jobs for other hosts
+    are submitted meanwhile, reusing the same keep-alive connection.
+    """
+    release_slow_host = threading.Event()
+    client_addresses = []
+
+    class _FtsHandler(MockServer.Handler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.server.server_port == slow_fts.server.server_port:
+                release_slow_host.wait(timeout=30)
+            else:
+                client_addresses.append(self.client_address)
+            body = json.dumps({'job_id': self.client_address[1]})
+            self.send_code_and_message(200, {'Content-Length': str(len(body))}, body)
+
+    def _submit_job(external_host):
+        return _http_session(external_host).post('%s/jobs' % external_host, data='{}', timeout=30).json()['job_id']
+
+    pool = SubmissionPool(max_workers_per_host=1)
+    with MockServer(_FtsHandler) as slow_fts, MockServer(_FtsHandler) as fast_fts:
+        try:
+            slow_jobs = [pool.submit(slow_fts.base_url, _submit_job, slow_fts.base_url) for _ in range(3)]
+            fast_jobs = [pool.submit(fast_fts.base_url, _submit_job, fast_fts.base_url) for _ in range(5)]
+
+            _, not_done = wait(fast_jobs, timeout=10)
+            assert not not_done
+            assert not any(job.done() for job in slow_jobs)
+            assert pool.queue_depth(slow_fts.base_url) == 3
+            assert pool.queue_depth(fast_fts.base_url) == 0
+            # all submissions to the fast host went through a single connection
+            assert len(set(client_addresses)) == 1
+        finally:
+            release_slow_host.set()
+            pool.shutdown()
+        assert all(job.result() for job in slow_jobs)
+        assert pool.queue_depth(slow_fts.base_url) == 0
+
+
+@pytest.mark.noparallel(groups=[NoParallelGroups.SUBMITTER])
+def test_submitter_pool_submits_to_fts_hosts_concurrently(rse_factory, did_factory, root_account):
+    """
+    The submitter hands the jobs of a batch to the per-host pool: the shared FTS3 transfertool
+    of each host submits from the pool threads, the jobs towards a responsive host go through
+    while another host hangs, and the submitter only returns once the whole batch is submitted.
+    """
+    release_slow_host = threading.Event()
+
+    class _FtsHandler(MockServer.Handler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.server.server_port == slow_fts.server.server_port:
+                release_slow_host.wait(timeout=30)
+            body = json.dumps({'job_id': generate_uuid()})
+            self.send_code_and_message(200, {'Content-Length': str(len(body))}, body)
+
+    submit_calls = []
+    fts3_submit = FTS3Transfertool.submit
+
+    def _recording_submit(self, *args, **kwargs):
+        submit_calls.append((self.external_host, id(self), threading.current_thread().name))
+        return fts3_submit(self, *args, **kwargs)
+
+    with MockServer(_FtsHandler) as slow_fts, MockServer(_FtsHandler) as fast_fts:
+        src_rse, src_rse_id = rse_factory.make_mock_rse()
+        slow_rse, slow_rse_id = rse_factory.make_mock_rse()
+        fast_rse, fast_rse_id = rse_factory.make_mock_rse()
+        all_rses = [src_rse_id, slow_rse_id, fast_rse_id]
+        rse_core.add_rse_attribute(src_rse_id, RseAttr.FTS, fast_fts.base_url)
+        rse_core.add_rse_attribute(slow_rse_id, RseAttr.FTS, slow_fts.base_url)
+        rse_core.add_rse_attribute(fast_rse_id, RseAttr.FTS, fast_fts.base_url)
+        for dst_rse_id in (slow_rse_id, fast_rse_id):
+            distance_core.add_distance(src_rse_id, dst_rse_id, distance=10)
+
+        dids = {slow_rse_id: [], fast_rse_id: []}
+        for dst_rse, dst_rse_id in ((slow_rse, slow_rse_id), (fast_rse, fast_rse_id)):
+            for _ in range(3):
+                did = did_factory.random_file_did()
+                replica_core.add_replica(rse_id=src_rse_id, account=root_account, bytes_=1, **did)
+                rule_core.add_rule(dids=[did], account=root_account, copies=1, rse_expression=dst_rse, grouping='ALL', weight=None, lifetime=None, locked=False, subscription_id=None)
+                dids[dst_rse_id].append(did)
+
+        def _states(rse_id):
+            return [request_core.get_request_by_did(rse_id=rse_id, **did)['state'] for did in dids[rse_id]]
+
+        with patch.object(FTS3Transfertool, 'submit', _recording_submit):
+            submitter_thread = threading.Thread(target=submitter, kwargs={
+                'once': True, 'rses': [{'id': rse_id} for rse_id in all_rses], 'group_bulk': 1, 'partition_wait_time': None,
+                'transfertools': ['fts3'], 'transfertype': 'single', 'ignore_availability': True,
+            })
+            submitter_thread.start()
+            try:
+                deadline = time.monotonic() + 30
+                while time.monotonic() < deadline and _states(fast_rse_id) != [RequestState.SUBMITTED] * 3:
+                    time.sleep(0.1)
+                assert _states(fast_rse_id) == [RequestState.SUBMITTED] * 3
+                # the consumer still waits for the jobs stuck on the slow host
+                assert submitter_thread.is_alive()
+                assert RequestState.SUBMITTED not in _states(slow_rse_id)
+            finally:
+                release_slow_host.set()
+                submitter_thread.join(timeout=60)
+        assert not submitter_thread.is_alive()
+
+    assert _states(slow_rse_id) == [RequestState.SUBMITTED] * 3
+    for dst_rse_id, fts in ((slow_rse_id, slow_fts), (fast_rse_id, fast_fts)):
+        for did in dids[dst_rse_id]:
+            request = request_core.get_request_by_did(rse_id=dst_rse_id, **did)
+            assert request['external_host'] == fts.base_url
+            assert request['external_id']
+        calls = [call for call in submit_calls if call[0] == fts.base_url]
+        assert len(calls) == 3
+        # one transfertool object per host, shared by the pool threads which submit its jobs
+        assert len({transfertool_id for _, transfertool_id, _ in calls}) == 1
+        assert all(thread_name.startswith('submit-') for _, _, thread_name in calls)
@@ -12,17 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import threading
+import time
+from types import SimpleNamespace
 from unittest import mock
 
 import pytest
+from sqlalchemy import select
 
 import rucio.db.sqla.util
 from rucio.common import exception
+from rucio.common.utils import generate_uuid
+from rucio.core import heartbeat
+from rucio.core.config import set as config_set
 from rucio.daemons.abacus import account, collection_replica, rse
 from rucio.daemons.atropos import atropos
 from rucio.daemons.automatix import automatix
 from rucio.daemons.badreplicas import minos, minos_temporary_expiration, necromancer
 from rucio.daemons.cache import consumer
+from rucio.daemons.common import AdaptiveSleep, CycleProfiler, HeartbeatHandler, QueryLatency, run_processes
 from rucio.daemons.conveyor import finisher, poller, preparer, receiver, stager, submitter, throttler
 from rucio.daemons.follower import follower
 from rucio.daemons.hermes import hermes
@@ -32,6 +41,8 @@ from rucio.daemons.replicarecoverer import suspicious_replica_recoverer
 from rucio.daemons.tracer import kronos
 from rucio.daemons.transmogrifier import transmogrifier
 from rucio.daemons.undertaker import undertaker
+from rucio.db.sqla import models
+from rucio.db.sqla.session import get_session
 
 DAEMONS = [
     account,
@@ -78,3 +89,173 @@ def test_fail_on_old_database(mock_is_old_db, daemon):
         daemon.run()
 
     assert mock_is_old_db.call_count > 1
+
+
+GRACEFUL_STOP = threading.Event()
+
+
+def _stop():
+    GRACEFUL_STOP.set()
+
+
+def _write_pid_and_wait(path):
+    with open(path, 'a') as f:
+        f.write(f'{os.getpid()}\n')
+    GRACEFUL_STOP.wait()
+
+
+def test_run_processes(tmp_path):
+    """ DAEMON: Test running a daemon function in several processes stopped together """
+    path = tmp_path / 'pids'
+    graceful_stop = threading.Event()
+    parent = threading.Thread(target=run_processes, kwargs={'target': _write_pid_and_wait, 'stop_fnc': _stop, 'processes': 2,
+                                                            'graceful_stop': graceful_stop, 'process_name': 'test-processes',
+                                                            'kwargs': {'path': str(path)}})
+    parent.start()
+    deadline = time.time() + 120
+    while time.time() < deadline and not (path.exists() and len(path.read_text().split()) == 2):
+        time.sleep(0.1)
+    graceful_stop.set()
+    parent.join(timeout=60)
+
+    assert not parent.is_alive()
+    pids = set(path.read_text().split())
+    assert len(pids) == 2
+    assert str(os.getpid()) not in pids
+
+
+def test_adaptive_sleep():
+    """ DAEMON: Test the backoff, immediate re-runs and backpressure of adaptive sleeps """
+    latency = SimpleNamespace(value=0.01)
+    policy = AdaptiveSleep(sleep_time=10, max_sleep_time=60, jitter=0, target_latency=0.1, latency=latency)
+    now = time.time()
+
+    assert [round(policy.next_sleep('a', now, must_sleep=True)) for _ in range(5)] == [10, 20, 40, 60, 60]
+    # activities back off independently
+    assert round(policy.next_sleep('b', now, must_sleep=True)) == 10
+    # a full batch is followed immediately by the next one, and resets the backoff
+    assert policy.next_sleep('a', now, must_sleep=False) == 0
+    assert round(policy.next_sleep('a', now, must_sleep=True)) == 10
+    # the time spent in the iteration is deducted from the sleep
+    assert round(policy.next_sleep('b', now - 15, must_sleep=True)) == 5
+
+    latency.value = 0.3
+    assert round(policy.next_sleep('a', now, must_sleep=False)) == 20
+    latency.value = 10
+    assert round(policy.next_sleep('a', now, must_sleep=False)) == 60
+
+    policy = AdaptiveSleep(sleep_time=10, jitter=0.5)
+    sleeps = [policy.next_sleep(str(activity), now, must_sleep=True) for activity in range(20)]
+    assert all(5 <= sleep <= 15 for sleep in sleeps)
+    assert len(set(sleeps)) > 1
+
+
+def test_query_latency():
+    """ DAEMON: Test the moving average of the query latency, including statements started before it was installed """
+    latency = QueryLatency(alpha=0.5)
+    conn = SimpleNamespace(info={})
+    latency._after(conn, None, 'SELECT 1', {}, None, False)
+    assert latency.value == 0
+    conn.info['query_start_time'] = []
+    latency._after(conn, None, 'SELECT 1', {}, None, False)
+    assert latency.value == 0
+
+    latency._before(conn, None, 'SELECT 1', {}, None, False)
+    latency._after(conn, None, 'SELECT 1', {}, None, False)
+    assert latency.value > 0
+    assert conn.info['query_start_time'] == []
+
+
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('daemons', 'profile_every', '2'),
+    ('daemons', 'profile_keep', '2'),
+]}], indirect=True)
+def test_cycle_profiler(core_config_mock, tmp_path):
+    """ DAEMON: Test the sampled profiles of the iterations, their rotation and the breakdown of the time of the iterations """
+    config_set('daemons', 'profile_dir', str(tmp_path))
+    profiler = CycleProfiler('test-profiler')
+    for _ in range(8):
+        with profiler.cycle():
+            sum(range(1000))
+    profiles = sorted(os.listdir(tmp_path / 'test-profiler'))
+    assert len(profiles) == 2
+    assert all(name.startswith('test-profiler-') and name.endswith('.prof') for name in profiles)
+
+    # the rotation of an executable whose name is a prefix of another one keeps the profiles of the other one
+    other_profiler = CycleProfiler('test')
+    for _ in range(8):
+        with other_profiler.cycle():
+            pass
+    assert sorted(os.listdir(tmp_path / 'test-profiler')) == profiles
+    assert len(os.listdir(tmp_path / 'test')) == 2
+
+    config_set('daemons', 'profile_mode', 'sampling')
+    config_set('daemons', 'profile_interval', '0')
+    config_set('daemons', 'profile_breakdown', 'True')
+    with mock.patch('rucio.daemons.common.METRICS') as metrics:
+        for _ in range(2):
+            with profiler.cycle():
+                time.sleep(0.1)
+    folded = [name for name in os.listdir(tmp_path / 'test-profiler') if name.endswith('.folded')]
+    assert len(folded) == 1
+    assert 'test_cycle_profiler' in (tmp_path / 'test-profiler' / folded[0]).read_text()
+    categories = {call.kwargs['category'] for call in metrics.counter.return_value.labels.call_args_list}
+    assert categories == {'db', 'fts', 'storage', 'stomp', 'python'}
+
+    # attribution of the samples
+    config_set('daemons', 'profile_every', '0')
+    config_set('daemons', 'profile_interval', '0.001')
+    breakdowns = []
+    with mock.patch.object(CycleProfiler, '_report_breakdown', autospec=True,
+                           side_effect=lambda self, recording, duration, logger: breakdowns.append(recording.categories)):
+        with profiler.cycle():
+            time.sleep(0.2)
+        session = get_session()
+        with profiler.cycle():
+            deadline = time.time() + 0.2
+            while time.time() < deadline:
+                session.execute(select(models.Account.account).limit(1)).all()
+        session.commit()
+    sleep_breakdown, db_breakdown = breakdowns
+    assert sleep_breakdown['python'] >= 0.9 * sum(sleep_breakdown.values())
+    assert db_breakdown['db'] >= 0.5 * sum(db_breakdown.values())
+
+    config_set('daemons', 'profile_breakdown', 'False')
+    for _ in range(4):
+        with profiler.cycle():
+            pass
+    assert len(os.listdir(tmp_path / 'test-profiler')) == 2
+
+
+def test_heartbeat_agent():
+    """ DAEMON: Test the renewal of the heartbeats of all the threads of a process at once """
+    executable = f'test-heartbeat-agent-{generate_uuid()}'
+    ready, done = threading.Barrier(3), threading.Event()
+    workers = []
+
+    def _worker():
+        with HeartbeatHandler(executable=executable, renewal_interval=60) as heartbeat_handler:
+            workers.append(heartbeat_handler)
+            ready.wait()
+            done.wait()
+
+    threads = [threading.Thread(target=_worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+
+    with mock.patch('rucio.core.heartbeat.live_threads', wraps=heartbeat.live_threads) as live_threads:
+        assignments = [worker.live()[:2] for worker in workers]
+        # the assignments are cached until the renewal interval elapses
+        assert not live_threads.called
+        assignments = [worker.live(force_renew=True)[:2] for worker in workers]
+        assert live_threads.call_count == 2
+        # each forced renewal renews the heartbeats of both threads
+        assert len(live_threads.call_args_list[1].args[3]) == 2
+        assert live_threads.call_args_list[1].kwargs['membership'] is None
+    assert sorted(assignments) == [(0, 2), (1, 2)]
+
+    done.set()
+    for thread in threads:
+        thread.join()
+    assert not [hb for hb in heartbeat.list_heartbeats() if hb['readable'] == executable]
@@ -12,13 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from datetime import datetime, timedelta
 from unittest.mock import patch
 
 import pytest
-from sqlalchemy import text
+from sqlalchemy import insert, text
 
 from rucio.common.exception import InputValidationError
+from rucio.common.utils import generate_uuid
+from rucio.db.sqla import models
 from rucio.db.sqla.session import NullPool, QueuePool, SingletonThreadPool, _get_engine_poolclass, get_session
+from rucio.db.sqla.util import (
+    REQUESTS_HISTORY_PARTITION_PREFIX,
+    _month_start,
+    _move_rows,
+    _qualified_name,
+    _requests_history_partitions,
+    create_requests_history_partitions,
+    drop_requests_history_partitions,
+    partition_requests_history,
+)
 
 
 def test_db_connection():
@@ -72,3 +85,61 @@ def test_pooloverload():
             'Please try again in a few minutes.' in response.data.decode())
 
     patch.stopall()
+
+
+@pytest.mark.noparallel(reason='Locks and partitions the requests history')
+@pytest.mark.skipif(get_session().bind.dialect.name != 'postgresql', reason='Partitioning of the requests history is only supported on PostgreSQL')
+def test_requests_history_partitions():
+    """ DB (CORE): Partition the requests history by month, create the partitions ahead and drop the old ones """
+    now = datetime.utcnow()
+    old_id, recent_id, future_id = generate_uuid(), generate_uuid(), generate_uuid()
+
+    def _partition(months):
+        return f'{REQUESTS_HISTORY_PARTITION_PREFIX}{_month_start(now, months):%Y%m}'
+
+    def _ids_in(partition):
+        stmt = text(f'SELECT id FROM {_qualified_name(partition, session)} WHERE id IN (:old, :recent, :future)')
+        rows = session.execute(stmt, {'old': old_id, 'recent': recent_id, 'future': future_id}).scalars()
+        return sorted(str(row).replace('-', '') for row in rows)
+
+    legacy, default = f'{REQUESTS_HISTORY_PARTITION_PREFIX}legacy', f'{REQUESTS_HISTORY_PARTITION_PREFIX}default'
+    # The DDL is transactional on PostgreSQL: everything is rolled back at the end of the test
+    session = get_session()()
+    try:
+        for request_id, created_at in ((old_id, now - timedelta(days=400)), (recent_id, now)):
+            session.execute(insert(models.RequestHistory).values(id=request_id, dest_rse_id=generate_uuid(), created_at=created_at))
+
+        assert partition_requests_history(months_ahead=2, session=session)
+        assert not partition_requests_history(months_ahead=2, session=session)
+        assert _requests_history_partitions(session) == {
+            legacy: _month_start(now, 1),
+            default: None,
+            _partition(1): _month_start(now, 2),
+            _partition(2): _month_start(now, 3),
+        }
+        assert _ids_in(legacy) == sorted([old_id, recent_id])
+
+        # The rows are moved between tables with the same columns
+        scratch = f'{REQUESTS_HISTORY_PARTITION_PREFIX}scratch'
+        session.execute(text(f'CREATE TABLE {_qualified_name(scratch, session)} (LIKE {_qualified_name(legacy, session)})'))
+        assert _move_rows(_qualified_name(legacy, session), _qualified_name(scratch, session), 'id = :id', session, {'id': old_id}) == 1
+        assert _ids_in(legacy) == [recent_id]
+        assert _move_rows(_qualified_name(scratch, session), _qualified_name(legacy, session), 'id = :id', session, {'id': old_id}) == 1
+        assert _ids_in(legacy) == sorted([old_id, recent_id])
+
+        # A request beyond the last partition lands in the default one, until its partition is created
+        session.execute(insert(models.RequestHistory).values(id=future_id, dest_rse_id=generate_uuid(), created_at=_month_start(now, 4) + timedelta(days=1)))
+        assert _ids_in(default) == [future_id]
+        assert create_requests_history_partitions(months_ahead=4, session=session) == [_partition(3), _partition(4)]
+        assert create_requests_history_partitions(months_ahead=4, session=session) == []
+        assert _ids_in(default) == []
+        assert _ids_in(_partition(4)) == [future_id]
+
+        assert drop_requests_history_partitions(older_than=_month_start(now), session=session) == []
+        assert drop_requests_history_partitions(older_than=_month_start(now, 1), session=session) == [legacy]
+        assert set(_requests_history_partitions(session)) == {default, *(_partition(months) for months in range(1, 5))}
+        stmt = text(f'SELECT id FROM {_qualified_name(models.RequestHistory.__tablename__, session)} WHERE id IN (:old, :recent, :future)')
+        assert [str(row).replace('-', '') for row in session.execute(stmt, {'old': old_id, 'recent': recent_id, 'future': future_id}).scalars()] == [future_id]
+    finally:
+        session.rollback()
+        session.close()
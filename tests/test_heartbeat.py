@@ -15,11 +15,12 @@
 import random
 import threading
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
 import pytest
 from sqlalchemy import delete, update
 
-from rucio.core.heartbeat import cardiac_arrest, die, list_heartbeats, list_payload_counts, live, sanity_check
+from rucio.core.heartbeat import assignment, cardiac_arrest, die, list_heartbeats, list_payload_counts, live, live_threads, sanity_check
 from rucio.db.sqla.constants import DatabaseOperationType
 from rucio.db.sqla.models import Heartbeat
 from rucio.db.sqla.session import db_session as db_session_context
@@ -143,6 +144,50 @@ class TestHeartbeat:
 
         assert list_payload_counts('test5') == {}
 
+    def test_heartbeat_threads(self, executable_factory):
+        """ HEARTBEAT (CORE): Renew the heartbeats of several threads at once """
+
+        pids = [self._pid() for _ in range(2)]
+        # keep the threads alive while they beat, so that their identifiers are distinct
+        stop = threading.Event()
+        threads = [threading.Thread(target=stop.wait) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        threads.sort(key=lambda thread: thread.ident)
+        executable = executable_factory()
+        try:
+            assert live(executable, 'host1', pids[1], threads[2]) == {'assign_thread': 0, 'nr_threads': 1}
+
+            membership, members = live_threads(executable, 'host0', pids[0], [(threads[0], 'payload1'), (threads[1], None)])
+            assert membership[0] == 3
+            assert [assignment(members, 'host0', pids[0], thread.ident) for thread in threads[:2]] == [{'assign_thread': 0, 'nr_threads': 3},
+                                                                                                      {'assign_thread': 1, 'nr_threads': 3}]
+            assert assignment(members, 'host1', pids[1], threads[2].ident) == {'assign_thread': 2, 'nr_threads': 3}
+            assert list_payload_counts(executable) == {'payload1': 1}
+
+            # the heartbeats are not listed again as long as the membership does not change
+            assert live_threads(executable, 'host0', pids[0], [(threads[0], 'payload2'), (threads[1], None)], membership=membership) == (membership, None)
+            assert list_payload_counts(executable) == {'payload2': 1}
+
+            die(executable, 'host1', pids[1], threads[2])
+            membership, members = live_threads(executable, 'host0', pids[0], [(threads[0], None)], membership=membership)
+            assert membership[0] == 2
+            assert assignment(members, 'host0', pids[0], threads[0].ident) == {'assign_thread': 0, 'nr_threads': 2}
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def test_heartbeat_threads_same_ident(self, executable_factory):
+        """ HEARTBEAT (CORE): Renew the heartbeats of threads reusing the identifier of an exited thread """
+
+        pid = self._pid()
+        executable = executable_factory()
+        threads = [SimpleNamespace(ident=1234, name='exited'), SimpleNamespace(ident=1234, name='successor')]
+        membership, _ = live_threads(executable, 'host0', pid, [(threads[0], 'payload1'), (threads[1], 'payload2')])
+        assert membership[0] == 1
+        assert list_payload_counts(executable) == {'payload2': 1}
+
     @pytest.mark.noparallel(reason='performs a heartbeat cardiac_arrest')
     @pytest.mark.dirty
     def test_old_heartbeat_cleanup(self, thread_factory, executable_factory):
@@ -314,7 +314,15 @@ def test_hermes(core_config_mock, caches_mock, monkeypatch):
                 ("messaging-hermes", "syslog_address", "/dev/log"),
                 ("messaging-hermes", "syslog_socktype", "SOCK_DGRAM"),
             ]
-        }
+        },
+        {
+            "table_content": [
+                ("hermes", "services_list", "syslog"),
+                ("hermes", "claim_messages", "True"),
+                ("messaging-hermes", "syslog_address", "/dev/log"),
+                ("messaging-hermes", "syslog_socktype", "SOCK_DGRAM"),
+            ]
+        },
     ],
     indirect=True,
 )
@@ -15,7 +15,7 @@
 from typing import TYPE_CHECKING
 
 import pytest
-from sqlalchemy import delete
+from sqlalchemy import delete, func, select
 
 from rucio.common.config import config_get_bool
 from rucio.common.types import InternalAccount, InternalScope
@@ -332,6 +332,38 @@ class TestJudgeEvaluator:
 
         assert get_rule(rule_id)['locks_ok_cnt'] == 8
 
+    @pytest.mark.noparallel(reason="uses mock scope and predefined RSEs; runs judge evaluator")
+    def test_judge_coalesce_attach_and_detach(self):
+        """ JUDGE EVALUATOR: Test that the pending attaches and detaches of a dataset are evaluated together"""
+        scope = InternalScope('mock', **self.vo)
+        dataset = 'dataset_' + str(uuid())
+        add_did(scope, dataset, DIDType.DATASET, self.jdoe)
+        files = create_files(3, scope, self.rse1_id, bytes_=100)
+        attach_dids(scope, dataset, files, self.jdoe)
+        rule_id = add_rule(dids=[{'scope': scope, 'name': dataset}], account=self.jdoe, copies=1, rse_expression=self.rse1, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+        assert get_rule(rule_id)['locks_ok_cnt'] == 3
+        re_evaluator(once=True, did_limit=None)
+
+        # Several attaches and a detach pile up before the judge runs
+        new_files = []
+        for _ in range(3):
+            new_files.extend(create_files(2, scope, self.rse1_id, bytes_=100))
+            attach_dids(scope, dataset, new_files[-2:], self.jdoe)
+        detach_dids(scope, dataset, [files[0]])
+        stmt = select(func.count(UpdatedDID.id)).where(UpdatedDID.scope == scope, UpdatedDID.name == dataset)
+        with db_session(DatabaseOperationType.READ) as session:
+            assert session.execute(stmt).scalar_one() == 4
+
+        # Fake judge
+        re_evaluator(once=True, did_limit=None)
+
+        with db_session(DatabaseOperationType.READ) as session:
+            assert session.execute(stmt).scalar_one() == 0
+        assert get_rule(rule_id)['locks_ok_cnt'] == 8
+        for file in new_files:
+            assert len(get_replica_locks(scope=file['scope'], name=file['name'])) == 1
+        assert len(get_replica_locks(scope=files[0]['scope'], name=files[0]['name'])) == 0
+
     @pytest.mark.noparallel(reason="uses mock scope and predefined RSEs; runs judge evaluator")
     def test_judge_add_files_to_dataset_with_2_rules(self):
         """ JUDGE EVALUATOR: Test the judge when adding files to dataset with 2 rules"""
@@ -0,0 +1,91 @@
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from rucio.common.exception import ConfigurationError
+from rucio.core.did import get_did_access_cnt, get_did_atime
+from rucio.core.replica import add_replicas, get_replica_atime
+from rucio.daemons.tracer.accumulator import TouchAccumulator
+from rucio.daemons.tracer.kronos import _make_touch_accumulator
+from rucio.tests.common import did_name_generator
+
+
+class TestTouchAccumulator:
+
+    def test_coalesce_and_flush(self, rse_factory, mock_scope, root_account):
+        """ KRONOS: touches of the same replica are coalesced into one update """
+        _, rse_id = rse_factory.make_mock_rse()
+        files = [{'scope': mock_scope, 'name': did_name_generator('file'), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(2)]
+        add_replicas(rse_id=rse_id, files=files, account=root_account, ignore_availability=True)
+
+        now = datetime.utcnow().replace(microsecond=0)
+        accumulator = TouchAccumulator(window=3600, max_pending=2)
+        accumulator.add([{'scope': mock_scope, 'name': files[0]['name'], 'rse_id': rse_id, 'accessed_at': now - timedelta(minutes=i)} for i in range(10)])
+        assert len(accumulator) == 1
+        assert not accumulator.is_due()
+        accumulator.add([{'scope': mock_scope, 'name': files[1]['name'], 'rse_id': rse_id, 'accessed_at': now}])
+        assert accumulator.is_due()
+
+        assert accumulator.flush() == 2
+        assert len(accumulator) == 0
+        assert get_replica_atime({'scope': mock_scope, 'name': files[0]['name'], 'rse_id': rse_id}) == now
+        assert get_did_atime(scope=mock_scope, name=files[0]['name']) == now
+        assert get_did_access_cnt(scope=mock_scope, name=files[0]['name']) == 10
+        assert get_did_access_cnt(scope=mock_scope, name=files[1]['name']) == 1
+
+    def test_journal_replay(self, tmp_path, rse_factory, mock_scope, root_account):
+        """ KRONOS: touches not flushed before a stop are replayed from the journal """
+        _, rse_id = rse_factory.make_mock_rse()
+        name = did_name_generator('file')
+        add_replicas(rse_id=rse_id, files=[{'scope': mock_scope, 'name': name, 'bytes': 1, 'adler32': '0cc737eb'}], account=root_account, ignore_availability=True)
+        journal_path = str(tmp_path / 'touches.journal')
+
+        now = datetime.utcnow().replace(microsecond=0)
+        accumulator = TouchAccumulator(journal_path=journal_path)
+        accumulator.add([{'scope': mock_scope, 'name': name, 'rse_id': rse_id, 'accessed_at': now}] * 3)
+        # the process stops without flushing
+        del accumulator
+
+        accumulator = TouchAccumulator(journal_path=journal_path)
+        assert len(accumulator) == 1
+        accumulator.close()
+        assert get_replica_atime({'scope': mock_scope, 'name': name, 'rse_id': rse_id}) == now
+        assert get_did_access_cnt(scope=mock_scope, name=name) == 3
+        assert len(TouchAccumulator(journal_path=journal_path)) == 0
+
+    def test_journal_lock(self, tmp_path):
+        """ KRONOS: a touch journal cannot be shared by two processes """
+        journal_path = str(tmp_path / 'touches.journal')
+        accumulator = TouchAccumulator(journal_path=journal_path)
+        with pytest.raises(ConfigurationError):
+            TouchAccumulator(journal_path=journal_path)
+        accumulator.close()
+        TouchAccumulator(journal_path=journal_path).close()
+
+    def test_default_journal(self, tmp_path, monkeypatch):
+        """ KRONOS: by default, each process keeps its own journal in the temporary directory """
+        monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+        first, second = _make_touch_accumulator(), _make_touch_accumulator()
+        assert first.journal_path == str(tmp_path / 'rucio_kronos' / 'touches_0.journal')
+        assert second.journal_path == str(tmp_path / 'rucio_kronos' / 'touches_1.journal')
+        first.close()
+        second.close()
+        # a restarted process takes over the first free journal
+        restarted = _make_touch_accumulator()
+        assert restarted.journal_path == first.journal_path
+        restarted.close()
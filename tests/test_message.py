@@ -22,7 +22,8 @@ from sqlalchemy import select
 from rucio.common.constants import MAX_MESSAGE_LENGTH
 from rucio.common.exception import InvalidObject, RucioException
 from rucio.common.utils import generate_uuid
-from rucio.core.message import add_message, add_messages, delete_messages, retrieve_messages, truncate_messages
+from rucio.core.message import WORK_QUEUE, add_message, add_messages, delete_messages, retrieve_messages, truncate_messages
+from rucio.core.work_queue import expire_work_leases, release_work, renew_work
 from rucio.db.sqla.models import Message
 from rucio.db.sqla.session import get_session
 
@@ -99,6 +100,45 @@ def test_bulk_insert_and_pop_messages(core_config_mock, caches_mock):
     assert retrieve_messages() == []
 
 
+@pytest.mark.noparallel(reason='fails when run in parallel')
+@pytest.mark.parametrize("core_config_mock", [{"table_content": [
+    ('hermes', 'services_list', 'influx,activemq,elastic,email'),
+]}], indirect=True)
+@pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
+    'rucio.core.config.REGION',
+]}], indirect=True)
+def test_claim_messages(core_config_mock, caches_mock):
+    """ MESSAGE (CORE): Test claiming messages by several workers """
+    truncate_messages()
+    expire_work_leases(WORK_QUEUE)
+    add_messages([{'event_type': generate_uuid()[:10], 'payload': {'number': cnt}} for cnt in range(10)])
+
+    first = retrieve_messages(40, claim_owner='worker1')
+    second = retrieve_messages(40, claim_owner='worker2')
+    assert len(first) == 30
+    assert second == []
+
+    # the leases of a worker which stopped expire, and its messages are claimed by the others
+    truncate_messages()
+    add_messages([{'event_type': generate_uuid()[:10], 'payload': {'number': cnt}} for cnt in range(10)])
+    first = retrieve_messages(15, claim_owner='worker1', lease_time=-1)
+    second = retrieve_messages(15, claim_owner='worker2')
+    assert len(first) == len(second) == 15
+    assert {msg['id'] for msg in first} == {msg['id'] for msg in second}
+    assert renew_work(WORK_QUEUE, 'worker1', [msg['id'] for msg in first]) == 0
+    assert renew_work(WORK_QUEUE, 'worker2', [msg['id'] for msg in second]) == 15
+
+    third = retrieve_messages(40, claim_owner='worker3')
+    assert len(third) == 15
+    assert not {msg['id'] for msg in second} & {msg['id'] for msg in third}
+
+    # released messages which still exist can be claimed again
+    assert release_work(WORK_QUEUE, 'worker3', [msg['id'] for msg in third]) == 15
+    assert {msg['id'] for msg in retrieve_messages(40, claim_owner='worker1')} == {msg['id'] for msg in third}
+    truncate_messages()
+    expire_work_leases(WORK_QUEUE)
+
+
 @pytest.mark.noparallel(reason='fails when run in parallel')
 @pytest.mark.parametrize("core_config_mock", [{"table_content": [
     ('hermes', 'services_list', 'influx,activemq,elastic,email'),
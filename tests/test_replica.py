@@ -24,25 +24,49 @@ from xml.etree import ElementTree  # noqa: S405 -- trusted XML input
 
 import pytest
 import xmltodict
+from sqlalchemy import func, select, update
 from werkzeug.datastructures import Headers, MultiDict
 
 import rucio.core.permission
 from rucio.client.ruleclient import RuleClient
 from rucio.common.constants import RseAttr
-from rucio.common.exception import AccessDenied, DatabaseException, DataIdentifierNotFound, InputValidationError, ReplicaIsLocked, ReplicaNotFound, RucioException, ScopeNotFound
+from rucio.common.exception import AccessDenied, DatabaseException, DataIdentifierNotFound, Duplicate, InputValidationError, ReplicaIsLocked, ReplicaNotFound, RucioException, ScopeNotFound
 from rucio.common.utils import clean_pfns, generate_uuid, parse_response
 from rucio.core.config import set as cconfig_set
-from rucio.core.did import add_did, attach_dids, get_did, get_did_access_cnt, get_did_atime, list_files, set_status
-from rucio.core.replica import add_bad_dids, add_replica, add_replicas, delete_replicas, get_bad_pfns, get_replica, get_replica_atime, get_replicas_state, get_rse_coverage_of_dataset, list_replicas, set_tombstone, touch_replica, update_replica_state
-from rucio.core.rse import add_protocol, add_rse_attribute, del_rse_attribute
+from rucio.core.did import add_did, attach_dids, get_did, get_did_access_cnt, get_did_atime, list_all_parent_dids, list_all_parent_dids_bulk, list_files, set_status
+from rucio.core.message import retrieve_messages
+from rucio.core.replica import (
+    PROTOCOLS_CACHE,
+    PFNToRSEIndex,
+    _claim_deletion_candidates,
+    _get_list_replicas_protocols,
+    add_bad_dids,
+    add_replica,
+    add_replicas,
+    delete_replicas,
+    get_bad_pfns,
+    get_replica,
+    get_replica_atime,
+    get_replicas_state,
+    get_rse_coverage_of_dataset,
+    invalidate_list_replicas_protocols_cache,
+    list_replicas,
+    set_tombstone,
+    touch_replica,
+    touch_replicas,
+    update_replica_state,
+)
+from rucio.core.rse import add_protocol, add_rse_attribute, del_protocols, del_rse_attribute, update_protocols
 from rucio.daemons.badreplicas.minos import minos
 from rucio.daemons.badreplicas.minos_temporary_expiration import minos_tu_expiration
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import OBSOLETE, BadPFNStatus, DatabaseOperationType, DIDType, ReplicaState
 from rucio.db.sqla.session import db_session
+from rucio.db.sqla.util import temp_table_mngr
 from rucio.gateway import replica as replica_gateway
 from rucio.rse import rsemanager as rsemgr
 from rucio.tests.common import Mime, accept, auth, did_name_generator, execute, headers
+from rucio.tests.common_server import count_queries
 
 if TYPE_CHECKING:
     from .temp_factories import TemporaryRSEFactory
@@ -197,6 +221,25 @@ class TestReplicaCore:
 
         assert nbfiles == replica_cpt
 
+    def test_add_replicas_skips_existing(self, rse_factory, mock_scope, root_account):
+        """ REPLICA (CORE): Existing DIDs and replicas are skipped by the bulk registration """
+        _, rse_id = rse_factory.make_mock_rse()
+        files = [{'scope': mock_scope, 'name': did_name_generator('file'), 'bytes': 2, 'adler32': '0cc737eb', 'meta': {'events': 10}} for _ in range(10)]
+
+        add_replicas(rse_id=rse_id, files=files[:4], account=root_account, ignore_availability=True)
+        add_replicas(rse_id=rse_id, files=files, account=root_account, ignore_availability=True)
+
+        with db_session(DatabaseOperationType.READ) as session:
+            stmt = select(func.sum(models.UpdatedRSECounter.files), func.sum(models.UpdatedRSECounter.bytes)).where(models.UpdatedRSECounter.rse_id == rse_id)
+            assert tuple(session.execute(stmt).one()) == (10, 20)
+        for file in files:
+            assert get_replica(rse_id=rse_id, scope=file['scope'], name=file['name'])['bytes'] == 2
+            assert get_did(scope=file['scope'], name=file['name'])['type'] == DIDType.FILE
+
+        # a file given twice is rejected, even if its DID already exists
+        with pytest.raises(Duplicate):
+            add_replicas(rse_id=rse_id, files=[files[0], dict(files[0])], account=root_account, ignore_availability=True)
+
     @pytest.mark.parametrize(
         "params",
         [
@@ -290,6 +333,25 @@ class TestReplicaCore:
 
         assert [f for f in list_files(scope=mock_scope, name=tmp_dsn2)] == []
 
+    def test_delete_replicas_partial_dataset(self, rse_factory, mock_scope, root_account):
+        """ REPLICA (CORE): Delete some of the replicas of a dataset, which is flagged incomplete once """
+        _, rse_id = rse_factory.make_mock_rse()
+
+        dsn = did_name_generator('dataset')
+        files = [{'scope': mock_scope, 'name': did_name_generator('file'), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(3)]
+        add_did(scope=mock_scope, name=dsn, did_type=DIDType.DATASET, account=root_account)
+        attach_dids(scope=mock_scope, name=dsn, rse_id=rse_id, dids=files, account=root_account)
+        set_status(scope=mock_scope, name=dsn, open=False)
+
+        delete_replicas(rse_id=rse_id, files=files[:2])
+
+        assert [f['name'] for f in list_files(scope=mock_scope, name=dsn)] == [files[2]['name']]
+        for name in (files[0]['name'], files[1]['name']):
+            with pytest.raises(DataIdentifierNotFound):
+                get_did(scope=mock_scope, name=name)
+        messages = [msg for msg in retrieve_messages(bulk=10000, event_type='INCOMPLETE') if msg['payload']['name'] == dsn]
+        assert len(messages) == 1
+
     def test_touch_replicas(self, rse_factory, mock_scope, root_account):
         """ REPLICA (CORE): Touch replicas accessed_at timestamp"""
 
@@ -342,6 +404,31 @@ class TestReplicaCore:
             touch_replica({'scope': file_item['scope'], 'name': file_item['name'], 'rse_id': rse_id})
         assert get_did_access_cnt(scope=mock_scope, name=file_item['name']) == 5
 
+    def test_touch_replicas_bulk(self, rse_factory, mock_scope, root_account):
+        """ REPLICA (CORE): Touch replicas in bulk with coalesced access counts """
+
+        _, rse1_id = rse_factory.make_mock_rse()
+        _, rse2_id = rse_factory.make_mock_rse()
+        files = [{'scope': mock_scope, 'name': did_name_generator('file'), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(3)]
+        add_replicas(rse_id=rse1_id, files=files, account=root_account, ignore_availability=True)
+        add_replicas(rse_id=rse2_id, files=files[:1], account=root_account, ignore_availability=True)
+
+        now = datetime.utcnow().replace(microsecond=0)
+        touches = [{'scope': f['scope'], 'name': f['name'], 'rse_id': rse1_id, 'accessed_at': now, 'count': 3} for f in files]
+        touches.append({'scope': files[0]['scope'], 'name': files[0]['name'], 'rse_id': rse2_id, 'accessed_at': now - timedelta(hours=1)})
+        touches.append({'scope': mock_scope, 'name': did_name_generator('file'), 'rse_id': rse1_id, 'accessed_at': now})
+        with count_queries() as counter:
+            assert touch_replicas(touches) == []
+        # the replicas of all the RSEs are looked up and locked together
+        assert counter.matching('FROM replicas') == 2
+
+        for f in files:
+            assert get_replica_atime({'scope': f['scope'], 'name': f['name'], 'rse_id': rse1_id}) == now
+            assert get_did_atime(scope=mock_scope, name=f['name']) == now
+        assert get_replica_atime({'scope': files[0]['scope'], 'name': files[0]['name'], 'rse_id': rse2_id}) == now - timedelta(hours=1)
+        assert get_did_access_cnt(scope=mock_scope, name=files[0]['name']) == 4
+        assert get_did_access_cnt(scope=mock_scope, name=files[1]['name']) == 3
+
     def test_list_replicas_all_states(self, rse_factory, mock_scope, root_account):
         """ REPLICA (CORE): list file replicas with all_states"""
         _, rse1_id = rse_factory.make_mock_rse()
@@ -558,6 +645,72 @@ class TestReplicaCore:
         with pytest.raises(ReplicaNotFound):
             set_tombstone(rse_id, mock_scope, name)
 
+    def test_list_replicas_protocols_cache_invalidation(self, rse_factory, mock_scope, root_account):
+        """ REPLICA (CORE): the cached list_replicas protocols of an RSE are dropped when its protocols change """
+        _, rse_id = rse_factory.make_mock_rse()
+        name = did_name_generator('file')
+        add_replica(rse_id, mock_scope, name, 4, root_account)
+
+        def _cached():
+            return [key for key, _ in PROTOCOLS_CACHE.items() if key[0] == rse_id]
+
+        list(list_replicas([{'scope': mock_scope, 'name': name}]))
+        assert _cached()
+        update_protocols(rse_id, scheme='mock', data={'prefix': '/other/'}, hostname='%s.cern.ch' % rse_id, port=0)
+        assert not _cached()
+
+        list(list_replicas([{'scope': mock_scope, 'name': name}]))
+        assert _cached()
+        add_protocol(rse_id, {'scheme': 'file', 'hostname': 'localhost', 'port': 0, 'prefix': '/test/', 'impl': 'rucio.rse.protocols.posix.Default',
+                              'domains': {'lan': {'read': 1, 'write': 1, 'delete': 1}, 'wan': {'read': 1, 'write': 1, 'delete': 1}}})
+        assert not _cached()
+
+        list(list_replicas([{'scope': mock_scope, 'name': name}]))
+        assert _cached()
+        del_protocols(rse_id, scheme='file')
+        assert not _cached()
+
+        # the changes done by other processes are picked up once the cached entries expire
+        with mock.patch('rucio.core.replica._get_list_replicas_protocols', wraps=_get_list_replicas_protocols) as build_protocols:
+            for expiration, nb_builds in ((3600, 1), (0, 2)):
+                with mock.patch('rucio.core.replica.PROTOCOLS_CACHE_EXPIRATION', expiration):
+                    invalidate_list_replicas_protocols_cache(rse_id)
+                    build_protocols.reset_mock()
+                    for _ in range(2):
+                        list(list_replicas([{'scope': mock_scope, 'name': name}]))
+                    assert build_protocols.call_count == nb_builds
+
+    def test_claim_deletion_candidates_pages(self, rse_factory, mock_scope, root_account):
+        """ REPLICA (CORE): the deletion candidates are walked in pages without gaps nor duplicates, least recently updated first across equal tombstones """
+        _, rse_id = rse_factory.make_mock_rse()
+        oldest, newest = datetime.utcnow() - timedelta(days=2), datetime.utcnow() - timedelta(days=1)
+        names = {}
+        for tombstone, nb_files in ((newest, 5), (oldest, 2)):
+            for _ in range(nb_files):
+                name = did_name_generator('file')
+                add_replica(rse_id, mock_scope, name, 4, root_account, tombstone=tombstone)
+                names[name] = tombstone
+        # the more recently updated, the earlier in the alphabet
+        updated_at = {name: oldest + timedelta(minutes=i) for i, name in enumerate(sorted(names, reverse=True))}
+
+        claimed = []
+        with db_session(DatabaseOperationType.WRITE) as session:
+            for name, updated in updated_at.items():
+                session.execute(update(models.RSEFileAssociation).where(
+                    models.RSEFileAssociation.rse_id == rse_id,
+                    models.RSEFileAssociation.scope == mock_scope,
+                    models.RSEFileAssociation.name == name,
+                ).values(updated_at=updated))
+            after = None
+            while True:
+                page = _claim_deletion_candidates(rse_id=rse_id, limit=2, after=after, session=session)
+                if not page:
+                    break
+                claimed.extend(page)
+                after = page[-1]
+            session.rollback()
+        assert [(scope, name) for _, _, scope, name in claimed] == sorted(((mock_scope, name) for name in names), key=lambda did: (names[did[1]], updated_at[did[1]]))
+
     def test_core_default_tombstone_correctly_set(self, rse_factory, did_factory, root_account):
         """ REPLICA (CORE): Per-RSE default tombstone is correctly taken into consideration"""
 
@@ -861,6 +1014,67 @@ def test_client_access_denied_on_delete_replicas(rse_factory, mock_scope, replic
         assert len(replicas) == 1
 
 
+def test_list_replicas_resolve_parents_bulk(rse_factory, did_factory, mock_scope, root_account):
+    """ REPLICA (CORE): parents are resolved in bulk and are identical to the per-file resolution """
+    _, rse_id = rse_factory.make_mock_rse()
+    nbfiles = 20
+    files = [{'scope': mock_scope, 'name': did_name_generator('file'), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(nbfiles)]
+    add_replicas(rse_id=rse_id, files=files, account=root_account, ignore_availability=True)
+
+    dataset1, dataset2 = did_factory.make_dataset(), did_factory.make_dataset()
+    container = did_factory.make_container()
+    attach_dids(dids=files, account=root_account, **dataset1)
+    attach_dids(dids=files[:nbfiles // 2], account=root_account, **dataset2)
+    attach_dids(dids=[dataset1, dataset2], account=root_account, **container)
+
+    parents = list_all_parent_dids_bulk(files)
+    for file in files:
+        expected = list_all_parent_dids(file['scope'], file['name'])
+        key = lambda p: (p['scope'].internal, p['name'])  # noqa: E731
+        assert sorted(parents[file['scope'], file['name']], key=key) == sorted(expected, key=key)
+
+    # consecutive batches can share one temporary table, each batch replaces the rows of the previous one
+    with db_session(DatabaseOperationType.WRITE) as session:
+        temp_table = temp_table_mngr(session).create_scope_name_table()
+        for batch in (files[:nbfiles // 2], files[nbfiles // 2:]):
+            batch_parents = list_all_parent_dids_bulk(batch, temp_table=temp_table, session=session)
+            assert batch_parents == {(f['scope'], f['name']): parents[f['scope'], f['name']] for f in batch}
+
+    dids = [{'scope': f['scope'], 'name': f['name'], 'type': DIDType.FILE} for f in files]
+    for file in list_replicas(dids=dids, resolve_parents=True):
+        parent_names = {p.split(':')[1] for p in file['parents']}
+        assert dataset1['name'] in parent_names
+        assert container['name'] in parent_names
+
+    # the parents of all the files are resolved with as many queries as the parents of a single file
+    round_trips = []
+    for batch in (dids[:1], dids):
+        with count_queries() as counter:
+            assert len(list(list_replicas(dids=batch, resolve_parents=True))) == len(batch)
+        round_trips.append(counter.matching('contents'))
+    assert 0 < round_trips[0] == round_trips[1]
+
+
+def test_pfn_to_rse_index():
+    """ REPLICA (CORE): the PFN prefix index resolves PFNs to the RSEs of the right VO """
+    index = PFNToRSEIndex([
+        ('rse1', 'def', 'davs', 'host1.org', 443, '/data/rse1/'),
+        ('rse2', 'def', 'davs', 'host1.org', 443, '/data/rse2/'),
+        ('rse3', 'tst', 'davs', 'host1.org', 443, '/data/rse1/'),
+        ('rse4', 'def', 'root', 'host1.org', 1094, '//eos/'),
+        ('rse5', 'def', 'davs', 'host2.org', 443, '/data/'),
+        ('rse6', 'def', 'davs', 'host2.org', 443, '/data/sub/'),
+    ])
+    assert index.lookup('davs://host1.org:443/data/rse1/file') == {'rse1'}
+    assert index.lookup('davs://host1.org/data/rse1/file') == {'rse1'}
+    assert index.lookup('davs://host1.org/data/rse1/file', vo='tst') == {'rse3'}
+    assert index.lookup('davs://host1.org:443/data/rse2/file') == {'rse2'}
+    assert index.lookup('root://host1.org:1094//eos/file') == {'rse4'}
+    assert index.lookup('davs://host1.org:8443/data/rse1/file') == set()
+    assert index.lookup('davs://host3.org/data/rse1/file') == set()
+    assert index.lookup('davs://host2.org/data/sub/file') == {'rse5', 'rse6'}
+
+
 def test_client_list_replicas_on_did_without_replicas(rse_factory, did_factory, replica_client, did_client, root_account):
     """ REPLICA (CLIENT): DIDs of type FILE, but without replicas, must be listed with empty pfns and rses"""
     rse, _ = rse_factory.make_posix_rse()
@@ -23,7 +23,7 @@ from rucio.common.constants import RseAttr
 from rucio.common.utils import generate_uuid, parse_response
 from rucio.core.distance import add_distance
 from rucio.core.replica import add_replica
-from rucio.core.request import TransferStatsManager, get_request_by_did, list_requests, list_requests_history, queue_requests, set_transfer_limit
+from rucio.core.request import TransferStatsManager, archive_requests, get_request_by_did, list_requests, list_requests_history, queue_requests, set_transfer_limit
 from rucio.core.rse import add_rse_attribute
 from rucio.db.sqla import constants, models
 from rucio.db.sqla.constants import RequestState, RequestType
@@ -153,6 +153,32 @@ def test_core_list(model: Union[type[models.Request], type[models.RequestHistory
     assert len(requests) == 0
 
 
+def test_archive_requests(rse_factory, mock_scope, root_account, db_session):
+    """ REQUEST (CORE): Test moving requests, with their sources, to the request history in bulk"""
+    _, source_rse_id = rse_factory.make_mock_rse(session=db_session)
+    _, dest_rse_id = rse_factory.make_mock_rse(session=db_session)
+    request_ids = []
+    for _ in range(3):
+        name = generate_uuid()
+        add_replica(source_rse_id, mock_scope, name, 1, root_account, session=db_session)
+        request = models.Request(state=constants.RequestState.DONE, scope=mock_scope, name=name, source_rse_id=source_rse_id, dest_rse_id=dest_rse_id,
+                                 activity='User Subscriptions')
+        request.save(session=db_session)
+        models.Source(request_id=request.id, rse_id=source_rse_id, dest_rse_id=dest_rse_id, scope=mock_scope, name=name, ranking=0, bytes=1).save(session=db_session)
+        request_ids.append(request.id)
+    untouched = models.Request(state=constants.RequestState.DONE, source_rse_id=source_rse_id, dest_rse_id=dest_rse_id)
+    untouched.save(session=db_session)
+
+    assert archive_requests(request_ids, session=db_session) == 3
+    assert archive_requests([request_ids[0]], session=db_session) == 0
+
+    assert {r.id for r in db_session.query(models.Request).filter(models.Request.dest_rse_id == dest_rse_id)} == {untouched.id}
+    history = db_session.query(models.RequestHistory).filter(models.RequestHistory.dest_rse_id == dest_rse_id).all()
+    assert {h.id for h in history} == set(request_ids)
+    assert all(h.state == constants.RequestState.DONE and h.activity == 'User Subscriptions' for h in history)
+    assert db_session.query(models.Source).filter(models.Source.request_id.in_(request_ids)).count() == 0
+
+
 @pytest.mark.parametrize(
     "model,api_endpoint", [
         (models.Request, '/requests/list'),
@@ -29,6 +29,7 @@ from rucio.common.config import config_get_bool
 from rucio.common.constants import DEFAULT_VO, RseAttr
 from rucio.common.exception import (
     AccessDenied,
+    DataIdentifierNotFound,
     DuplicateRule,
     InputValidationError,
     InsufficientAccountLimit,
@@ -398,6 +399,30 @@ class TestCore:
             rse_locks = [lock['rse_id'] for lock in get_replica_locks(scope=file['scope'], name=file['name'])]
             assert (rse_locks[0] == rse_locks[1])
 
+    def test_add_rules_shared_quota(self, mock_scope, did_factory, random_account, rse_factory):
+        """ REPLICATION RULE (CORE): Rules added in one batch share the account quota of their RSE selector"""
+        rse, rse_id = rse_factory.make_mock_rse()
+        datasets = []
+        for _ in range(2):
+            files = create_files(3, mock_scope, self.rse1_id, bytes_=100)
+            dataset = did_factory.random_dataset_did()
+            add_did(did_type=DIDType.DATASET, account=random_account, **dataset)
+            attach_dids(dids=files, account=random_account, **dataset)
+            datasets.append(dataset)
+
+        with db_session(DatabaseOperationType.WRITE) as session:
+            set_local_account_limit(account=random_account, rse_id=rse_id, bytes_=500, session=session)
+        rule = {'account': random_account, 'copies': 1, 'rse_expression': rse, 'grouping': 'DATASET', 'weight': None, 'lifetime': None, 'locked': False, 'subscription_id': None}
+
+        # each dataset fits in the quota, but not both of them
+        with pytest.raises(InsufficientAccountLimit):
+            add_rules(dids=datasets, rules=[rule])
+        rule_ids = add_rules(dids=datasets[:1], rules=[rule])
+        assert len(rule_ids[(datasets[0]['scope'], datasets[0]['name'])]) == 1
+
+        with pytest.raises(DataIdentifierNotFound):
+            add_rules(dids=[{'scope': mock_scope, 'name': did_name_generator('dataset')}], rules=[rule])
+
     def test_add_rule_container_none(self, mock_scope, did_factory, jdoe_account):
         """ REPLICATION RULE (CORE): Add a replication rule on a container, NONE Grouping"""
         container = did_factory.random_container_did()
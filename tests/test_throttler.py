@@ -13,9 +13,10 @@
 # limitations under the License.
 
 from datetime import datetime, timedelta
+from unittest import mock
 
 import pytest
-from sqlalchemy import delete
+from sqlalchemy import delete, update
 
 from rucio.common.constants import TransferLimitDirection
 from rucio.common.utils import generate_uuid
@@ -25,6 +26,7 @@ from rucio.core.replica import add_replica
 from rucio.core.request import (
     delete_transfer_limit,
     get_request_by_did,
+    list_waiting_request_changes,
     queue_requests,
     release_all_waiting_requests,
     release_waiting_requests_fifo,
@@ -33,7 +35,7 @@ from rucio.core.request import (
     release_waiting_requests_per_free_volume,
 )
 from rucio.daemons.conveyor.preparer import preparer
-from rucio.daemons.conveyor.throttler import throttler
+from rucio.daemons.conveyor.throttler import ThrottlingEngine, throttler
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import DatabaseOperationType, DIDType, RequestState, RequestType
 from rucio.db.sqla.session import db_session, get_session
@@ -141,9 +143,10 @@ def _add_test_replicas_and_request(request_configs, scope, account):
 
 @pytest.mark.noparallel(reason='uses preparer and throttler')
 @pytest.mark.usefixtures("core_config_mock", "file_config_mock")
-@pytest.mark.parametrize("file_config_mock", [{"overrides": [
-    ('conveyor', 'use_preparer', 'true')
-]}], indirect=True)
+@pytest.mark.parametrize("file_config_mock", [
+    {"overrides": [('conveyor', 'use_preparer', 'true')]},
+    {"overrides": [('conveyor', 'use_preparer', 'true'), ('conveyor', 'throttler_in_memory_engine', 'true')]},
+], indirect=True)
 class TestSimpleLimits:
     """
     Test the behavior of throttler on simple cases without overlapping limits.
@@ -543,9 +546,10 @@ class TestSimpleLimits:
 
 @pytest.mark.noparallel(reason='uses preparer and throttler')
 @pytest.mark.usefixtures("core_config_mock", "file_config_mock")
-@pytest.mark.parametrize("file_config_mock", [{"overrides": [
-    ('conveyor', 'use_preparer', 'true')
-]}], indirect=True)
+@pytest.mark.parametrize("file_config_mock", [
+    {"overrides": [('conveyor', 'use_preparer', 'true')]},
+    {"overrides": [('conveyor', 'use_preparer', 'true'), ('conveyor', 'throttler_in_memory_engine', 'true')]},
+], indirect=True)
 class TestOverlappingLimits:
     user_activity = 'User Subscription'
     user_activity2 = 'User Subscription2'
@@ -1018,3 +1022,92 @@ class TestRequestCoreRelease:
         assert request['state'] == RequestState.QUEUED
         request = get_request_by_did(mock_scope, name3, dest_rse_id)
         assert request['state'] == RequestState.WAITING
+
+    def test_throttling_engine(self, mock_scope, root_account, connected_rse_pair, transfer_limit_factory):
+        """ THROTTLER (CORE): the in-memory view of the waiting requests follows the database and releases in bulk. """
+        source_rse, source_rse_id, dest_rse, dest_rse_id = connected_rse_pair
+
+        def _waiting_towards_dest():
+            return sum(stat.counter for stat in engine.waiting_stats() if stat.dest_rse_id == dest_rse_id)
+
+        transfer_limit_factory(dest_rse, self.all_activities, max_transfers=1)
+        name1, name2 = _add_test_replicas_and_request(
+            scope=mock_scope, account=root_account,
+            request_configs=[
+                {'source_rse_id': source_rse_id, 'dest_rse_id': dest_rse_id, 'requested_at': datetime.utcnow().replace(year=2018)},
+                {'source_rse_id': source_rse_id, 'dest_rse_id': dest_rse_id, 'requested_at': datetime.utcnow().replace(year=2020)},
+            ]
+        )
+        preparer(once=True, partition_wait_time=0, transfertools=['mock'])
+        engine = ThrottlingEngine()
+        engine.refresh()
+        assert _waiting_towards_dest() == 2
+
+        # picked up by an incremental refresh
+        name3, = _add_test_replicas_and_request(
+            scope=mock_scope, account=root_account,
+            request_configs=[
+                {'source_rse_id': source_rse_id, 'dest_rse_id': dest_rse_id, 'requested_at': datetime.utcnow().replace(year=2019)},
+            ]
+        )
+        preparer(once=True, partition_wait_time=0, transfertools=['mock'])
+        engine.refresh()
+        assert _waiting_towards_dest() == 3
+
+        assert engine.release_fifo(source_rse_id=None, dest_rse_id=dest_rse_id, activity=None, account=root_account, count=2) == 2
+        assert _waiting_towards_dest() == 1
+        assert engine.flush() == 2
+        assert get_request_by_did(mock_scope, name1, dest_rse_id)['state'] == RequestState.QUEUED
+        assert get_request_by_did(mock_scope, name2, dest_rse_id)['state'] == RequestState.WAITING
+        assert get_request_by_did(mock_scope, name3, dest_rse_id)['state'] == RequestState.QUEUED
+
+        # the released requests are not seen as waiting again
+        engine.refresh()
+        assert _waiting_towards_dest() == 1
+        release_all_waiting_requests(dest_rse_id)
+        engine.refresh()
+        assert _waiting_towards_dest() == 0
+
+        # the incremental feed only lists the waiting and queued requests
+        request_ids = [get_request_by_did(mock_scope, name, dest_rse_id)['id'] for name in (name1, name2, name3)]
+        with db_session(DatabaseOperationType.WRITE) as session:
+            session.execute(update(models.Request).where(models.Request.id == request_ids[0]).values(state=RequestState.SUBMITTED))
+        changes = {row.id for row in list_waiting_request_changes(updated_since=datetime.utcnow() - timedelta(hours=1))}
+        assert request_ids[0] not in changes
+        assert set(request_ids[1:]) <= changes
+
+    def test_throttling_engine_flush_failure(self, mock_scope, root_account, connected_rse_pair, transfer_limit_factory):
+        """ THROTTLER (CORE): the in-memory view is reloaded when the release of the picked requests fails. """
+        source_rse, source_rse_id, dest_rse, dest_rse_id = connected_rse_pair
+
+        def _waiting_towards_dest():
+            return sum(stat.counter for stat in engine.waiting_stats() if stat.dest_rse_id == dest_rse_id)
+
+        transfer_limit_factory(dest_rse, self.all_activities, max_transfers=1)
+        name1, name2 = _add_test_replicas_and_request(
+            scope=mock_scope, account=root_account,
+            request_configs=[
+                {'source_rse_id': source_rse_id, 'dest_rse_id': dest_rse_id, 'requested_at': datetime.utcnow().replace(year=2018)},
+                {'source_rse_id': source_rse_id, 'dest_rse_id': dest_rse_id, 'requested_at': datetime.utcnow().replace(year=2020)},
+            ]
+        )
+        preparer(once=True, partition_wait_time=0, transfertools=['mock'])
+        engine = ThrottlingEngine()
+        engine.refresh()
+        assert _waiting_towards_dest() == 2
+
+        assert engine.release_fifo(source_rse_id=None, dest_rse_id=dest_rse_id, activity=None, account=root_account, count=1) == 1
+        with mock.patch('rucio.daemons.conveyor.throttler.release_waiting_requests_by_id', side_effect=RuntimeError('database unavailable')):
+            with pytest.raises(RuntimeError):
+                engine.flush()
+        assert get_request_by_did(mock_scope, name1, dest_rse_id)['state'] == RequestState.WAITING
+
+        # the next refresh reloads the requests which were not released
+        engine.refresh()
+        assert _waiting_towards_dest() == 2
+        assert engine.flush() == 0
+
+        assert engine.release_fifo(source_rse_id=None, dest_rse_id=dest_rse_id, activity=None, account=root_account, count=1) == 1
+        assert engine.flush() == 1
+        assert get_request_by_did(mock_scope, name1, dest_rse_id)['state'] == RequestState.QUEUED
+        assert get_request_by_did(mock_scope, name2, dest_rse_id)['state'] == RequestState.WAITING
@@ -13,19 +13,24 @@
 # limitations under the License.
 
 import datetime
+import random
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
+from rucio.common.constants import RseAttr
 from rucio.common.exception import NoDistance
 from rucio.common.utils import generate_uuid
 from rucio.core import request as request_core
 from rucio.core import rse as rse_core
 from rucio.core import rule as rule_core
-from rucio.core.distance import add_distance
+from rucio.core import transfer as transfer_core
+from rucio.core.distance import add_distance, update_distances
 from rucio.core.replica import add_replicas
 from rucio.core.request import list_and_mark_transfer_requests_and_source_replicas
-from rucio.core.topology import Topology, get_hops
+from rucio.core.topology import ExpiringObjectCache, Topology, get_hops
 from rucio.core.transfer import ProtocolFactory, build_transfer_paths
 from rucio.daemons.conveyor.common import assign_paths_to_transfertool_and_create_hops, pick_and_prepare_submission_path
 from rucio.db.sqla import models
@@ -150,6 +155,99 @@ def test_get_hops(rse_factory):
     assert hop4['dest_rse'].id == rse6_id
 
 
+def test_cached_shortest_paths(rse_factory):
+    """
+    The cached shortest paths must be the same as the ones computed by a full search,
+    also after an edge changed.
+    """
+    rse_ids = [rse_factory.make_mock_rse()[1] for _ in range(6)]
+    multihop_rse_ids = set(rse_ids[2:5])
+    for (src, dst), distance in {(0, 2): 10, (0, 3): 35, (1, 0): 10, (1, 5): 100, (2, 3): 10, (2, 5): 60,
+                                 (3, 4): 10, (4, 5): 10, (5, 2): 10}.items():
+        add_distance(rse_ids[src], rse_ids[dst], distance=distance)
+
+    session = get_session()
+    cached = Topology(rse_ids=rse_ids).configure_multihop(multihop_rse_ids=multihop_rse_ids, session=session)
+    legacy = Topology(rse_ids=rse_ids, cache_paths=False).configure_multihop(multihop_rse_ids=multihop_rse_ids, session=session)
+
+    def _search(topology, src_ids, dst_id):
+        found = topology.search_shortest_paths(src_nodes=[topology[rse_id] for rse_id in src_ids], dst_node=topology[dst_id], operation_src='third_party_copy_read',
+                                               operation_dest='third_party_copy_write', domain='wan', limit_dest_schemes=[], session=session)
+        return {src.id: [(hop['source_rse'].id, hop['dest_rse'].id, hop['cumulated_distance']) for hop in path] for src, path in found.items()}
+
+    def _check_paths():
+        for dst_id in rse_ids:
+            # The full search is done for one source at a time, otherwise it can use the other sources as intermediate hops
+            expected = {}
+            for src_id in rse_ids:
+                expected.update(_search(legacy, [src_id], dst_id))
+            assert _search(cached, rse_ids, dst_id) == expected
+
+    _check_paths()
+    # RSEs which are not enabled for multihop are not used as intermediate hops
+    assert [hop['dest_rse'].id for hop in get_hops(rse_ids[1], rse_ids[5], multihop_rse_ids=multihop_rse_ids)] == [rse_ids[5]]
+
+    version = cached.paths_version
+    for topology in (cached, legacy):
+        # Shortcut through a multihop node
+        topology.update_edge(topology[rse_ids[2]], topology[rse_ids[4]], 5)
+        # Change of the first hop of a source
+        topology.update_edge(topology[rse_ids[1]], topology[rse_ids[5]], 20)
+        # Removal of an edge used by the paths
+        topology.delete_edge(topology[rse_ids[3]], topology[rse_ids[4]])
+    assert cached.paths_version > version
+    _check_paths()
+
+
+def test_topology_refresh(rse_factory):
+    """
+    A refresh only reloads what changed, in a new topology object; readers of the cached
+    topology keep getting the previous one while it is refreshed.
+    """
+    rse_ids = [rse_factory.make_mock_rse()[1] for _ in range(3)]
+    add_distance(rse_ids[0], rse_ids[1], distance=10)
+    add_distance(rse_ids[1], rse_ids[2], distance=10)
+
+    topology = Topology(rse_ids=rse_ids).configure_multihop(multihop_rse_ids={rse_ids[1]})
+    topology.ensure_loaded(load_attributes=True, load_info=True)
+    topology.ensure_edges_loaded()
+
+    refreshed = topology.refreshed()
+    assert refreshed is not topology
+    assert refreshed.refreshed() is refreshed
+    assert refreshed.edge(refreshed[rse_ids[0]], refreshed[rse_ids[1]]).cost == 10
+    assert refreshed[rse_ids[1]].used_for_multihop
+
+    update_distances(rse_ids[1], rse_ids[2], distance=30)
+    rse_core.add_rse_attribute(rse_ids[2], 'refresh_test', True)
+    new_topology = refreshed.refreshed()
+    assert new_topology is not refreshed
+    assert new_topology.edge(new_topology[rse_ids[1]], new_topology[rse_ids[2]]).cost == 30
+    assert new_topology.edge(new_topology[rse_ids[0]], new_topology[rse_ids[1]]).cost == 10
+    assert new_topology[rse_ids[2]].attributes['refresh_test']
+    # Unchanged RSEs are not reloaded
+    assert new_topology[rse_ids[0]].attributes is refreshed[rse_ids[0]].attributes
+    # The previous object is untouched
+    assert refreshed.edge(refreshed[rse_ids[1]], refreshed[rse_ids[2]]).cost == 10
+    assert 'refresh_test' not in refreshed[rse_ids[2]].attributes
+
+    refresh_started, refresh_allowed = threading.Event(), threading.Event()
+
+    def _refresh(obj):
+        refresh_started.set()
+        refresh_allowed.wait(timeout=10)
+        return obj.refreshed()
+
+    cached_topology = ExpiringObjectCache(ttl=0, new_obj_fnc=lambda: new_topology, refresh_fnc=_refresh)
+    assert cached_topology.get() is new_topology
+    time.sleep(0.01)
+    assert cached_topology.get() is new_topology
+    assert refresh_started.wait(timeout=10)
+    # The refresh is in progress: readers don't wait for it
+    assert cached_topology.get() is new_topology
+    refresh_allowed.set()
+
+
 def test_disk_vs_tape_priority(rse_factory, root_account, mock_scope, file_config_mock):
     tape1_rse_name, tape1_rse_id = rse_factory.make_posix_rse(rse_type=RSEType.TAPE)
     tape2_rse_name, tape2_rse_id = rse_factory.make_posix_rse(rse_type=RSEType.TAPE)
@@ -327,6 +425,74 @@ def test_failure_rate_with_custom_strategy(rse_factory, root_account, mock_scope
         assert transfer[0].src.rse.name == high_failure_rse_name
 
 
+@pytest.mark.parametrize("file_config_mock", [
+    {"overrides": [('transfers', 'source_ranking_strategies', ','.join([
+        'EnforceSourceRSEExpression', 'SkipBlocklistedRSEs', 'SkipRestrictedRSEs', 'EnforceStagingBuffer', 'RestrictTapeSources', 'SkipSchemeMissmatch',
+        'SkipIntermediateTape', 'FailureRate', 'HighestAdjustedRankingFirst', 'PreferDiskOverTape', 'PathDistance', 'PreferSingleHop',
+    ]))]},
+], indirect=True)
+def test_vectorized_source_ranking(rse_factory, root_account, jdoe_account, mock_scope, file_config_mock, monkeypatch):
+    """
+    Ranking the sources of a batch of requests with arrays gives the same result as ranking them source by source
+    """
+    pytest.importorskip('numpy')
+    rng = random.Random(42)
+    source_rse_ids = []
+    for i in range(8):
+        _, rse_id = rse_factory.make_posix_rse(rse_type=RSEType.TAPE if i % 3 == 0 else RSEType.DISK)
+        source_rse_ids.append(rse_id)
+    dst_rse_name, dst_rse_id = rse_factory.make_posix_rse()
+    rse_core.add_rse_attribute(source_rse_ids[1], RseAttr.RESTRICTED_READ, True)
+    rse_core.update_rse(source_rse_ids[2], {'availability_read': False})
+    for rse_id in source_rse_ids:
+        # many ties, to check that the order of equal sources is preserved too
+        add_distance(rse_id, dst_rse_id, distance=rng.choice([10, 20]))
+
+    db_session = get_session()
+    for rse_id in source_rse_ids[3:6]:
+        models.TransferStats(
+            resolution=datetime.timedelta(minutes=5).total_seconds(),
+            timestamp=datetime.datetime.utcnow() - datetime.timedelta(minutes=30),
+            dest_rse_id=dst_rse_id,
+            src_rse_id=rse_id,
+            activity='test activity',
+            files_done=rng.randint(0, 5),
+            bytes_done=1,
+            files_failed=rng.randint(0, 5),
+        ).save(session=db_session)
+    db_session.commit()
+
+    for i in range(30):
+        file = {'scope': mock_scope, 'name': 'lfn.' + generate_uuid(), 'type': 'FILE', 'bytes': 1, 'adler32': 'beefdead'}
+        # the first file is only on tape
+        for rse_id in [source_rse_ids[0]] if i == 0 else rng.sample(source_rse_ids, rng.randint(1, len(source_rse_ids))):
+            add_replicas(rse_id=rse_id, files=[file], account=root_account)
+        rule_core.add_rule(dids=[{'scope': file['scope'], 'name': file['name']}], account=root_account, copies=1, rse_expression=dst_rse_name, grouping='ALL', weight=None,
+                           lifetime=None, locked=False, subscription_id=None)
+
+    topology = Topology().configure_multihop()
+    requests = list_and_mark_transfer_requests_and_source_replicas(rse_collection=topology, rses=source_rse_ids + [dst_rse_id])
+    assert len(requests) == 30
+    for rws in requests.values():
+        # only the requests of the admin account may read from the restricted RSE
+        rws.account = rng.choice([root_account, jdoe_account])
+        rws.attributes['allow_tape_source'] = rng.random() < 0.8 and [s.rse.id for s in rws.sources] != source_rse_ids[:1]
+        for source in rws.sources:
+            source.ranking = rng.randint(-2, 0)
+
+    def _ranked_sources():
+        paths, *rejected = build_transfer_paths(topology=topology, protocol_factory=ProtocolFactory(), requests_with_sources=requests.values(),
+                                                admin_accounts={root_account}, session=db_session)
+        return {request_id: [[(hop.src.rse.id, hop.dst.rse.id) for hop in path] for path in candidate_paths]
+                for request_id, candidate_paths in paths.items()}, rejected
+
+    vectorized = _ranked_sources()
+    monkeypatch.setitem(transfer_core.EXTRA_MODULES, 'numpy', None)
+    assert _ranked_sources() == vectorized
+    paths, (_, _, only_tape, _) = vectorized
+    assert paths and only_tape
+
+
 @pytest.mark.parametrize("caches_mock", [{"caches_to_mock": [
     'rucio.core.rse_expression_parser.REGION',  # The list of multihop RSEs is retrieved by an expression
 ]}], indirect=True)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the bulk registration of file replicas with core.replica.add_replicas.
+
+Runs against the database configured in rucio.cfg (SQLite, PostgreSQL, ...) and
+reports the per-phase timings recorded by add_replicas, together with the number
+of database round trips.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from prometheus_client import REGISTRY  # noqa: E402
+
+from rucio.common.stopwatch import Stopwatch  # noqa: E402
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core.replica import add_replicas  # noqa: E402
+from rucio.core.rse import add_rse  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+from rucio.tests.common_server import count_queries  # noqa: E402
+
+PHASES = ('check_dids', 'insert_dids', 'check_replicas', 'insert_replicas', 'update_counters')
+
+
+def phase_time(phase: str) -> float:
+    return REGISTRY.get_sample_value(f'rucio_core_replica_add_replicas_{phase}_sum') or 0.
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=10000, help='number of files per add_replicas call')
+    parser.add_argument('--scope', default='mock')
+    parser.add_argument('--account', default='root')
+    parser.add_argument('--vo', default='def')
+    args = parser.parse_args()
+
+    scope = InternalScope(args.scope, vo=args.vo)
+    account = InternalAccount(args.account, vo=args.vo)
+    rse_id = add_rse(f'BENCH_{generate_uuid()[:8].upper()}', vo=args.vo)
+    dialect = get_session().bind.dialect.name
+
+    run_id = generate_uuid()
+    stopwatch = Stopwatch()
+    with count_queries() as counter:
+        for start in range(0, args.files, args.batch_size):
+            files = [{'scope': scope, 'name': f'bench_{run_id}_{i}', 'bytes': 1, 'adler32': '0cc737eb'}
+                     for i in range(start, min(start + args.batch_size, args.files))]
+            session = get_session()
+            add_replicas(rse_id=rse_id, files=files, account=account, session=session)
+            session.commit()
+    stopwatch.stop()
+
+    print(f'{dialect}: {args.files} files in batches of {args.batch_size}')
+    print(f'total:            {stopwatch.elapsed:10.3f}s ({args.files / stopwatch.elapsed:,.0f} files/s)')
+    for phase in PHASES:
+        print(f'{phase + ":":17} {phase_time(phase):10.3f}s')
+    print(f'database round trips: {counter.count}')
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the creation of replication rules with core.rule.add_rules: one call for
+all the datasets (the rules are grouped and share their RSE resolution, quota state
+and DID lookup) against one call per dataset (every rule resolved on its own).
+
+Runs against the database configured in rucio.cfg and reports the wall time and the
+number of database round trips of both modes.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from rucio.common.stopwatch import Stopwatch  # noqa: E402
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core.did import add_did, attach_dids  # noqa: E402
+from rucio.core.replica import add_replicas  # noqa: E402
+from rucio.core.rse import add_rse, add_rse_attribute  # noqa: E402
+from rucio.core.rule import add_rules  # noqa: E402
+from rucio.db.sqla.constants import DIDType  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+from rucio.tests.common_server import count_queries  # noqa: E402
+
+
+def make_datasets(nb_datasets: int, nb_files: int, scope: InternalScope, account: InternalAccount, rse_id: str) -> list[dict]:
+    run_id = generate_uuid()
+    datasets = []
+    for i in range(nb_datasets):
+        files = [{'scope': scope, 'name': f'bench_{run_id}_{i}_{j}', 'bytes': 1, 'adler32': '0cc737eb'} for j in range(nb_files)]
+        add_replicas(rse_id=rse_id, files=files, account=account)
+        dataset = {'scope': scope, 'name': f'bench_{run_id}_{i}'}
+        add_did(did_type=DIDType.DATASET, account=account, **dataset)
+        attach_dids(dids=files, account=account, **dataset)
+        datasets.append(dataset)
+    return datasets
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--datasets', type=int, default=1000)
+    parser.add_argument('--files', type=int, default=10, help='number of files per dataset')
+    parser.add_argument('--rses', type=int, default=10, help='number of RSEs matched by the rule expression')
+    parser.add_argument('--copies', type=int, default=2)
+    parser.add_argument('--scope', default='mock')
+    parser.add_argument('--account', default='root')
+    parser.add_argument('--vo', default='def')
+    args = parser.parse_args()
+
+    scope = InternalScope(args.scope, vo=args.vo)
+    account = InternalAccount(args.account, vo=args.vo)
+    tag = f'bench_{generate_uuid()[:8]}'
+    source_rse_id = add_rse(f'BENCH_{generate_uuid()[:8].upper()}', vo=args.vo)
+    for _ in range(args.rses):
+        add_rse_attribute(add_rse(f'BENCH_{generate_uuid()[:8].upper()}', vo=args.vo), tag, True)
+    rule = {'account': account, 'copies': args.copies, 'rse_expression': tag, 'grouping': 'DATASET',
+            'weight': None, 'lifetime': None, 'locked': False, 'subscription_id': None}
+
+    results = {}
+    for mode in ('per dataset', 'batched'):
+        datasets = make_datasets(args.datasets, args.files, scope, account, source_rse_id)
+        stopwatch = Stopwatch()
+        with count_queries() as counter:
+            session = get_session()
+            if mode == 'batched':
+                add_rules(dids=datasets, rules=[dict(rule)], session=session)
+            else:
+                for dataset in datasets:
+                    add_rules(dids=[dataset], rules=[dict(rule)], session=session)
+            session.commit()
+        stopwatch.stop()
+        results[mode] = (stopwatch.elapsed, counter.count)
+
+    print(f'{get_session().bind.dialect.name}: {args.datasets} datasets of {args.files} files, {args.copies} copies over {args.rses} RSEs')
+    for mode, (elapsed, round_trips) in results.items():
+        print(f'{mode + ":":13} {elapsed:10.3f}s, {round_trips} round trips')
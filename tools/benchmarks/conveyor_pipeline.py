@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+End-to-end load benchmark of the conveyor: preparer, throttler, submitter, poller and finisher,
+driven one iteration at a time (once=True) with the mock transfertool, which submits nothing
+and reports every transfer as done at the first poll.
+
+For every scale, seeds a synthetic topology (source and destination RSEs with the mock protocol
+and distances between all of them), files on the sources, and one rule per dataset towards the
+destinations. The requests are created for the preparer and the destinations get a transfer
+limit, high enough to never hold them back, so that they go through every state: PREPARING,
+WAITING, QUEUED, SUBMITTED and DONE. Then runs every stage until it has drained its input and reports, per stage, the
+requests handled per second, the number of SQL statements and their latency percentiles.
+
+Runs against the database configured in rucio.cfg: point RUCIO_CONFIG to a configuration using
+SQLite or a local PostgreSQL, dedicated to the benchmark, as the poller and finisher also handle
+requests which were not created by it.
+"""
+
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from collections import defaultdict
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from rucio.common.constants import TransferLimitDirection  # noqa: E402
+from rucio.common.stopwatch import Stopwatch  # noqa: E402
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core import config as core_config  # noqa: E402
+from rucio.core.did import add_did, attach_dids  # noqa: E402
+from rucio.core.replica import add_replicas  # noqa: E402
+from rucio.core.request import delete_transfer_limit, set_transfer_limit  # noqa: E402
+from rucio.core.rse import add_protocol, add_rse, add_rse_attribute  # noqa: E402
+from rucio.core.rule import add_rules  # noqa: E402
+from rucio.daemons.conveyor.finisher import finisher  # noqa: E402
+from rucio.daemons.conveyor.poller import poller  # noqa: E402
+from rucio.daemons.conveyor.preparer import preparer  # noqa: E402
+from rucio.daemons.conveyor.submitter import submitter  # noqa: E402
+from rucio.daemons.conveyor.throttler import throttler  # noqa: E402
+from rucio.db.sqla import models  # noqa: E402
+from rucio.db.sqla.constants import DIDType, RequestState  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+from rucio.tests.common_server import count_queries  # noqa: E402
+
+
+def percentile(durations: list[float], p: float) -> float:
+    if not durations:
+        return 0
+    durations = sorted(durations)
+    return durations[min(len(durations) - 1, int(p / 100 * len(durations)))]
+
+
+def seed(nb_requests: int, nb_files: int, nb_sources: int, nb_destinations: int, scope: InternalScope, account: InternalAccount, vo: str) -> tuple[str, list[str]]:
+    """
+    :returns: The RSE expression and the ids of the destination RSEs.
+    """
+    prefix = f'BENCH{generate_uuid()[:8].upper()}'
+    tag = prefix.lower()
+    rse_ids = {}
+    for kind, count in (('SRC', nb_sources), ('DST', nb_destinations)):
+        rse_ids[kind] = []
+        for i in range(count):
+            rse_id = add_rse(f'{prefix}_{kind}{i}', vo=vo)
+            add_protocol(rse_id=rse_id, parameter={
+                'scheme': 'mock',
+                'hostname': f'{rse_id}.cern.ch',
+                'port': 0,
+                'prefix': f'/bench_{rse_id}/',
+                'impl': 'rucio.rse.protocols.mock.Default',
+                'domains': {'wan': {'read': 1, 'write': 1, 'delete': 1, 'third_party_copy_read': 1, 'third_party_copy_write': 1},
+                            'lan': {'read': 1, 'write': 1, 'delete': 1}},
+            })
+            rse_ids[kind].append(rse_id)
+    for rse_id in rse_ids['DST']:
+        add_rse_attribute(rse_id, tag, True)
+    # a limit which is never reached, so that the requests go through the throttler without being held back
+    set_transfer_limit(tag, direction=TransferLimitDirection.DESTINATION, max_transfers=nb_requests)
+
+    session = get_session()
+    session.execute(insert(models.Distance), [{'src_rse_id': src_rse_id, 'dest_rse_id': dest_rse_id, 'distance': random.randint(1, 10)}  # noqa: S311
+                                              for src_rse_id in rse_ids['SRC'] for dest_rse_id in rse_ids['DST']])
+    session.commit()
+
+    datasets = []
+    for i in range(max(1, nb_requests // nb_files)):
+        files = [{'scope': scope, 'name': f'{tag}_{i}_{j}', 'bytes': 1, 'adler32': '0cc737eb'} for j in range(nb_files)]
+        add_replicas(rse_id=random.choice(rse_ids['SRC']), files=files, account=account)  # noqa: S311
+        dataset = {'scope': scope, 'name': f'{tag}_{i}'}
+        add_did(did_type=DIDType.DATASET, account=account, **dataset)
+        attach_dids(dids=files, account=account, **dataset)
+        datasets.append(dataset)
+
+    session = get_session()
+    add_rules(dids=datasets, rules=[{'account': account, 'copies': 1, 'rse_expression': tag, 'grouping': 'DATASET', 'weight': None,
+                                     'lifetime': None, 'locked': False, 'subscription_id': None}], session=session)
+    session.commit()
+    return tag, rse_ids['DST']
+
+
+def count_requests(dest_rse_ids: list[str]) -> dict[RequestState, int]:
+    session = get_session()
+    stmt = select(
+        models.Request.state,
+        func.count(),
+    ).where(
+        models.Request.dest_rse_id.in_(dest_rse_ids)
+    ).group_by(
+        models.Request.state
+    )
+    counts = defaultdict(int, session.execute(stmt).all())
+    session.commit()
+    return counts
+
+
+def run_stage(run_once, input_states: list[RequestState], dest_rse_ids: list[str], max_idle: int = 2) -> dict:
+    """
+    Call run_once until the number of requests in input_states stops decreasing.
+
+    Only the statements and the time spent in run_once are accounted, not the ones of the
+    bookkeeping between two iterations.
+    """
+    before = remaining = sum(count_requests(dest_rse_ids)[state] for state in input_states)
+    iterations, idle, elapsed, durations = 0, 0, 0.0, []
+    while remaining and idle < max_idle:
+        with count_queries() as counter:
+            stopwatch = Stopwatch()
+            run_once()
+            stopwatch.stop()
+        elapsed += stopwatch.elapsed
+        durations.extend(counter.durations)
+        iterations += 1
+        left = sum(count_requests(dest_rse_ids)[state] for state in input_states)
+        idle = idle + 1 if left >= remaining else 0
+        remaining = left
+    handled = before - remaining
+    return {'iterations': iterations, 'handled': handled, 'elapsed': elapsed,
+            'rate': handled / elapsed if elapsed else 0, 'queries': len(durations),
+            'p50': percentile(durations, 50), 'p95': percentile(durations, 95), 'p99': percentile(durations, 99)}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--scales', default='100,1000', help='comma separated numbers of requests to benchmark')
+    parser.add_argument('--files', type=int, default=10, help='number of files per dataset, each dataset gets one rule')
+    parser.add_argument('--sources', type=int, default=5, help='number of source RSEs')
+    parser.add_argument('--destinations', type=int, default=5, help='number of destination RSEs')
+    parser.add_argument('--bulk', type=int, default=100, help='bulk size of the daemons')
+    parser.add_argument('--scope', default='mock')
+    parser.add_argument('--account', default='root')
+    parser.add_argument('--vo', default='def')
+    args = parser.parse_args()
+
+    scope = InternalScope(args.scope, vo=args.vo)
+    account = InternalAccount(args.account, vo=args.vo)
+    print(f'{get_session().bind.dialect.name}: {args.sources} sources, {args.destinations} destinations, {args.files} files per rule')
+
+    # create the requests in the PREPARING state, as with the preparer deployed
+    core_config.set('conveyor', 'use_preparer', 'true')
+    for scale in (int(scale) for scale in args.scales.split(',')):
+        stopwatch = Stopwatch()
+        rse_expression, dest_rse_ids = seed(scale, args.files, args.sources, args.destinations, scope, account, args.vo)
+        stopwatch.stop()
+        rses = [{'id': rse_id} for rse_id in dest_rse_ids]
+        print(f'\n{scale} requests, seeded in {stopwatch.elapsed:.1f}s')
+        stages = [
+            ('preparer', [RequestState.PREPARING],
+             lambda: preparer(once=True, bulk=args.bulk, partition_wait_time=0, transfertools=['mock'])),
+            ('throttler', [RequestState.WAITING],
+             lambda: throttler(once=True, partition_wait_time=0)),
+            ('submitter', [RequestState.QUEUED],
+             lambda: submitter(once=True, rses=rses, bulk=args.bulk, partition_wait_time=0, transfertools=['mock'], transfertype='single', filter_transfertool=None)),
+            ('poller', [RequestState.SUBMITTED],
+             lambda: poller(once=True, db_bulk=args.bulk, older_than=0, partition_wait_time=0, transfertool='mock', filter_transfertool=None)),
+            ('finisher', [RequestState.DONE, RequestState.FAILED],
+             lambda: finisher(once=True, db_bulk=args.bulk, partition_wait_time=0)),
+        ]
+        print(f'{"stage":10} {"iter":>5} {"requests":>9} {"time [s]":>9} {"req/s":>9} {"queries":>8} {"q/req":>6} {"p50 [ms]":>9} {"p95 [ms]":>9} {"p99 [ms]":>9}')
+        for name, input_states, run_once in stages:
+            result = run_stage(run_once, input_states, dest_rse_ids)
+            print(f'{name:10} {result["iterations"]:5} {result["handled"]:9} {result["elapsed"]:9.2f} {result["rate"]:9.1f} {result["queries"]:8}'
+                  f' {result["queries"] / max(1, result["handled"]):6.1f} {result["p50"] * 1000:9.2f} {result["p95"] * 1000:9.2f} {result["p99"] * 1000:9.2f}')
+        left = {state.name: count for state, count in count_requests(dest_rse_ids).items() if count}
+        if left:
+            print(f'requests left: {left}')
+        delete_transfer_limit(rse_expression, direction=TransferLimitDirection.DESTINATION)
+    core_config.remove_option('conveyor', 'use_preparer')
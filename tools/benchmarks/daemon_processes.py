@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare N threads in one process with N worker processes (run_processes) for the submitter,
+with the mock transfertool, and for the judge evaluator.
+
+submitter  seeds queued requests the same way as conveyor_pipeline.py, then runs the submitter
+           until all of them are submitted
+evaluator  seeds datasets with a rule and attaches files to them, then runs the judge evaluator
+           until all the updated DIDs are evaluated
+
+Runs against the database configured in rucio.cfg, which must be shared by the processes and
+dedicated to the benchmark: use PostgreSQL, SQLite serializes the writers of all the processes.
+"""
+
+import os
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conveyor_pipeline import count_requests, run_stage, seed  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core.did import add_did, attach_dids  # noqa: E402
+from rucio.core.replica import add_replicas  # noqa: E402
+from rucio.core.rse import add_rse, add_rse_attribute  # noqa: E402
+from rucio.core.rule import add_rule  # noqa: E402
+from rucio.daemons.common import run_processes  # noqa: E402
+from rucio.daemons.conveyor import submitter  # noqa: E402
+from rucio.daemons.conveyor.preparer import preparer  # noqa: E402
+from rucio.daemons.conveyor.throttler import throttler  # noqa: E402
+from rucio.daemons.judge import evaluator  # noqa: E402
+from rucio.db.sqla import models  # noqa: E402
+from rucio.db.sqla.constants import DIDType, RequestState  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+
+
+def drain(start_daemon, stop_daemon, graceful_stop: threading.Event, remaining, timeout: float) -> dict:
+    """
+    Start the daemon in a thread and stop it once remaining() reaches 0.
+    """
+    before = remaining()
+    graceful_stop.clear()
+    thread = threading.Thread(target=start_daemon, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    left = before
+    while left and time.perf_counter() - start < timeout:
+        time.sleep(0.5)
+        left = remaining()
+    elapsed = time.perf_counter() - start
+    stop_daemon()
+    thread.join()
+    graceful_stop.clear()
+    return {'handled': before - left, 'left': left, 'elapsed': elapsed, 'rate': (before - left) / elapsed}
+
+
+def bench_submitter(mode: str, args, scope: InternalScope, account: InternalAccount) -> dict:
+    dest_rse_ids = seed(args.requests, args.files, args.sources, args.destinations, scope, account, args.vo)
+    run_stage(lambda: preparer(once=True, bulk=args.bulk, partition_wait_time=0, transfertools=['mock']), [RequestState.PREPARING], dest_rse_ids)
+    run_stage(lambda: throttler(once=True, partition_wait_time=0), [RequestState.WAITING], dest_rse_ids)
+
+    kwargs = {'once': False, 'rses': [{'id': rse_id} for rse_id in dest_rse_ids], 'bulk': args.bulk, 'partition_wait_time': args.partition_wait_time,
+              'sleep_time': 1, 'transfertools': ['mock'], 'transfertype': 'single', 'filter_transfertool': None}
+    if mode == 'threads':
+        def start_daemon():
+            submitter._submitter_process(total_threads=args.workers, **kwargs)
+    else:
+        def start_daemon():
+            run_processes(target=submitter._submitter_process, stop_fnc=submitter.stop, processes=args.workers, graceful_stop=submitter.GRACEFUL_STOP,
+                          process_name='benchmark-submitter', kwargs={'total_threads': 1, **kwargs})
+    return drain(start_daemon, submitter.stop, submitter.GRACEFUL_STOP, lambda: count_requests(dest_rse_ids)[RequestState.QUEUED], args.timeout)
+
+
+def bench_evaluator(mode: str, args, scope: InternalScope, account: InternalAccount) -> dict:
+    prefix = f'BENCH{generate_uuid()[:8].upper()}'
+    tag = prefix.lower()
+    source_rse_id = add_rse(f'{prefix}_SRC', vo=args.vo)
+    for i in range(args.destinations):
+        add_rse_attribute(add_rse(f'{prefix}_DST{i}', vo=args.vo), tag, True)
+    for i in range(max(1, args.requests // args.files)):
+        dataset = {'scope': scope, 'name': f'{tag}_{i}'}
+        add_did(did_type=DIDType.DATASET, account=account, **dataset)
+        add_rule(dids=[dataset], account=account, copies=1, rse_expression=tag, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)
+        files = [{'scope': scope, 'name': f'{tag}_{i}_{j}', 'bytes': 1, 'adler32': '0cc737eb'} for j in range(args.files)]
+        add_replicas(rse_id=source_rse_id, files=files, account=account)
+        attach_dids(dids=files, account=account, **dataset)
+
+    def remaining():
+        session = get_session()
+        stmt = select(func.count()).where(models.UpdatedDID.scope == scope, models.UpdatedDID.name.like(f'{tag}%'))
+        count = session.execute(stmt).scalar_one()
+        session.commit()
+        return count
+
+    kwargs = {'sleep_time': 1, 'did_limit': args.bulk}
+    if mode == 'threads':
+        def start_daemon():
+            evaluator._run_threads(threads=args.workers, **kwargs)
+    else:
+        def start_daemon():
+            run_processes(target=evaluator._run_threads, stop_fnc=evaluator.stop, processes=args.workers, graceful_stop=evaluator.graceful_stop,
+                          process_name='benchmark-evaluator', kwargs={'threads': 1, **kwargs})
+    return drain(start_daemon, evaluator.stop, evaluator.graceful_stop, remaining, args.timeout)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--daemons', default='submitter,evaluator', help='comma separated daemons to benchmark: submitter, evaluator')
+    parser.add_argument('--workers', type=int, default=4, help='number of threads, or of processes')
+    parser.add_argument('--requests', type=int, default=2000, help='number of requests to submit, or of files to evaluate')
+    parser.add_argument('--files', type=int, default=100, help='number of files per dataset')
+    parser.add_argument('--sources', type=int, default=5, help='number of source RSEs')
+    parser.add_argument('--destinations', type=int, default=5, help='number of destination RSEs')
+    parser.add_argument('--bulk', type=int, default=100, help='bulk size of the daemons')
+    parser.add_argument('--partition-wait-time', type=int, default=5, help='seconds the daemons wait for the heartbeats of the other workers')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds after which a run is stopped')
+    parser.add_argument('--scope', default='mock')
+    parser.add_argument('--account', default='root')
+    parser.add_argument('--vo', default='def')
+    args = parser.parse_args()
+
+    scope = InternalScope(args.scope, vo=args.vo)
+    account = InternalAccount(args.account, vo=args.vo)
+    benchmarks = {'submitter': bench_submitter, 'evaluator': bench_evaluator}
+    print(f'{get_session().bind.dialect.name}: {args.workers} workers, {args.requests} requests or files')
+    print(f'{"daemon":10} {"mode":10} {"handled":>8} {"left":>6} {"time [s]":>9} {"per s":>8}')
+    for daemon in args.daemons.split(','):
+        for mode in ('threads', 'processes'):
+            result = benchmarks[daemon](mode, args, scope, account)
+            print(f'{daemon:10} {mode:10} {result["handled"]:8} {result["left"]:6} {result["elapsed"]:9.2f} {result["rate"]:8.1f}')
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the resolution of the parents of the files listed by list_replicas(resolve_parents=True):
+one list_all_parent_dids call per file against list_all_parent_dids_bulk on batches of files.
+
+Seeds files with replicas on a new RSE, each attached to a dataset, and the datasets to a
+container, in the database configured in rucio.cfg. Reports the time and the number of
+database round trips of each resolution, and of list_replicas itself.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from rucio.common.stopwatch import Stopwatch  # noqa: E402
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core.did import add_did, attach_dids, list_all_parent_dids, list_all_parent_dids_bulk  # noqa: E402
+from rucio.core.replica import add_replicas, list_replicas  # noqa: E402
+from rucio.core.rse import add_rse  # noqa: E402
+from rucio.db.sqla.constants import DIDType  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+from rucio.tests.common_server import count_queries  # noqa: E402
+
+
+def seed(nb_files: int, files_per_dataset: int, scope: InternalScope, account: InternalAccount, vo: str) -> list[dict]:
+    run_id = generate_uuid()
+    rse_id = add_rse(f'BENCH_{run_id[:8].upper()}', vo=vo)
+    files = [{'scope': scope, 'name': f'bench_{run_id}_{i}', 'bytes': 1, 'adler32': '0cc737eb'} for i in range(nb_files)]
+    session = get_session()
+    add_replicas(rse_id=rse_id, files=files, account=account, ignore_availability=True, session=session)
+    container = {'scope': scope, 'name': f'bench_{run_id}_container'}
+    add_did(did_type=DIDType.CONTAINER, account=account, session=session, **container)
+    datasets = []
+    for start in range(0, nb_files, files_per_dataset):
+        dataset = {'scope': scope, 'name': f'bench_{run_id}_dataset_{start}'}
+        add_did(did_type=DIDType.DATASET, account=account, session=session, **dataset)
+        attach_dids(dids=files[start:start + files_per_dataset], account=account, session=session, **dataset)
+        datasets.append(dataset)
+    attach_dids(dids=datasets, account=account, session=session, **container)
+    session.commit()
+    return files
+
+
+def measure(name: str, func) -> None:
+    session = get_session()
+    with count_queries() as counter:
+        stopwatch = Stopwatch()
+        func(session)
+        stopwatch.stop()
+    session.rollback()
+    print(f'{name:24} {stopwatch.elapsed:9.3f}s {counter.count:9} round trips')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--files-per-dataset', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=1000, help='number of files per list_all_parent_dids_bulk call')
+    parser.add_argument('--scope', default='mock')
+    parser.add_argument('--account', default='root')
+    parser.add_argument('--vo', default='def')
+    args = parser.parse_args()
+
+    scope = InternalScope(args.scope, vo=args.vo)
+    account = InternalAccount(args.account, vo=args.vo)
+    files = seed(args.files, args.files_per_dataset, scope, account, args.vo)
+    print(f'{get_session().bind.dialect.name}: {args.files} files, {args.files_per_dataset} per dataset')
+
+    measure('per file', lambda session: [list(list_all_parent_dids(f['scope'], f['name'], session=session)) for f in files])
+    measure(f'bulk, batches of {args.batch_size}',
+            lambda session: [list_all_parent_dids_bulk(files[start:start + args.batch_size], session=session)
+                             for start in range(0, len(files), args.batch_size)])
+    measure('list_replicas', lambda session: list(list_replicas(dids=[{'scope': f['scope'], 'name': f['name']} for f in files],
+                                                                resolve_parents=True, session=session)))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the shortest path lookups done by build_transfer_paths: the per-request
+Dijkstra search of Topology against the cached shortest path trees, and the cost of
+invalidating the cached paths when the distance of a single link changes.
+
+Populates a synthetic topology (1000 RSEs by default, with random links and a subset
+of them enabled for multihop) in the database configured in rucio.cfg. The topology
+can be reused with --prefix.
+"""
+
+import os
+import random
+import sys
+import time
+from argparse import ArgumentParser
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core.rse import add_protocol, add_rse, list_rses  # noqa: E402
+from rucio.core.topology import Topology  # noqa: E402
+from rucio.db.sqla import models  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+
+
+def populate(prefix: str, nb_rses: int, nb_links: int, vo: str) -> list[str]:
+    rse_ids = []
+    for i in range(nb_rses):
+        rse_id = add_rse(f'{prefix}_{i}', vo=vo)
+        add_protocol(rse_id=rse_id, parameter={
+            'scheme': 'root',
+            'hostname': f'{rse_id}.cern.ch',
+            'port': 1094,
+            'prefix': f'/bench_{rse_id}/',
+            'impl': 'rucio.rse.protocols.xrootd.Default',
+            'domains': {'wan': {'read': 1, 'write': 1, 'delete': 1, 'third_party_copy_read': 1, 'third_party_copy_write': 1},
+                        'lan': {'read': 1, 'write': 1, 'delete': 1}},
+        })
+        rse_ids.append(rse_id)
+
+    session = get_session()
+    session.execute(insert(models.Distance), [
+        {'src_rse_id': src_rse_id, 'dest_rse_id': dest_rse_id, 'distance': random.randint(1, 100)}  # noqa: S311
+        for src_rse_id in rse_ids
+        for dest_rse_id in random.sample([rse_id for rse_id in rse_ids if rse_id != src_rse_id], nb_links)
+    ])
+    session.commit()
+    return rse_ids
+
+
+def lookups(topology: Topology, queries: list, session) -> float:
+    start = time.perf_counter()
+    for src_ids, dst_id in queries:
+        topology.search_shortest_paths(src_nodes=[topology[rse_id] for rse_id in src_ids], dst_node=topology[dst_id],
+                                       operation_src='third_party_copy_read', operation_dest='third_party_copy_write',
+                                       domain='wan', limit_dest_schemes=[], session=session)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rses', type=int, default=1000)
+    parser.add_argument('--links', type=int, default=20, help='number of outgoing links of each RSE')
+    parser.add_argument('--multihop-fraction', type=float, default=0.1, help='fraction of the RSEs enabled for multihop')
+    parser.add_argument('--requests', type=int, default=10000, help='number of requests to find paths for')
+    parser.add_argument('--sources', type=int, default=3, help='number of source replicas of each request')
+    parser.add_argument('--destinations', type=int, default=100, help='number of distinct destinations of the requests')
+    parser.add_argument('--edge-updates', type=int, default=1000)
+    parser.add_argument('--prefix', help='reuse the RSEs populated by a previous run with this name prefix')
+    parser.add_argument('--vo', default='def')
+    args = parser.parse_args()
+
+    if args.prefix:
+        rse_ids = [rse['id'] for rse in list_rses() if rse['rse'].startswith(args.prefix + '_')]
+    else:
+        prefix = f'BENCH{generate_uuid()[:8].upper()}'
+        start = time.perf_counter()
+        rse_ids = populate(prefix, args.rses, args.links, args.vo)
+        print(f'populated {prefix} with {args.rses} RSEs in {time.perf_counter() - start:.1f}s')
+
+    multihop_rse_ids = set(random.sample(rse_ids, int(len(rse_ids) * args.multihop_fraction)))
+    destinations = random.sample(rse_ids, min(args.destinations, len(rse_ids)))
+    queries = [(random.sample(rse_ids, args.sources), random.choice(destinations)) for _ in range(args.requests)]  # noqa: S311
+
+    session = get_session()
+    results = {}
+    for cache_paths in (False, True):
+        topology = Topology(rse_ids=rse_ids, cache_paths=cache_paths).configure_multihop(multihop_rse_ids=multihop_rse_ids, session=session)
+        topology.ensure_loaded(load_name=True, load_columns=True, load_attributes=True, load_info=True, session=session)
+        topology.ensure_edges_loaded(session=session)
+        results[cache_paths] = lookups(topology, queries, session)
+        if cache_paths:
+            results['warm'] = lookups(topology, queries, session)
+            edges = random.sample(list(topology.edges), min(args.edge_updates, len(topology.edges)))
+            start = time.perf_counter()
+            for src_node, dst_node in edges:
+                topology.update_edge(src_node, dst_node, random.randint(1, 100))  # noqa: S311
+            results['update'] = time.perf_counter() - start
+            results['after_update'] = lookups(topology, queries, session)
+
+    print(f'{len(rse_ids)} RSEs, {len(multihop_rse_ids)} multihop, {args.requests} requests with {args.sources} sources towards {len(destinations)} destinations')
+    print(f'dijkstra per request:         {results[False]:10.3f}s')
+    print(f'cached trees (cold):          {results[True]:10.3f}s')
+    print(f'cached trees (warm):          {results["warm"]:10.3f}s')
+    print(f'{len(edges)} edge updates:            {results["update"]:10.3f}s')
+    print(f'cached trees (after updates): {results["after_update"]:10.3f}s')
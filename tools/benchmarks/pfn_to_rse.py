@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the resolution of PFNs to RSEs: PFNToRSEIndex against the
+previous per-pattern scan of all RSE protocols.
+
+The previous algorithm is too slow to run on the full set of PFNs, so it is
+measured on a sample and extrapolated.
+"""
+
+import os
+import random
+import sys
+import time
+from argparse import ArgumentParser
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from rucio.core.replica import PFNToRSEIndex  # noqa: E402
+
+
+def synthetic_protocols(nb_rses: int, protocols_per_rse: int):
+    for i in range(nb_rses):
+        for j in range(protocols_per_rse):
+            yield (f'rse{i:05d}', 'def', 'davs', f'storage{i % (nb_rses // 2 or 1)}.site{i}.org', 443 + j, f'/data{j}/rse{i}/')
+
+
+def scan_lookup(patterns: dict[str, list[str]], pfn: str) -> list[str]:
+    """ The per-pattern matching previously done by get_pfn_to_rse """
+    return [rse_id for rse_id, rse_patterns in patterns.items() for pattern in rse_patterns if pfn.find(pattern) > -1]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--rses', type=int, default=1000)
+    parser.add_argument('--protocols-per-rse', type=int, default=2)
+    parser.add_argument('--pfns', type=int, default=1000000)
+    parser.add_argument('--scan-sample', type=int, default=1000)
+    args = parser.parse_args()
+
+    protocols = list(synthetic_protocols(args.rses, args.protocols_per_rse))
+    rng = random.Random(42)  # noqa: S311
+    pfns = []
+    for _ in range(args.pfns):
+        rse_id, _, scheme, hostname, port, prefix = rng.choice(protocols)
+        pfns.append(f'{scheme}://{hostname}:{port}{prefix}scope/{rng.getrandbits(64):x}')
+
+    start = time.perf_counter()
+    index = PFNToRSEIndex(protocols)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for pfn in pfns:
+        index.lookup(pfn, vo='def')
+    index_time = time.perf_counter() - start
+
+    patterns = {}
+    for rse_id, _, scheme, hostname, port, prefix in protocols:
+        patterns.setdefault(rse_id, []).extend([f'{scheme}://{hostname}:{port}{prefix}', f'{scheme}://{hostname}{prefix}'])
+    sample = pfns[:args.scan_sample]
+    start = time.perf_counter()
+    for pfn in sample:
+        scan_lookup(patterns, pfn)
+    scan_time = (time.perf_counter() - start) * len(pfns) / len(sample)
+
+    print(f'{len(protocols)} protocols, {len(pfns)} PFNs')
+    print(f'index build:          {build_time:10.3f}s')
+    print(f'index lookups:        {index_time:10.3f}s ({len(pfns) / index_time:,.0f} PFN/s)')
+    print(f'scan (extrapolated):  {scan_time:10.3f}s ({len(pfns) / scan_time:,.0f} PFN/s)')
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark the selection of deletion candidates done by the reaper: the keyset walk
+over REPLICAS_DELETION_QUEUE_IDX against the previous ordered scan of all the
+replicas with an expired tombstone.
+
+Populates a synthetic RSE (10M replicas by default) in the database configured in
+rucio.cfg. Both selections are rolled back, so the RSE can be reused with --rse.
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from sqlalchemy import and_, insert, or_, select  # noqa: E402
+
+from rucio.common.types import InternalAccount, InternalScope  # noqa: E402
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core.replica import _claim_deletion_candidates  # noqa: E402
+from rucio.core.rse import add_rse, get_rse_id  # noqa: E402
+from rucio.db.sqla import models  # noqa: E402
+from rucio.db.sqla.constants import DIDType, ReplicaState  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+
+
+def populate(rse_id: str, scope: InternalScope, account: InternalAccount, nb_replicas: int, locked_fraction: float, batch_size: int) -> None:
+    run_id = generate_uuid()
+    now = datetime.utcnow()
+    locked_every = int(1 / locked_fraction) if locked_fraction else 0
+    for start in range(0, nb_replicas, batch_size):
+        names = [f'bench_{run_id}_{i}' for i in range(start, min(start + batch_size, nb_replicas))]
+        session = get_session()
+        session.execute(insert(models.DataIdentifier), [
+            {'scope': scope, 'name': name, 'account': account, 'did_type': DIDType.FILE, 'bytes': 1, 'adler32': '0cc737eb'}
+            for name in names
+        ])
+        session.execute(insert(models.RSEFileAssociation), [
+            {'rse_id': rse_id, 'scope': scope, 'name': name, 'bytes': 1, 'state': ReplicaState.AVAILABLE,
+             'lock_cnt': 1 if locked_every and (start + i) % locked_every == 0 else 0,
+             'tombstone': now - timedelta(seconds=start + i)}
+            for i, name in enumerate(names)
+        ])
+        session.commit()
+
+
+def legacy_candidates(rse_id: str, limit: int, session) -> list:
+    """ The ordered scan previously done by list_and_mark_unlocked_replicas, up to its first chunk """
+    stmt = select(
+        models.RSEFileAssociation.scope,
+        models.RSEFileAssociation.name,
+    ).where(
+        models.RSEFileAssociation.lock_cnt == 0,
+        models.RSEFileAssociation.rse_id == rse_id,
+        models.RSEFileAssociation.tombstone < datetime.utcnow(),
+    ).where(
+        or_(models.RSEFileAssociation.state.in_((ReplicaState.AVAILABLE, ReplicaState.UNAVAILABLE, ReplicaState.BAD)),
+            and_(models.RSEFileAssociation.state == ReplicaState.BEING_DELETED, models.RSEFileAssociation.updated_at < datetime.utcnow() - timedelta(seconds=600)))
+    ).outerjoin(
+        models.Source,
+        and_(models.RSEFileAssociation.scope == models.Source.scope,
+             models.RSEFileAssociation.name == models.Source.name,
+             models.RSEFileAssociation.rse_id == models.Source.rse_id)
+    ).where(
+        models.Source.scope.is_(None)
+    ).order_by(
+        models.RSEFileAssociation.tombstone,
+        models.RSEFileAssociation.updated_at
+    ).with_for_update(
+        skip_locked=True,
+        of=models.RSEFileAssociation.scope,
+    )
+    result = session.execute(stmt).yield_per(2 * limit)
+    return result.fetchmany(int(1.25 * limit))
+
+
+def measure(func, rse_id: str, limit: int, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        session = get_session()
+        start = time.perf_counter()
+        func(rse_id, limit, session)
+        best = min(best, time.perf_counter() - start)
+        session.rollback()
+    return best
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--replicas', type=int, default=10000000)
+    parser.add_argument('--locked-fraction', type=float, default=0.1, help='fraction of the replicas with lock_cnt > 0')
+    parser.add_argument('--limit', type=int, default=1000, help='number of candidates requested per reaper chunk')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--insert-batch-size', type=int, default=10000)
+    parser.add_argument('--rse', help='reuse an RSE populated by a previous run')
+    parser.add_argument('--scope', default='mock')
+    parser.add_argument('--account', default='root')
+    parser.add_argument('--vo', default='def')
+    args = parser.parse_args()
+
+    if args.rse:
+        rse_id = get_rse_id(args.rse, vo=args.vo)
+    else:
+        rse = f'BENCH_{generate_uuid()[:8].upper()}'
+        rse_id = add_rse(rse, vo=args.vo)
+        start = time.perf_counter()
+        populate(rse_id, InternalScope(args.scope, vo=args.vo), InternalAccount(args.account, vo=args.vo),
+                 args.replicas, args.locked_fraction, args.insert_batch_size)
+        print(f'populated {rse} with {args.replicas} replicas in {time.perf_counter() - start:.1f}s')
+
+    batch_size = int(1.25 * args.limit)
+    legacy_time = measure(legacy_candidates, rse_id, args.limit, args.repeat)
+    queue_time = measure(lambda rse_id, limit, session: _claim_deletion_candidates(rse_id=rse_id, limit=batch_size, session=session),
+                         rse_id, args.limit, args.repeat)
+
+    print(f'{get_session().bind.dialect.name}: first {batch_size} candidates, best of {args.repeat}')
+    print(f'ordered scan:    {legacy_time:10.3f}s')
+    print(f'deletion queue:  {queue_time:10.3f}s')
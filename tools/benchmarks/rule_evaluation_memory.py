@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measure the memory and time taken by the in-memory resolution of a large container
+during rule evaluation, for the previous representation (one dictionary and one
+InternalScope per file, per-dataset dictionaries merged by rebuilding them) and the
+current one (FileColumns, interned scopes, in-place merges).
+
+The rows are synthetic: no database is needed.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from rucio.common.file_columns import FileColumns  # noqa: E402
+from rucio.common.types import InternalScope  # noqa: E402
+
+
+def dataset_rows(dataset: int, nb_files: int):
+    """ The rows of one dataset, with a new InternalScope per row as returned by the database driver """
+    for i in range(nb_files):
+        yield InternalScope('mc23_13p6TeV', vo='def', from_external=False), f'EVNT.{dataset:06d}._{i:06d}.pool.root.1', 2 ** 31 + i, None, f'{i:08x}'
+
+
+def previous(nb_datasets: int, nb_files: int):
+    datasetfiles, replicas = [], {}
+    for dataset in range(nb_datasets):
+        files, tmp_replicas = {}, {}
+        for scope, name, bytes_, md5, adler32 in dataset_rows(dataset, nb_files):
+            files[(scope, name)] = {'scope': scope, 'name': name, 'bytes': bytes_, 'md5': md5, 'adler32': adler32}
+            tmp_replicas[(scope, name)] = []
+        datasetfiles.append({'scope': None, 'name': dataset, 'files': list(files.values())})
+        replicas = dict(list(replicas.items()) + list(tmp_replicas.items()))
+    return datasetfiles, replicas
+
+
+def current(nb_datasets: int, nb_files: int):
+    datasetfiles, replicas = [], {}
+    for dataset in range(nb_datasets):
+        files, tmp_replicas = FileColumns(), {}
+        for scope, name, bytes_, md5, adler32 in dataset_rows(dataset, nb_files):
+            scope = files.append(scope, name, bytes_, md5, adler32)
+            tmp_replicas[(scope, name)] = []
+        datasetfiles.append({'scope': None, 'name': dataset, 'files': files})
+        replicas.update(tmp_replicas)
+    return datasetfiles, replicas
+
+
+def measure(func, nb_datasets: int, nb_files: int) -> tuple[float, float, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    datasetfiles, _ = func(nb_datasets, nb_files)
+    build_time = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # one pass over the files, as done by each grouping function
+    start = time.perf_counter()
+    for dataset in datasetfiles:
+        sum(file['bytes'] for file in dataset['files'])
+    iteration_time = time.perf_counter() - start
+    return retained / 2 ** 20, build_time, iteration_time
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--datasets', type=int, default=200)
+    parser.add_argument('--files', type=int, default=1000, help='number of files per dataset')
+    args = parser.parse_args()
+
+    print(f'container of {args.datasets} datasets x {args.files} files')
+    for label, func in (('previous', previous), ('current', current)):
+        retained, build_time, iteration_time = measure(func, args.datasets, args.files)
+        print(f'{label + ":":10} {retained:8.1f} MiB retained, build {build_time:7.3f}s, one pass over the files {iteration_time:7.3f}s')
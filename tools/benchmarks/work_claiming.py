@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the two ways the workers of a daemon can share the messages table under worker
+churn: hash partitioning (filter_thread_work, with the worker numbers assigned by the
+heartbeats, as hermes does by default) and claims in a work queue (hermes with
+claim_messages enabled).
+
+Workers are threads which retrieve a batch of messages, spend --cost seconds on each of
+them as if delivering them, and delete them. Messages are produced at a constant --rate.
+Every --churn seconds a random worker dies in the middle of a batch, without deleting it,
+and a new worker starts. The heartbeat of a dead worker, and thus its hash bucket, stays
+until --heartbeat-timeout; the messages it claimed are claimed again once their lease
+(--lease-time) expires.
+
+Reports, for each mode, the messages delivered per second, the latency percentiles between
+the creation and the deletion of the messages, and the messages delivered more than once.
+
+Runs against the database configured in rucio.cfg. Hash partitioning is only effective on
+PostgreSQL, MySQL and Oracle: on SQLite, every worker retrieves every message.
+"""
+
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from rucio.common.utils import generate_uuid  # noqa: E402
+from rucio.core import heartbeat  # noqa: E402
+from rucio.core.message import WORK_QUEUE, delete_messages, retrieve_messages  # noqa: E402
+from rucio.core.work_queue import expire_work_leases, release_work  # noqa: E402
+from rucio.db.sqla import models  # noqa: E402
+from rucio.db.sqla.session import get_session  # noqa: E402
+
+PIDS = itertools.count(1)
+
+
+class Run:
+    """
+    The state shared by the producer and the workers of one mode.
+    """
+
+    def __init__(self, mode: str, args):
+        self.mode = mode
+        self.args = args
+        self.event_type = f'bench-{generate_uuid()[:8]}'
+        self.executable = f'work-claiming-{self.event_type}'
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.deliveries = Counter()
+        self.latencies: list[float] = []
+        self.errors = 0
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, run: Run):
+        super().__init__(daemon=True)
+        self.run_ = run
+        self.pid = next(PIDS)
+        self.owner = f'{run.executable}@bench:{self.pid}'
+        self.killed = threading.Event()
+
+    def run(self) -> None:
+        run, args = self.run_, self.run_.args
+        while not self.killed.is_set() and not run.stop.is_set():
+            try:
+                beat = heartbeat.live(run.executable, 'bench', self.pid, older_than=args.heartbeat_timeout)
+                if run.mode == 'hash':
+                    messages = retrieve_messages(args.bulk, thread=beat['assign_thread'], total_threads=beat['nr_threads'], event_type=run.event_type)
+                else:
+                    messages = retrieve_messages(args.bulk, event_type=run.event_type, claim_owner=self.owner, lease_time=args.lease_time)
+            except Exception:
+                with run.lock:
+                    run.errors += 1
+                time.sleep(args.idle)
+                continue
+            if not messages:
+                time.sleep(args.idle)
+                continue
+            for _ in messages:
+                if self.killed.is_set():
+                    return
+                time.sleep(args.cost)
+            delete_messages([{'id': message['id'], 'created_at': message['created_at'], 'updated_at': message['created_at'],
+                              'payload': '{}', 'event_type': message['event_type'], 'services': message['services']} for message in messages])
+            if run.mode == 'claim':
+                release_work(WORK_QUEUE, self.owner, [message['id'] for message in messages])
+            now = datetime.utcnow()
+            with run.lock:
+                run.deliveries.update(message['id'] for message in messages)
+                run.latencies.extend((now - message['created_at']).total_seconds() for message in messages)
+
+
+def produce(run: Run, interval: float = 0.5) -> None:
+    while not run.stop.is_set():
+        session = get_session()
+        session.execute(insert(models.Message), [{'event_type': run.event_type, 'payload': '{}', 'services': 'activemq'}
+                                                 for _ in range(int(run.args.rate * interval))])
+        session.commit()
+        time.sleep(interval)
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def benchmark(mode: str, args) -> dict:
+    run = Run(mode, args)
+    workers = [Worker(run) for _ in range(args.workers)]
+    producer = threading.Thread(target=produce, args=(run, ), daemon=True)
+    producer.start()
+    for worker in workers:
+        worker.start()
+
+    start = time.monotonic()
+    next_churn = start + args.churn
+    while time.monotonic() - start < args.duration:
+        time.sleep(0.1)
+        if args.churn and time.monotonic() >= next_churn:
+            next_churn += args.churn
+            victim = random.choice(workers)  # noqa: S311
+            victim.killed.set()
+            workers.remove(victim)
+            worker = Worker(run)
+            worker.start()
+            workers.append(worker)
+    elapsed = time.monotonic() - start
+    run.stop.set()
+    producer.join()
+    for worker in workers:
+        worker.join()
+
+    session = get_session()
+    left = session.execute(select(func.count()).where(models.Message.event_type == run.event_type)).scalar_one()
+    session.execute(delete(models.Message).where(models.Message.event_type == run.event_type))
+    session.execute(delete(models.Heartbeat).where(models.Heartbeat.readable == run.executable))
+    session.commit()
+    expire_work_leases(WORK_QUEUE)
+
+    delivered = sum(run.deliveries.values())
+    return {'delivered': delivered, 'rate': delivered / elapsed, 'duplicates': delivered - len(run.deliveries),
+            'left': left, 'errors': run.errors, 'p50': percentile(run.latencies, 50), 'p95': percentile(run.latencies, 95),
+            'p99': percentile(run.latencies, 99), 'max': max(run.latencies, default=0)}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', default='hash,claim', help='comma separated modes to benchmark: hash, claim')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=120, help='seconds to run each mode for')
+    parser.add_argument('--rate', type=float, default=200, help='messages produced per second')
+    parser.add_argument('--bulk', type=int, default=100, help='messages retrieved per batch')
+    parser.add_argument('--cost', type=float, default=0.005, help='seconds spent on each message')
+    parser.add_argument('--churn', type=float, default=10, help='seconds between two worker replacements, 0 to disable')
+    parser.add_argument('--heartbeat-timeout', type=int, default=30, help='seconds after which the heartbeat of a dead worker is ignored')
+    parser.add_argument('--lease-time', type=int, default=30, help='seconds after which the claims of a dead worker expire')
+    parser.add_argument('--idle', type=float, default=0.5, help='seconds a worker sleeps when it has nothing to do')
+    args = parser.parse_args()
+
+    print(f'{get_session().bind.dialect.name}: {args.workers} workers, {args.rate:.0f} messages/s, one worker replaced every {args.churn}s')
+    print(f'{"mode":6} {"delivered":>10} {"msg/s":>8} {"dupl.":>6} {"left":>6} {"errors":>6} {"p50 [s]":>8} {"p95 [s]":>8} {"p99 [s]":>8} {"max [s]":>8}')
+    for mode in args.modes.split(','):
+        result = benchmark(mode, args)
+        print(f'{mode:6} {result["delivered"]:10} {result["rate"]:8.1f} {result["duplicates"]:6} {result["left"]:6} {result["errors"]:6}'
+              f' {result["p50"]:8.2f} {result["p95"]:8.2f} {result["p99"]:8.2f} {result["max"]:8.2f}')
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Manage the optional monthly partitioning of the requests history (PostgreSQL only).
+
+ partition   convert the requests_history table into a partitioned table (once)
+ create      create the monthly partitions of the coming months (e.g. daily, from cron)
+ drop        drop the partitions which only contain requests older than the retention
+"""
+
+import logging
+import os.path
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from rucio.common.logging import setup_logging  # noqa: E402
+from rucio.db.sqla.util import create_requests_history_partitions, drop_requests_history_partitions, partition_requests_history  # noqa: E402
+
+LOG = logging.getLogger(__name__)
+
+if __name__ == '__main__':
+
+    setup_logging(process_name='requests-history-partitions')
+
+    parser = ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command in ('partition', 'create'):
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument('--months-ahead', type=int, default=2, help='number of monthly partitions to create after the current month')
+    subparser = subparsers.add_parser('drop')
+    subparser.add_argument('--older-than', type=int, required=True, help='retention of the requests history, in days')
+    args = parser.parse_args()
+
+    if args.command == 'partition':
+        if not partition_requests_history(months_ahead=args.months_ahead):
+            LOG.info('The requests history is already partitioned')
+    elif args.command == 'create':
+        LOG.info('Created partitions: %s', create_requests_history_partitions(months_ahead=args.months_ahead))
+    else:
+        LOG.info('Dropped partitions: %s', drop_requests_history_partitions(older_than=datetime.utcnow() - timedelta(days=args.older_than)))
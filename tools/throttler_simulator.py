@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# Copyright European Organization for Nuclear Research (CERN) since 2012
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Record the request state transitions of an instance and replay them through the throttler.
+
+ record   poll the requests table and append every observed state transition to a trace file
+ replay   replay a trace into the requests table, running a throttler cycle every --cycle
+          seconds of trace time, and compare the decisions of the incremental ThrottlingEngine
+          with the ones of the database release functions used by conveyor-throttler by default
+
+At each cycle of a replay, the transitions made visible since the previous cycle are written to
+the requests table. A transition becomes visible a random delay of at most --commit-delay after
+its updated_at, as with writers committing long transactions: the engine then gets them in
+batches and out of updated_at order through the same refresh, overlap window and periodic
+resync as in the daemon. The database release functions run first, on the same requests as
+the engine, and their releases are reverted; the releases of the engine are kept.
+
+The replay writes to the database configured in rucio.cfg, which must contain the RSEs, accounts
+and transfer limits of the recorded instance, and no requests: use a copy of the instance
+without its requests. The datasets of the requests are not recorded, so grouped_fifo limits
+release the requests one by one, on both sides.
+"""
+
+import json
+import logging
+import os.path
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+# Ensure package imports work when executed from any cwd
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(base_path, 'lib'))
+
+from sqlalchemy import delete, func, insert, select, update  # noqa: E402
+
+from rucio.common.logging import setup_logging  # noqa: E402
+from rucio.common.types import InternalAccount  # noqa: E402
+from rucio.core.request import get_request_stats  # noqa: E402
+from rucio.core.rse import RseCollection  # noqa: E402
+from rucio.daemons.conveyor import throttler  # noqa: E402
+from rucio.daemons.conveyor.throttler import ACTIVE_STATES, DatabaseReleaser, ThrottlingEngine, _get_request_stats, _handle_requests  # noqa: E402
+from rucio.db.sqla import models  # noqa: E402
+from rucio.db.sqla.constants import DatabaseOperationType, RequestState, RequestType  # noqa: E402
+from rucio.db.sqla.session import db_session  # noqa: E402
+
+LOG = logging.getLogger(__name__)
+THROTTLED_STATES = set(ACTIVE_STATES + [RequestState.WAITING])
+REQUEST_TYPES = [RequestType.TRANSFER, RequestType.STAGEIN, RequestType.STAGEOUT]
+
+
+def _quiet(*args, **kwargs) -> None:
+    pass
+
+
+def _to_event(row) -> dict:
+    return {'id': str(row.id), 'state': row.state.value, 'account': row.account.internal if row.account else None,
+            'dest_rse_id': str(row.dest_rse_id), 'source_rse_id': str(row.source_rse_id) if row.source_rse_id else None,
+            'activity': row.activity, 'requested_at': row.requested_at.isoformat() if row.requested_at else None,
+            'updated_at': row.updated_at.isoformat()}
+
+
+def _from_event(event: dict) -> SimpleNamespace:
+    return SimpleNamespace(id=event['id'], state=RequestState(event['state']),
+                           account=InternalAccount(event['account'], from_external=False) if event['account'] else None,
+                           dest_rse_id=event['dest_rse_id'], source_rse_id=event['source_rse_id'], activity=event['activity'],
+                           requested_at=datetime.fromisoformat(event['requested_at']) if event['requested_at'] else None,
+                           updated_at=datetime.fromisoformat(event['updated_at']))
+
+
+def record(path: str, duration: float, interval: float, overlap: float) -> None:
+    seen = {}
+    watermark = datetime(1970, 1, 1)
+    end = time.monotonic() + duration
+    with open(path, 'a') as trace:
+        while True:
+            nb_events = 0
+            stmt = select(
+                models.Request.id,
+                models.Request.state,
+                models.Request.account,
+                models.Request.dest_rse_id,
+                models.Request.source_rse_id,
+                models.Request.activity,
+                models.Request.requested_at,
+                models.Request.updated_at,
+            ).where(
+                models.Request.request_type.in_(REQUEST_TYPES),
+                models.Request.updated_at >= watermark - timedelta(seconds=overlap),
+            )
+            with db_session(DatabaseOperationType.READ) as session:
+                for row in session.execute(stmt).yield_per(1000):
+                    request_id = str(row.id)
+                    if seen.get(request_id) == row.updated_at:
+                        continue
+                    seen[request_id] = row.updated_at
+                    watermark = max(watermark, row.updated_at)
+                    trace.write(json.dumps(_to_event(row)) + '\n')
+                    nb_events += 1
+            trace.flush()
+            LOG.info('Recorded %d transitions', nb_events)
+            if time.monotonic() >= end:
+                break
+            time.sleep(interval)
+
+
+class TraceClock(datetime):
+    """
+    The trace time, as seen by the throttler module during a replay.
+    """
+    now = datetime.min
+
+    @classmethod
+    def utcnow(cls) -> datetime:  # type: ignore[override]
+        return cls.now
+
+
+class TraceTable:
+    """
+    The requests table of a replay.
+    """
+
+    def __init__(self):
+        self.updated_at: dict[str, datetime] = {}
+
+    def write(self, events: list[SimpleNamespace]) -> None:
+        """
+        Write the latest transition of each request, unless a later one was already written.
+        """
+        latest = {}
+        for event in events:
+            if event.updated_at > max(self.updated_at.get(event.id, datetime.min), getattr(latest.get(event.id), 'updated_at', datetime.min)):
+                latest[event.id] = event
+        if not latest:
+            return
+        with db_session(DatabaseOperationType.WRITE) as session:
+            session.execute(delete(models.Request).where(models.Request.id.in_(list(latest))))
+            rows = [{'id': e.id, 'request_type': RequestType.TRANSFER, 'state': e.state, 'account': e.account,
+                     'dest_rse_id': e.dest_rse_id, 'source_rse_id': e.source_rse_id, 'activity': e.activity,
+                     'requested_at': e.requested_at, 'created_at': e.updated_at, 'updated_at': e.updated_at}
+                    for e in latest.values() if e.state in THROTTLED_STATES]
+            if rows:
+                session.execute(insert(models.Request), rows)
+        # the terminated requests are archived, their updated_at is kept to ignore their late transitions
+        self.updated_at.update((event.id, event.updated_at) for event in latest.values())
+
+    def released_since(self, marker: datetime) -> dict[str, datetime]:
+        """
+        :returns: The requests released since the given real time, with their last updated_at in the trace.
+        """
+        stmt = select(models.Request.id).where(models.Request.updated_at >= marker)
+        with db_session(DatabaseOperationType.READ) as session:
+            return {str(request_id): self.updated_at[str(request_id)] for request_id in session.execute(stmt).scalars()}
+
+    def revert(self, released: dict[str, datetime]) -> None:
+        if released:
+            with db_session(DatabaseOperationType.WRITE) as session:
+                session.execute(update(models.Request), [{'id': request_id, 'state': RequestState.WAITING, 'updated_at': updated_at}
+                                                         for request_id, updated_at in released.items()])
+
+    def stamp(self, released: dict[str, datetime], now: datetime) -> None:
+        """
+        Move the requests released in real time to the trace time.
+        """
+        if released:
+            with db_session(DatabaseOperationType.WRITE) as session:
+                session.execute(update(models.Request), [{'id': request_id, 'updated_at': now} for request_id in released])
+            self.updated_at.update(dict.fromkeys(released, now))
+
+
+def replay(path: str, cycle: float, commit_delay: float, overlap: float, resync_interval: float, keep_releases: bool, seed: int) -> None:
+    with db_session(DatabaseOperationType.READ) as session:
+        if session.execute(select(func.count()).select_from(models.Request)).scalar_one():
+            LOG.error('The requests table is not empty: replay needs a database without requests')
+            return
+
+    rng = random.Random(seed)  # noqa: S311
+    previous_state = {}
+    events = []
+    with open(path) as trace:
+        for line in trace:
+            if not line.strip():
+                continue
+            event = _from_event(json.loads(line))
+            previous = previous_state.get(event.id)
+            previous_state[event.id] = event.state
+            if not keep_releases and previous == RequestState.WAITING and event.state == RequestState.QUEUED:
+                # released by the recorded throttler: let the simulated ones decide
+                continue
+            event.visible_at = event.updated_at + timedelta(seconds=rng.uniform(0, commit_delay))
+            events.append(event)
+    if not events:
+        LOG.info('Empty trace')
+        return
+    events.sort(key=lambda e: e.visible_at)
+
+    table = TraceTable()
+    engine = ThrottlingEngine(resync_interval=resync_interval, overlap=overlap)
+    timings, totals = Counter(), Counter()
+
+    def _run_cycle(now: datetime) -> None:
+        TraceClock.now = now
+        rse_collection = RseCollection()
+
+        marker = datetime.utcnow()
+        start = time.perf_counter()
+        release_groups = _get_request_stats(rse_collection, update_limit_stats=False, logger=_quiet)
+        _handle_requests(release_groups, logger=_quiet, releaser=DatabaseReleaser())
+        timings['database'] += time.perf_counter() - start
+        database_released = table.released_since(marker)
+        table.revert(database_released)
+
+        marker = datetime.utcnow()
+        start = time.perf_counter()
+        with mock.patch.object(throttler, 'datetime', SimpleNamespace(datetime=TraceClock, timedelta=timedelta)):
+            engine.refresh(logger=_quiet)
+            db_stats = list(get_request_stats(state=ACTIVE_STATES)) + list(engine.waiting_stats())  # type: ignore (Session parameter is missing)
+            release_groups = _get_request_stats(rse_collection, db_stats=db_stats, update_limit_stats=False, logger=_quiet)
+            _handle_requests(release_groups, logger=_quiet, releaser=engine)
+            engine.flush(logger=_quiet)
+        timings['engine'] += time.perf_counter() - start
+        engine_released = table.released_since(marker)
+        table.stamp(engine_released, now)
+
+        totals['database'] += len(database_released)
+        totals['engine'] += len(engine_released)
+        totals['cycles'] += 1
+        if set(database_released) != set(engine_released):
+            totals['diverging_cycles'] += 1
+            LOG.warning('%s: %d requests released only by the database functions, %d only by the engine', now,
+                        len(set(database_released) - set(engine_released)), len(set(engine_released) - set(database_released)))
+
+    now = events[0].updated_at
+    idx = 0
+    while idx < len(events):
+        now += timedelta(seconds=cycle)
+        batch = []
+        while idx < len(events) and events[idx].visible_at <= now:
+            batch.append(events[idx])
+            idx += 1
+        table.write(batch)
+        _run_cycle(now)
+
+    LOG.info('%d events, %d cycles, %d cycles with different decisions', len(events), totals['cycles'], totals['diverging_cycles'])
+    LOG.info('released by the database functions: %d in %.3fs', totals['database'], timings['database'])
+    LOG.info('released by the engine:             %d in %.3fs', totals['engine'], timings['engine'])
+
+
+if __name__ == '__main__':
+
+    setup_logging(process_name='throttler-simulator')
+
+    parser = ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparser = subparsers.add_parser('record')
+    subparser.add_argument('trace', help='file to append the transitions to')
+    subparser.add_argument('--duration', type=float, default=3600, help='seconds to record for')
+    subparser.add_argument('--interval', type=float, default=10, help='seconds between two polls of the requests table')
+    subparser.add_argument('--overlap', type=float, default=60, help='seconds by which consecutive polls overlap')
+    subparser = subparsers.add_parser('replay')
+    subparser.add_argument('trace')
+    subparser.add_argument('--cycle', type=float, default=600, help='seconds of trace time between two throttler cycles')
+    subparser.add_argument('--commit-delay', type=float, default=30, help='maximum seconds between the updated_at of a transition and its visibility')
+    subparser.add_argument('--overlap', type=float, default=60, help='overlap of the refreshes of the engine, in seconds')
+    subparser.add_argument('--resync-interval', type=float, default=3600, help='seconds of trace time between two full reloads of the engine')
+    subparser.add_argument('--seed', type=int, default=0, help='seed of the random commit delays')
+    subparser.add_argument('--keep-releases', action='store_true', help='also replay the releases done by the recorded throttler')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.trace, duration=args.duration, interval=args.interval, overlap=args.overlap)
+    else:
+        replay(args.trace, cycle=args.cycle, commit_delay=args.commit_delay, overlap=args.overlap,
+               resync_interval=args.resync_interval, keep_releases=args.keep_releases, seed=args.seed)